@@ -0,0 +1,37 @@
+"""Add precomputed diet/allergen compliance columns to recipes
+
+Revision ID: 0022_recipe_compliance
+Revises: 0021_google_oauth_tokens
+Create Date: 2026-10-18
+
+Existing rows get compliance_version NULL (safe_for_me checks them in memory until computed).
+Populate them with: python -m app.cli backfill-compliance
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0022_recipe_compliance"
+down_revision: Union[str, None] = "0021_google_oauth_tokens"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("recipes", sa.Column("diet_flags", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("recipes", sa.Column("allergen_flags", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("recipes", sa.Column("compliance_version", sa.Integer(), nullable=True))
+    op.create_index(op.f("ix_recipes_diet_flags"), "recipes", ["diet_flags"], unique=False)
+    op.create_index(op.f("ix_recipes_allergen_flags"), "recipes", ["allergen_flags"], unique=False)
+    op.create_index(op.f("ix_recipes_compliance_version"), "recipes", ["compliance_version"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_recipes_compliance_version"), table_name="recipes")
+    op.drop_index(op.f("ix_recipes_allergen_flags"), table_name="recipes")
+    op.drop_index(op.f("ix_recipes_diet_flags"), table_name="recipes")
+    op.drop_column("recipes", "compliance_version")
+    op.drop_column("recipes", "allergen_flags")
+    op.drop_column("recipes", "diet_flags")
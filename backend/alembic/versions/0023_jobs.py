@@ -0,0 +1,47 @@
+"""Add jobs table for background AI work
+
+Revision ID: 0023_jobs
+Revises: 0022_recipe_compliance
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0023_jobs"
+down_revision: Union[str, None] = "0022_recipe_compliance"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.String(length=32), nullable=False),
+        sa.Column("kind", sa.String(length=50), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("trial_session_id", sa.Integer(), nullable=True),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("progress", sa.JSON(), nullable=False),
+        sa.Column("result", sa.JSON(), nullable=True),
+        sa.Column("error", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["trial_session_id"], ["trial_sessions.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_jobs_status"), "jobs", ["status"], unique=False)
+    op.create_index(op.f("ix_jobs_user_id"), "jobs", ["user_id"], unique=False)
+    op.create_index(op.f("ix_jobs_trial_session_id"), "jobs", ["trial_session_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_jobs_trial_session_id"), table_name="jobs")
+    op.drop_index(op.f("ix_jobs_user_id"), table_name="jobs")
+    op.drop_index(op.f("ix_jobs_status"), table_name="jobs")
+    op.drop_table("jobs")
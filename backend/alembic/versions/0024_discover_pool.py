@@ -0,0 +1,37 @@
+"""Add discover_pool table for pre-generated discover suggestions
+
+Revision ID: 0024_discover_pool
+Revises: 0023_jobs
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0024_discover_pool"
+down_revision: Union[str, None] = "0023_jobs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "discover_pool",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("fingerprint", sa.String(length=64), nullable=False),
+        sa.Column("recipe", sa.JSON(), nullable=False),
+        sa.Column("served_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("served_to", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_discover_pool_id"), "discover_pool", ["id"], unique=False)
+    op.create_index(op.f("ix_discover_pool_fingerprint"), "discover_pool", ["fingerprint"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_discover_pool_fingerprint"), table_name="discover_pool")
+    op.drop_index(op.f("ix_discover_pool_id"), table_name="discover_pool")
+    op.drop_table("discover_pool")
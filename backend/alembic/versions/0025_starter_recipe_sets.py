@@ -0,0 +1,39 @@
+"""Add starter_recipe_sets catalog
+
+Revision ID: 0025_starter_recipe_sets
+Revises: 0024_discover_pool
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0025_starter_recipe_sets"
+down_revision: Union[str, None] = "0024_discover_pool"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "starter_recipe_sets",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("catalog_key", sa.String(length=64), nullable=False),
+        sa.Column("target_country", sa.String(length=10), nullable=False),
+        sa.Column("target_language", sa.String(length=10), nullable=False),
+        sa.Column("dish_preferences", sa.JSON(), nullable=False),
+        sa.Column("diet_filters", sa.JSON(), nullable=False),
+        sa.Column("recipes_data", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_starter_recipe_sets_id"), "starter_recipe_sets", ["id"], unique=False)
+    op.create_index(op.f("ix_starter_recipe_sets_catalog_key"), "starter_recipe_sets", ["catalog_key"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_starter_recipe_sets_catalog_key"), table_name="starter_recipe_sets")
+    op.drop_index(op.f("ix_starter_recipe_sets_id"), table_name="starter_recipe_sets")
+    op.drop_table("starter_recipe_sets")
@@ -0,0 +1,26 @@
+"""Add recipes.image_status for background image generation
+
+Revision ID: 0026_recipe_image_status
+Revises: 0025_starter_recipe_sets
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0026_recipe_image_status"
+down_revision: Union[str, None] = "0025_starter_recipe_sets"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("recipes", sa.Column("image_status", sa.String(length=16), nullable=True))
+    op.create_index(op.f("ix_recipes_image_status"), "recipes", ["image_status"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_recipes_image_status"), table_name="recipes")
+    op.drop_column("recipes", "image_status")
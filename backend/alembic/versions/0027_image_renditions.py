@@ -0,0 +1,26 @@
+"""Add responsive image renditions to recipes and the image cache
+
+Revision ID: 0027_image_renditions
+Revises: 0026_recipe_image_status
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0027_image_renditions"
+down_revision: Union[str, None] = "0026_recipe_image_status"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("recipes", sa.Column("image_renditions", sa.JSON(), nullable=True))
+    op.add_column("recipe_image_cache", sa.Column("renditions", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("recipe_image_cache", "renditions")
+    op.drop_column("recipes", "image_renditions")
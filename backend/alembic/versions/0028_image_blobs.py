@@ -0,0 +1,35 @@
+"""Add image_blobs for content-addressed, reference-counted recipe image files
+
+Revision ID: 0028_image_blobs
+Revises: 0027_image_renditions
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0028_image_blobs"
+down_revision: Union[str, None] = "0027_image_renditions"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "image_blobs",
+        sa.Column("hash", sa.String(length=64), nullable=False),
+        sa.Column("path", sa.String(length=100), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("stored_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("released_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("hash"),
+    )
+    op.create_index(op.f("ix_image_blobs_ref_count"), "image_blobs", ["ref_count"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_image_blobs_ref_count"), table_name="image_blobs")
+    op.drop_table("image_blobs")
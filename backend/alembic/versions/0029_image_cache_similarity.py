@@ -0,0 +1,36 @@
+"""Add near-duplicate reuse columns to the recipe image cache
+
+Revision ID: 0029_image_cache_similarity
+Revises: 0028_image_blobs
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0029_image_cache_similarity"
+down_revision: Union[str, None] = "0028_image_blobs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("recipe_image_cache", sa.Column("canonical_key", sa.String(length=255), nullable=True))
+    op.add_column("recipe_image_cache", sa.Column("title_tokens", sa.JSON(), nullable=True))
+    op.add_column("recipe_image_cache", sa.Column("ingredient_tokens", sa.JSON(), nullable=True))
+    op.add_column(
+        "recipe_image_cache", sa.Column("hit_count", sa.Integer(), nullable=False, server_default="0")
+    )
+    op.create_index(
+        op.f("ix_recipe_image_cache_canonical_key"), "recipe_image_cache", ["canonical_key"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_recipe_image_cache_canonical_key"), table_name="recipe_image_cache")
+    op.drop_column("recipe_image_cache", "hit_count")
+    op.drop_column("recipe_image_cache", "ingredient_tokens")
+    op.drop_column("recipe_image_cache", "title_tokens")
+    op.drop_column("recipe_image_cache", "canonical_key")
@@ -0,0 +1,50 @@
+"""Add fetched_page_cache for URL-import pages (validators + extraction result)
+
+Revision ID: 0030_fetched_page_cache
+Revises: 0029_image_cache_similarity
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0030_fetched_page_cache"
+down_revision: Union[str, None] = "0029_image_cache_similarity"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "fetched_page_cache",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("url_key", sa.String(length=64), nullable=False),
+        sa.Column("url", sa.String(length=2000), nullable=False),
+        sa.Column("etag", sa.String(length=255), nullable=True),
+        sa.Column("last_modified", sa.String(length=64), nullable=True),
+        sa.Column("page_text", sa.Text(), nullable=False),
+        sa.Column("chunks", sa.JSON(), nullable=False),
+        sa.Column("source", sa.String(length=20), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("hit_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("fetched_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("validated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_used_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_fetched_page_cache_id"), "fetched_page_cache", ["id"], unique=False)
+    op.create_index(op.f("ix_fetched_page_cache_url_key"), "fetched_page_cache", ["url_key"], unique=True)
+    op.create_index(op.f("ix_fetched_page_cache_fetched_at"), "fetched_page_cache", ["fetched_at"], unique=False)
+    op.create_index(
+        op.f("ix_fetched_page_cache_last_used_at"), "fetched_page_cache", ["last_used_at"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_fetched_page_cache_last_used_at"), table_name="fetched_page_cache")
+    op.drop_index(op.f("ix_fetched_page_cache_fetched_at"), table_name="fetched_page_cache")
+    op.drop_index(op.f("ix_fetched_page_cache_url_key"), table_name="fetched_page_cache")
+    op.drop_index(op.f("ix_fetched_page_cache_id"), table_name="fetched_page_cache")
+    op.drop_table("fetched_page_cache")
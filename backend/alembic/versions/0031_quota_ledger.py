@@ -0,0 +1,46 @@
+"""Add quota_ledger: reserved / committed / released quota movements per user or trial session
+
+Revision ID: 0031_quota_ledger
+Revises: 0030_fetched_page_cache
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0031_quota_ledger"
+down_revision: Union[str, None] = "0030_fetched_page_cache"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "quota_ledger",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("trial_session_id", sa.Integer(), nullable=True),
+        sa.Column("units", sa.Integer(), nullable=False),
+        sa.Column("state", sa.String(length=16), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("settled_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["trial_session_id"], ["trial_sessions.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_quota_ledger_user_day", "quota_ledger", ["user_id", "day"], unique=False)
+    op.create_index("ix_quota_ledger_state_expires", "quota_ledger", ["state", "expires_at"], unique=False)
+    op.create_index(op.f("ix_quota_ledger_trial_session_id"), "quota_ledger", ["trial_session_id"], unique=False)
+    op.create_index(op.f("ix_quota_ledger_day"), "quota_ledger", ["day"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_quota_ledger_day"), table_name="quota_ledger")
+    op.drop_index(op.f("ix_quota_ledger_trial_session_id"), table_name="quota_ledger")
+    op.drop_index("ix_quota_ledger_state_expires", table_name="quota_ledger")
+    op.drop_index("ix_quota_ledger_user_day", table_name="quota_ledger")
+    op.drop_table("quota_ledger")
@@ -0,0 +1,24 @@
+"""Add jobs.heartbeat_at so recovery only takes over jobs whose process died
+
+Revision ID: 0032_job_heartbeat
+Revises: 0031_quota_ledger
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0032_job_heartbeat"
+down_revision: Union[str, None] = "0031_quota_ledger"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("jobs", sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("jobs", "heartbeat_at")
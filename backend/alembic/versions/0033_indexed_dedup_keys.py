@@ -0,0 +1,57 @@
+"""Add indexed recipes.image_cache_key and jobs.dedup_key so image and refill jobs are found in SQL
+
+Revision ID: 0033_indexed_dedup_keys
+Revises: 0032_job_heartbeat
+Create Date: 2026-10-19
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0033_indexed_dedup_keys"
+down_revision: Union[str, None] = "0032_job_heartbeat"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Job kind -> payload field naming what the job works on
+_DEDUP_FIELDS = {"recipes.image": "cache_key", "discover.refill": "fingerprint"}
+
+
+def upgrade() -> None:
+    op.add_column("recipes", sa.Column("image_cache_key", sa.String(length=255), nullable=True))
+    op.create_index(op.f("ix_recipes_image_cache_key"), "recipes", ["image_cache_key"], unique=False)
+    op.add_column("jobs", sa.Column("dedup_key", sa.String(length=255), nullable=True))
+    op.create_index("ix_jobs_kind_dedup_key_status", "jobs", ["kind", "dedup_key", "status"], unique=False)
+
+    conn = op.get_bind()
+    unfinished = conn.execute(
+        sa.text(
+            "SELECT id, kind, payload FROM jobs WHERE kind IN ('recipes.image', 'discover.refill')"
+            " AND status IN ('queued', 'running')"
+        )
+    ).all()
+    for job_id, kind, payload in unfinished:
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        key = (payload or {}).get(_DEDUP_FIELDS[kind])
+        if key:
+            conn.execute(sa.text("UPDATE jobs SET dedup_key = :k WHERE id = :id"), {"k": key, "id": job_id})
+        if kind == "recipes.image" and key and (payload or {}).get("recipe_id") is not None:
+            conn.execute(
+                sa.text("UPDATE recipes SET image_cache_key = :k WHERE id = :id AND image_status = 'pending'"),
+                {"k": key, "id": payload["recipe_id"]},
+            )
+    # Other pending recipes have no key to be found by; let them be requested again.
+    conn.execute(
+        sa.text("UPDATE recipes SET image_status = NULL WHERE image_status = 'pending' AND image_cache_key IS NULL")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_jobs_kind_dedup_key_status", table_name="jobs")
+    op.drop_column("jobs", "dedup_key")
+    op.drop_index(op.f("ix_recipes_image_cache_key"), table_name="recipes")
+    op.drop_column("recipes", "image_cache_key")
@@ -0,0 +1,27 @@
+"""Add recipe_variants.updated_at so cached variant payloads are versioned by their last edit
+
+Revision ID: 0034_variant_updated_at
+Revises: 0033_indexed_dedup_keys
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0034_variant_updated_at"
+down_revision: Union[str, None] = "0033_indexed_dedup_keys"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("recipe_variants", sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE recipe_variants SET updated_at = created_at")
+    with op.batch_alter_table("recipe_variants") as batch_op:
+        batch_op.alter_column("updated_at", existing_type=sa.DateTime(timezone=True), nullable=False)
+
+
+def downgrade() -> None:
+    op.drop_column("recipe_variants", "updated_at")
@@ -0,0 +1,49 @@
+"""One unfinished job per kind and dedup_key (partial unique index); bulk imports keyed by user
+
+Revision ID: 0035_unique_unfinished_job_key
+Revises: 0034_variant_updated_at
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0035_unique_unfinished_job_key"
+down_revision: Union[str, None] = "0034_variant_updated_at"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_UNFINISHED = "status IN ('queued', 'running') AND dedup_key IS NOT NULL"
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(
+        sa.text(
+            "UPDATE jobs SET dedup_key = 'user:' || user_id WHERE kind = 'recipes.bulk_import'"
+            " AND status IN ('queued', 'running') AND user_id IS NOT NULL"
+        )
+    )
+    # Keep the key on the oldest unfinished job of each (kind, key); the others still run, unkeyed.
+    conn.execute(
+        sa.text(
+            f"UPDATE jobs SET dedup_key = NULL WHERE {_UNFINISHED} AND EXISTS ("
+            " SELECT 1 FROM jobs AS older WHERE older.kind = jobs.kind AND older.dedup_key = jobs.dedup_key"
+            " AND older.status IN ('queued', 'running')"
+            " AND (older.created_at < jobs.created_at OR (older.created_at = jobs.created_at AND older.id < jobs.id)))"
+        )
+    )
+    op.create_index(
+        "uq_jobs_unfinished_kind_dedup_key",
+        "jobs",
+        ["kind", "dedup_key"],
+        unique=True,
+        sqlite_where=sa.text(_UNFINISHED),
+        postgresql_where=sa.text(_UNFINISHED),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_jobs_unfinished_kind_dedup_key", table_name="jobs")
@@ -11,7 +11,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select
 
 from .database import get_db
-from . import models
+from . import auth_cache, models
 
 SECRET_KEY = os.getenv("SECRET_KEY", "change-me-in-production")
 ALGORITHM = "HS256"
@@ -46,9 +46,11 @@ def verify_password_from_prehashed(password_hash: str, hashed: str) -> bool:
     return pwd_context.verify(password_hash, hashed)
 
 
-def create_access_token(user_id: int) -> str:
+def create_access_token(user_id: int, account_tier: str = "free") -> str:
+    # The tier rides along for the rate limiter, which reads it without DB access; GET /users/me
+    # renews the token, so a tier change reaches it within one visit.
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    return jwt.encode({"sub": str(user_id), "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode({"sub": str(user_id), "tier": account_tier, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
 
 
 # Trial tokens: 7-day expiry, type "trial", sub = token_id (<=32 chars)
@@ -66,10 +68,19 @@ def create_trial_token(token_id: str) -> str:
     )
 
 
+def _decode_token(token: str) -> dict:
+    """jwt.decode (signature, algorithm, exp) behind the short-lived token cache. Raises JWTError."""
+    payload = auth_cache.get_token(token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        auth_cache.put_token(token, payload)
+    return payload
+
+
 def decode_trial_token(token: str) -> dict | None:
     """Verify signature and algorithm, ensure type == 'trial'. Return payload or None."""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _decode_token(token)
         if payload.get("type") != "trial":
             return None
         return payload
@@ -77,6 +88,24 @@ def decode_trial_token(token: str) -> dict | None:
         return None
 
 
+def token_subject(token: str) -> tuple[str, str, str | None] | None:
+    """
+    ("user", user id, account tier claim) or ("trial", token id, None) for a valid token, else None.
+    No DB access.
+    """
+    try:
+        payload = _decode_token(token)
+    except JWTError:
+        return None
+    sub = payload.get("sub")
+    if not sub or not isinstance(sub, str):
+        return None
+    if payload.get("type") == "trial":
+        return ("trial", sub, None)
+    tier = payload.get("tier")
+    return ("user", sub, tier if isinstance(tier, str) else None)
+
+
 def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
@@ -87,7 +116,7 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _decode_token(token)
         if payload.get("type") == "trial":
             raise credentials_exception  # Trial token is not a user; return 401 instead of 500
         user_id: str | None = payload.get("sub")
@@ -97,7 +126,7 @@ def get_current_user(
     except (JWTError, ValueError, TypeError):
         raise credentials_exception
 
-    user = db.get(models.User, uid)
+    user = auth_cache.load_user(db, uid)
     if user is None:
         raise credentials_exception
     if user.is_blocked:
@@ -116,7 +145,7 @@ def get_current_user_optional(
     if not token or not token.strip():
         return None
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _decode_token(token)
         if payload.get("type") == "trial":
             return None  # Trial token: no user, quota enforced via enforce_trial_or_user_quota
         user_id: str | None = payload.get("sub")
@@ -128,7 +157,7 @@ def get_current_user_optional(
         uid = int(user_id)
     except (TypeError, ValueError):
         return None
-    user = db.get(models.User, uid)
+    user = auth_cache.load_user(db, uid)
     if user is None or user.is_blocked:
         return None
     return user
@@ -142,7 +171,7 @@ def get_optional_user_and_trial(
     if not token or not token.strip():
         return (None, None)
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _decode_token(token)
     except JWTError:
         return (None, None)
     if payload.get("type") == "trial":
@@ -162,7 +191,7 @@ def get_optional_user_and_trial(
         uid = int(user_id)
     except (TypeError, ValueError):
         return (None, None)
-    user = db.get(models.User, uid)
+    user = auth_cache.load_user(db, uid)
     if user is None or user.is_blocked:
         return (None, None)
     return (user, None)
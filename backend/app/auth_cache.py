@@ -0,0 +1,139 @@
+"""
+Short-lived in-process cache behind the auth dependencies.
+
+Decoded JWT payloads are kept per token string, and a snapshot of each user row (quota and
+settings columns) per user id, both for AUTH_CACHE_TTL_S. A cached user is attached to the
+request's session without loading the row, so handlers get a normal persistent User they can read
+and update. is_blocked and is_verified are not trusted from the snapshot: a primary-key SELECT of
+just those two columns runs on every hit, so a block or deletion made by any worker applies at once.
+Entries are dropped whenever a User row is updated or deleted through the ORM (settings, admin
+block / quota changes, deletion) and again when that transaction commits or rolls back; code that
+changes users with core UPDATEs calls invalidate_user().
+"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, attributes, make_transient_to_detached, object_session
+from sqlalchemy.orm.util import identity_key
+
+TTL_S = float(os.getenv("AUTH_CACHE_TTL_S", "30"))
+MAX_ENTRIES = 10_000
+
+_lock = threading.Lock()
+_tokens: OrderedDict[str, tuple[dict, float]] = OrderedDict()  # token -> (payload, expires wall time)
+_users: OrderedDict[int, tuple[dict, float]] = OrderedDict()  # user id -> (column values, expires monotonic)
+_DIRTY_KEY = "auth_cache_dirty_users"
+
+
+def _put(cache: OrderedDict, key, value) -> None:
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > MAX_ENTRIES:
+        cache.popitem(last=False)
+
+
+def get_token(token: str) -> dict | None:
+    """Cached payload of a token decoded earlier (None when unknown or expired)."""
+    with _lock:
+        entry = _tokens.get(token)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del _tokens[token]
+            return None
+        return entry[0]
+
+
+def put_token(token: str, payload: dict) -> None:
+    """Remember a verified payload until TTL_S or the token's own exp, whichever comes first."""
+    expires = time.time() + TTL_S
+    if isinstance(payload.get("exp"), (int, float)):
+        expires = min(expires, payload["exp"])
+    with _lock:
+        _put(_tokens, token, (payload, expires))
+
+
+def load_user(db: Session, user_id: int):
+    """
+    The User with user_id in db: from the session's identity map, else built from a fresh cached
+    snapshot (after re-reading its access flags), else loaded and snapshotted. None when there is
+    no such user.
+    """
+    from . import models
+
+    existing = db.identity_map.get(identity_key(models.User, user_id))
+    if existing is not None:
+        return existing
+    with _lock:
+        entry = _users.get(user_id)
+        if entry is not None and entry[1] <= time.monotonic():
+            del _users[user_id]
+            entry = None
+        values = copy.deepcopy(entry[0]) if entry is not None else None
+    if values is not None:
+        table = models.User.__table__
+        flags = db.execute(select(table.c.is_blocked, table.c.is_verified).where(table.c.id == user_id)).first()
+        if flags is None:  # deleted by another worker
+            invalidate_user(user_id)
+            return None
+        if tuple(flags) != (values["is_blocked"], values["is_verified"]):
+            invalidate_user(user_id)  # changed by another worker: load the whole row again
+            values = None
+    if values is None:
+        user = db.get(models.User, user_id)
+        if user is not None:
+            snapshot = {attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs}
+            with _lock:
+                _put(_users, user_id, (copy.deepcopy(snapshot), time.monotonic() + TTL_S))
+        return user
+    user = models.User.__mapper__.class_manager.new_instance()
+    for key, value in values.items():
+        attributes.set_committed_value(user, key, value)
+    make_transient_to_detached(user)
+    db.add(user)
+    return user
+
+
+def cached_user(user_id: int) -> dict | None:
+    """Column values of a fresh cached snapshot of the user (no query), or None."""
+    with _lock:
+        entry = _users.get(user_id)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return dict(entry[0])
+
+
+def invalidate_user(user_id: int) -> None:
+    with _lock:
+        _users.pop(user_id, None)
+
+
+def clear() -> None:
+    with _lock:
+        _tokens.clear()
+        _users.clear()
+
+
+def _user_changed(mapper, connection, target) -> None:
+    invalidate_user(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_DIRTY_KEY, set()).add(target.id)
+
+
+def _transaction_ended(session: Session) -> None:
+    # A request that re-cached the row between flush and commit would otherwise keep the old state.
+    for user_id in session.info.pop(_DIRTY_KEY, ()):
+        invalidate_user(user_id)
+
+
+def register_user_cache_listeners(cls) -> None:
+    """Invalidate cached users on ORM update/delete of cls (models.User) and at commit/rollback."""
+    event.listen(cls, "after_update", _user_changed)
+    event.listen(cls, "after_delete", _user_changed)
+    event.listen(Session, "after_commit", _transaction_ended)
+    event.listen(Session, "after_rollback", _transaction_ended)
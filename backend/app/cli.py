@@ -0,0 +1,231 @@
+"""
+Maintenance commands, run from backend/:  python -m app.cli <command> [options]
+
+  backfill-compliance   Recompute recipe diet/allergen compliance columns in batches.
+  warm-starter-catalog  Pre-generate starter-recipe sets for the top locales and diets.
+  backfill-image-renditions  Build thumb/medium/full WebP + JPEG renditions for stored images.
+  bench-image-bytes     Report image bytes per recipe list page, originals vs thumbnails.
+  bench-structured-import  Structured-data coverage of saved recipe pages and LLM time it saves.
+  bench-page-text       Time and text size of page-text extraction, regex chain vs tokenizer.
+  bench-middleware      Per-request time of the HTTP middleware stack, old decorator stack vs fused ASGI.
+  bench-serialization   Time to serialize a recipe list response, per-row models vs RowSerializer.
+"""
+import argparse
+import os
+import sys
+
+from .database import SessionLocal
+
+
+def _backfill_compliance(args: argparse.Namespace) -> int:
+    from .services.recipe_compliance import backfill_compliance
+
+    db = SessionLocal()
+    try:
+        updated = backfill_compliance(db, batch_size=args.batch_size, recompute_all=args.all)
+    finally:
+        db.close()
+    print(f"Updated compliance for {updated} recipe(s).")
+    return 0
+
+
+def _parse_locale(value: str) -> tuple[str, str]:
+    country, sep, language = value.partition(":")
+    if not sep or not country.strip() or not language.strip():
+        raise argparse.ArgumentTypeError(f"expected COUNTRY:LANGUAGE (e.g. PL:pl), got {value!r}")
+    return country.strip().upper(), language.strip().lower()
+
+
+def _parse_diets(value: str) -> tuple[str, ...]:
+    return tuple(d.strip().lower() for d in value.split(",") if d.strip())
+
+
+def _warm_starter_catalog(args: argparse.Namespace) -> int:
+    from .services.starter_recipes import TOP_DIET_SETS, TOP_LOCALES, warm_starter_catalog
+
+    db = SessionLocal()
+    try:
+        generated, present = warm_starter_catalog(
+            db,
+            locales=args.locale or list(TOP_LOCALES),
+            diet_sets=args.diets or list(TOP_DIET_SETS),
+            refresh=args.refresh,
+        )
+    finally:
+        db.close()
+    print(f"Generated {generated} starter set(s); {present} already in the catalog.")
+    return 0
+
+
+def _backfill_image_renditions(args: argparse.Namespace) -> int:
+    from .services.image_renditions import available
+    from .services.recipe_image import backfill_renditions
+
+    if not available():
+        print("Pillow is not installed; cannot build renditions.")
+        return 1
+    db = SessionLocal()
+    try:
+        updated = backfill_renditions(db)
+    finally:
+        db.close()
+    print(f"Built renditions for {updated} recipe(s).")
+    return 0
+
+
+def _bench_image_bytes(args: argparse.Namespace) -> int:
+    from .services.recipe_image import list_page_image_bytes
+
+    db = SessionLocal()
+    try:
+        report = list_page_image_bytes(db, page_size=args.page_size)
+    finally:
+        db.close()
+    before, after = report["before_bytes"], report["after_bytes"]
+    saved = f" ({100 - after * 100 // before}% less)" if before else ""
+    print(
+        f"List page of {report['recipes']} recipe(s) with images: "
+        f"{before} bytes as originals, {after} bytes as thumbnails{saved}."
+    )
+    return 0
+
+
+_DEFAULT_PAGE_CORPUS = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "recipe_pages")
+
+
+def _bench_structured_import(args: argparse.Namespace) -> int:
+    from .services.structured_recipes import measure_corpus
+
+    pages = {}
+    for name in sorted(os.listdir(args.dir)):
+        if name.endswith((".html", ".htm")):
+            with open(os.path.join(args.dir, name), encoding="utf-8", errors="replace") as f:
+                pages[name] = f.read()
+    llm_extract = None
+    if args.measure_llm:
+        if not os.getenv("OPENAI_API_KEY"):
+            print("OPENAI_API_KEY is not set; cannot time the extraction LLM.")
+            return 1
+        from .routers.recipes import _extract_text
+        from .services.translation import extract_recipes_from_page
+
+        llm_extract = lambda page_html: extract_recipes_from_page(_extract_text(page_html))  # noqa: E731
+    report = measure_corpus(pages, llm_extract=llm_extract)
+    for c in report["covered"]:
+        print(f"  {c['page']}: {c['recipes']} recipe(s) from structured data")
+    print(
+        f"Structured data: {len(report['covered'])}/{report['pages']} page(s), {report['recipes']} recipe(s), "
+        f"parsed in {report['parse_ms']} ms; {report['pages'] - len(report['covered'])} page(s) need the extraction LLM."
+    )
+    if "llm_ms_saved" in report:
+        print(f"Extraction LLM: {report['llm_ms_avg']} ms per page; {report['llm_ms_saved']} ms saved on this corpus.")
+    return 0
+
+
+def _bench_page_text(args: argparse.Namespace) -> int:
+    from .services.page_text import large_test_pages, measure_extraction
+
+    pages = {}
+    for name in sorted(os.listdir(args.dir)):
+        if name.endswith((".html", ".htm")):
+            with open(os.path.join(args.dir, name), encoding="utf-8", errors="replace") as f:
+                pages[name] = f.read()
+    pages.update(large_test_pages(args.large_bytes))
+    rows = measure_extraction(pages, max_chars=args.max_chars)
+    for row in rows:
+        print(
+            f"  {row['page']} ({row['html_bytes']} bytes): regex {row['regex_ms']} ms / {row['regex_chars']} chars, "
+            f"tokenizer {row['tokenizer_ms']} ms / {row['tokenizer_chars']} chars"
+        )
+    regex_ms, tokenizer_ms = sum(r["regex_ms"] for r in rows), sum(r["tokenizer_ms"] for r in rows)
+    regex_chars, tokenizer_chars = sum(r["regex_chars"] for r in rows), sum(r["tokenizer_chars"] for r in rows)
+    print(
+        f"Total: regex {round(regex_ms, 1)} ms / ~{regex_chars // 4} tokens, "
+        f"tokenizer {round(tokenizer_ms, 1)} ms / ~{tokenizer_chars // 4} tokens sent to extraction."
+    )
+    return 0
+
+
+def _bench_middleware(args: argparse.Namespace) -> int:
+    from .middleware import measure_overhead
+
+    for row in measure_overhead(requests=args.requests):
+        origin = "with Origin" if row["origin"] else "no Origin"
+        print(
+            f"  GET {row['path']} ({origin}): bare {row['bare_us']} us, "
+            f"old stack {row['legacy_us'] - row['bare_us']:+.1f} us, "
+            f"fused {row['fused_us'] - row['bare_us']:+.1f} us per request"
+        )
+    return 0
+
+
+def _bench_serialization(args: argparse.Namespace) -> int:
+    from .fast_json import measure_recipe_list
+
+    report = measure_recipe_list(count=args.recipes, repeat=args.repeat)
+    print(f"Serializing {report['recipes']} recipes ({report['bytes']} bytes of JSON), ms per response:")
+    for key, label in (
+        ("per_row_stdlib_ms", "model_validate per row + stdlib json"),
+        ("response_model_ms", "response_model (TypeAdapter validate + dump_json)"),
+        ("row_serializer_typeadapter_ms", "RowSerializer, TypeAdapter dump"),
+        ("row_serializer_orjson_ms", "RowSerializer, orjson"),
+    ):
+        if key in report:
+            print(f"  {label}: {report[key]} ms")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("backfill-compliance", help="Recompute recipe compliance columns")
+    p.add_argument("--batch-size", type=int, default=500)
+    p.add_argument("--all", action="store_true", help="Recompute every row, not only stale ones")
+    p.set_defaults(func=_backfill_compliance)
+
+    p = sub.add_parser("warm-starter-catalog", help="Pre-generate starter-recipe sets")
+    p.add_argument(
+        "--locale", type=_parse_locale, action="append",
+        help="COUNTRY:LANGUAGE, repeatable (default: the built-in top locales)",
+    )
+    p.add_argument(
+        "--diets", type=_parse_diets, action="append",
+        help='Comma-separated diet set, repeatable; "" for no diet (default: none, vegetarian, vegan, kosher, gluten_free)',
+    )
+    p.add_argument("--refresh", action="store_true", help="Regenerate sets that are already in the catalog")
+    p.set_defaults(func=_warm_starter_catalog)
+
+    p = sub.add_parser("backfill-image-renditions", help="Build responsive renditions for stored images")
+    p.set_defaults(func=_backfill_image_renditions)
+
+    p = sub.add_parser("bench-image-bytes", help="Image bytes per recipe list page, before/after renditions")
+    p.add_argument("--page-size", type=int, default=20)
+    p.set_defaults(func=_bench_image_bytes)
+
+    p = sub.add_parser("bench-structured-import", help="Structured-data coverage of saved recipe pages")
+    p.add_argument("--dir", default=_DEFAULT_PAGE_CORPUS, help="Directory of saved .html pages")
+    p.add_argument("--measure-llm", action="store_true", help="Also time the LLM extraction it replaces (needs API key)")
+    p.set_defaults(func=_bench_structured_import)
+
+    p = sub.add_parser("bench-page-text", help="Page-text extraction time and size, regex chain vs tokenizer")
+    p.add_argument("--dir", default=_DEFAULT_PAGE_CORPUS, help="Directory of saved .html pages")
+    p.add_argument("--large-bytes", type=int, default=1_000_000, help="Size of the synthetic large pages")
+    p.add_argument("--max-chars", type=int, default=10000, help="Text budget sent to the extraction model")
+    p.set_defaults(func=_bench_page_text)
+
+    p = sub.add_parser("bench-middleware", help="Middleware overhead per request, old stack vs fused ASGI")
+    p.add_argument("--requests", type=int, default=5000, help="Requests per path and stack")
+    p.set_defaults(func=_bench_middleware)
+
+    p = sub.add_parser("bench-serialization", help="Recipe list serialization time, per-row models vs RowSerializer")
+    p.add_argument("--recipes", type=int, default=500)
+    p.add_argument("--repeat", type=int, default=20)
+    p.set_defaults(func=_bench_serialization)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -22,8 +22,11 @@ class Base(DeclarativeBase):
 
 
 def get_db():
+    from .quota import settle_reservations  # quota -> models -> database
+
     db = SessionLocal()
     try:
-        yield db
+        with settle_reservations(db):
+            yield db
     finally:
         db.close()
@@ -0,0 +1,220 @@
+"""
+Fast JSON for large responses, opt-in per route.
+
+FastJSONResponse renders content with orjson when it is installed, else with the stdlib encoder
+as JSONResponse does. bytes content is sent as it is (already serialized JSON).
+
+RowSerializer(schema) turns ORM rows into the JSON the Pydantic schema would produce without
+building a model per row. Column values come straight from each instance's loaded state, which
+skips attribute instrumentation and validation. The schema's computed fields are added, then the
+whole list is dumped in one call. It uses orjson when installed, else a TypeAdapter over a
+TypedDict mirror of the schema. Only for schemas whose fields are plain columns of the row. A
+route keeps response_model for its OpenAPI schema and returns serializer.response(rows).
+
+PayloadCache keeps the serialized bytes of rows that almost never change, such as recipe
+variants. Repeated reads then skip loading and encoding their JSON columns. Entries are dropped
+on any ORM update or delete of the row in this process, and after `ttl_s` in every process.
+Each entry carries a version (created_at for variants), so a reused id never serves old bytes.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Iterable
+
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from starlette.responses import JSONResponse
+from typing_extensions import TypedDict
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+_ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+_MISSING = object()
+
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """Compact UTF-8 JSON; datetimes as Pydantic writes them (UTC as Z) when orjson is installed."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+class _Attrs(dict):
+    """A row dict readable as attributes, for the schema's computed-field getters."""
+
+    __getattr__ = dict.__getitem__
+
+
+class RowSerializer:
+    def __init__(self, schema: type[BaseModel]):
+        self.schema = schema
+        self.fields = list(schema.model_fields)
+        self._defaults = {name: f.get_default(call_default_factory=True) for name, f in schema.model_fields.items()}
+        self._computed = [(name, f.wrapped_property.fget) for name, f in schema.model_computed_fields.items()]
+        mirror = TypedDict(
+            f"{schema.__name__}Row",
+            {
+                **{name: f.annotation for name, f in schema.model_fields.items()},
+                **{name: f.return_type for name, f in schema.model_computed_fields.items()},
+            },
+        )
+        self._one = TypeAdapter(mirror)
+        self._many = TypeAdapter(list[mirror])
+
+    def row(self, obj) -> dict:
+        state = obj.__dict__
+        out = _Attrs()
+        for name in self.fields:
+            value = state.get(name, _MISSING)
+            if value is _MISSING:  # expired or deferred: let the ORM load it
+                value = getattr(obj, name, self._defaults[name])
+            out[name] = value
+        for name, getter in self._computed:
+            out[name] = getter(out)
+        return out
+
+    def dump_one(self, obj) -> bytes:
+        row = self.row(obj)
+        return orjson.dumps(row, option=_ORJSON_OPTIONS) if orjson is not None else self._one.dump_json(row)
+
+    def dump_many(self, objs: Iterable) -> bytes:
+        rows = [self.row(obj) for obj in objs]
+        return orjson.dumps(rows, option=_ORJSON_OPTIONS) if orjson is not None else self._many.dump_json(rows)
+
+    def response(self, objs: Iterable, status_code: int = 200) -> FastJSONResponse:
+        return FastJSONResponse(self.dump_many(objs), status_code=status_code)
+
+
+class PayloadCache:
+    """Serialized rows by id, each stored with a version (e.g. created_at) that must match on read."""
+
+    def __init__(self, ttl_s: float, max_entries: int = 10_000):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[int, tuple[Hashable, bytes, float]] = OrderedDict()  # id -> (version, payload, expires)
+        self._info_key = f"payload_cache_dirty_{id(self)}"
+
+    def get_many(self, versions: dict[int, Hashable]) -> dict[int, bytes]:
+        """Cached payloads of the ids whose stored version equals versions[id]."""
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for row_id, version in versions.items():
+                entry = self._entries.get(row_id)
+                if entry is None:
+                    continue
+                if entry[2] <= now or entry[0] != version:
+                    del self._entries[row_id]
+                else:
+                    found[row_id] = entry[1]
+        return found
+
+    def put(self, row_id: int, version: Hashable, payload: bytes) -> None:
+        with self._lock:
+            self._entries[row_id] = (version, payload, time.monotonic() + self.ttl_s)
+            self._entries.move_to_end(row_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, row_id: int) -> None:
+        with self._lock:
+            self._entries.pop(row_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def register_listeners(self, cls) -> None:
+        """Invalidate on ORM update/delete of cls and again when that transaction ends, like auth_cache."""
+
+        def changed(mapper, connection, target) -> None:
+            self.invalidate(target.id)
+            session = object_session(target)
+            if session is not None:
+                session.info.setdefault(self._info_key, set()).add(target.id)
+
+        def transaction_ended(session: Session) -> None:
+            for row_id in session.info.pop(self._info_key, ()):
+                self.invalidate(row_id)
+
+        event.listen(cls, "after_update", changed)
+        event.listen(cls, "after_delete", changed)
+        event.listen(Session, "after_commit", transaction_ended)
+        event.listen(Session, "after_rollback", transaction_ended)
+
+
+def measure_recipe_list(count: int = 500, repeat: int = 20) -> dict:
+    """
+    Milliseconds to serialize a list of `count` recipes as GET /api/recipes/ returns it, averaged
+    over `repeat` runs. Compares a per-row model_validate plus the stdlib encoder, the response_model
+    path (TypeAdapter validate from attributes + dump_json), and RowSerializer with and without orjson.
+    """
+    from datetime import datetime, timezone
+
+    from . import models, schemas
+
+    now = datetime.now(timezone.utc)
+    recipes = [
+        models.Recipe(
+            id=i, user_id=1, title_pl=f"Zupa pomidorowa {i}", title_original=f"Tomato soup {i}",
+            ingredients_pl=["500 g pomidorów", "1 cebula", "2 ząbki czosnku", "1 l bulionu"] * 3,
+            ingredients_original=["500 g tomatoes", "1 onion", "2 garlic cloves", "1 l stock"] * 3,
+            steps_pl=["Podsmaż cebulę i czosnek.", "Dodaj pomidory i bulion.", "Gotuj 20 minut i zmiksuj."] * 2,
+            tags=["zupa", "wegańska"], substitutions={"bulion": "woda z solą"}, notes={"tip": "Podawaj z bazylią."},
+            user_notes=None, is_favorite=i % 3 == 0, raw_input="Tomato soup. " * 40, detected_language="en",
+            target_language="pl", target_country="PL", target_city="", created_at=now, diet_tags=["vegan"],
+            collections=["Obiady"], image_url="/static/recipe-images/ab/ab12.jpg",
+            image_renditions={"thumb": {"webp": "/t.webp", "jpeg": "/t.jpg", "width": 320, "height": 240}},
+            image_status=None, author_name=None, author_bio=None, author_image_url=None, prep_time_minutes=15,
+            cook_time_minutes=25, user_rating=None, servings_override=None,  # every column set, as on a loaded row
+        )
+        for i in range(count)
+    ]
+    adapter = TypeAdapter(list[schemas.RecipeOut])
+    rows = RowSerializer(schemas.RecipeOut)
+
+    def per_row_stdlib() -> bytes:
+        data = [schemas.RecipeOut.model_validate(r).model_dump(mode="json") for r in recipes]
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def response_model_path() -> bytes:
+        return adapter.dump_json(adapter.validate_python(recipes, from_attributes=True))
+
+    def row_serializer_adapter() -> bytes:
+        return rows._many.dump_json([rows.row(r) for r in recipes])
+
+    variants = {
+        "per_row_stdlib_ms": per_row_stdlib,
+        "response_model_ms": response_model_path,
+        "row_serializer_typeadapter_ms": row_serializer_adapter,
+    }
+    if orjson is not None:
+        variants["row_serializer_orjson_ms"] = lambda: rows.dump_many(recipes)
+    reference = json.loads(response_model_path())
+    report = {"recipes": count, "bytes": len(response_model_path())}
+    for name, serialize in variants.items():
+        assert json.loads(serialize()) == reference, name
+        start = time.perf_counter()
+        for _ in range(repeat):
+            serialize()
+        report[name] = round((time.perf_counter() - start) / repeat * 1000, 2)
+    return report
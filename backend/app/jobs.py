@@ -0,0 +1,348 @@
+"""
+Background jobs for slow AI work. Jobs are rows in the `jobs` table; execution is delegated to a
+pluggable JobBackend (default: in-process thread pool, no external broker).
+
+Handlers are registered per kind with @job_handler("kind") and receive a JobContext with their own
+DB session. A kind may run in its own lane (a separate, smaller worker pool) so slow external APIs
+get bounded concurrency without starving other jobs. A handler returns the JSON result or raises HTTPException (recorded as the job error).
+Quota is tied to success: the endpoint reserves it and passes the reservations to enqueue_job,
+which keeps them on the job (payload["reservations"]). run_job settles them with the handler's
+session: committed when the job succeeds, released and refunded when it fails.
+
+Several processes may share the jobs table. A runner claims a job with one conditional UPDATE, so
+each job runs once. The thread backend keeps heartbeat_at fresh on the jobs it holds (queued in its
+pools or running); recover_jobs() only touches jobs whose heartbeat has gone stale, i.e. whose
+process died.
+"""
+import logging
+import os
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .quota import adopt_reservations, release_reservations, settle_reservations
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+HEARTBEAT_INTERVAL_S = float(os.getenv("JOB_HEARTBEAT_INTERVAL_S", "30"))
+# A queued or running job whose heartbeat is older than this belongs to a process that died.
+STALE_AFTER_S = float(os.getenv("JOB_STALE_AFTER_S", str(HEARTBEAT_INTERVAL_S * 4)))
+
+# Session factory used by workers; tests may point it elsewhere.
+session_factory: Callable[[], Session] = SessionLocal
+
+
+class JobContext:
+    """What a handler sees: the job's payload, owner ids, its own DB session and a progress reporter."""
+
+    def __init__(self, job: models.Job, db: Session):
+        self.job_id = job.id
+        self.kind = job.kind
+        self.payload = dict(job.payload or {})
+        self.user_id = job.user_id
+        self.trial_session_id = job.trial_session_id
+        self.db = db
+
+    def report(self, **progress) -> None:
+        """Persist progress (e.g. current=2, total=7, message="...") so pollers and SSE streams see it."""
+        job = self.db.get(models.Job, self.job_id)
+        if job is None:
+            return
+        job.progress = {**(job.progress or {}), **progress}
+        self.db.commit()
+
+
+JobHandler = Callable[[JobContext], dict]
+_HANDLERS: dict[str, JobHandler] = {}
+DEFAULT_LANE = "default"
+_LANES: dict[str, str] = {}  # kind -> lane
+_LANE_WORKERS: dict[str, int] = {}  # lane -> max concurrent jobs
+
+
+def job_handler(
+    kind: str, lane: str = DEFAULT_LANE, lane_workers: int | None = None
+) -> Callable[[JobHandler], JobHandler]:
+    """Register a handler for a job kind, optionally in its own lane with lane_workers workers."""
+    def decorator(fn: JobHandler) -> JobHandler:
+        _HANDLERS[kind] = fn
+        _LANES[kind] = lane
+        if lane_workers is not None:
+            _LANE_WORKERS[lane] = lane_workers
+        return fn
+    return decorator
+
+
+def job_lane(kind: str) -> str:
+    return _LANES.get(kind, DEFAULT_LANE)
+
+
+class JobBackend(ABC):
+    """Executes queued jobs. Implementations only need submit(); run_job does the bookkeeping."""
+
+    @abstractmethod
+    def submit(self, job_id: str, lane: str = DEFAULT_LANE) -> None:
+        """Arrange for run_job(job_id) to be called, in the given lane."""
+
+    def shutdown(self) -> None:
+        pass
+
+
+class ThreadPoolJobBackend(JobBackend):
+    """
+    In-process worker pools, one per lane. A heartbeat thread stamps heartbeat_at on every job
+    held here until it finishes; jobs held when the process dies go stale and are taken over by
+    recover_jobs() in another process.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self._max_workers = max_workers
+        self._executors: dict[str, ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+        self._held: set[str] = set()
+        self._stop = threading.Event()
+        self._heartbeat: threading.Thread | None = None
+
+    def _executor(self, lane: str) -> ThreadPoolExecutor:
+        with self._lock:
+            executor = self._executors.get(lane)
+            if executor is None:
+                workers = _LANE_WORKERS.get(lane, self._max_workers)
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"job-{lane}")
+                self._executors[lane] = executor
+            return executor
+
+    def submit(self, job_id: str, lane: str = DEFAULT_LANE) -> None:
+        with self._lock:
+            self._held.add(job_id)
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+                self._heartbeat.start()
+        self._executor(lane).submit(self._run, job_id)
+
+    def _run(self, job_id: str) -> None:
+        try:
+            run_job(job_id)
+        finally:
+            with self._lock:
+                self._held.discard(job_id)
+
+    def _beat(self) -> None:
+        while not self._stop.wait(HEARTBEAT_INTERVAL_S):
+            with self._lock:
+                held = list(self._held)
+            if not held:
+                continue
+            try:
+                touch_jobs(held)
+            except Exception:
+                logger.exception("Job heartbeat failed")
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        with self._lock:
+            executors, self._executors = list(self._executors.values()), {}
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class InlineJobBackend(JobBackend):
+    """Runs the job synchronously inside submit() (tests, scripts)."""
+
+    def submit(self, job_id: str, lane: str = DEFAULT_LANE) -> None:
+        run_job(job_id)
+
+
+_backend: JobBackend | None = None
+
+
+def get_job_backend() -> JobBackend:
+    """Return the configured backend (JOB_BACKEND=thread|inline, JOB_WORKERS=N)."""
+    global _backend
+    if _backend is None:
+        if (os.getenv("JOB_BACKEND") or "thread").strip().lower() == "inline":
+            _backend = InlineJobBackend()
+        else:
+            _backend = ThreadPoolJobBackend(max_workers=int(os.getenv("JOB_WORKERS", "4")))
+    return _backend
+
+
+def set_job_backend(backend: JobBackend | None) -> None:
+    """Swap the backend (e.g. a broker-backed implementation, or InlineJobBackend in tests)."""
+    global _backend
+    if _backend is not None and _backend is not backend:
+        _backend.shutdown()
+    _backend = backend
+
+
+def enqueue_job(
+    db: Session,
+    kind: str,
+    payload: dict,
+    user_id: int | None = None,
+    trial_session_id: int | None = None,
+    reservations: list[int] | None = None,
+    dedup_key: str | None = None,
+) -> models.Job | None:
+    """
+    Persist a queued job and hand it to the backend. Returns the committed Job row. reservations
+    (quota.take_reservations of the request) are settled when the job finishes; dedup_key names
+    what the job works on, for has_job(). At most one job per kind and dedup_key is unfinished (a
+    partial unique index): when another one is, the session is rolled back and None is returned,
+    so callers commit their own changes first.
+    """
+    if kind not in _HANDLERS:
+        raise ValueError(f"No handler registered for job kind {kind!r}")
+    if reservations:
+        payload = {**payload, "reservations": reservations}
+    job = models.Job(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        status=JOB_QUEUED,
+        user_id=user_id,
+        trial_session_id=trial_session_id,
+        payload=payload,
+        progress={},
+        heartbeat_at=datetime.now(timezone.utc),
+        dedup_key=dedup_key,
+    )
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        if dedup_key is None:
+            raise
+        db.rollback()
+        return None
+    db.refresh(job)
+    get_job_backend().submit(job.id, job_lane(kind))
+    return job
+
+
+def has_job(db: Session, kind: str, dedup_key: str, statuses: tuple[str, ...]) -> bool:
+    """Whether a job of kind for dedup_key is in one of statuses (an indexed lookup)."""
+    return db.execute(
+        select(models.Job.id)
+        .where(models.Job.kind == kind, models.Job.dedup_key == dedup_key, models.Job.status.in_(statuses))
+        .limit(1)
+    ).first() is not None
+
+
+def run_job(job_id: str) -> None:
+    """Execute one job with its own session; records result or error. Never raises."""
+    db = session_factory()
+    try:
+        if not _claim(db, job_id):
+            return  # finished, or another runner has it
+        job = db.get(models.Job, job_id)
+        handler = _HANDLERS.get(job.kind)
+        ctx = JobContext(job, db)
+        try:
+            with settle_reservations(db):
+                adopt_reservations(db, ctx.payload.get("reservations"))
+                if handler is None:
+                    raise HTTPException(status_code=500, detail=f"Unknown job kind {job.kind!r}")
+                result = handler(ctx)
+            error = None
+        except HTTPException as e:
+            db.rollback()
+            result, error = None, {"status_code": e.status_code, "detail": e.detail}
+        except Exception as e:
+            db.rollback()
+            logger.exception("Job %s (%s) failed", job_id, job.kind)
+            result, error = None, {"status_code": 500, "detail": f"Job failed: {e}"}
+
+        job = db.get(models.Job, job_id)
+        job.finished_at = datetime.now(timezone.utc)
+        if error is None:
+            job.status = JOB_SUCCEEDED
+            job.result = result or {}
+        else:
+            job.status = JOB_FAILED
+            job.error = error
+        db.commit()
+    except Exception:
+        logger.exception("Job %s bookkeeping failed", job_id)
+        db.rollback()
+    finally:
+        db.close()
+
+
+def _claim(db: Session, job_id: str) -> bool:
+    """queued -> running in one statement; True only for the runner whose UPDATE matched."""
+    jobs = models.Job.__table__
+    now = datetime.now(timezone.utc)
+    claimed = db.execute(
+        update(jobs)
+        .where(jobs.c.id == job_id, jobs.c.status == JOB_QUEUED)
+        .values(status=JOB_RUNNING, started_at=now, heartbeat_at=now)
+    ).rowcount
+    db.commit()
+    return claimed == 1
+
+
+def touch_jobs(job_ids: list[str]) -> None:
+    """Stamp heartbeat_at on unfinished jobs this process holds."""
+    jobs = models.Job.__table__
+    db = session_factory()
+    try:
+        db.execute(
+            update(jobs)
+            .where(jobs.c.id.in_(job_ids), jobs.c.status.in_((JOB_QUEUED, JOB_RUNNING)))
+            .values(heartbeat_at=datetime.now(timezone.utc))
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def recover_jobs() -> None:
+    """
+    On startup: fail running jobs (releasing their quota reservations) and re-submit queued jobs
+    whose heartbeat is stale (their process died). Each is taken over with a conditional UPDATE, so when several workers start at once every
+    abandoned job is failed or re-submitted exactly once, and live workers' jobs are left alone.
+    """
+    jobs = models.Job.__table__
+    now = datetime.now(timezone.utc)
+    abandoned = or_(jobs.c.heartbeat_at.is_(None), jobs.c.heartbeat_at < now - timedelta(seconds=STALE_AFTER_S))
+    db = session_factory()
+    try:
+        interrupted = db.execute(
+            update(jobs)
+            .where(jobs.c.status == JOB_RUNNING, abandoned)
+            .values(
+                status=JOB_FAILED,
+                finished_at=now,
+                error={"status_code": 503, "detail": "Job interrupted by a server restart. Please try again."},
+            )
+            .returning(jobs.c.payload)
+        ).all()
+        for (payload,) in interrupted:
+            release_reservations(db, (payload or {}).get("reservations") or [])
+        queued = db.execute(
+            update(jobs)
+            .where(jobs.c.status == JOB_QUEUED, abandoned)
+            .values(heartbeat_at=now)
+            .returning(jobs.c.id, jobs.c.kind)
+        ).all()
+        db.commit()
+    finally:
+        db.close()
+    backend = get_job_backend()
+    for job_id, kind in queued:
+        backend.submit(job_id, job_lane(kind))
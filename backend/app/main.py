@@ -1,113 +1,49 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI, Request
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from slowapi import Limiter
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
-from slowapi.util import get_remote_address
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
 
 from .database import engine
-from .routers import auth, users, recipes, shopping_lists, substitutions, admin, meta, onboarding, trial, meal_plan, calendar_google
+from .jobs import get_job_backend, recover_jobs
+from .middleware import CORSAndSecurityHeadersMiddleware
+from .quota import run_reservation_sweeper
+from .rate_limit import RateLimitMiddleware
+from .services import page_fetch
+from .services.image_store import content_hash_of_path
+from .routers import auth, users, recipes, shopping_lists, substitutions, admin, meta, onboarding, trial, meal_plan, calendar_google, jobs
 
 # DB schema is managed via Alembic migrations (production) or test fixtures (tests).
 
-limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=[] if os.getenv("TESTING") else ["10/minute"],
-)
-
-app = FastAPI(title="Intelligent Kitchen Helper API", version="0.1.0")
-app.state.limiter = limiter
-app.add_exception_handler(
-    RateLimitExceeded,
-    lambda request, exc: JSONResponse(
-        status_code=429,
-        content={"detail": "Too many requests. Try again later."},
-    ),
-)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background jobs: fail ones cut off by the last shutdown, re-submit ones that never started.
+    recover_jobs()
+    # Quota reservations whose request or worker died are released once they expire.
+    sweeper = asyncio.create_task(run_reservation_sweeper())
+    yield
+    sweeper.cancel()
+    get_job_backend().shutdown()
+    page_fetch.set_client(None)
+
+
+app = FastAPI(title="Intelligent Kitchen Helper API", version="0.1.0", lifespan=lifespan)
 
 # In production set CORS_ORIGINS e.g. https://myrecipes.cloud (comma-separated for multiple)
 _cors_origins = os.getenv("CORS_ORIGINS", "*")
 allow_origins = [o.strip() for o in _cors_origins.split(",")] if _cors_origins != "*" else ["*"]
 
+# Token buckets per route rule and caller (user / trial / IP), shared across workers (app/rate_limit.py)
+app.add_middleware(RateLimitMiddleware)
 
-def _cors_headers_for_request(request: Request) -> dict:
-    """Build CORS headers for preflight/response; reflect origin when allowed."""
-    origin = request.headers.get("origin") or ""
-    if allow_origins == ["*"]:
-        allow_origin = "*"
-    elif origin in allow_origins:
-        allow_origin = origin
-    else:
-        allow_origin = allow_origins[0] if allow_origins else "*"
-    return {
-        "Access-Control-Allow-Origin": allow_origin,
-        "Access-Control-Allow-Methods": "GET, POST, PUT, PATCH, DELETE, OPTIONS",
-        "Access-Control-Allow-Headers": "Authorization, Content-Type, Accept",
-        "Access-Control-Max-Age": "86400",
-    }
-
-
-class CORSPreflightMiddleware:
-    """Handle OPTIONS (CORS preflight) as the outermost middleware so it always returns 200."""
-
-    def __init__(self, app):
-        self.app = app
-
-    async def __call__(self, scope, receive, send):
-        if scope.get("type") == "http" and scope.get("method") == "OPTIONS":
-            headers = _cors_headers_for_request_from_scope(scope)
-            await send({
-                "type": "http.response.start",
-                "status": 200,
-                "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
-            })
-            await send({"type": "http.response.body", "body": b""})
-            return
-        await self.app(scope, receive, send)
-
-
-def _cors_headers_for_request_from_scope(scope: dict) -> dict:
-    origin = (next((v.decode() for k, v in scope.get("headers", []) if k == b"origin"), None) or "")
-    if allow_origins == ["*"]:
-        allow_origin = "*"
-    elif origin in allow_origins:
-        allow_origin = origin
-    else:
-        allow_origin = allow_origins[0] if allow_origins else "*"
-    return {
-        "Access-Control-Allow-Origin": allow_origin,
-        "Access-Control-Allow-Methods": "GET, POST, PUT, PATCH, DELETE, OPTIONS",
-        "Access-Control-Allow-Headers": "Authorization, Content-Type, Accept",
-        "Access-Control-Max-Age": "86400",
-    }
-
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=allow_origins,
-    allow_credentials=False,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-app.add_middleware(SlowAPIMiddleware)
-
-# OPTIONS handler must run first (added last) so preflight never hits rate limiter or routes
-app.add_middleware(CORSPreflightMiddleware)
-
-
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    response = await call_next(request)
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    return response
+# Outermost (added last): answers OPTIONS before the rate limiter or routes; CORS + security headers
+app.add_middleware(CORSAndSecurityHeadersMiddleware, allow_origins=allow_origins)
 
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -120,12 +56,33 @@ app.include_router(admin.router)
 app.include_router(meta.router)
 app.include_router(trial.router)
 app.include_router(onboarding.router)
+app.include_router(jobs.router)
+
+
+class ImageStaticFiles(StaticFiles):
+    """
+    Content-addressed images (recipe-images/ab/ab12….webp) never change: cache them for a year
+    with the hash as ETag. Anything else must be revalidated (ETag / If-Modified-Since -> 304).
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        digest = content_hash_of_path(str(full_path))
+        if digest:
+            response.headers["etag"] = f'"{digest}"'
+            response.headers["cache-control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["cache-control"] = "no-cache"
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
 
 # Recipe dish images (generated or cached); URL path /static/recipe-images/...
 _static_dir = Path(__file__).resolve().parent.parent / "static"
 _static_dir.mkdir(parents=True, exist_ok=True)
 (_static_dir / "recipe-images").mkdir(exist_ok=True)
-app.mount("/static", StaticFiles(directory=str(_static_dir)), name="static")
+app.mount("/static", ImageStaticFiles(directory=str(_static_dir)), name="static")
 
 
 @app.get("/health")
@@ -0,0 +1,71 @@
+"""
+In-process metrics (per worker): counters and timing summaries, read via GET /api/admin/metrics.
+Good enough to compare latencies before/after a change; not a replacement for a metrics backend.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+_RESERVOIR_SIZE = 500  # most recent observations kept per timing for percentiles
+
+_lock = threading.Lock()
+_counters: dict[str, int] = {}
+_timings: dict[str, dict] = {}
+
+
+def incr(name: str, value: int = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe_ms(name: str, value_ms: float) -> None:
+    """Record one timing in milliseconds."""
+    with _lock:
+        t = _timings.get(name)
+        if t is None:
+            t = _timings[name] = {"count": 0, "sum": 0.0, "max": 0.0, "recent": deque(maxlen=_RESERVOIR_SIZE)}
+        t["count"] += 1
+        t["sum"] += value_ms
+        t["max"] = max(t["max"], value_ms)
+        t["recent"].append(value_ms)
+
+
+@contextmanager
+def timed(name: str):
+    """Time a block: with timed("discover.ai_ms"): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_ms(name, (time.perf_counter() - start) * 1000)
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def snapshot() -> dict:
+    """Counters and timing summaries (count, avg, p50, p95, max in ms)."""
+    with _lock:
+        counters = dict(_counters)
+        timings = {}
+        for name, t in _timings.items():
+            recent = sorted(t["recent"])
+            timings[name] = {
+                "count": t["count"],
+                "avg_ms": round(t["sum"] / t["count"], 1) if t["count"] else 0.0,
+                "p50_ms": round(_percentile(recent, 50), 1),
+                "p95_ms": round(_percentile(recent, 95), 1),
+                "max_ms": round(t["max"], 1),
+            }
+    return {"counters": counters, "timings": timings}
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _timings.clear()
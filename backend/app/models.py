@@ -1,11 +1,14 @@
 from datetime import date, datetime, timezone
 from sqlalchemy import (
-    Boolean, Date, DateTime, ForeignKey, Integer, String, Text
+    Boolean, Date, DateTime, ForeignKey, Index, Integer, String, Text, text
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.types import JSON
 
+from .auth_cache import register_user_cache_listeners
 from .database import Base
+from .services.image_store import register_image_ref_listeners
+from .services.recipe_compliance import register_compliance_listeners
 
 
 class User(Base):
@@ -67,6 +70,9 @@ class User(Base):
     )
 
 
+register_user_cache_listeners(User)
+
+
 class MealPlan(Base):
     """Weekly meal plan: 5–7 days, each with one meal (name, description, full recipe for shopping list)."""
 
@@ -155,8 +161,20 @@ class Recipe(Base):
     # Per-recipe servings override; if null, use user default_servings for display/scaling
     servings_override: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
+    # Precomputed compliance (see services/recipe_compliance): bitmasks kept in sync on every flush
+    # so "safe for me" filtering is a SQL predicate. compliance_version NULL = not computed yet.
+    diet_flags: Mapped[int] = mapped_column(Integer, default=0, nullable=False, index=True)
+    allergen_flags: Mapped[int] = mapped_column(Integer, default=0, nullable=False, index=True)
+    compliance_version: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)
+
     # Recipe photo (dish image); filled by image service (cache or generate)
-    image_url: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    image_url: Mapped[str | None] = mapped_column(String(500), nullable=True, active_history=True)
+    # Background generation state: NULL (not requested) | pending | ready | failed
+    image_status: Mapped[str | None] = mapped_column(String(16), nullable=True, index=True)
+    # Image cache key the recipe waits on while pending, so the image job finds its recipes by index
+    image_cache_key: Mapped[str | None] = mapped_column(String(255), nullable=True, index=True)
+    # Responsive renditions of image_url: {"thumb": {"webp", "jpeg", "width", "height"}, "medium": ..., "full": ...}
+    image_renditions: Mapped[dict | None] = mapped_column(JSON, nullable=True, active_history=True)
 
     # Target locale snapshot; source language is auto-detected
     detected_language: Mapped[str | None] = mapped_column(String(10), nullable=True)
@@ -179,6 +197,10 @@ class Recipe(Base):
     )
 
 
+register_compliance_listeners(Recipe)
+register_image_ref_listeners(Recipe, "image_url", "image_renditions")
+
+
 class RecipeVariant(Base):
     __tablename__ = "recipe_variants"
 
@@ -194,6 +216,13 @@ class RecipeVariant(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False
     )
+    # Bumped on every write; versions the serialized payloads cached per process.
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
 
     recipe: Mapped["Recipe"] = relationship("Recipe", back_populates="variants")
 
@@ -243,6 +272,25 @@ class PreparedStarterRecipes(Base):
     expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
 
 
+class StarterRecipeSet(Base):
+    """Vetted starter-recipe set per (country, language, dish preferences, diets); reused across onboardings."""
+
+    __tablename__ = "starter_recipe_sets"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    catalog_key: Mapped[str] = mapped_column(String(64), unique=True, nullable=False, index=True)
+    target_country: Mapped[str] = mapped_column(String(10), nullable=False)
+    target_language: Mapped[str] = mapped_column(String(10), nullable=False)
+    dish_preferences: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+    diet_filters: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+    recipes_data: Mapped[list] = mapped_column(JSON, nullable=False)  # same shape as get_starter_recipes()
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+
 class RecipeImageCache(Base):
     """Cache of recipe dish images by normalized title (and optional language). Reuse same image for multiple recipes."""
 
@@ -250,7 +298,14 @@ class RecipeImageCache(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     cache_key: Mapped[str] = mapped_column(String(255), unique=True, nullable=False, index=True)
-    image_url: Mapped[str] = mapped_column(String(500), nullable=False)
+    image_url: Mapped[str] = mapped_column(String(500), nullable=False, active_history=True)
+    # copied to recipes on a cache hit
+    renditions: Mapped[dict | None] = mapped_column(JSON, nullable=True, active_history=True)
+    # Near-duplicate reuse (services/dish_similarity): an alias row points at the generated row it reuses
+    canonical_key: Mapped[str | None] = mapped_column(String(255), nullable=True, index=True)
+    title_tokens: Mapped[list | None] = mapped_column(JSON, nullable=True)
+    ingredient_tokens: Mapped[list | None] = mapped_column(JSON, nullable=True)
+    hit_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # recipes served from this row
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
@@ -258,6 +313,47 @@ class RecipeImageCache(Base):
     )
 
 
+register_image_ref_listeners(RecipeImageCache, "image_url", "renditions")
+
+
+class ImageBlob(Base):
+    """One stored image file (content-addressed); ref_count = recipes + image-cache rows pointing at it."""
+
+    __tablename__ = "image_blobs"
+
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256 hex of the file bytes
+    path: Mapped[str] = mapped_column(String(100), nullable=False)  # relative to RECIPE_IMAGES_DIR
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    ref_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False, index=True)
+    stored_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    # Set when a reference is dropped; unreferenced blobs with it set are collected without grace period
+    released_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class FetchedPageCache(Base):
+    """URL-import page cache (services/page_cache): validators, extracted text and extraction result per URL."""
+
+    __tablename__ = "fetched_page_cache"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    url_key: Mapped[str] = mapped_column(String(64), unique=True, nullable=False, index=True)  # sha256 of normalized URL
+    url: Mapped[str] = mapped_column(String(2000), nullable=False)
+    etag: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    last_modified: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    page_text: Mapped[str] = mapped_column(Text, nullable=False)
+    chunks: Mapped[list] = mapped_column(JSON, nullable=False)  # translate-ready text per recipe on the page
+    source: Mapped[str] = mapped_column(String(20), nullable=False)  # structured | llm
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    hit_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    fetched_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+    validated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
+
 class TrialSession(Base):
     """Anonymous trial session: 5 actions per token_id, IP-limited. device_id allows resume after sign-out."""
 
@@ -296,6 +392,97 @@ class TrialIpWhitelist(Base):
     label: Mapped[str | None] = mapped_column(String(100), nullable=True)
 
 
+class QuotaLedgerEntry(Base):
+    """
+    One quota movement of a user or trial session. Up-front charges start "reserved" (with a
+    deadline) and become "committed" or "released" (refunded); charges for finished work and
+    later refunds (units < 0) are written "committed".
+    """
+
+    __tablename__ = "quota_ledger"
+    __table_args__ = (
+        Index("ix_quota_ledger_user_day", "user_id", "day"),
+        Index("ix_quota_ledger_state_expires", "state", "expires_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    trial_session_id: Mapped[int | None] = mapped_column(
+        Integer, ForeignKey("trial_sessions.id", ondelete="CASCADE"), nullable=True, index=True
+    )
+    units: Mapped[int] = mapped_column(Integer, nullable=False)
+    state: Mapped[str] = mapped_column(String(16), nullable=False)  # reserved | committed | released
+    day: Mapped[date] = mapped_column(Date, nullable=False, index=True)  # UTC day of the charge
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    settled_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class Job(Base):
+    """Background job for slow AI work (meal plan, URL import, chained adaptation); polled or streamed by the client."""
+
+    __tablename__ = "jobs"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)  # uuid4 hex
+    kind: Mapped[str] = mapped_column(String(50), nullable=False)
+    status: Mapped[str] = mapped_column(String(16), default="queued", nullable=False, index=True)  # queued|running|succeeded|failed
+    user_id: Mapped[int | None] = mapped_column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True
+    )
+    trial_session_id: Mapped[int | None] = mapped_column(
+        Integer, ForeignKey("trial_sessions.id", ondelete="CASCADE"), nullable=True, index=True
+    )
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+    progress: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+    result: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    error: Mapped[dict | None] = mapped_column(JSON, nullable=True)  # {"status_code": 502, "detail": "..."}
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Refreshed by the process holding the job (queued or running); stale = that process died.
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # What the job works on (image cache key, discover fingerprint, "user:<id>" for a bulk import),
+    # to find duplicates by index; at most one unfinished job per kind and key
+    dedup_key: Mapped[str | None] = mapped_column(String(255), nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_kind_dedup_key_status", "kind", "dedup_key", "status"),
+        Index(
+            "uq_jobs_unfinished_kind_dedup_key",
+            "kind",
+            "dedup_key",
+            unique=True,
+            sqlite_where=text("status IN ('queued', 'running') AND dedup_key IS NOT NULL"),
+            postgresql_where=text("status IN ('queued', 'running') AND dedup_key IS NOT NULL"),
+        ),
+    )
+
+
+class DiscoverPoolEntry(Base):
+    """Pre-generated, compliance-checked discover suggestion, keyed by a preference fingerprint."""
+
+    __tablename__ = "discover_pool"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False, index=True)  # sha256 of normalized prefs
+    recipe: Mapped[dict] = mapped_column(JSON, nullable=False)  # {title, estimated_calories, ingredients, steps}
+    served_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    served_to: Mapped[list] = mapped_column(JSON, nullable=False, default=list)  # identity keys ("u:1", "t:2")
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+
 class IngredientSubstitution(Base):
     __tablename__ = "ingredient_substitutions"
 
@@ -1,17 +1,42 @@
-"""Enforce user or trial quota for expensive endpoints (create/adapt/what-can-I-make)."""
-from datetime import datetime, timezone
+"""
+Enforce user or trial quota for expensive endpoints (create/adapt/what-can-I-make).
+
+Every charge is a single conditional UPDATE ... RETURNING on the users / trial_sessions row, so
+concurrent requests (threads, workers, instances) can never take more than the limit, and is
+recorded in quota_ledger. Endpoints consume before the AI call: that writes a "reserved" entry
+which whoever owns the session settles (settle_reservations: the request's get_db, run_job, a
+stream's generator) - committed when the work succeeded, released and refunded when it raised.
+Reservations left behind by a dead process are released by the sweeper once they expire.
+"""
+import asyncio
+import logging
+import os
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
 
 from fastapi import Request, HTTPException, status
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import case, func, insert, or_, select, update
+from sqlalchemy.orm import Session, attributes
+from sqlalchemy.orm.util import identity_key
 
-from . import models
+from . import auth_cache, models
 from .auth import decode_trial_token
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
 
 # Keep in sync with frontend AuthContext MAX_TRIAL_ACTIONS
 MAX_TRIAL_ACTIONS = 5
 TRIAL_EXHAUSTED_DETAIL = "Free trial finished; please register"
 TRIAL_EXHAUSTED_CODE = "trial_exhausted"
+QUOTA_REACHED_DETAIL = "You have reached the free recipes limit. Contact the administrator."
+
+LEDGER_RESERVED = "reserved"
+LEDGER_COMMITTED = "committed"
+LEDGER_RELEASED = "released"
+RESERVATION_TTL_S = int(os.getenv("QUOTA_RESERVATION_TTL_S", "900"))
+SWEEP_INTERVAL_S = float(os.getenv("QUOTA_SWEEP_INTERVAL_S", "60"))
+_PENDING_KEY = "quota_pending_reservations"
 
 _UNLIMITED_QUOTA_EMAIL = "tshprung@gmail.com"
 
@@ -20,6 +45,22 @@ def _has_unlimited_quota(user: models.User) -> bool:
     return (user.email or "").strip().lower() == _UNLIMITED_QUOTA_EMAIL
 
 
+def check_user_quota(user: models.User, detail: str = QUOTA_REACHED_DETAIL) -> None:
+    """Raise 402 when user has no transformations left (a cheap early check; consuming is what counts)."""
+    if not _has_unlimited_quota(user) and user.transformations_limit != -1 and (
+        user.transformations_used >= user.transformations_limit
+    ):
+        raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail=detail)
+
+
+def _trial_exhausted() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_402_PAYMENT_REQUIRED,
+        detail={"message": TRIAL_EXHAUSTED_DETAIL, "code": TRIAL_EXHAUSTED_CODE},
+        headers={"X-Trial-Exhausted": "1"},
+    )
+
+
 def _get_trial_token_from_request(request: Request) -> str | None:
     auth = request.headers.get("authorization") or ""
     if not auth.strip().lower().startswith("bearer "):
@@ -34,25 +75,17 @@ def enforce_trial_or_user_quota(
     allow_overdraft: bool = False,
 ) -> models.TrialSession | None:
     """
-    Enforce quota: if user is present, check user quota (do not increment here).
-    If no user, require valid trial token, load TrialSession, check used_actions < MAX,
-    increment used_actions and last_seen_at, commit, and return the TrialSession.
+    Enforce quota: if user is present, check user quota (do not increment here; the endpoint
+    consumes with consume_user_quota or charge_user_quota). If no user, require a valid trial
+    token, load the TrialSession and consume one action atomically (consume_trial_action).
     Raises 401 for invalid/missing trial token, 402 for quota exceeded (user or trial).
     Returns the TrialSession when in trial mode, else None.
     """
     if current_user is not None:
-        # User path: only check (increment is done in endpoint after success)
-        user_for_update = (
-            db.execute(select(models.User).where(models.User.id == current_user.id))
-            .scalar_one()
-        )
-        if (not allow_overdraft) and not _has_unlimited_quota(current_user) and user_for_update.transformations_limit != -1 and (
-            user_for_update.transformations_used >= user_for_update.transformations_limit
-        ):
-            raise HTTPException(
-                status_code=status.HTTP_402_PAYMENT_REQUIRED,
-                detail="You have reached the free recipes limit. Contact the administrator.",
-            )
+        # User path: only check (the endpoint consumes). current_user is already loaded in this
+        # request's session, no need to select it again.
+        if not allow_overdraft:
+            check_user_quota(current_user)
         return None
 
     # Trial path: require Bearer trial token
@@ -91,13 +124,304 @@ def enforce_trial_or_user_quota(
             headers={"WWW-Authenticate": "Bearer"},
         )
     if trial_session.used_actions >= MAX_TRIAL_ACTIONS:
-        raise HTTPException(
-            status_code=status.HTTP_402_PAYMENT_REQUIRED,
-            detail={"message": TRIAL_EXHAUSTED_DETAIL, "code": TRIAL_EXHAUSTED_CODE},
-            headers={"X-Trial-Exhausted": "1"},
+        raise _trial_exhausted()
+    consume_trial_action(db, trial_session)
+    return trial_session
+
+
+def _commit_keeping_state(db: Session) -> None:
+    # The request goes on using the user / trial session it loaded; expiring them on commit would
+    # only cost a reload of rows whose new counts we already have from RETURNING.
+    expire_on_commit, db.expire_on_commit = db.expire_on_commit, False
+    try:
+        db.commit()
+    finally:
+        db.expire_on_commit = expire_on_commit
+
+
+def _adjust_user(db: Session, user_id: int, delta: int, within_limit: bool = False) -> int | None:
+    """
+    transformations_used += delta in one statement (never below 0); with within_limit only if the
+    result stays within the limit. Returns the new count, None when no row matched.
+    """
+    users = models.User.__table__
+    if delta >= 0:
+        new_used = users.c.transformations_used + delta
+    else:
+        new_used = case((users.c.transformations_used > -delta, users.c.transformations_used + delta), else_=0)
+    stmt = update(users).where(users.c.id == user_id).values(transformations_used=new_used)
+    if within_limit:
+        stmt = stmt.where(
+            or_(
+                users.c.transformations_limit == -1,
+                users.c.transformations_used + delta <= users.c.transformations_limit,
+            )
+        )
+    used = db.execute(stmt.returning(users.c.transformations_used)).scalar_one_or_none()
+    auth_cache.invalidate_user(user_id)
+    _set_loaded(db.identity_map.get(identity_key(models.User, user_id)), "transformations_used", used)
+    return used
+
+
+def _adjust_trial(db: Session, trial_session_id: int, delta: int, within_limit: bool = False) -> int | None:
+    """used_actions += delta (never below 0); with within_limit only while below MAX_TRIAL_ACTIONS."""
+    trials = models.TrialSession.__table__
+    values = {"used_actions": case((trials.c.used_actions > -delta, trials.c.used_actions + delta), else_=0)}
+    if delta >= 0:
+        values = {"used_actions": trials.c.used_actions + delta, "last_seen_at": datetime.now(timezone.utc)}
+    stmt = update(trials).where(trials.c.id == trial_session_id).values(**values)
+    if within_limit:
+        stmt = stmt.where(trials.c.used_actions + delta <= MAX_TRIAL_ACTIONS)
+    used = db.execute(stmt.returning(trials.c.used_actions)).scalar_one_or_none()
+    trial_session = db.identity_map.get(identity_key(models.TrialSession, trial_session_id))
+    _set_loaded(trial_session, "used_actions", used)
+    if used is not None and "last_seen_at" in values:
+        _set_loaded(trial_session, "last_seen_at", values["last_seen_at"])
+    return used
+
+
+def _set_loaded(obj, key: str, value) -> None:
+    if obj is not None and value is not None:
+        attributes.set_committed_value(obj, key, value)
+
+
+def _record(
+    db: Session, units: int, user_id: int | None = None, trial_session_id: int | None = None, reserve: bool = False
+) -> None:
+    """Write a ledger entry; a reservation is remembered on db until it is settled."""
+    now = datetime.now(timezone.utc)
+    entry_id = db.execute(
+        insert(models.QuotaLedgerEntry.__table__)
+        .values(
+            user_id=user_id,
+            trial_session_id=trial_session_id,
+            units=units,
+            state=LEDGER_RESERVED if reserve else LEDGER_COMMITTED,
+            day=now.date(),
+            created_at=now,
+            expires_at=now + timedelta(seconds=RESERVATION_TTL_S) if reserve else None,
+            settled_at=None if reserve else now,
         )
-    trial_session.used_actions += 1
-    trial_session.last_seen_at = datetime.now(timezone.utc)
+        .returning(models.QuotaLedgerEntry.__table__.c.id)
+    ).scalar_one()
+    if reserve:
+        db.info.setdefault(_PENDING_KEY, []).append(entry_id)
+
+
+def consume_user_quota(
+    db: Session, user: models.User, count: int = 1, detail: str = QUOTA_REACHED_DETAIL
+) -> None:
+    """
+    Reserve count transformations before doing the work: UPDATE ... SET used = used + count WHERE
+    limit = -1 OR used + count <= limit RETURNING used, plus a reserved ledger entry. Raises 402
+    (with detail) when that matches no row. Commits, so no row lock is held across the AI call.
+    """
+    if count <= 0 or _has_unlimited_quota(user):
+        return
+    if _adjust_user(db, user.id, count, within_limit=True) is None:
+        raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail=detail)
+    _record(db, count, user_id=user.id, reserve=True)
+    _commit_keeping_state(db)
+
+
+def try_consume_user_quota(db: Session, user: models.User) -> bool:
+    """Like consume_user_quota for one unit, but returns False instead of raising when none is left."""
+    try:
+        consume_user_quota(db, user)
+    except HTTPException:
+        return False
+    return True
+
+
+def charge_user_quota(db: Session, user: models.User, clamp_to_limit: bool = False, count: int = 1) -> bool:
+    """
+    Charge count transformations for work that has already succeeded (background jobs charge on success),
+    as one in-SQL increment and a committed ledger entry. Does not raise when the limit was reached
+    meanwhile; with clamp_to_limit nothing is charged past it. Returns whether the units were charged.
+    Caller commits.
+    """
+    if count <= 0 or _has_unlimited_quota(user):
+        return False
+    if _adjust_user(db, user.id, count, within_limit=clamp_to_limit) is None:
+        return False
+    _record(db, count, user_id=user.id)
+    return True
+
+
+def refund_user_quota(db: Session, user_id: int, count: int = 1) -> None:
+    """Give back count transformations charged for work that later failed (never below 0). Caller commits."""
+    _adjust_user(db, user_id, -count)
+    _record(db, -count, user_id=user_id)
+
+
+def consume_trial_action(db: Session, trial_session: models.TrialSession) -> None:
+    """
+    Reserve one trial action: UPDATE ... SET used_actions = used_actions + 1 WHERE used_actions < MAX
+    RETURNING used_actions, plus a reserved ledger entry. Raises the trial-exhausted 402 when no row
+    matched. Commits.
+    """
+    if _adjust_trial(db, trial_session.id, 1, within_limit=True) is None:
+        raise _trial_exhausted()
+    _record(db, 1, trial_session_id=trial_session.id, reserve=True)
+    _commit_keeping_state(db)
+
+
+def refund_trial_action(db: Session, trial_session_id: int) -> None:
+    """Give back one trial action charged for a job that failed (never below 0). Caller commits."""
+    _adjust_trial(db, trial_session_id, -1)
+    _record(db, -1, trial_session_id=trial_session_id)
+
+
+def take_reservations(db: Session) -> list[int]:
+    """Detach db's unsettled reservations, for work that outlives the session's owner (a stream, a job)."""
+    return db.info.pop(_PENDING_KEY, [])
+
+
+def adopt_reservations(db: Session, ids: list[int] | None) -> None:
+    """Make reservations taken from another session db's own, to be settled with it (a job's run)."""
+    if ids:
+        db.info.setdefault(_PENDING_KEY, []).extend(ids)
+
+
+def _settle(db: Session, ids: list[int], from_state: str, to_state: str) -> list[tuple]:
+    ledger = models.QuotaLedgerEntry.__table__
+    return db.execute(
+        update(ledger)
+        .where(ledger.c.id.in_(ids), ledger.c.state == from_state)
+        .values(state=to_state, settled_at=datetime.now(timezone.utc))
+        .returning(ledger.c.id, ledger.c.user_id, ledger.c.trial_session_id, ledger.c.units)
+    ).all()
+
+
+def _apply(db: Session, rows: list[tuple], sign: int) -> None:
+    for _, user_id, trial_session_id, units in rows:
+        if user_id is not None:
+            _adjust_user(db, user_id, sign * units)
+        if trial_session_id is not None:
+            _adjust_trial(db, trial_session_id, sign * units)
+
+
+def commit_reservations(db: Session, ids: list[int] | None = None) -> None:
+    """
+    Mark reservations (default: db's unsettled ones) committed, and commit. One the sweeper already
+    released (the work outlived its deadline) is charged again, since the work did happen.
+    """
+    ids = take_reservations(db) if ids is None else ids
+    if not ids:
+        return
+    if len(_settle(db, ids, LEDGER_RESERVED, LEDGER_COMMITTED)) < len(ids):
+        _apply(db, _settle(db, ids, LEDGER_RELEASED, LEDGER_COMMITTED), +1)
     db.commit()
-    db.refresh(trial_session)
-    return trial_session
+
+
+def release_reservations(db: Session, ids: list[int] | None = None) -> None:
+    """Release reservations (default: db's unsettled ones) still reserved and refund them; commits."""
+    ids = take_reservations(db) if ids is None else ids
+    if not ids:
+        return
+    _apply(db, _settle(db, ids, LEDGER_RESERVED, LEDGER_RELEASED), -1)
+    db.commit()
+
+
+@contextmanager
+def settle_reservations(db: Session):
+    """
+    Around everything done with a session: afterwards its reservations are committed, or released
+    (rolled back first) if the block raised.
+    """
+    try:
+        yield
+    except BaseException:
+        if db.info.get(_PENDING_KEY):
+            db.rollback()
+            release_reservations(db)
+        raise
+    commit_reservations(db)
+
+
+@contextmanager
+def refund_on_error(db: Session):
+    """
+    Wrap the AI call that quota was reserved for: if it raises (AI error, not-a-recipe, ...), roll
+    back and release the session's reservations right away, then re-raise.
+    """
+    try:
+        yield
+    except Exception:
+        db.rollback()
+        release_reservations(db)
+        raise
+
+
+def sweep_expired_reservations(db: Session, now: datetime | None = None, batch_size: int = 500) -> int:
+    """Release reservations past their deadline (their request or worker died). Returns how many."""
+    ledger = models.QuotaLedgerEntry.__table__
+    now = now or datetime.now(timezone.utc)
+    released = 0
+    while True:
+        ids = db.execute(
+            select(ledger.c.id)
+            .where(ledger.c.state == LEDGER_RESERVED, ledger.c.expires_at < now)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return released
+        release_reservations(db, list(ids))
+        released += len(ids)
+
+
+async def run_reservation_sweeper() -> None:
+    """Background task (app lifespan): sweep expired reservations every SWEEP_INTERVAL_S."""
+
+    def sweep_once() -> int:
+        db = SessionLocal()
+        try:
+            return sweep_expired_reservations(db)
+        finally:
+            db.close()
+
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL_S)
+        try:
+            released = await asyncio.to_thread(sweep_once)
+        except Exception:
+            logger.exception("Quota reservation sweep failed")
+            continue
+        if released:
+            logger.info("Released %d expired quota reservation(s)", released)
+
+
+def usage_by_day(db: Session, since: date, user_id: int | None = None) -> list[dict]:
+    """
+    Per user and UTC day since `since`: units used (committed, net of refunds), units still
+    reserved and units released. Aggregated over the (user_id, day) index of quota_ledger.
+    """
+    ledger = models.QuotaLedgerEntry.__table__
+
+    def total(state: str):
+        return func.coalesce(func.sum(case((ledger.c.state == state, ledger.c.units), else_=0)), 0)
+
+    stmt = (
+        select(
+            ledger.c.user_id,
+            ledger.c.day,
+            total(LEDGER_COMMITTED),
+            total(LEDGER_RESERVED),
+            total(LEDGER_RELEASED),
+        )
+        .where(ledger.c.user_id.is_not(None), ledger.c.day >= since)
+        .group_by(ledger.c.user_id, ledger.c.day)
+        .order_by(ledger.c.day.desc(), ledger.c.user_id)
+    )
+    if user_id is not None:
+        stmt = stmt.where(ledger.c.user_id == user_id)
+    rows = db.execute(stmt).all()
+    emails = dict(
+        db.execute(
+            select(models.User.id, models.User.email).where(models.User.id.in_({r[0] for r in rows}))
+        ).all()
+    ) if rows else {}
+    return [
+        {"user_id": uid, "email": emails.get(uid), "day": day, "used": used, "reserved": reserved, "released": released}
+        for uid, day, used, reserved, released in rows
+    ]
@@ -0,0 +1,383 @@
+"""
+Token-bucket rate limiting shared by every worker process (and, with Redis, every host).
+
+RateLimitMiddleware takes the first RULES entry that matches the request's method and path. It
+identifies the caller from the bearer token with no DB access: the user id, or the token id for a
+trial token. Anonymous callers, and rules marked per_ip, use the client IP. The user's tier comes
+from the auth cache snapshot when this process has one, else from the token's tier claim (free for
+tokens issued before the claim existed). The middleware then takes one token from the
+caller's bucket for that rule. When the bucket is empty it answers 429 with Retry-After. Each bucket
+holds `burst` tokens and refills at per_minute / 60 tokens per second.
+
+Buckets live in a store chosen by RATE_LIMIT_BACKEND:
+  sqlite  (default) one SQLite file shared by all processes on the host. It is placed on /dev/shm
+          (shared memory) when that exists. A take is a single atomic UPSERT ... RETURNING.
+  redis   any server speaking the Redis protocol (RATE_LIMIT_REDIS_URL), for several hosts. A take
+          is one EVALSHA of a Lua script that uses the server's clock.
+  memory  this process only (tests, a single worker).
+A store that errors lets the request through; the error is logged and counted.
+"""
+import logging
+import math
+import os
+import re
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from hashlib import sha1
+from urllib.parse import unquote, urlsplit
+
+import anyio
+
+from . import auth, auth_cache, metrics
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("RATE_LIMIT_ENABLED", "0" if os.getenv("TESTING") else "1").strip().lower() in ("1", "true", "yes")
+TOO_MANY_REQUESTS_DETAIL = "Too many requests. Try again later."
+_PRUNE_EVERY = 1000  # takes between deletions of long-idle SQLite buckets
+
+
+@dataclass(frozen=True)
+class Limit:
+    per_minute: float
+    burst: int
+
+    @property
+    def rate(self) -> float:
+        """Tokens refilled per second."""
+        return self.per_minute / 60.0
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    methods: frozenset[str] | None  # None: any method
+    path: re.Pattern
+    limits: dict[str, Limit | None]  # tier -> limit (None: not limited); "*" for tiers not listed
+    per_ip: bool = False
+
+    def limit_for(self, tier: str) -> Limit | None:
+        return self.limits.get(tier, self.limits["*"])
+
+
+# Calls that reach OpenAI (or another paid API): tight, and the same for trial and anonymous callers.
+_AI_PATHS = re.compile(
+    r"^/api/(recipes/?"
+    r"|recipes/(stream|bulk-import|discover|what-can-i-make)"
+    r"|recipes/\d+/(adapt|relocalize|ingredient-alternatives|image/generate)"
+    r"|meal-plan/(generate|generate/stream|\d+/replace-day))$"
+)
+
+RULES: tuple[Rule, ...] = (
+    Rule("static", None, re.compile(r"^/static/"), {"*": None}, per_ip=True),
+    # Credential guessing and sign-up spam come from anonymous callers: per IP whatever the token.
+    Rule("auth", frozenset({"POST"}), re.compile(r"^/api/(auth|trial)/"), {"*": Limit(10, 10)}, per_ip=True),
+    Rule(
+        "ai",
+        frozenset({"POST"}),
+        _AI_PATHS,
+        {"free": Limit(10, 5), "paid": Limit(30, 10), "unlimited": None, "*": Limit(6, 3)},
+    ),
+    Rule(
+        "default",
+        None,
+        re.compile(""),
+        {"anonymous": Limit(10, 10), "trial": Limit(30, 20), "paid": Limit(240, 60), "unlimited": None, "*": Limit(120, 40)},
+    ),
+)
+
+
+def match_rule(method: str, path: str, rules: tuple[Rule, ...] = RULES) -> Rule | None:
+    for rule in rules:
+        if (rule.methods is None or method in rule.methods) and rule.path.match(path):
+            return rule
+    return None
+
+
+def _header(scope: dict, name: bytes) -> str | None:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def caller(scope: dict) -> tuple[str, str]:
+    """(bucket identity, tier) of the request: user, trial token or client IP."""
+    authorization = _header(scope, b"authorization") or ""
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        subject = auth.token_subject(token.strip())
+        if subject is not None:
+            kind, sub, token_tier = subject
+            if kind == "trial":
+                return f"trial:{sub}", "trial"
+            try:
+                snapshot = auth_cache.cached_user(int(sub))
+            except ValueError:
+                snapshot = None
+            return f"user:{sub}", (snapshot or {}).get("account_tier") or token_tier or "free"
+    return _client_ip(scope), "anonymous"
+
+
+def _client_ip(scope: dict) -> str:
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitStore(ABC):
+    """Bucket storage. take() returns 0.0 when a token was taken, else seconds until one is free."""
+
+    blocking = True  # take() does I/O: the middleware runs it in a worker thread
+
+    @abstractmethod
+    def take(self, key: str, limit: Limit, cost: int = 1) -> float:
+        """Take cost tokens from key's bucket if it holds them."""
+
+
+def _refill(tokens: float, updated: float, now: float, limit: Limit) -> float:
+    return min(limit.burst, tokens + max(0.0, now - updated) * limit.rate)
+
+
+class MemoryStore(RateLimitStore):
+    blocking = False
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: dict[str, tuple[float, float]] = {}  # key -> (tokens, updated)
+
+    def take(self, key: str, limit: Limit, cost: int = 1) -> float:
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (limit.burst, now))
+            tokens = _refill(tokens, updated, now, limit)
+            if tokens < cost:
+                self._buckets[key] = (tokens, now)
+                return (cost - tokens) / limit.rate
+            self._buckets[key] = (tokens - cost, now)
+            return 0.0
+
+
+# Every SET expression reads the row as it was before the statement, so the refill is computed once
+# per expression on the same old values; SQLite runs the whole UPSERT under its write lock.
+_SQLITE_TAKE = """
+INSERT INTO buckets (key, tokens, updated, allowed) VALUES (:key, :burst - :cost, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = min(:burst, tokens + max(0, :now - updated) * :rate)
+        - CASE WHEN min(:burst, tokens + max(0, :now - updated) * :rate) >= :cost THEN :cost ELSE 0 END,
+    allowed = min(:burst, tokens + max(0, :now - updated) * :rate) >= :cost,
+    updated = :now
+RETURNING tokens, allowed
+"""
+
+
+def default_sqlite_path() -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "recipe-app-rate-limits.sqlite3")
+
+
+class SQLiteStore(RateLimitStore):
+    """Buckets in a SQLite file: shared by all processes that open the same path."""
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path or default_sqlite_path()
+        self._local = threading.local()
+        self._takes = 0
+        self._conn()  # create the file and table up front
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # losing buckets in a crash only resets limits
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, allowed INTEGER NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, limit: Limit, cost: int = 1) -> float:
+        conn = self._conn()
+        now = time.time()
+        tokens, allowed = conn.execute(
+            _SQLITE_TAKE, {"key": key, "burst": limit.burst, "rate": limit.rate, "cost": cost, "now": now}
+        ).fetchone()
+        self._takes += 1
+        if self._takes % _PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM buckets WHERE updated < ?", (now - 86400,))
+        return 0.0 if allowed else (cost - tokens) / limit.rate
+
+
+TOKEN_BUCKET_LUA = """
+local burst = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = burst
+if b[1] then
+  tokens = math.min(burst, tonumber(b[1]) + math.max(0, now - tonumber(b[2])) * rate)
+end
+local wait = 0
+if tokens >= cost then tokens = tokens - cost else wait = (cost - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return tostring(wait)
+"""
+TOKEN_BUCKET_SHA = sha1(TOKEN_BUCKET_LUA.encode()).hexdigest()
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisStore(RateLimitStore):
+    """
+    Buckets in Redis (or anything speaking its protocol, e.g. Valkey, KeyDB, Dragonfly). Uses a
+    small built-in RESP client with one connection per thread, so there is no client dependency.
+    """
+
+    def __init__(self, url: str, timeout_s: float = 0.5) -> None:
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.strip("/") or 0)
+        self.timeout_s = timeout_s
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout_s)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.conn = (sock, sock.makefile("rb"))
+        if self.password:
+            self._call("AUTH", self.password)
+        if self.db:
+            self._call("SELECT", self.db)
+        return self._local.conn
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            conn[1].close()
+            conn[0].close()
+
+    def _read(self, reader):
+        line = reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by Redis")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            raise RedisError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            if int(body) < 0:
+                return None
+            data = reader.read(int(body) + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            return None if int(body) < 0 else [self._read(reader) for _ in range(int(body))]
+        raise ConnectionError(f"unexpected Redis reply {line!r}")
+
+    def _call(self, *args):
+        sock, reader = getattr(self._local, "conn", None) or self._connect()
+        encoded = [str(a).encode() for a in args]
+        command = b"*%d\r\n" % len(encoded) + b"".join(b"$%d\r\n%s\r\n" % (len(a), a) for a in encoded)
+        try:
+            sock.sendall(command)
+            return self._read(reader)
+        except (OSError, ConnectionError):
+            self.close()
+            raise
+
+    def take(self, key: str, limit: Limit, cost: int = 1) -> float:
+        args = (1, f"ratelimit:{key}", limit.burst, repr(limit.rate), cost)
+        try:
+            wait = self._call("EVALSHA", TOKEN_BUCKET_SHA, *args)
+        except RedisError as e:
+            if not str(e).startswith("NOSCRIPT"):
+                raise
+            wait = self._call("EVAL", TOKEN_BUCKET_LUA, *args)
+        return float(wait)
+
+
+_store: RateLimitStore | None = None
+
+
+def get_rate_limit_store() -> RateLimitStore:
+    """Return the configured store (RATE_LIMIT_BACKEND=sqlite|redis|memory)."""
+    global _store
+    if _store is None:
+        backend = (os.getenv("RATE_LIMIT_BACKEND") or "sqlite").strip().lower()
+        if backend == "memory":
+            _store = MemoryStore()
+        elif backend == "redis":
+            _store = RedisStore(os.getenv("RATE_LIMIT_REDIS_URL") or "redis://localhost:6379/0")
+        else:
+            _store = SQLiteStore(os.getenv("RATE_LIMIT_SQLITE_PATH") or None)
+    return _store
+
+
+def set_rate_limit_store(store: RateLimitStore | None) -> None:
+    """Swap the store (e.g. MemoryStore in tests)."""
+    global _store
+    _store = store
+
+
+class RateLimitMiddleware:
+    """Pure ASGI: one bucket take per request before it reaches the app; 429 when empty."""
+
+    def __init__(self, app, rules: tuple[Rule, ...] = RULES):
+        self.app = app
+        self.rules = rules
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+        rule = match_rule(scope["method"], scope["path"], self.rules)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+        identity, tier = (_client_ip(scope), "anonymous") if rule.per_ip else caller(scope)
+        limit = rule.limit_for(tier)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        store = get_rate_limit_store()
+        key = f"{rule.name}:{identity}"
+        try:
+            if store.blocking:
+                wait = await anyio.to_thread.run_sync(store.take, key, limit)
+            else:
+                wait = store.take(key, limit)
+        except Exception:
+            logger.warning("Rate limit store failed; letting the request through", exc_info=True)
+            metrics.incr("rate_limit.store_errors")
+            wait = 0.0
+        if wait <= 0:
+            await self.app(scope, receive, send)
+            return
+        metrics.incr(f"rate_limit.limited.{rule.name}")
+        body = b'{"detail":"%s"}' % TOO_MANY_REQUESTS_DETAIL.encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,11 +1,13 @@
 import os
+from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
+from .. import metrics, models, quota, schemas
 from ..auth import get_current_user_optional
 from ..database import get_db
+from ..services import image_store, overgenerate, recipe_image
 from ..services.user_deletion import delete_user_and_data
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
@@ -46,6 +48,18 @@ def list_users(
     return [schemas.AdminUserOut.model_validate(u) for u in users]
 
 
+@router.get("/quota-usage", response_model=list[schemas.AdminQuotaUsageOut])
+def quota_usage(
+    days: int = Query(30, ge=1, le=366),
+    user_id: int | None = None,
+    db: Session = Depends(get_db),
+    _: None = Depends(_require_admin),
+):
+    """Quota used / reserved / released per user and UTC day over the last `days` days (newest first)."""
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    return quota.usage_by_day(db, since, user_id=user_id)
+
+
 @router.post("/upgrade-user")
 def upgrade_user(
     payload: schemas.AdminUpgradeUserRequest,
@@ -159,5 +173,23 @@ def delete_user(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     delete_user_and_data(user_id, db)
     db.commit()
+    image_store.collect_garbage(db)
     return {"detail": "User deleted.", "email": user.email}
 
+
+@router.get("/metrics")
+def get_metrics(_: None = Depends(_require_admin)):
+    """
+    In-process counters and latency summaries for this worker (e.g. recipes.stream.time_to_first_content),
+    plus the per-filter rejection rates that size discover / meal-plan over-generation.
+    """
+    return {**metrics.snapshot(), "filter_rejections": overgenerate.stats.snapshot()}
+
+
+@router.get("/image-reuse")
+def get_image_reuse(
+    db: Session = Depends(get_db),
+    _: None = Depends(_require_admin),
+):
+    """Dish-image generations avoided by the exact cache key and by near-duplicate (similar dish) reuse."""
+    return recipe_image.image_reuse_report(db)
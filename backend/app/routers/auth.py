@@ -143,7 +143,7 @@ def login(payload: schemas.UserLogin, db: Session = Depends(get_db)):
     # Starter recipes are no longer created automatically on login.
     # Users can still add them explicitly from Settings (/users/me/fetch-starter-recipes)
     # or via onboarding claim flows.
-    return {"access_token": create_access_token(user.id)}
+    return {"access_token": create_access_token(user.id, user.account_tier)}
 
 
 @router.post("/verify")
@@ -331,6 +331,6 @@ def google_callback(code: str | None = None, error: str | None = None, db: Sessi
     user = _get_or_create_oauth_user(db, email, name)
     # Do not run ensure_starter_recipes here — it can take several seconds (AI call) and delays redirect.
     # Users from onboarding claim pre-fetched recipes on the frontend; others can use "Fetch starter recipes" in Settings.
-    token = create_access_token(user.id)
+    token = create_access_token(user.id, user.account_tier)
     front = _frontend_url("/signin", {"token": token})
     return RedirectResponse(url=front if front else "/signin")
@@ -0,0 +1,135 @@
+"""Background job status: poll GET /api/jobs/{id} or stream GET /api/jobs/{id}/events (SSE)."""
+import asyncio
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .. import jobs, models, schemas
+from ..auth import get_optional_user_and_trial
+from ..database import get_db
+from ..sse import SSE_HEADERS, SSE_MEDIA_TYPE, sse_comment, sse_event
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+_POLL_INTERVAL_SECONDS = 0.5
+_HEARTBEAT_SECONDS = 15.0
+_MAX_STREAM_SECONDS = 600.0
+
+
+def job_accepted_response(job: models.Job) -> JSONResponse:
+    """202 Accepted with the job id and where to follow it."""
+    body = schemas.JobAcceptedOut(
+        job_id=job.id,
+        kind=job.kind,
+        status=job.status,
+        status_url=f"/api/jobs/{job.id}",
+        events_url=f"/api/jobs/{job.id}/events",
+    )
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=body.model_dump())
+
+
+def _get_owned_job_or_404(
+    job_id: str,
+    user: models.User | None,
+    trial_session: models.TrialSession | None,
+    db: Session,
+) -> models.Job:
+    job = db.get(models.Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    if user is not None and job.user_id == user.id:
+        return job
+    if trial_session is not None and job.trial_session_id == trial_session.id:
+        return job
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+
+def _require_identity(user_and_trial: tuple) -> tuple[models.User | None, models.TrialSession | None]:
+    user, trial_session = user_and_trial
+    if user is None and trial_session is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user, trial_session
+
+
+@router.get("/{job_id}", response_model=schemas.JobOut)
+def get_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    user_and_trial: tuple = Depends(get_optional_user_and_trial),
+):
+    """Current status, progress and (when finished) result or error of a background job."""
+    user, trial_session = _require_identity(user_and_trial)
+    return _get_owned_job_or_404(job_id, user, trial_session, db)
+
+
+def _read_job(job_id: str) -> dict | None:
+    """One poll: the job's status, progress and (once finished) full JobOut, read with a short-lived session."""
+    db = jobs.session_factory()
+    try:
+        job = db.get(models.Job, job_id)
+        if job is None:
+            return None
+        return {
+            "status": job.status,
+            "progress": dict(job.progress or {}),
+            "done": schemas.JobOut.model_validate(job).model_dump(mode="json")
+            if job.status in jobs.FINISHED_STATUSES
+            else None,
+        }
+    finally:
+        db.close()
+
+
+async def _job_event_stream(job_id: str):
+    """
+    Poll the job row and emit progress/status changes, then a final done event. Waits on the event
+    loop between polls; only the DB read takes a threadpool thread, so idle watchers hold none.
+    """
+    last_status = None
+    last_progress = None
+    started = time.monotonic()
+    last_sent = started
+    while True:
+        job = await run_in_threadpool(_read_job, job_id)
+        if job is None:
+            yield sse_event("error", {"status_code": 404, "detail": "Job not found"})
+            return
+        if job["status"] != last_status:
+            last_status = job["status"]
+            last_sent = time.monotonic()
+            yield sse_event("status", {"status": job["status"]})
+        if job["progress"] != last_progress:
+            last_progress = job["progress"]
+            last_sent = time.monotonic()
+            yield sse_event("progress", last_progress)
+        if job["done"] is not None:
+            yield sse_event("done", job["done"])
+            return
+        now = time.monotonic()
+        if now - started > _MAX_STREAM_SECONDS:
+            # Client can reconnect or fall back to polling GET /api/jobs/{id}.
+            yield sse_event("timeout", {"status": job["status"]})
+            return
+        if now - last_sent > _HEARTBEAT_SECONDS:
+            last_sent = now
+            yield sse_comment()
+        await asyncio.sleep(_POLL_INTERVAL_SECONDS)
+
+
+@router.get("/{job_id}/events")
+def stream_job_events(
+    job_id: str,
+    db: Session = Depends(get_db),
+    user_and_trial: tuple = Depends(get_optional_user_and_trial),
+):
+    """Server-Sent Events: status, progress and a final done event carrying the full job."""
+    user, trial_session = _require_identity(user_and_trial)
+    _get_owned_job_or_404(job_id, user, trial_session, db)
+    return StreamingResponse(_job_event_stream(job_id), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
@@ -1,36 +1,32 @@
-"""Weekly meal plan: generate, replace day, add all to shopping list."""
-from datetime import date
+"""Weekly meal plan: generate (whole plan, background job or streamed per day), replace day, add all to shopping list."""
+from datetime import date, timedelta
 from datetime import date as _date
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
 from ..auth import get_current_user
-from ..database import get_db
-from ..services.meal_plan_ai import generate_single_meal, generate_weekly_meal_plan
+from ..database import SessionLocal, get_db
+from ..jobs import JobContext, enqueue_job, job_handler
+from ..quota import (
+    commit_reservations,
+    consume_user_quota,
+    refund_on_error,
+    release_reservations,
+    take_reservations,
+)
+from ..services.meal_plan_ai import generate_single_meal, generate_weekly_meal_plan, iter_meal_plan_days
+from ..sse import SSE_HEADERS, SSE_MEDIA_TYPE, sse_event
+from .jobs import job_accepted_response
 
 router = APIRouter(prefix="/api/meal-plan", tags=["meal-plan"])
 
-_UNLIMITED_QUOTA_EMAIL = "tshprung@gmail.com"
-
-
-def _has_unlimited_quota(user: models.User) -> bool:
-    return (user.email or "").strip().lower() == _UNLIMITED_QUOTA_EMAIL
-
 
 def _check_and_consume_quota(user: models.User, db: Session) -> None:
-    if _has_unlimited_quota(user):
-        return
-    row = db.execute(select(models.User).where(models.User.id == user.id)).scalar_one()
-    if row.transformations_limit != -1 and row.transformations_used >= row.transformations_limit:
-        raise HTTPException(
-            status_code=status.HTTP_402_PAYMENT_REQUIRED,
-            detail="You have reached the free recipes limit. Contact the administrator.",
-        )
-    row.transformations_used += 1
-    db.commit()
+    """Raise 402 when the user is out of quota; otherwise reserve one unit atomically."""
+    consume_user_quota(db, user)
 
 
 def _meal_plan_to_out(plan: models.MealPlan) -> schemas.MealPlanOut:
@@ -46,23 +42,12 @@ def _meal_plan_to_out(plan: models.MealPlan) -> schemas.MealPlanOut:
         id=plan.id,
         start_date=plan.start_date.isoformat() if hasattr(plan.start_date, "isoformat") else str(plan.start_date),
         days=days,
+        status=plan.data.get("status"),
     )
 
 
-@router.post("/generate", response_model=schemas.MealPlanOut)
-def generate_plan(
-    payload: schemas.MealPlanGenerateRequest,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
-):
-    """Generate a 5–7 day meal plan. Requires verified email. Consumes one transformation quota."""
-    if not current_user.is_verified:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Verify your email before using the app.",
-        )
-    _check_and_consume_quota(current_user, db)
-
+def _plan_dates(payload: schemas.MealPlanGenerateRequest) -> tuple[date, list[_date] | None]:
+    """(start_date, explicit selected dates or None) from the request."""
     selected_dates: list[_date] | None = None
     if payload.selected_dates:
         parsed: list[_date] = []
@@ -79,29 +64,45 @@ def generate_plan(
         start_date = date.fromisoformat(start)
     except ValueError:
         start_date = date.today()
+    return start_date, selected_dates
+
+
+def _plan_generation_kwargs(payload: schemas.MealPlanGenerateRequest, current_user: models.User) -> dict:
+    """Constraints from the request, falling back to the user's saved settings."""
+    return dict(
+        meal_types=payload.meal_types,
+        protein_types=payload.protein_types,
+        meat_meals_per_week=payload.meat_meals_per_week,
+        fish_meals_per_week=payload.fish_meals_per_week,
+        diet_filters=payload.diet_filters or current_user.diet_filters or None,
+        allergens=payload.allergens if payload.allergens is not None else current_user.allergens or None,
+        custom_avoid_text=(
+            payload.custom_avoid_text
+            if payload.custom_avoid_text is not None
+            else current_user.custom_allergens_text
+        ),
+        household_adults=current_user.household_adults,
+        household_kids=current_user.household_kids,
+        max_time_minutes=payload.max_time_minutes,
+        budget=payload.budget,
+        target_language=(current_user.target_language or "").strip() or "en",
+        measurement_system=(current_user.measurement_system or "").strip() or "metric",
+    )
+
 
+def _generate_plan(
+    payload: schemas.MealPlanGenerateRequest,
+    current_user: models.User,
+    db: Session,
+) -> models.MealPlan:
+    """Call the AI and persist the plan. Quota is handled by the caller."""
+    start_date, selected_dates = _plan_dates(payload)
     try:
         num_days = len(selected_dates) if selected_dates else payload.num_days
         days = generate_weekly_meal_plan(
             start_date=start_date.isoformat(),
             num_days=num_days,
-            meal_types=payload.meal_types,
-            protein_types=payload.protein_types,
-            meat_meals_per_week=payload.meat_meals_per_week,
-            fish_meals_per_week=payload.fish_meals_per_week,
-            diet_filters=payload.diet_filters or current_user.diet_filters or None,
-            allergens=payload.allergens if payload.allergens is not None else current_user.allergens or None,
-            custom_avoid_text=(
-                payload.custom_avoid_text
-                if payload.custom_avoid_text is not None
-                else current_user.custom_allergens_text
-            ),
-            household_adults=current_user.household_adults,
-            household_kids=current_user.household_kids,
-            max_time_minutes=payload.max_time_minutes,
-            budget=payload.budget,
-            target_language=(current_user.target_language or "").strip() or "en",
-            measurement_system=(current_user.measurement_system or "").strip() or "metric",
+            **_plan_generation_kwargs(payload, current_user),
         )
     except RuntimeError as e:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
@@ -126,9 +127,154 @@ def generate_plan(
     db.add(plan)
     db.commit()
     db.refresh(plan)
+    return plan
+
+
+@job_handler("meal_plan.generate")
+def _generate_plan_job(ctx: JobContext) -> dict:
+    """Background meal plan generation; the unit reserved at enqueue is kept only if the plan is saved."""
+    user = ctx.db.get(models.User, ctx.user_id)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found.")
+    payload = schemas.MealPlanGenerateRequest.model_validate(ctx.payload["request"])
+    ctx.report(message="generating")
+    plan = _generate_plan(payload, user, ctx.db)
+    return _meal_plan_to_out(plan).model_dump(mode="json")
+
+
+@router.post("/generate", response_model=schemas.MealPlanOut)
+def generate_plan(
+    payload: schemas.MealPlanGenerateRequest,
+    background: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Generate a 5–7 day meal plan. Requires verified email. Consumes one transformation quota.
+    With ?background=true returns 202 and a job id; the unit is reserved now and refunded if the job fails.
+    """
+    if not current_user.is_verified:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Verify your email before using the app.",
+        )
+    _check_and_consume_quota(current_user, db)
+    if background:
+        job = enqueue_job(
+            db,
+            "meal_plan.generate",
+            {"request": payload.model_dump(mode="json")},
+            user_id=current_user.id,
+            reservations=take_reservations(db),
+        )
+        return job_accepted_response(job)
+
+    with refund_on_error(db):
+        plan = _generate_plan(payload, current_user, db)
     return _meal_plan_to_out(plan)
 
 
+def _stream_plan_days(plan_id: int, dates: list[str], generation_kwargs: dict, reservation_ids: list[int]):
+    """
+    SSE body for /generate/stream: days are generated concurrently and each one is saved into
+    MealPlan.data and pushed as soon as it is ready. The endpoint's reservation is committed when
+    the plan got at least one day, else released and the plan deleted - also when the client
+    disconnects mid-stream (the plan then keeps its finished days as "partial").
+    """
+    db = SessionLocal()
+    done: dict[int, dict] = {}
+    try:
+        plan = db.get(models.MealPlan, plan_id)
+        yield sse_event("plan", {"id": plan.id, "start_date": plan.start_date.isoformat(), "total": len(dates)})
+
+        failed: list[int] = []
+        error_detail = "Could not generate a meal plan. Try relaxing filters or try again."
+        try:
+            for index, day in iter_meal_plan_days(dates, **generation_kwargs):
+                if day is None:
+                    failed.append(index)
+                    yield sse_event("day_failed", {"index": index, "date": dates[index]})
+                    continue
+                done[index] = day
+                # Reassign (not mutate) so the JSON column is flagged dirty.
+                plan.data = {"days": [done[i] for i in sorted(done)], "status": "generating"}
+                db.commit()
+                yield sse_event(
+                    "day",
+                    {"index": index, "day": schemas.MealPlanDayOut.model_validate(day).model_dump(mode="json")},
+                )
+        except RuntimeError as e:
+            # Config/rate limit: keep what finished, report the rest as failed.
+            error_detail = str(e)
+            failed = [i for i in range(len(dates)) if i not in done]
+
+        if not done:
+            yield sse_event("error", {"status_code": 503, "detail": error_detail})
+            return
+        plan.data = {"days": [done[i] for i in sorted(done)], "status": "partial" if failed else "complete"}
+        db.commit()
+        db.refresh(plan)
+        yield sse_event("done", _meal_plan_to_out(plan).model_dump(mode="json"))
+    finally:
+        db.rollback()
+        plan = db.get(models.MealPlan, plan_id)
+        if done:
+            if plan is not None and plan.data.get("status") == "generating":  # client left mid-stream
+                plan.data = {"days": [done[i] for i in sorted(done)], "status": "partial"}
+                db.commit()
+            commit_reservations(db, reservation_ids)
+        else:
+            if plan is not None:
+                db.delete(plan)
+                db.commit()
+            release_reservations(db, reservation_ids)
+        db.close()
+
+
+@router.post("/generate/stream")
+def generate_plan_stream(
+    payload: schemas.MealPlanGenerateRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Generate the plan one day per request, concurrently, streamed as Server-Sent Events
+    (plan, day*, day_failed*, done). The plan row exists from the start and holds the days
+    finished so far. One transformation is reserved up front and kept only when at least one
+    day was generated.
+    """
+    if not current_user.is_verified:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Verify your email before using the app.",
+        )
+    _check_and_consume_quota(current_user, db)
+
+    start_date, selected_dates = _plan_dates(payload)
+    if selected_dates:
+        dates = [d.isoformat() for d in selected_dates]
+    else:
+        dates = [(start_date + timedelta(days=i)).isoformat() for i in range(payload.num_days)]
+
+    plan = models.MealPlan(
+        user_id=current_user.id,
+        start_date=start_date,
+        data={"days": [], "status": "generating"},
+    )
+    db.add(plan)
+    db.commit()
+    return StreamingResponse(
+        _stream_plan_days(
+            plan.id,
+            dates,
+            _plan_generation_kwargs(payload, current_user),
+            take_reservations(db),  # settled by the stream once it knows whether a day was generated
+        ),
+        media_type=SSE_MEDIA_TYPE,
+        headers=SSE_HEADERS,
+    )
+
+
 @router.get("/latest", response_model=schemas.MealPlanOut)
 def get_latest(
     db: Session = Depends(get_db),
@@ -169,25 +315,26 @@ def replace_day(
 
     _check_and_consume_quota(current_user, db)
 
-    try:
-        new_meal = generate_single_meal(
-            diet_filters=current_user.diet_filters or None,
-            allergens=current_user.allergens or None,
-            custom_avoid_text=current_user.custom_allergens_text,
-            max_time_minutes=None,
-            target_language=(current_user.target_language or "").strip() or "en",
-            measurement_system=(current_user.measurement_system or "").strip() or "metric",
-            meal_type=(meals_list[payload.meal_index].get("meal_type") or None),
-            protein_types=None,
-        )
-    except RuntimeError as e:
-        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    with refund_on_error(db):
+        try:
+            new_meal = generate_single_meal(
+                diet_filters=current_user.diet_filters or None,
+                allergens=current_user.allergens or None,
+                custom_avoid_text=current_user.custom_allergens_text,
+                max_time_minutes=None,
+                target_language=(current_user.target_language or "").strip() or "en",
+                measurement_system=(current_user.measurement_system or "").strip() or "metric",
+                meal_type=(meals_list[payload.meal_index].get("meal_type") or None),
+                protein_types=None,
+            )
+        except RuntimeError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
 
-    if not new_meal:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Could not generate a replacement meal. Try again.",
-        )
+        if not new_meal:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Could not generate a replacement meal. Try again.",
+            )
 
     # Preserve the meal_type slot (if present) when replacing.
     if isinstance(meals_list[payload.meal_index], dict) and meals_list[payload.meal_index].get("meal_type") and isinstance(new_meal, dict):
@@ -7,7 +7,7 @@ from sqlalchemy.orm import Session
 
 from .. import models, schemas
 from ..database import get_db
-from ..services.starter_recipes import get_starter_recipes
+from ..services.starter_recipes import get_catalog_starter_recipes
 
 router = APIRouter(prefix="/api/onboarding", tags=["onboarding"])
 
@@ -23,11 +23,12 @@ def prepare_starter_recipes(
     db: Session = Depends(get_db),
 ):
     """
-    Pre-fetch 3 starter recipes during onboarding (no auth).
+    Pre-fetch 3 starter recipes during onboarding (no auth); served from the starter catalog when present.
     Returns a short-lived claim_token to be sent after registration/login to attach recipes to the user.
     Rate-limited by IP to avoid abuse.
     """
-    recipes_data = get_starter_recipes(
+    recipes_data = get_catalog_starter_recipes(
+        db,
         payload.target_country,
         payload.target_language,
         dish_preferences=payload.dish_preferences or None,
@@ -1,44 +1,89 @@
-import ipaddress
+import logging
+import os
 import re
-from urllib.parse import urlparse
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 
-import httpx
 from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
+from .. import jobs, metrics, models, schemas
 from ..auth import get_current_user, get_current_user_optional, get_optional_user_and_trial
-from ..database import get_db
-from ..quota import MAX_TRIAL_ACTIONS, enforce_trial_or_user_quota
-from ..services.adaptation import adapt_recipe
+from ..database import SessionLocal, get_db
+from ..fast_json import FastJSONResponse, PayloadCache, RowSerializer
+from ..jobs import JobContext, enqueue_job, job_handler
+from ..quota import (
+    MAX_TRIAL_ACTIONS,
+    charge_user_quota,
+    check_user_quota,
+    commit_reservations,
+    consume_user_quota,
+    enforce_trial_or_user_quota,
+    refund_on_error,
+    release_reservations,
+    settle_reservations,
+    take_reservations,
+    try_consume_user_quota,
+)
+from ..services import discover_pool, image_store, page_cache, page_fetch, recipe_export, recipe_image
+from ..services.adaptation import adapt_recipe, diets_can_combine
 from .recipes_helpers import (
     COMMON_PANTRY,
+    filter_safe_for_user,
     get_recipe_or_404,
     ingredient_matches_user,
     normalize_adapt_types,
     normalize_ingredient_line,
     recipe_ingredient_lines,
+    recipe_matches_query,
     recipes_for_user_or_trial,
+    recipes_query_for_user_or_trial,
     user_ingredients_set,
     what_can_i_make_my_recipes,
 )
 from ..services.ingredient_alternatives import get_ingredient_alternatives
+from ..services.page_text import html_to_text
 from ..services.recipe_image import save_user_upload
-from ..services.translation import split_page_into_recipes, translate_recipe
+from ..services.structured_recipes import extract_structured_recipes
+from ..services.translation import (
+    _structured_recipe_to_raw_input,
+    split_page_into_recipes,
+    translate_recipe,
+    translate_recipe_stream,
+)
+from ..sse import SSE_HEADERS, SSE_MEDIA_TYPE, sse_event
 from ..services.what_can_i_make_ai import suggest_recipe_from_ingredients, suggest_recipes_from_preferences
+from .jobs import job_accepted_response
 
-router = APIRouter(prefix="/api/recipes", tags=["recipes"])
-
-# Users with this email get unlimited transformations (no quota check, no increment).
-_UNLIMITED_QUOTA_EMAIL = "tshprung@gmail.com"
+logger = logging.getLogger(__name__)
 
-def _has_unlimited_quota(user: models.User) -> bool:
-    return (user.email or "").strip().lower() == _UNLIMITED_QUOTA_EMAIL
+router = APIRouter(prefix="/api/recipes", tags=["recipes"])
 
 _TAG_RE = re.compile(r"<[^>]+>")
-_MAX_FETCH_BYTES = 1_000 * 1024  # 1 MB
+_WS_RE = re.compile(r"\s+")
 _MIN_EXTRACTED_LEN = 10
+_MAX_PAGE_TEXT_CHARS = 10000
+
+# List responses serialized straight from the loaded rows (app/fast_json.py). Variant JSON is kept
+# per process and versioned by updated_at, so an edit made by any worker is seen at once.
+_RECIPE_ROWS = RowSerializer(schemas.RecipeOut)
+_VARIANT_ROWS = RowSerializer(schemas.RecipeVariantOut)
+_variant_payloads = PayloadCache(ttl_s=float(os.getenv("VARIANT_PAYLOAD_CACHE_TTL_S", "30")))
+_variant_payloads.register_listeners(models.RecipeVariant)
+
+# Bulk import: items of one user in flight at once, and bulk jobs running at once across users.
+BULK_IMPORT_JOB_KIND = "recipes.bulk_import"
+BULK_IMPORT_CONCURRENCY = int(os.getenv("BULK_IMPORT_CONCURRENCY", "3"))
+BULK_IMPORT_WORKERS = int(os.getenv("BULK_IMPORT_WORKERS", "2"))
+BULK_ITEM_QUEUED = "queued"
+BULK_ITEM_SUCCEEDED = "succeeded"
+BULK_ITEM_FAILED = "failed"
+BULK_ITEM_SKIPPED = "skipped"  # quota ran out
+BULK_ITEM_DUPLICATE = "duplicate"  # same URL / text as an earlier item
 
 
 def _sanitize_text(text: str, max_len: int | None = None) -> str:
@@ -49,64 +94,16 @@ def _sanitize_text(text: str, max_len: int | None = None) -> str:
     return cleaned
 
 
-def _is_safe_url(url: str) -> bool:
-    try:
-        parsed = urlparse(url)
-    except Exception:
-        return False
-    if parsed.scheme not in ("http", "https"):
-        return False
-    host = (parsed.hostname or "").strip().lower()
-    if host in ("localhost", "127.0.0.1", "::1", ""):
-        return False
-    try:
-        ip = ipaddress.ip_address(host)
-        if ip.is_private or ip.is_loopback or ip.is_reserved:
-            return False
-    except ValueError:
-        pass
-    return True
-
-
-def _fetch_and_extract_text(url: str) -> str:
-    if not _is_safe_url(url):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid or disallowed URL. Only public http(s) URLs are allowed.",
-        )
+def _fetch_page(url: str, headers: dict | None = None) -> page_fetch.FetchedPage:
     try:
-        resp = httpx.get(
-            url,
-            timeout=10.0,
-            follow_redirects=True,
-            headers={"User-Agent": "RecipeApp/1.0"},
-        )
-        resp.raise_for_status()
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Failed to fetch page: {e.response.status_code}",
-        ) from e
-    except httpx.RequestError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Failed to connect to the provided URL.",
-        ) from e
+        return page_fetch.fetch_page(url, headers=headers)
+    except page_fetch.PageFetchError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
 
-    content = resp.content
-    if len(content) > _MAX_FETCH_BYTES:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Page is too large to process.",
-        )
 
-    text = resp.text
-    # Strip script/style and get visible text (simple approach)
-    text = re.sub(r"<script[^>]*>[\s\S]*?</script>", " ", text, flags=re.IGNORECASE)
-    text = re.sub(r"<style[^>]*>[\s\S]*?</style>", " ", text, flags=re.IGNORECASE)
-    text = _TAG_RE.sub(" ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    text = _sanitize_text(text, max_len=10000)
+def _extract_text(page_html: str) -> str:
+    # Visible text with block / list structure, without scripts and nav/footer/aside boilerplate
+    text = _sanitize_text(html_to_text(page_html, max_chars=_MAX_PAGE_TEXT_CHARS))
     # Some sites protect content with bot-block pages; try to detect those and
     # return a clearer error so users know to paste the recipe manually.
     lower = text.lower()
@@ -123,6 +120,51 @@ def _fetch_and_extract_text(url: str) -> str:
     return text
 
 
+def _translation_targets(
+    payload: schemas.RecipeCreate,
+    current_user: models.User | None,
+    trial_session: models.TrialSession | None,
+) -> tuple[str, str, str]:
+    """(target_language, target_country, target_city): user settings, or trial overrides/session defaults."""
+    if current_user is not None:
+        return current_user.target_language, current_user.target_country, current_user.target_city
+    return (payload.target_language or trial_session.language), (payload.target_country or trial_session.country), ""
+
+
+def _recipe_from_translated(
+    translated: dict,
+    raw_input: str,
+    source_url: str,
+    current_user: models.User | None,
+    trial_session: models.TrialSession | None,
+    targets: tuple[str, str, str],
+) -> models.Recipe:
+    """Build (not add) a Recipe from translate_recipe output."""
+    target_language, target_country, target_city = targets
+    notes = translated.get("notes", {}) or {}
+    if source_url:
+        notes.setdefault("source_url", source_url)
+    return models.Recipe(
+        user_id=current_user.id if current_user is not None else None,
+        trial_session_id=trial_session.id if trial_session is not None else None,
+        title_pl=translated.get("title_pl", "Untitled"),
+        title_original=translated.get("title_original", (raw_input or "")[:100]),
+        prep_time_minutes=translated.get("prep_time_minutes"),
+        cook_time_minutes=translated.get("cook_time_minutes"),
+        ingredients_pl=translated.get("ingredients_pl", []),
+        ingredients_original=translated.get("ingredients_original", []),
+        steps_pl=translated.get("steps_pl", []),
+        tags=translated.get("tags", []),
+        substitutions=translated.get("substitutions", {}),
+        notes=notes,
+        raw_input=raw_input,
+        detected_language=translated.get("detected_language"),
+        target_language=target_language,
+        target_country=target_country,
+        target_city=target_city,
+    )
+
+
 def _create_recipes_from_chunks(
     chunks: list[str],
     source_url: str,
@@ -131,70 +173,47 @@ def _create_recipes_from_chunks(
     current_user: models.User | None,
     trial_session,
 ):
-    """Translate and create one recipe per chunk; return RecipeCreateMultiOut."""
-    if current_user is not None:
-        user_for_update = (
-            db.execute(select(models.User).where(models.User.id == current_user.id)).scalar_one()
-        )
-    if current_user is not None:
-        target_language = current_user.target_language
-        target_country = current_user.target_country
-        target_city = current_user.target_city
-    else:
-        target_language = (payload.target_language or trial_session.language)
-        target_country = payload.target_country or trial_session.country
-        target_city = ""
+    """
+    Translate and create one recipe per chunk; return RecipeCreateMultiOut. A user is charged one
+    transformation up front (refunded if nothing gets created) and one per further created recipe.
+    """
+    target_language, target_country, target_city = _translation_targets(payload, current_user, trial_session)
 
+    if current_user is not None:
+        consume_user_quota(db, current_user)
     created: list[models.Recipe] = []
-    for raw_input in chunks:
-        try:
-            translated = translate_recipe(
-                raw_input=raw_input,
-                target_language=target_language,
-                target_country=target_country,
-                target_city=target_city,
+    with refund_on_error(db):
+        for raw_input in chunks:
+            try:
+                translated = translate_recipe(
+                    raw_input=raw_input,
+                    target_language=target_language,
+                    target_country=target_country,
+                    target_city=target_city,
+                )
+            except ValueError as e:
+                if str(e).startswith("NOT_A_RECIPE:"):
+                    continue
+                raise
+            recipe = _recipe_from_translated(
+                translated, raw_input, source_url, current_user, trial_session,
+                (target_language, target_country, target_city),
             )
-        except ValueError as e:
-            if str(e).startswith("NOT_A_RECIPE:"):
-                continue
-            raise
-        except Exception:
-            raise
-        notes = translated.get("notes", {}) or {}
-        notes.setdefault("source_url", source_url)
-        recipe = models.Recipe(
-            user_id=current_user.id if current_user is not None else None,
-            trial_session_id=trial_session.id if trial_session is not None else None,
-            title_pl=translated.get("title_pl", "Untitled"),
-            title_original=translated.get("title_original", (raw_input or "")[:100]),
-            prep_time_minutes=translated.get("prep_time_minutes"),
-            cook_time_minutes=translated.get("cook_time_minutes"),
-            ingredients_pl=translated.get("ingredients_pl", []),
-            ingredients_original=translated.get("ingredients_original", []),
-            steps_pl=translated.get("steps_pl", []),
-            tags=translated.get("tags", []),
-            substitutions=translated.get("substitutions", {}),
-            notes=notes,
-            raw_input=raw_input,
-            detected_language=translated.get("detected_language"),
-            target_language=target_language,
-            target_country=target_country,
-            target_city=target_city,
-        )
-        if current_user is not None and not _has_unlimited_quota(current_user):
-            user_for_update.transformations_used += 1
-        db.add(recipe)
-        created.append(recipe)
-    if not created:
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail=(
-                "This doesn't look like a recipe. Please paste the ingredients + steps, or try a different URL."
-            ),
-        )
+            db.add(recipe)
+            created.append(recipe)
+        if not created:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=(
+                    "This doesn't look like a recipe. Please paste the ingredients + steps, or try a different URL."
+                ),
+            )
+    if current_user is not None:
+        charge_user_quota(db, current_user, count=len(created) - 1)  # one per created recipe
     db.commit()
     for r in created:
         db.refresh(r)
+    _queue_new_recipe_images(created, db)
     remaining = None
     if trial_session is not None:
         remaining = MAX_TRIAL_ACTIONS - trial_session.used_actions
@@ -204,6 +223,155 @@ def _create_recipes_from_chunks(
     )
 
 
+def _split_url_into_chunks(source_url: str, db: Session) -> list[str]:
+    """
+    Translate-ready text per recipe on the page. Served from the page cache within its freshness
+    window or after a 304 to a conditional GET; otherwise fetched, extracted and cached.
+    """
+    cached = page_cache.lookup(db, source_url)
+    if cached is not None and page_cache.is_fresh(cached):
+        metrics.incr("url_import.cache_fresh")
+        return page_cache.mark_used(db, cached)
+    page = _fetch_page(source_url, headers=page_cache.conditional_headers(cached))
+    if page.status_code == 304 and cached is not None:
+        metrics.incr("url_import.cache_revalidated")
+        return page_cache.mark_used(db, cached, revalidated=True)
+    metrics.incr("url_import.cache_miss")
+    with metrics.timed("url_import.structured_parse"):
+        structured = extract_structured_recipes(page.text)
+    if structured:
+        # Complete schema.org / h-recipe data: translate it directly, no extraction LLM call.
+        metrics.incr("url_import.structured_data")
+        chunks = [_structured_recipe_to_raw_input(r) for r in structured]
+        page_cache.store(db, source_url, page.headers, "\n\n".join(chunks), chunks, "structured")
+        return chunks
+    page_text = _extract_text(page.text)
+    metrics.incr("url_import.llm_extract")
+    with metrics.timed("url_import.llm_extract"):
+        chunks = split_page_into_recipes(page_text)
+    if not chunks:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=(
+                "This doesn't look like a recipe. Please paste the ingredients + steps, or try a different URL. "
+                "If you think this is a mistake, contact tshprung.us@gmail.com."
+            ),
+        )
+    page_cache.store(db, source_url, page.headers, page_text, chunks, "llm")
+    return chunks
+
+
+def _import_payload(
+    payload: schemas.RecipeCreate,
+    db: Session,
+    current_user: models.User | None,
+    trial_session: models.TrialSession | None,
+    report=None,
+) -> schemas.RecipeCreateMultiOut:
+    """Fetch/split (URL) or sanitize (text) and create the recipes; errors are HTTPExceptions."""
+    report = report or (lambda **progress: None)
+    source_url = (payload.source_url or "").strip()
+    if source_url:
+        report(message="fetching")
+        chunks = _split_url_into_chunks(source_url, db)
+    else:
+        chunks = [_sanitize_text(payload.raw_input or "", max_len=10000)]
+    report(total=len(chunks), message="translating")
+    try:
+        return _create_recipes_from_chunks(
+            chunks=chunks,
+            source_url=source_url,
+            payload=payload,
+            db=db,
+            current_user=current_user,
+            trial_session=trial_session,
+        )
+    except HTTPException:
+        raise
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Translation failed: {e}")
+
+
+@job_handler("recipes.import")
+def _import_recipes_job(ctx: JobContext) -> dict:
+    """Background import (URL pages may hold several recipes); quota is charged per created recipe."""
+    db = ctx.db
+    current_user = db.get(models.User, ctx.user_id) if ctx.user_id is not None else None
+    trial_session = db.get(models.TrialSession, ctx.trial_session_id) if ctx.trial_session_id is not None else None
+    payload = schemas.RecipeCreate.model_validate(ctx.payload["request"])
+    out = _import_payload(payload, db, current_user, trial_session, report=ctx.report)
+    return out.model_dump(mode="json")
+
+
+def _bulk_item_key(item: schemas.RecipeCreate) -> str:
+    if (item.source_url or "").strip():
+        return "url:" + page_cache.normalize_url(item.source_url)
+    return "text:" + _WS_RE.sub(" ", item.raw_input or "").strip()
+
+
+def _bulk_import_item(user_id: int, item: schemas.RecipeCreate) -> dict:
+    """One bulk-import item with its own session. Returns its status entry; never raises."""
+    db = jobs.session_factory()
+    try:
+        user = db.get(models.User, user_id)
+        check_user_quota(user)  # skip before fetching; the charge itself is atomic
+        with settle_reservations(db):
+            out = _import_payload(item, db, user, None)
+        return {"status": BULK_ITEM_SUCCEEDED, "recipe_ids": [r.id for r in out.recipes]}
+    except HTTPException as e:
+        db.rollback()
+        item_status = BULK_ITEM_SKIPPED if e.status_code == status.HTTP_402_PAYMENT_REQUIRED else BULK_ITEM_FAILED
+        return {"status": item_status, "error": {"status_code": e.status_code, "detail": e.detail}}
+    except Exception as e:
+        db.rollback()
+        logger.exception("Bulk import item failed")
+        return {"status": BULK_ITEM_FAILED, "error": {"status_code": 500, "detail": f"Import failed: {e}"}}
+    finally:
+        db.close()
+
+
+@job_handler(BULK_IMPORT_JOB_KIND, lane=BULK_IMPORT_JOB_KIND, lane_workers=BULK_IMPORT_WORKERS)
+def _bulk_import_job(ctx: JobContext) -> dict:
+    """
+    Import each item (URL or text) with at most BULK_IMPORT_CONCURRENCY in flight for this user.
+    Items share the fetched-page cache; repeats of an earlier item are reported, not imported twice.
+    Quota is charged per created recipe; once it runs out the remaining items are skipped.
+    """
+    items = [schemas.RecipeCreate.model_validate(i) for i in ctx.payload["items"]]
+    statuses: list[dict] = [{"index": i, "status": BULK_ITEM_QUEUED} for i in range(len(items))]
+    first_seen: dict[str, int] = {}
+    pending: list[int] = []
+    for index, item in enumerate(items):
+        key = _bulk_item_key(item)
+        if key in first_seen:
+            statuses[index].update(status=BULK_ITEM_DUPLICATE, duplicate_of=first_seen[key])
+        else:
+            first_seen[key] = index
+            pending.append(index)
+
+    def report() -> None:
+        done = sum(1 for s in statuses if s["status"] != BULK_ITEM_QUEUED)
+        ctx.report(current=done, total=len(items), items=statuses)
+
+    report()
+    with ThreadPoolExecutor(max_workers=BULK_IMPORT_CONCURRENCY, thread_name_prefix="bulk-import") as pool:
+        futures = {pool.submit(_bulk_import_item, ctx.user_id, items[i]): i for i in pending}
+        for future in as_completed(futures):
+            statuses[futures[future]].update(future.result())
+            report()
+    counts = Counter(s["status"] for s in statuses)
+    metrics.incr("recipes.bulk_import.items", len(items))
+    return {
+        "items": statuses,
+        "created": sum(len(s.get("recipe_ids", [])) for s in statuses),
+        "succeeded": counts[BULK_ITEM_SUCCEEDED],
+        "failed": counts[BULK_ITEM_FAILED],
+        "skipped": counts[BULK_ITEM_SKIPPED] + counts[BULK_ITEM_DUPLICATE],
+    }
+
+
 @router.post(
     "/",
     response_model=schemas.RecipeOut | schemas.RecipeCreateTrialResponse | schemas.RecipeCreateMultiOut,
@@ -212,9 +380,14 @@ def _create_recipes_from_chunks(
 def create_recipe(
     payload: schemas.RecipeCreate,
     request: Request,
+    background: bool = False,
     db: Session = Depends(get_db),
     current_user: models.User | None = Depends(get_current_user_optional),
 ):
+    """
+    Create recipe(s) from pasted text or a URL (a page may yield several recipes).
+    With ?background=true returns 202 and a job id; the job result is a RecipeCreateMultiOut.
+    """
     trial_session = enforce_trial_or_user_quota(request, db, current_user)
     if current_user is not None and not current_user.is_verified:
         raise HTTPException(
@@ -222,18 +395,20 @@ def create_recipe(
             detail="Verify your email before using the app.",
         )
 
+    if background:
+        job = enqueue_job(
+            db,
+            "recipes.import",
+            {"request": payload.model_dump(mode="json")},
+            user_id=current_user.id if current_user is not None else None,
+            trial_session_id=trial_session.id if trial_session is not None else None,
+            reservations=take_reservations(db),  # the trial action; users are charged per recipe by the job
+        )
+        return job_accepted_response(job)
+
     source_url = (payload.source_url or "").strip()
     if source_url:
-        page_text = _fetch_and_extract_text(source_url)
-        chunks = split_page_into_recipes(page_text)
-        if not chunks:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail=(
-                    "This doesn't look like a recipe. Please paste the ingredients + steps, or try a different URL. "
-                    "If you think this is a mistake, contact tshprung.us@gmail.com."
-                ),
-            )
+        chunks = _split_url_into_chunks(source_url, db)
         # Multiple recipes from one URL: translate and create each
         if len(chunks) > 1:
             return _create_recipes_from_chunks(
@@ -248,69 +423,37 @@ def create_recipe(
     else:
         raw_input = _sanitize_text(payload.raw_input or "", max_len=10000)
 
+    target_language, target_country, target_city = _translation_targets(payload, current_user, trial_session)
     if current_user is not None:
-        user_for_update = (
-            db.execute(select(models.User).where(models.User.id == current_user.id)).scalar_one()
-        )
-
-    try:
-        if current_user is not None:
-            target_language = current_user.target_language
-            target_country = current_user.target_country
-            target_city = current_user.target_city
-        else:
-            target_language = (payload.target_language or trial_session.language)
-            target_country = payload.target_country or trial_session.country
-            target_city = ""
-        translated = translate_recipe(
-            raw_input=raw_input,
-            target_language=target_language,
-            target_country=target_country,
-            target_city=target_city,
-        )
-    except ValueError as e:
-        msg = str(e) or ""
-        if msg.startswith("NOT_A_RECIPE:"):
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail=(
-                    "This doesn't look like a recipe. Please paste the ingredients + steps, or try a different URL. "
-                    "If you think this is a mistake, contact tshprung.us@gmail.com."
-                ),
+        consume_user_quota(db, current_user)
+    with refund_on_error(db):
+        try:
+            translated = translate_recipe(
+                raw_input=raw_input,
+                target_language=target_language,
+                target_country=target_country,
+                target_city=target_city,
             )
-        raise
-    except RuntimeError as e:
-        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Translation failed: {e}")
-
-    notes = translated.get("notes", {}) or {}
-    if source_url:
-        notes.setdefault("source_url", source_url)
-
-    recipe = models.Recipe(
-        user_id=current_user.id if current_user is not None else None,
-        trial_session_id=trial_session.id if trial_session is not None else None,
-        title_pl=translated.get("title_pl", "Untitled"),
-        title_original=translated.get("title_original", (raw_input or "")[:100]),
-        prep_time_minutes=translated.get("prep_time_minutes"),
-        cook_time_minutes=translated.get("cook_time_minutes"),
-        ingredients_pl=translated.get("ingredients_pl", []),
-        ingredients_original=translated.get("ingredients_original", []),
-        steps_pl=translated.get("steps_pl", []),
-        tags=translated.get("tags", []),
-        substitutions=translated.get("substitutions", {}),
-        notes=notes,
-        raw_input=raw_input,
-        detected_language=translated.get("detected_language"),
-        target_language=target_language,
-        target_country=target_country,
-        target_city=target_city,
+        except ValueError as e:
+            msg = str(e) or ""
+            if msg.startswith("NOT_A_RECIPE:"):
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=(
+                        "This doesn't look like a recipe. Please paste the ingredients + steps, or try a different URL. "
+                        "If you think this is a mistake, contact tshprung.us@gmail.com."
+                    ),
+                )
+            raise
+        except RuntimeError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Translation failed: {e}")
+
+    recipe = _recipe_from_translated(
+        translated, raw_input, source_url, current_user, trial_session,
+        (target_language, target_country, target_city),
     )
-
-    if current_user is not None and not _has_unlimited_quota(current_user):
-        user_for_update.transformations_used += 1
-
     db.add(recipe)
     db.commit()
     db.refresh(recipe)
@@ -322,6 +465,183 @@ def create_recipe(
     return recipe
 
 
+@router.post("/bulk-import", status_code=status.HTTP_202_ACCEPTED)
+def bulk_import_recipes(
+    payload: schemas.RecipeBulkImportIn,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Import many URLs / pasted texts in one background job (202 + job id). The job's progress and
+    result list a status per item (succeeded with recipe_ids, failed, skipped, duplicate).
+    """
+    enforce_trial_or_user_quota(request, db, current_user)
+    if not current_user.is_verified:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Verify your email before using the app.",
+        )
+    # One unfinished bulk import per user, enforced by the jobs' unique dedup key.
+    job = enqueue_job(
+        db,
+        BULK_IMPORT_JOB_KIND,
+        {"items": [item.model_dump(mode="json") for item in payload.items]},
+        user_id=current_user.id,
+        dedup_key=f"user:{current_user.id}",
+    )
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A bulk import is already running. Wait for it to finish before starting another.",
+        )
+    return job_accepted_response(job)
+
+
+_NOT_A_RECIPE_DETAIL = (
+    "This doesn't look like a recipe. Please paste the ingredients + steps, or try a different URL. "
+    "If you think this is a mistake, contact tshprung.us@gmail.com."
+)
+
+
+def _stream_recipe_creation(
+    chunks: list[str],
+    source_url: str,
+    payload: schemas.RecipeCreate,
+    user_id: int | None,
+    trial_session_id: int | None,
+    started: float,
+    reservation_ids: list[int],
+):
+    """
+    SSE body for POST /api/recipes/stream. Emits, per recipe: title, ingredient*, step*, recipe
+    (persisted RecipeOut); then done. Errors after the stream has started arrive as an error event.
+    The endpoint's reservations pay for the first recipe; they are released if none is created.
+    """
+    db = SessionLocal()
+    first_content_ms: float | None = None
+    created_ids: list[int] = []
+    try:
+        current_user = db.get(models.User, user_id) if user_id is not None else None
+        trial_session = db.get(models.TrialSession, trial_session_id) if trial_session_id is not None else None
+        targets = _translation_targets(payload, current_user, trial_session)
+        yield sse_event("meta", {"total": len(chunks)})
+
+        for index, raw_input in enumerate(chunks):
+            translated = None
+            try:
+                for event in translate_recipe_stream(
+                    raw_input=raw_input,
+                    target_language=targets[0],
+                    target_country=targets[1],
+                    target_city=targets[2],
+                ):
+                    kind, key = event[0], event[1]
+                    if kind == "result":
+                        translated = key
+                        continue
+                    if first_content_ms is None and key in ("title_pl", "ingredients_pl", "steps_pl"):
+                        first_content_ms = (time.perf_counter() - started) * 1000
+                        metrics.observe_ms("recipes.stream.time_to_first_content", first_content_ms)
+                    if kind == "field" and key == "title_pl":
+                        yield sse_event("title", {"index": index, "title": event[2]})
+                    elif kind == "item" and key == "ingredients_pl":
+                        yield sse_event("ingredient", {"index": index, "position": event[2], "text": event[3]})
+                    elif kind == "item" and key == "steps_pl":
+                        yield sse_event("step", {"index": index, "position": event[2], "text": event[3]})
+            except ValueError as e:
+                if str(e).startswith("NOT_A_RECIPE:") and len(chunks) > 1:
+                    yield sse_event("skipped", {"index": index})
+                    continue
+                if str(e).startswith("NOT_A_RECIPE:"):
+                    yield sse_event("error", {"status_code": 422, "detail": _NOT_A_RECIPE_DETAIL})
+                else:
+                    yield sse_event("error", {"status_code": 502, "detail": f"Translation failed: {e}"})
+                return
+            except RuntimeError as e:
+                yield sse_event("error", {"status_code": 503, "detail": str(e)})
+                return
+            except Exception as e:
+                yield sse_event("error", {"status_code": 502, "detail": f"Translation failed: {e}"})
+                return
+
+            recipe = _recipe_from_translated(translated, raw_input, source_url, current_user, trial_session, targets)
+            if current_user is not None and created_ids:
+                charge_user_quota(db, current_user)
+            db.add(recipe)
+            db.commit()
+            db.refresh(recipe)
+            _queue_new_recipe_images([recipe], db)
+            created_ids.append(recipe.id)
+            yield sse_event(
+                "recipe",
+                {"index": index, "recipe": schemas.RecipeOut.model_validate(recipe).model_dump(mode="json")},
+            )
+
+        if not created_ids:
+            yield sse_event("error", {"status_code": 422, "detail": _NOT_A_RECIPE_DETAIL})
+            return
+        metrics.observe_ms("recipes.stream.total", (time.perf_counter() - started) * 1000)
+        yield sse_event(
+            "done",
+            {
+                "recipe_ids": created_ids,
+                "remaining_actions": (
+                    MAX_TRIAL_ACTIONS - trial_session.used_actions if trial_session is not None else None
+                ),
+                "time_to_first_content_ms": round(first_content_ms) if first_content_ms is not None else None,
+            },
+        )
+    finally:
+        db.rollback()
+        if created_ids:
+            commit_reservations(db, reservation_ids)
+        else:
+            release_reservations(db, reservation_ids)
+        db.close()
+
+
+@router.post("/stream")
+def create_recipe_stream(
+    payload: schemas.RecipeCreate,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.User | None = Depends(get_current_user_optional),
+):
+    """
+    Streaming variant of POST /api/recipes/ (Server-Sent Events). Title, ingredients and steps are sent
+    as soon as the model writes them; each recipe is saved when complete. Quota/auth/URL errors are
+    normal HTTP errors; translation errors arrive as an error event.
+    """
+    started = time.perf_counter()
+    trial_session = enforce_trial_or_user_quota(request, db, current_user)
+    if current_user is not None and not current_user.is_verified:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Verify your email before using the app.",
+        )
+    source_url = (payload.source_url or "").strip()
+    if source_url:
+        chunks = _split_url_into_chunks(source_url, db)
+    else:
+        chunks = [_sanitize_text(payload.raw_input or "", max_len=10000)]
+    if current_user is not None:
+        consume_user_quota(db, current_user)
+    return StreamingResponse(
+        _stream_recipe_creation(
+            chunks,
+            source_url,
+            payload,
+            current_user.id if current_user is not None else None,
+            trial_session.id if trial_session is not None else None,
+            started,
+            take_reservations(db),  # settled by the stream once it knows whether a recipe was created
+        ),
+        media_type=SSE_MEDIA_TYPE,
+        headers=SSE_HEADERS,
+    )
+
+
 @router.post("/from-ai-suggestion", response_model=schemas.RecipeOut, status_code=status.HTTP_201_CREATED)
 def create_recipe_from_ai_suggestion(
     payload: schemas.FromAISuggestionRequest,
@@ -383,17 +703,62 @@ def create_recipe_from_ai_suggestion(
 @router.get("/", response_model=list[schemas.RecipeOut])
 def list_recipes(
     collection: str | None = None,
+    q: str | None = None,
+    safe_for_me: bool = False,
     db: Session = Depends(get_db),
     user_and_trial: tuple = Depends(get_optional_user_and_trial),
 ):
+    """List the caller's recipes. safe_for_me=true keeps only recipes matching the user's diets and allergens."""
     current_user, trial_session = user_and_trial
     if current_user is None and trial_session is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
-    recipes = recipes_for_user_or_trial(db, current_user, trial_session)
+    query = recipes_query_for_user_or_trial(db, current_user, trial_session)
+    recipes = filter_safe_for_user(query, current_user) if safe_for_me else query.all()
+    if q and q.strip():
+        recipes = [r for r in recipes if recipe_matches_query(r, q)]
     if collection and collection.strip():
         coll = collection.strip().lower()
         recipes = [r for r in recipes if (r.collections or []) and any((c or "").strip().lower() == coll for c in r.collections)]
-    return recipes
+    return _RECIPE_ROWS.response(recipes)
+
+
+_EXPORT_MEDIA_TYPES = {"jsonl": "application/x-ndjson", "csv": "text/csv; charset=utf-8", "zip": "application/zip"}
+
+
+def _export_stream(user_id: int, format: str, include_images: bool):
+    db = SessionLocal()
+    try:
+        if format == "csv":
+            yield from recipe_export.iter_csv(db, user_id)
+        elif format == "zip":
+            yield from recipe_export.iter_zip(db, user_id, include_images=include_images)
+        else:
+            yield from recipe_export.iter_jsonl(db, user_id)
+    finally:
+        db.close()
+
+
+@router.get("/export")
+def export_recipes(
+    format: str = "jsonl",
+    include_images: bool = False,
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Download the whole library with variants, streamed: format=jsonl (one recipe per line), csv, or
+    zip (recipes.jsonl, plus the stored images under images/ with include_images=true).
+    """
+    if format not in recipe_export.EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format must be one of: {', '.join(recipe_export.EXPORT_FORMATS)}",
+        )
+    filename = f"recipes-{datetime.now(timezone.utc):%Y%m%d}.{format}"
+    return StreamingResponse(
+        _export_stream(current_user.id, format, include_images),
+        media_type=_EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @router.get("/collections", response_model=schemas.RecipeCollectionsListOut)
@@ -442,7 +807,7 @@ def create_collection(
     names: set[str] = set()
 
     if current_user is not None:
-        user = db.execute(select(models.User).where(models.User.id == current_user.id)).scalar_one()
+        user = current_user
         existing = list(user.filter_names or [])
         if any((n or "").strip().lower() == name_lower for n in existing):
             names.update((n or "").strip() for n in existing if (n or "").strip())
@@ -490,7 +855,7 @@ def remove_collection(
 
     # For logged-in users, also remove from filter_names.
     if current_user is not None:
-        user = db.execute(select(models.User).where(models.User.id == current_user.id)).scalar_one()
+        user = current_user
         if user.filter_names:
             user.filter_names = [n for n in user.filter_names if (n or "").strip().lower() != name_lower]
 
@@ -545,19 +910,14 @@ def discover_recipes(
             detail="Verify your email before using the app.",
         )
     if current_user is not None:
-        user_for_update = (
-            db.execute(select(models.User).where(models.User.id == current_user.id)).scalar_one()
-        )
         # Persist discovery preferences on the user so we can prefill next time.
-        user_for_update.dish_preferences = payload.dish_types or []
-        user_for_update.diet_filters = payload.diet_filters or []
+        current_user.dish_preferences = payload.dish_types or []
+        current_user.diet_filters = payload.diet_filters or []
         if payload.allergens is not None:
-          user_for_update.allergens = payload.allergens or []
+          current_user.allergens = payload.allergens or []
         if payload.custom_avoid_text is not None:
-          user_for_update.custom_allergens_text = schemas.sanitize_custom_allergens_text(payload.custom_avoid_text)
-        if not _has_unlimited_quota(current_user):
-            user_for_update.transformations_used += 1
-        db.commit()
+          current_user.custom_allergens_text = schemas.sanitize_custom_allergens_text(payload.custom_avoid_text)
+        consume_user_quota(db, current_user)  # also commits the preferences
     requested_lang = (payload.target_language or "").strip() if getattr(payload, "target_language", None) else ""
     if requested_lang:
         target_lang = requested_lang
@@ -576,22 +936,43 @@ def discover_recipes(
         if payload.custom_avoid_text is not None
         else (current_user.custom_allergens_text if current_user else None)
     )
-    try:
-        recipes = suggest_recipes_from_preferences(
-            dish_types=payload.dish_types or None,
-            diet_filters=payload.diet_filters or None,
-            max_time_minutes=payload.max_time_minutes,
-            target_language=target_lang,
-            keywords=payload.keywords,
-            ingredients_text=payload.ingredients_text,
-            measurement_system=measurement,
-            allergens=allergens,
-            custom_avoid_text=custom_avoid,
-            num_recipes=payload.num_recipes,
-            servings=payload.servings or (current_user.default_servings if current_user else None),
+    servings = payload.servings or (current_user.default_servings if current_user else None)
+    pool_params = None
+    recipes = None
+    if discover_pool.is_poolable(payload.keywords, payload.ingredients_text, custom_avoid):
+        pool_params = discover_pool.pool_params(
+            payload.dish_types, payload.diet_filters, allergens, payload.max_time_minutes, target_lang, measurement, servings
         )
-    except RuntimeError as e:
-        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+        fingerprint = discover_pool.pool_fingerprint(pool_params)
+        identity = discover_pool.identity_key(
+            current_user.id if current_user else None, trial_session.id if trial_session else None
+        )
+        recipes = discover_pool.take_from_pool(db, fingerprint, payload.num_recipes, identity)
+    else:
+        metrics.incr("discover.pool.bypass")
+    if recipes is None:
+        try:
+            with refund_on_error(db):
+                recipes = suggest_recipes_from_preferences(
+                    dish_types=payload.dish_types or None,
+                    diet_filters=payload.diet_filters or None,
+                    max_time_minutes=payload.max_time_minutes,
+                    target_language=target_lang,
+                    keywords=payload.keywords,
+                    ingredients_text=payload.ingredients_text,
+                    measurement_system=measurement,
+                    allergens=allergens,
+                    custom_avoid_text=custom_avoid,
+                    num_recipes=payload.num_recipes,
+                    servings=servings,
+                )
+        except RuntimeError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    if pool_params is not None:
+        try:
+            discover_pool.schedule_refill_if_low(db, fingerprint, pool_params)
+        except Exception:
+            logger.exception("Could not schedule discover pool refill")
     # Always return at most requested best-matching recipes.
     recipes = recipes[: payload.num_recipes] if recipes else []
     no_reason = None
@@ -631,25 +1012,47 @@ def discover_recipes(
     return out
 
 
+@job_handler(discover_pool.REFILL_JOB_KIND)
+def _refill_discover_pool_job(ctx: JobContext) -> dict:
+    """Top up one fingerprint of the discover pool with a batch of fresh suggestions."""
+    params = ctx.payload["params"]
+    metrics.incr("discover.pool.refill")
+    try:
+        with metrics.timed("discover.pool.refill"):
+            recipes = suggest_recipes_from_preferences(
+                dish_types=params["dish_types"] or None,
+                diet_filters=params["diet_filters"] or None,
+                max_time_minutes=params["max_time_minutes"],
+                target_language=params["target_language"],
+                measurement_system=params["measurement_system"],
+                allergens=params["allergens"] or None,
+                num_recipes=discover_pool.REFILL_BATCH,
+                servings=params.get("servings"),
+            )
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    added = discover_pool.add_to_pool(ctx.db, ctx.payload["fingerprint"], params, recipes)
+    ctx.db.commit()
+    return {"added": added}
+
+
 def _what_can_i_make_ai(
     payload: schemas.WhatCanIMakeRequest,
     current_user: models.User | None,
     trial_session: models.TrialSession | None,
     db: Session,
 ) -> schemas.WhatCanIMakeAIOut:
-    """AI path: generate recipe suggestion from ingredients + diet. Quota already consumed by caller."""
+    """
+    AI path: generate recipe suggestion from ingredients + diet. The trial action was consumed by the
+    caller; a user's unit is consumed here. Both are refunded if the AI call fails.
+    """
     if current_user is not None and not current_user.is_verified:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Verify your email before using the app.",
         )
     if current_user is not None:
-        user_for_update = (
-            db.execute(select(models.User).where(models.User.id == current_user.id)).scalar_one()
-        )
-        if not _has_unlimited_quota(current_user):
-            user_for_update.transformations_used += 1
-        db.commit()
+        consume_user_quota(db, current_user)
 
     if current_user is not None:
         target_lang = (current_user.target_language or "").strip() or "en"
@@ -664,14 +1067,15 @@ def _what_can_i_make_ai(
         avoid_terms = []
         allergen_codes = None
     try:
-        suggestion = suggest_recipe_from_ingredients(
-            ingredients=payload.ingredients or [],
-            diet_filters=payload.diet_filters or None,
-            allergen_codes=allergen_codes,
-            avoid_terms=avoid_terms or None,
-            assume_pantry=payload.assume_pantry,
-            target_language=target_lang,
-        )
+        with refund_on_error(db):
+            suggestion = suggest_recipe_from_ingredients(
+                ingredients=payload.ingredients or [],
+                diet_filters=payload.diet_filters or None,
+                allergen_codes=allergen_codes,
+                avoid_terms=avoid_terms or None,
+                assume_pantry=payload.assume_pantry,
+                target_language=target_lang,
+            )
     except RuntimeError as e:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
 
@@ -725,8 +1129,59 @@ def recipe_ingredient_match(
     )
 
 
+def _autogenerate_images() -> bool:
+    return (os.getenv("RECIPE_IMAGE_AUTOGEN") or "").strip().lower() in ("1", "true", "yes")
+
+
+def _queue_new_recipe_images(recipes: list[models.Recipe], db: Session) -> None:
+    """When RECIPE_IMAGE_AUTOGEN is on, give new recipes a cached image or a pending generation."""
+    if not _autogenerate_images():
+        return
+    for r in recipes:
+        try:
+            recipe_image.request_recipe_image(r, db)
+        except Exception:
+            db.rollback()
+            logger.exception("Could not queue image for recipe %s", r.id)
+
+
+@job_handler(recipe_image.IMAGE_JOB_KIND, lane=recipe_image.IMAGE_JOB_LANE, lane_workers=recipe_image.IMAGE_WORKERS)
+def _generate_recipe_image_job(ctx: JobContext) -> dict:
+    """Generate one dish image and apply it to every recipe pending on the same cache key."""
+    result = recipe_image.generate_pending_image(ctx.db, ctx.payload["cache_key"], ctx.payload.get("recipe_id"))
+    if result["status"] != recipe_image.IMAGE_READY:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Image generation failed.")
+    return result
+
+
+@router.post("/{recipe_id}/image/generate", response_model=schemas.RecipeOut, status_code=status.HTTP_202_ACCEPTED)
+def generate_recipe_image(
+    recipe_id: int,
+    db: Session = Depends(get_db),
+    user_and_trial: tuple = Depends(get_optional_user_and_trial),
+):
+    """
+    Request an AI dish image without waiting for it: returns at once with image_url (cache hit)
+    or image_status="pending"; poll GET /api/recipes/{id} until it is "ready" or "failed".
+    """
+    current_user, trial_session = user_and_trial
+    if current_user is None and trial_session is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    recipe = get_recipe_or_404(recipe_id, current_user, trial_session, db)
+    if recipe.image_status == recipe_image.IMAGE_FAILED:
+        recipe.image_status = None  # explicit retry
+    recipe_image.request_recipe_image(recipe, db)
+    db.refresh(recipe)
+    return recipe
+
+
 _MAX_IMAGE_UPLOAD_BYTES = 3 * 1024 * 1024  # 3 MB
 _ALLOWED_IMAGE_CONTENT_TYPES = {"image/jpeg", "image/png"}
+_UPLOAD_REJECTED_DETAIL = {
+    "too_large": "Image must be 3 MB or smaller.",
+    "unsupported": "Only JPEG or PNG images are allowed.",
+    "empty": "Empty file.",
+}
 
 
 @router.post("/{recipe_id}/image-upload", response_model=schemas.RecipeOut)
@@ -736,7 +1191,10 @@ def upload_recipe_image(
     db: Session = Depends(get_db),
     user_and_trial: tuple = Depends(get_optional_user_and_trial),
 ):
-    """Upload a custom recipe image (replaces existing). Accepts JPEG or PNG, max 3 MB."""
+    """
+    Upload a custom recipe image (replaces existing). Accepts JPEG or PNG (checked by magic bytes),
+    max 3 MB; the file is streamed into the image store in chunks, never read into memory whole.
+    """
     current_user, trial_session = user_and_trial
     if current_user is None and trial_session is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
@@ -747,24 +1205,23 @@ def upload_recipe_image(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Only JPEG or PNG images are allowed.",
         )
-    content = file.file.read()
-    if len(content) > _MAX_IMAGE_UPLOAD_BYTES:
+    try:
+        image_url, renditions = save_user_upload(db, file.file, _MAX_IMAGE_UPLOAD_BYTES)
+    except image_store.UploadRejected as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Image must be 3 MB or smaller.",
-        )
-    if len(content) == 0:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty file.")
-    ext = "png" if content_type == "image/png" else "jpg"
-    try:
-        image_url = save_user_upload(recipe_id, content, ext)
+            detail=_UPLOAD_REJECTED_DETAIL[e.reason],
+        ) from e
     except OSError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to save image.",
         ) from e
     recipe.image_url = image_url
+    recipe.image_renditions = renditions
+    recipe.image_status = None  # a pending generation must not replace the user's photo
     db.commit()
+    image_store.collect_garbage(db)  # the replaced photo, unless other recipes use it
     db.refresh(recipe)
     return recipe
 
@@ -781,7 +1238,10 @@ def remove_recipe_image(
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
     recipe = get_recipe_or_404(recipe_id, current_user, trial_session, db)
     recipe.image_url = None
+    recipe.image_renditions = None
+    recipe.image_status = None
     db.commit()
+    image_store.collect_garbage(db)
     db.refresh(recipe)
     return recipe
 
@@ -874,7 +1334,20 @@ def list_variants(
     if current_user is None and trial_session is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
     recipe = get_recipe_or_404(recipe_id, current_user, trial_session, db)
-    return recipe.variants
+    versions = dict(
+        db.execute(
+            select(models.RecipeVariant.id, models.RecipeVariant.updated_at)
+            .where(models.RecipeVariant.recipe_id == recipe.id)
+            .order_by(models.RecipeVariant.id)
+        ).all()
+    )
+    payloads = _variant_payloads.get_many(versions)
+    missing = [variant_id for variant_id in versions if variant_id not in payloads]
+    if missing:
+        for variant in db.query(models.RecipeVariant).filter(models.RecipeVariant.id.in_(missing)):
+            payloads[variant.id] = _VARIANT_ROWS.dump_one(variant)
+            _variant_payloads.put(variant.id, variant.updated_at, payloads[variant.id])
+    return FastJSONResponse(b"[" + b",".join(payloads[variant_id] for variant_id in versions) + b"]")
 
 
 def _recipe_needs_relocalize(recipe: models.Recipe, user: models.User) -> bool:
@@ -908,40 +1381,31 @@ def relocalize_recipe(
             detail="Verify your email before using the app.",
         )
 
-    # Quota check before OpenAI cost, but do not consume quota yet
-    user_for_update = (
-        db.execute(select(models.User).where(models.User.id == current_user.id)).scalar_one()
-    )
-    if not _has_unlimited_quota(current_user) and user_for_update.transformations_limit != -1 and (
-        user_for_update.transformations_used >= user_for_update.transformations_limit
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_402_PAYMENT_REQUIRED,
-            detail="You have reached the free recipes limit. Contact the administrator.",
-        )
-
-    try:
-        translated = translate_recipe(
-            raw_input=recipe.raw_input,
-            target_language=current_user.target_language,
-            target_country=current_user.target_country,
-            target_city=current_user.target_city,
-        )
-    except ValueError as e:
-        msg = str(e) or ""
-        if msg.startswith("NOT_A_RECIPE:"):
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail=(
-                    "This doesn't look like a recipe. If you think this is a mistake, "
-                    "contact tshprung.us@gmail.com."
-                ),
+    # Take the unit before the OpenAI cost; refunded if translation fails
+    consume_user_quota(db, current_user)
+    with refund_on_error(db):
+        try:
+            translated = translate_recipe(
+                raw_input=recipe.raw_input,
+                target_language=current_user.target_language,
+                target_country=current_user.target_country,
+                target_city=current_user.target_city,
             )
-        raise
-    except RuntimeError as e:
-        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Translation failed: {e}")
+        except ValueError as e:
+            msg = str(e) or ""
+            if msg.startswith("NOT_A_RECIPE:"):
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=(
+                        "This doesn't look like a recipe. If you think this is a mistake, "
+                        "contact tshprung.us@gmail.com."
+                    ),
+                )
+            raise
+        except RuntimeError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Translation failed: {e}")
 
     recipe.title_pl = translated.get("title_pl", recipe.title_pl)
     recipe.title_original = translated.get("title_original", recipe.title_original)
@@ -958,114 +1422,162 @@ def relocalize_recipe(
     recipe.target_country = current_user.target_country
     recipe.target_city = current_user.target_city
 
-    if not _has_unlimited_quota(current_user):
-        user_for_update.transformations_used += 1
     db.commit()
     db.refresh(recipe)
     return recipe
 
 
-@router.post("/{recipe_id}/adapt")
-def adapt_recipe_endpoint(
-    recipe_id: int,
+def _adaptation_targets(
     payload: schemas.AdaptRequest,
-    request: Request,
-    db: Session = Depends(get_db),
-    current_user: models.User | None = Depends(get_current_user_optional),
-):
-    # Allow this specific transform flow to run even when user credits are exhausted
-    # (credits are clamped to 0 remaining after the run).
-    allow_overdraft = bool(getattr(payload, "custom_instruction", None)) and (
-        (getattr(payload, "variant_type", None) or "").strip() == "transform"
-    )
-    trial_session = enforce_trial_or_user_quota(request, db, current_user, allow_overdraft=allow_overdraft)
-    recipe = get_recipe_or_404(recipe_id, current_user, trial_session, db)
+    current_user: models.User | None,
+    trial_session: models.TrialSession | None,
+) -> tuple[str, str | None, list[str]]:
+    """(target_language, target_country, avoid_terms) for an adaptation request."""
+    if current_user is not None:
+        target_lang = (current_user.target_language or "").strip() or "en"
+        target_country = current_user.target_country
+        avoid_terms = []
+        if current_user.custom_allergens_text:
+            raw = current_user.custom_allergens_text
+            parts = [p.strip() for p in raw.replace(";", ",").split(",")]
+            avoid_terms = [p for p in parts if p]
+    else:
+        # Trial: use request body if provided (from Settings saved in localStorage), else session defaults
+        target_lang = (payload.target_language or trial_session.language or "").strip() or "en"
+        target_country = payload.target_country or trial_session.country
+        avoid_terms = []
+    return target_lang, target_country, avoid_terms
 
-    if current_user is not None and not current_user.is_verified:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Verify your email before using the app.",
-        )
 
-    types = normalize_adapt_types(getattr(payload, "variant_types", None), getattr(payload, "variant_type", None))
+def _cached_variant(db: Session, recipe_id: int, types: list[str]) -> models.RecipeVariant | None:
+    """Saved variant for exactly these diets; for combinable diets the order does not matter."""
     composite_key = ",".join(types)
+    existing = db.query(models.RecipeVariant).filter_by(recipe_id=recipe_id, variant_type=composite_key).first()
+    if existing is not None or not diets_can_combine(types):
+        return existing
+    wanted = sorted(types)
+    for v in (
+        db.query(models.RecipeVariant)
+        .filter(models.RecipeVariant.recipe_id == recipe_id, models.RecipeVariant.variant_type.contains(","))
+        .all()
+    ):
+        if sorted(v.variant_type.split(",")) == wanted:
+            return v
+    return None
 
-    if current_user is not None:
-        user_for_update = (
-            db.execute(select(models.User).where(models.User.id == current_user.id)).scalar_one()
+
+def _variant_as_recipe(variant: models.RecipeVariant | dict) -> dict:
+    """Saved variant or adapt_recipe result, in the dict shape adapt_recipe accepts for chaining."""
+    get = variant.get if isinstance(variant, dict) else (lambda key: getattr(variant, key))
+    return {
+        "title_pl": get("title_pl"),
+        "ingredients_pl": get("ingredients_pl") or [],
+        "steps_pl": get("steps_pl") or [],
+        "notes": get("notes") or {},
+    }
+
+
+def _adapt_composite(
+    recipe: models.Recipe,
+    types: list[str],
+    target_lang: str,
+    target_country: str | None,
+    avoid_terms: list[str],
+    db: Session,
+) -> dict:
+    """
+    Adapt to several diets (composite key "a,b,c"). When the diets can be combined, starts from the
+    largest already-saved variant for any subset of them (in any order) and applies the rest in one
+    prompt. Otherwise starts from the longest saved prefix variant ("a" or "a,b") and applies the
+    remaining diets one at a time, saving each intermediate prefix as its own variant for later reuse.
+    Returns the adapt_recipe-shaped result for the full composite. Caller saves the final variant.
+    """
+    saved = {
+        v.variant_type: v
+        for v in db.query(models.RecipeVariant).filter(models.RecipeVariant.recipe_id == recipe.id).all()
+    }
+    current = recipe
+    if diets_can_combine(types):
+        wanted = set(types)
+        best: set[str] = set()
+        for key, variant in saved.items():
+            diets = set(key.split(","))
+            if len(best) < len(diets) < len(wanted) and diets <= wanted:
+                current, best = _variant_as_recipe(variant), diets
+        remaining = [t for t in types if t not in best]
+        return adapt_recipe(
+            current, ",".join(remaining), custom_instruction=None, target_language=target_lang,
+            target_country=target_country,
+            avoid_terms=avoid_terms or None,
         )
 
-    # For standard (non-custom) adaptations, check cache first (don't consume quota)
-    if not payload.custom_instruction:
-        existing = (
-            db.query(models.RecipeVariant)
-            .filter_by(recipe_id=recipe_id, variant_type=composite_key)
-            .first()
+    start = 0
+    for k in range(len(types) - 1, 0, -1):
+        prefix = saved.get(",".join(types[:k]))
+        if prefix is not None:
+            current, start = _variant_as_recipe(prefix), k
+            break
+    remaining = types[start:]
+
+    if len(remaining) == 1 or diets_can_combine(remaining):
+        return adapt_recipe(
+            current, ",".join(remaining), custom_instruction=None, target_language=target_lang,
+            target_country=target_country,
+            avoid_terms=avoid_terms or None,
         )
-        if existing:
-            out = {
-                "can_adapt": True,
-                "variant": schemas.RecipeVariantOut.model_validate(existing),
-                "alternatives": [],
-            }
-            if trial_session is not None:
-                out["remaining_actions"] = MAX_TRIAL_ACTIONS - trial_session.used_actions
-            return out
 
-    if current_user is not None and not _has_unlimited_quota(current_user):
-        # Clamp: if user has no remaining credits, still let this run, but never exceed the limit.
-        if user_for_update.transformations_limit != -1:
-            user_for_update.transformations_used = min(
-                user_for_update.transformations_used + 1,
-                user_for_update.transformations_limit,
+    for j, t in enumerate(remaining):
+        result = adapt_recipe(
+            current, t, custom_instruction=None, target_language=target_lang,
+            target_country=target_country,
+            avoid_terms=avoid_terms or None,
+        )
+        if not result.get("can_adapt"):
+            return result
+        current = _variant_as_recipe(result)
+        prefix_key = ",".join(types[: start + j + 1])
+        if start + j + 1 < len(types) and prefix_key not in saved:
+            db.add(
+                models.RecipeVariant(
+                    recipe_id=recipe.id,
+                    variant_type=prefix_key,
+                    title_pl=current["title_pl"],
+                    ingredients_pl=current["ingredients_pl"],
+                    steps_pl=current["steps_pl"],
+                    notes=current["notes"],
+                )
             )
-        else:
-            user_for_update.transformations_used += 1
-    db.commit()
+            db.commit()
+    return {**current, "can_adapt": True, "alternatives": []}
 
+
+def _run_adaptation(
+    recipe: models.Recipe,
+    payload: schemas.AdaptRequest,
+    types: list[str],
+    current_user: models.User | None,
+    trial_session: models.TrialSession | None,
+    db: Session,
+) -> dict:
+    """Run the AI adaptation (chained for several types) and save the variant. Quota is handled by the caller."""
+    recipe_id = recipe.id
+    composite_key = ",".join(types)
     custom_instruction = (
         _sanitize_text(payload.custom_instruction, max_len=1000)
         if payload.custom_instruction is not None
         else None
     )
-
-    if current_user is not None:
-        target_lang = (current_user.target_language or "").strip() or "en"
-        target_country = current_user.target_country
-        avoid_terms = []
-        if current_user.custom_allergens_text:
-            raw = current_user.custom_allergens_text
-            parts = [p.strip() for p in raw.replace(";", ",").split(",")]
-            avoid_terms = [p for p in parts if p]
-    else:
-        # Trial: use request body if provided (from Settings saved in localStorage), else session defaults
-        target_lang = (payload.target_language or trial_session.language or "").strip() or "en"
-        target_country = payload.target_country or trial_session.country
-        avoid_terms = []
+    target_lang, target_country, avoid_terms = _adaptation_targets(payload, current_user, trial_session)
 
     try:
         if len(types) > 1:
-            # Chain adaptations: apply each diet in order
-            current = recipe
-            for t in types:
-                result = adapt_recipe(
-                    current, t, custom_instruction=None, target_language=target_lang,
-                    target_country=target_country,
-                    avoid_terms=avoid_terms or None,
-                )
-                if not result.get("can_adapt"):
-                    return {
-                        "can_adapt": False,
-                        "variant": None,
-                        "alternatives": result.get("alternatives", []),
-                    }
-                current = {
-                    "title_pl": result["title_pl"],
-                    "ingredients_pl": result["ingredients_pl"],
-                    "steps_pl": result["steps_pl"],
-                    "notes": result.get("notes", {}),
+            result = _adapt_composite(recipe, types, target_lang, target_country, avoid_terms, db)
+            if not result.get("can_adapt"):
+                return {
+                    "can_adapt": False,
+                    "variant": None,
+                    "alternatives": result.get("alternatives", []),
                 }
-            result = current
             variant_type = composite_key
             title_pl = result["title_pl"]
         else:
@@ -1110,11 +1622,96 @@ def adapt_recipe_endpoint(
     db.add(variant)
     db.commit()
     db.refresh(variant)
-    out = {
+    return {
         "can_adapt": True,
         "variant": schemas.RecipeVariantOut.model_validate(variant),
         "alternatives": [],
     }
+
+
+@job_handler("recipes.adapt")
+def _adapt_recipe_job(ctx: JobContext) -> dict:
+    """Background adaptation (typically a chain of diets); the quota reserved at enqueue is kept on success."""
+    db = ctx.db
+    current_user = db.get(models.User, ctx.user_id) if ctx.user_id is not None else None
+    trial_session = db.get(models.TrialSession, ctx.trial_session_id) if ctx.trial_session_id is not None else None
+    payload = schemas.AdaptRequest.model_validate(ctx.payload["request"])
+    recipe = get_recipe_or_404(ctx.payload["recipe_id"], current_user, trial_session, db)
+    types = normalize_adapt_types(payload.variant_types, payload.variant_type)
+    ctx.report(total=len(types), message="adapting")
+
+    out = _run_adaptation(recipe, payload, types, current_user, trial_session, db)
+    if out["variant"] is not None:
+        out["variant"] = out["variant"].model_dump(mode="json")
+    if trial_session is not None:
+        out["remaining_actions"] = MAX_TRIAL_ACTIONS - trial_session.used_actions
+    return out
+
+
+@router.post("/{recipe_id}/adapt")
+def adapt_recipe_endpoint(
+    recipe_id: int,
+    payload: schemas.AdaptRequest,
+    request: Request,
+    background: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User | None = Depends(get_current_user_optional),
+):
+    """
+    Adapt a recipe to one diet or a chain of diets (saved as a variant; cached per type set).
+    With ?background=true a non-cached adaptation returns 202 and a job id; the quota reserved
+    here is refunded if the job fails.
+    """
+    # Allow this specific transform flow to run even when user credits are exhausted
+    # (credits are clamped to 0 remaining after the run).
+    allow_overdraft = bool(getattr(payload, "custom_instruction", None)) and (
+        (getattr(payload, "variant_type", None) or "").strip() == "transform"
+    )
+    trial_session = enforce_trial_or_user_quota(request, db, current_user, allow_overdraft=allow_overdraft)
+    recipe = get_recipe_or_404(recipe_id, current_user, trial_session, db)
+
+    if current_user is not None and not current_user.is_verified:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Verify your email before using the app.",
+        )
+
+    types = normalize_adapt_types(getattr(payload, "variant_types", None), getattr(payload, "variant_type", None))
+
+    # For standard (non-custom) adaptations, check cache first (don't consume quota)
+    if not payload.custom_instruction:
+        existing = _cached_variant(db, recipe_id, types)
+        if existing:
+            out = {
+                "can_adapt": True,
+                "variant": schemas.RecipeVariantOut.model_validate(existing),
+                "alternatives": [],
+            }
+            if trial_session is not None:
+                out["remaining_actions"] = MAX_TRIAL_ACTIONS - trial_session.used_actions
+            return out
+
+    if current_user is not None:
+        if allow_overdraft:
+            # Clamp: if user has no remaining credits, still let this run, but never exceed the limit.
+            try_consume_user_quota(db, current_user)
+        else:
+            consume_user_quota(db, current_user)
+    db.commit()
+
+    if background:
+        job = enqueue_job(
+            db,
+            "recipes.adapt",
+            {"recipe_id": recipe_id, "request": payload.model_dump(mode="json")},
+            user_id=current_user.id if current_user is not None else None,
+            trial_session_id=trial_session.id if trial_session is not None else None,
+            reservations=take_reservations(db),
+        )
+        return job_accepted_response(job)
+
+    with refund_on_error(db):
+        out = _run_adaptation(recipe, payload, types, current_user, trial_session, db)
     if trial_session is not None:
         out["remaining_actions"] = MAX_TRIAL_ACTIONS - trial_session.used_actions
     return out
@@ -1140,32 +1737,24 @@ def ingredient_alternatives(
             detail="Verify your email before using the app.",
         )
 
-    user_for_update = (
-        db.execute(select(models.User).where(models.User.id == current_user.id)).scalar_one()
+    consume_user_quota(
+        db,
+        current_user,
+        detail="Insufficient credits. Ingredient alternatives use one credit. Contact the administrator or upgrade.",
     )
-    if not _has_unlimited_quota(current_user) and user_for_update.transformations_limit != -1 and (
-        user_for_update.transformations_used >= user_for_update.transformations_limit
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_402_PAYMENT_REQUIRED,
-            detail="Insufficient credits. Ingredient alternatives use one credit. Contact the administrator or upgrade.",
-        )
 
     target_lang = (current_user.target_language or "").strip() or "en"
     try:
-        alternatives = get_ingredient_alternatives(
-            ingredient=payload.ingredient,
-            diet_filters=payload.diet_filters or None,
-            target_language=target_lang,
-            target_country=current_user.target_country,
-        )
+        with refund_on_error(db):
+            alternatives = get_ingredient_alternatives(
+                ingredient=payload.ingredient,
+                diet_filters=payload.diet_filters or None,
+                target_language=target_lang,
+                target_country=current_user.target_country,
+            )
     except RuntimeError as e:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
 
-    if not _has_unlimited_quota(current_user):
-        user_for_update.transformations_used += 1
-    db.commit()
-
     return schemas.IngredientAlternativesOut(
         alternatives=[schemas.IngredientAlternativeOut(name=a["name"], notes=a.get("notes")) for a in alternatives],
     )
@@ -1257,3 +1846,4 @@ def delete_recipe(
             models.ShoppingListCache.user_id == current_user.id
         ).delete(synchronize_session=False)
     db.commit()
+    image_store.collect_garbage(db)
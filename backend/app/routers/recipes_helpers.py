@@ -1,9 +1,11 @@
 """Shared helpers for recipe ownership, listing, and ingredient matching. Used by recipes router."""
 
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import or_
+from sqlalchemy.orm import Query, Session
 
 from .. import models
+from ..services.recipe_compliance import allergen_mask, diet_mask, recipe_is_safe_for
 
 
 def _recipe_owned_by(
@@ -31,15 +33,48 @@ def get_recipe_or_404(
     return recipe
 
 
+def recipes_query_for_user_or_trial(
+    db: Session,
+    current_user: models.User | None,
+    trial_session: models.TrialSession | None,
+) -> Query:
+    """Query of recipes belonging to the current user or trial session. Caller must check auth."""
+    if current_user is not None:
+        return db.query(models.Recipe).filter(models.Recipe.user_id == current_user.id)
+    return db.query(models.Recipe).filter(models.Recipe.trial_session_id == trial_session.id)
+
+
 def recipes_for_user_or_trial(
     db: Session,
     current_user: models.User | None,
     trial_session: models.TrialSession | None,
 ) -> list[models.Recipe]:
     """Return recipes belonging to the current user or trial session. Caller must check auth."""
-    if current_user is not None:
-        return db.query(models.Recipe).filter(models.Recipe.user_id == current_user.id).all()
-    return db.query(models.Recipe).filter(models.Recipe.trial_session_id == trial_session.id).all()
+    return recipes_query_for_user_or_trial(db, current_user, trial_session).all()
+
+
+def filter_safe_for_user(query: Query, user: models.User | None) -> list[models.Recipe]:
+    """
+    Recipes of a query compatible with the user's diet_filters and allergens, selected in SQL by
+    the precomputed compliance bitmasks. Rows whose compliance was never computed (not backfilled
+    yet) are checked in memory by recipe_is_safe_for instead. Free-text custom allergens are not covered.
+    """
+    if user is None:
+        return query.all()
+    need_diets = diet_mask(user.diet_filters)
+    avoid = allergen_mask(user.allergens)
+    if not need_diets and not avoid:
+        return query.all()
+    safe = models.Recipe.compliance_version.is_not(None)
+    if need_diets:
+        safe &= models.Recipe.diet_flags.op("&")(need_diets) == need_diets
+    if avoid:
+        safe &= models.Recipe.allergen_flags.op("&")(avoid) == 0
+    rows = query.filter(or_(safe, models.Recipe.compliance_version.is_(None))).all()
+    return [
+        r for r in rows
+        if r.compliance_version is not None or recipe_is_safe_for(r, user.diet_filters, user.allergens)
+    ]
 
 
 def recipe_matches_query(recipe: models.Recipe, q: str) -> bool:
@@ -125,20 +160,6 @@ def ingredient_matches_user(recipe_line: str, user_set: set[str]) -> bool:
     return False
 
 
-def recipe_meat_dairy_keywords(recipe: models.Recipe) -> tuple[bool, bool]:
-    """Returns (has_meat, has_dairy) based on ingredient text."""
-    text = " ".join(recipe_ingredient_lines(recipe)).lower()
-    meat = any(w in text for w in (
-        "meat", "chicken", "beef", "pork", "lamb", "fish", "salmon", "tuna",
-        "mięso", "kurczak", "wołowina", "wieprzowina", "ryba", "łosoś",
-    ))
-    dairy = any(w in text for w in (
-        "milk", "cream", "cheese", "butter", "yogurt",
-        "mleko", "śmietana", "ser", "masło", "jogurt",
-    ))
-    return meat, dairy
-
-
 def what_can_i_make_my_recipes(
     recipes: list[models.Recipe],
     user_ingredients: list[str],
@@ -152,13 +173,8 @@ def what_can_i_make_my_recipes(
         lines = recipe_ingredient_lines(recipe)
         if not lines:
             continue
-        if diet_filters:
-            meat, dairy = recipe_meat_dairy_keywords(recipe)
-            if "vegetarian" in diet_filters or "vegan" in diet_filters:
-                if meat:
-                    continue
-            if "dairy_free" in diet_filters and dairy:
-                continue
+        if diet_filters and not recipe_is_safe_for(recipe, diet_filters, None):
+            continue
         missing = []
         for line in lines:
             if not ingredient_matches_user(line, user_set):
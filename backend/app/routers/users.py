@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from .. import models, schemas
 from ..auth import get_current_user, create_access_token
 from ..database import get_db
+from ..services import image_store
 from ..services.starter_recipes import add_starter_recipes_to_user, ensure_starter_recipes_for_user
 from ..services.user_deletion import delete_user_and_data
 
@@ -23,7 +24,7 @@ def get_me(current_user: models.User = Depends(get_current_user)):
     data = schemas.UserOut.model_validate(current_user).model_dump()
     data["is_admin"] = (current_user.email or "").strip().lower() in _admin_emails()
     # Sliding expiry: issue a new token on every visit so the counter resets
-    data["renewed_token"] = create_access_token(current_user.id)
+    data["renewed_token"] = create_access_token(current_user.id, current_user.account_tier)
     return schemas.UserOut(**data)
 
 
@@ -36,6 +37,7 @@ def delete_me(
     user_id = current_user.id
     delete_user_and_data(user_id, db)
     db.commit()
+    image_store.collect_garbage(db)
     return None
 
 
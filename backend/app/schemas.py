@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 import unicodedata
-from datetime import datetime
+from datetime import date, datetime
 from typing import Union
 
-from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
+from pydantic import BaseModel, EmailStr, Field, computed_field, field_validator, model_validator
+
+from .services.image_renditions import srcset
 
 
 ALLOWED_ALLERGEN_CODES = {
@@ -262,6 +264,12 @@ class RecipeCreate(BaseModel):
         return self
 
 
+MAX_BULK_IMPORT_ITEMS = 50
+
+
+class RecipeBulkImportIn(BaseModel):
+    """POST /api/recipes/bulk-import: URLs and/or pasted texts, one recipe source per item."""
+    items: list[RecipeCreate] = Field(min_length=1, max_length=MAX_BULK_IMPORT_ITEMS)
 
 
 class RecipeCreateTrialResponse(BaseModel):
@@ -303,11 +311,24 @@ class RecipeOut(BaseModel):
     user_rating: int | None = None
     diet_tags: list[str] = Field(default_factory=list)
     image_url: str | None = None
+    image_status: str | None = None  # pending while a dish image is generated in the background
+    image_renditions: dict | None = None  # {"thumb"|"medium"|"full": {"webp", "jpeg", "width", "height"}}
     servings_override: int | None = None
     collections: list[str] = Field(default_factory=list)
 
     model_config = {"from_attributes": True}
 
+    @computed_field
+    @property
+    def image_srcset(self) -> str | None:
+        """WebP srcset for <img srcset>/<source type="image/webp">; list pages pick the thumb."""
+        return srcset(self.image_renditions, "webp")
+
+    @computed_field
+    @property
+    def image_srcset_jpeg(self) -> str | None:
+        return srcset(self.image_renditions, "jpeg")
+
 
 class RecipeMetaUpdate(BaseModel):
     rating: int | None = Field(default=None, ge=1, le=5)
@@ -510,6 +531,7 @@ class MealPlanOut(BaseModel):
     id: int
     start_date: str  # YYYY-MM-DD
     days: list[MealPlanDayOut]
+    status: str | None = None  # streamed plans: generating | complete | partial
 
     model_config = {"from_attributes": True}
 
@@ -570,6 +592,16 @@ class AdminUserOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class AdminQuotaUsageOut(BaseModel):
+    """Quota of one user on one UTC day, from the quota ledger."""
+    user_id: int
+    email: str | None = None
+    day: date
+    used: int  # committed, net of refunds
+    reserved: int  # in flight (not settled yet)
+    released: int  # refunded reservations (failed AI calls)
+
+
 class AdminUpgradeUserRequest(BaseModel):
     email: EmailStr
     new_limit: int
@@ -587,3 +619,27 @@ class AdminTrialIpWhitelistOut(BaseModel):
     label: str | None = None
 
     model_config = {"from_attributes": True}
+
+
+class JobOut(BaseModel):
+    """Background job status. result/error are set once status is succeeded/failed."""
+    id: str
+    kind: str
+    status: str  # queued | running | succeeded | failed
+    progress: dict = Field(default_factory=dict)
+    result: dict | None = None
+    error: dict | None = None  # {"status_code": int, "detail": ...}
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    model_config = {"from_attributes": True}
+
+
+class JobAcceptedOut(BaseModel):
+    """202 response for endpoints called with ?background=true."""
+    job_id: str
+    kind: str
+    status: str
+    status_url: str
+    events_url: str
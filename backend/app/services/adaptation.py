@@ -46,6 +46,25 @@ DIET_LABELS = {
     "for_kids_under_1": "suitable for babies under 1 year (no honey, no whole nuts, no added salt/sugar, soft and safe textures)",
 }
 
+# Diets that are pure ingredient exclusions/substitutions: any set of these can be applied in a
+# single prompt. Kosher/halal/kids rules restructure the dish (meat vs dairy version, textures),
+# so composites containing them are still applied one diet at a time.
+COMBINABLE_DIETS = frozenset({"vegetarian", "vegan", "dairy_free", "gluten_free", "nut_free", "low_sodium"})
+
+
+def diets_can_combine(variant_types: list[str]) -> bool:
+    """True when all diets can be applied together in one adaptation prompt."""
+    return len(variant_types) > 1 and all(t in COMBINABLE_DIETS for t in variant_types)
+
+
+def _diet_label(variant_type: str) -> str:
+    """Prompt label; a composite "vegan,gluten_free" asks for all diets at once."""
+    types = [t.strip() for t in variant_type.split(",") if t.strip()]
+    if len(types) <= 1:
+        return DIET_LABELS.get(variant_type, variant_type)
+    return "ALL of the following at the same time: " + "; ".join(DIET_LABELS.get(t, t) for t in types)
+
+
 SYSTEM_PROMPT = (
     "You are a professional recipe adaptation assistant. "
     "Adapt recipes to a specified diet while preserving the dish's character. "
@@ -197,6 +216,7 @@ def adapt_recipe(
     target_country: str | None = None,
     avoid_terms: list[str] | None = None,
 ) -> dict:
+    """Adapt to one diet, or to a composite "a,b" of COMBINABLE_DIETS in a single call."""
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY is not configured on the server.")
@@ -218,7 +238,7 @@ def adapt_recipe(
             avoid_terms_rule=avoid_terms_rule,
         )
     else:
-        diet_label = DIET_LABELS.get(variant_type, variant_type)
+        diet_label = _diet_label(variant_type)
         prompt = ADAPTED_TEMPLATE.safe_substitute(
             diet_label=diet_label,
             output_lang=output_lang,
@@ -0,0 +1,181 @@
+"""
+Pool of pre-generated discover suggestions, keyed by a preference fingerprint.
+
+Popular preference combinations (dish types, diets, allergens, max time, language, measurement,
+servings) are served from the pool instantly; background "discover.refill" jobs top a fingerprint up
+when it runs low. Entries are compliance-checked before they are stored, served to each identity at most once and
+retired after DISCOVER_POOL_MAX_SERVES uses so results stay varied.
+Requests with free-text inputs (keywords, ingredients, avoid terms) always go live.
+"""
+import hashlib
+import json
+import os
+import random
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from .. import metrics, models
+from ..jobs import JOB_QUEUED, JOB_RUNNING, enqueue_job, has_job
+from .what_can_i_make_ai import recipe_complies_with_allergens, recipe_complies_with_diets
+
+REFILL_JOB_KIND = "discover.refill"
+
+POOL_TARGET = int(os.getenv("DISCOVER_POOL_TARGET", "24"))  # entries kept per fingerprint
+POOL_LOW_WATER = int(os.getenv("DISCOVER_POOL_LOW_WATER", "8"))  # refill below this
+POOL_MAX_SERVES = int(os.getenv("DISCOVER_POOL_MAX_SERVES", "3"))  # retire after N users saw it
+REFILL_BATCH = 10  # suggestions per AI call (discover's own upper bound)
+
+
+def _norm_list(values: list[str] | None) -> list[str]:
+    return sorted({(v or "").strip().lower() for v in (values or []) if (v or "").strip()})
+
+
+def pool_params(
+    dish_types: list[str] | None,
+    diet_filters: list[str] | None,
+    allergens: list[str] | None,
+    max_time_minutes: int | None,
+    target_language: str,
+    measurement_system: str,
+    servings: int | None = None,
+) -> dict:
+    """Normalized preferences: order and case of list entries do not matter."""
+    return {
+        "dish_types": _norm_list(dish_types),
+        "diet_filters": _norm_list(diet_filters),
+        "allergens": _norm_list(allergens),
+        "max_time_minutes": int(max_time_minutes) if max_time_minutes and max_time_minutes > 0 else None,
+        "target_language": (target_language or "en").strip().lower(),
+        "measurement_system": "imperial" if (measurement_system or "").strip().lower() == "imperial" else "metric",
+        "servings": int(servings) if servings and servings > 0 else None,
+    }
+
+
+def pool_fingerprint(params: dict) -> str:
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def is_poolable(keywords: str | None, ingredients_text: str | None, custom_avoid_text: str | None) -> bool:
+    """Only preference-only requests share pool entries; free text is too personal to pre-generate."""
+    return not any(((keywords or "").strip(), (ingredients_text or "").strip(), (custom_avoid_text or "").strip()))
+
+
+def identity_key(user_id: int | None, trial_session_id: int | None) -> str | None:
+    if user_id is not None:
+        return f"u:{user_id}"
+    if trial_session_id is not None:
+        return f"t:{trial_session_id}"
+    return None
+
+
+def pool_size(db: Session, fingerprint: str) -> int:
+    return db.execute(
+        select(func.count(models.DiscoverPoolEntry.id)).where(models.DiscoverPoolEntry.fingerprint == fingerprint)
+    ).scalar_one()
+
+
+def take_from_pool(db: Session, fingerprint: str, n: int, identity: str | None) -> list[dict] | None:
+    """
+    Serve n entries this identity has not seen (least-served first, shuffled) and commit the bookkeeping.
+    Returns None (a miss) when the pool cannot fill the whole request; nothing is consumed then.
+
+    Each entry is claimed with UPDATE ... WHERE served_count = <the count read>, so of two requests
+    that picked the same entry only one bumps it; the other rolls back its claims and misses. The
+    caller must have committed its own work before calling.
+    """
+    candidates = (
+        db.execute(
+            select(models.DiscoverPoolEntry)
+            .where(models.DiscoverPoolEntry.fingerprint == fingerprint)
+            .order_by(models.DiscoverPoolEntry.served_count, func.random())
+            .limit(max(n * 4, 20))
+        )
+        .scalars()
+        .all()
+    )
+    picked: list[models.DiscoverPoolEntry] = []
+    titles: set[str] = set()
+    for entry in candidates:
+        title = (entry.recipe.get("title") or "").strip().lower()
+        if title in titles or (identity is not None and identity in (entry.served_to or [])):
+            continue
+        picked.append(entry)
+        titles.add(title)
+        if len(picked) == n:
+            break
+    if len(picked) < n:
+        metrics.incr("discover.pool.miss")
+        return None
+
+    random.shuffle(picked)
+    table = models.DiscoverPoolEntry.__table__
+    out = []
+    for entry in picked:
+        out.append(dict(entry.recipe))
+        served_to = [*(entry.served_to or []), identity] if identity is not None else (entry.served_to or [])
+        claimed = db.execute(
+            update(table)
+            .where(table.c.id == entry.id, table.c.served_count == entry.served_count)
+            .values(served_count=entry.served_count + 1, served_to=served_to)
+        ).rowcount
+        if claimed != 1:  # served concurrently since we read it
+            db.rollback()
+            metrics.incr("discover.pool.miss")
+            return None
+    db.execute(
+        delete(table).where(table.c.id.in_([e.id for e in picked]), table.c.served_count >= POOL_MAX_SERVES)
+    )
+    db.commit()
+    metrics.incr("discover.pool.hit")
+    return out
+
+
+def add_to_pool(db: Session, fingerprint: str, params: dict, recipes: list[dict]) -> int:
+    """Store compliant suggestions not already pooled (by title); returns how many were added. Caller commits."""
+    existing = {
+        (r.get("title") or "").strip().lower()
+        for r in db.execute(
+            select(models.DiscoverPoolEntry.recipe).where(models.DiscoverPoolEntry.fingerprint == fingerprint)
+        ).scalars()
+    }
+    room = max(0, POOL_TARGET - len(existing))
+    added = 0
+    for r in recipes:
+        title = (r.get("title") or "").strip()
+        if not title or title.lower() in existing or added >= room:
+            continue
+        if not recipe_complies_with_diets(r, params["diet_filters"]) or not recipe_complies_with_allergens(
+            r, params["allergens"], None
+        ):
+            metrics.incr("discover.pool.rejected")
+            continue
+        db.add(
+            models.DiscoverPoolEntry(
+                fingerprint=fingerprint,
+                recipe={
+                    "title": title,
+                    "estimated_calories": r.get("estimated_calories"),
+                    "ingredients": list(r.get("ingredients") or []),
+                    "steps": list(r.get("steps") or []),
+                },
+                served_count=0,
+                served_to=[],
+            )
+        )
+        existing.add(title.lower())
+        added += 1
+    metrics.incr("discover.pool.added", added)
+    return added
+
+
+def schedule_refill_if_low(db: Session, fingerprint: str, params: dict) -> bool:
+    """Queue one refill job for this fingerprint when it is below the low-water mark."""
+    if pool_size(db, fingerprint) >= POOL_LOW_WATER or has_job(
+        db, REFILL_JOB_KIND, fingerprint, (JOB_QUEUED, JOB_RUNNING)
+    ):
+        return False
+    if enqueue_job(db, REFILL_JOB_KIND, {"fingerprint": fingerprint, "params": params}, dedup_key=fingerprint) is None:
+        return False
+    metrics.incr("discover.pool.refill_scheduled")
+    return True
@@ -0,0 +1,160 @@
+"""
+Local near-duplicate detection for dish images: "Classic Cheesecake", "Sernik" and "New York
+cheesecake" should share one generated picture.
+
+Titles (both the translated and the original one) and key ingredients are reduced to canonical
+tokens: lowercased, accents stripped, simple plurals folded, filler words dropped, and common
+Polish / Hebrew dish words mapped to one English token. Two dishes are compared with a token-set
+score (overlap of the smaller set), titles weighted over ingredients. No external service.
+"""
+import os
+import re
+import unicodedata
+
+SIMILARITY_THRESHOLD = float(os.getenv("RECIPE_IMAGE_SIMILARITY_THRESHOLD", "0.8"))
+TITLE_WEIGHT = 0.7
+MAX_INGREDIENTS = 8
+
+# Word stem -> canonical token; a token maps when it starts with the stem.
+_CANONICAL_STEMS = {
+    # Polish
+    "sernik": "cheesecake",
+    "zup": "soup",
+    "rosol": "soup",
+    "barszcz": "borscht",
+    "pomidor": "tomato",
+    "ziemniak": "potato",
+    "kartofl": "potato",
+    "kurczak": "chicken",
+    "kurczet": "chicken",
+    "wolow": "beef",
+    "wieprz": "pork",
+    "ryb": "fish",
+    "losos": "salmon",
+    "grzyb": "mushroom",
+    "pieczark": "mushroom",
+    "kapust": "cabbage",
+    "ogor": "cucumber",
+    "marchew": "carrot",
+    "cebul": "onion",
+    "czosn": "garlic",
+    "jablk": "apple",
+    "jablecz": "apple",
+    "szarlotk": "apple",
+    "ciast": "cake",
+    "makaron": "pasta",
+    "salat": "salad",
+    "surowk": "salad",
+    "nalesnik": "pancake",
+    "placek": "pancake",
+    "placki": "pancake",
+    "pierog": "dumpling",
+    "gulasz": "stew",
+    "serek": "cheese",
+    "sera": "cheese",
+    "serem": "cheese",
+    "jaj": "egg",
+    "twarog": "cheese",
+    "cukr": "sugar",
+    "smietan": "cream",
+    "mlek": "milk",
+    "masl": "butter",
+    "maka": "flour",
+    "ryz": "rice",
+    "czekolad": "chocolate",
+    # Hebrew
+    "עוג": "cake",
+    "מרק": "soup",
+    "עגבני": "tomato",
+    "עוף": "chicken",
+    "תפוח": "apple",
+    "שוקולד": "chocolate",
+    "סלט": "salad",
+    "אורז": "rice",
+    "גבינ": "cheese",
+    # English variants
+    "cheese cake": "cheesecake",
+    "cream cheese": "cheese",
+    "spaghetti": "pasta",
+    "noodle": "pasta",
+    "potatoe": "potato",
+    "tomatoe": "tomato",
+}
+# Longest stems first so a longer stem ("sernik") wins over a shorter one ("ser…").
+_STEMS = sorted(((k, v) for k, v in _CANONICAL_STEMS.items() if " " not in k), key=lambda kv: -len(kv[0]))
+_PHRASES = {k: v for k, v in _CANONICAL_STEMS.items() if " " in k}
+
+_FILLER = {
+    "a", "an", "and", "the", "with", "of", "in", "on", "for", "style",
+    "classic", "homemade", "easy", "quick", "simple", "best", "traditional", "perfect", "my", "mom", "grandma",
+    "z", "ze", "i", "w", "na", "po", "do", "domowy", "domowa", "domowe", "klasyczny", "klasyczna", "babci",
+    "של", "עם", "ו", "ביתי", "ביתית", "קלאסי", "קלאסית",
+}
+# Quantities and units in ingredient lines ("500g", "2 tbsp", "1 sztuka").
+_UNITS = {
+    "g", "kg", "mg", "ml", "l", "dl", "cl", "oz", "lb", "lbs", "cup", "cups", "tbsp", "tsp", "tablespoon",
+    "teaspoon", "pinch", "szt", "sztuka", "sztuki", "lyzka", "lyzki", "lyzeczka", "lyzeczki", "szklanka",
+    "szklanki", "szczypta", "zabek", "zabki", "clove", "cloves", "piece", "pieces", "slice", "slices",
+}
+
+
+def _fold(text: str) -> str:
+    """Lowercase and strip accents (ł -> l as well), keeping non-Latin letters such as Hebrew."""
+    text = unicodedata.normalize("NFKD", (text or "").lower().replace("ł", "l"))
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def _canonical(token: str) -> str:
+    for stem, canonical in _STEMS:
+        if token.startswith(stem):
+            return canonical
+    if token.isascii() and len(token) > 4 and token.endswith("es") and token[-3] in "sxz":
+        return token[:-2]
+    if token.isascii() and len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokens(text: str | None) -> set[str]:
+    """Canonical tokens of a title or ingredient line (quantities, units and filler words dropped)."""
+    folded = _fold(text or "")
+    for phrase, canonical in _PHRASES.items():
+        folded = folded.replace(phrase, canonical)
+    out = set()
+    for word in re.findall(r"[^\W\d_]+", folded):
+        if word in _FILLER or word in _UNITS:
+            continue
+        out.add(_canonical(word))
+    return out
+
+
+def _ingredient_text(ing) -> str:
+    if isinstance(ing, dict):
+        return str(ing.get("name") or "")
+    return str(ing or "")
+
+
+def dish_signature(titles: list[str | None], ingredients: list | None) -> tuple[list[str], list[str]]:
+    """(title tokens, ingredient tokens), sorted, for storing next to a cached image."""
+    title_tokens = set().union(*(tokens(t) for t in titles)) if titles else set()
+    ingredient_tokens: set[str] = set()
+    for ing in (ingredients or [])[:MAX_INGREDIENTS]:
+        ingredient_tokens |= tokens(_ingredient_text(ing))
+    return sorted(title_tokens), sorted(ingredient_tokens)
+
+
+def _overlap(a: set[str], b: set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def similarity(a: tuple[list[str], list[str]], b: tuple[list[str], list[str]]) -> float:
+    """
+    Token-set score in [0, 1]: title overlap weighted TITLE_WEIGHT plus ingredient overlap; when
+    either side has no ingredient tokens the title overlap alone decides.
+    """
+    title = _overlap(set(a[0]), set(b[0]))
+    if not a[1] or not b[1]:
+        return title
+    return round(TITLE_WEIGHT * title + (1 - TITLE_WEIGHT) * _overlap(set(a[1]), set(b[1])), 4)
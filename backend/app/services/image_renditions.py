@@ -0,0 +1,67 @@
+"""
+Responsive renditions of recipe images: thumb / medium / full, each as WebP plus a JPEG fallback.
+
+Built once when an image is stored (upload or generation) so list pages can load a ~160px
+thumbnail instead of the original. Needs Pillow; without it images are stored as before and
+recipes simply have no renditions.
+"""
+import io
+import logging
+from collections.abc import Callable
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional dependency
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# name -> longest edge in pixels (never upscaled)
+RENDITIONS = (("thumb", 160), ("medium", 480), ("full", 1024))
+_WEBP_QUALITY = 80
+_JPEG_QUALITY = 82
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def build_renditions(source: bytes | str, store: Callable[[bytes, str], str]) -> dict | None:
+    """
+    Decode source (image bytes or a file path) and encode every rendition as WebP and JPEG and save each via store(bytes, extension) -> URL.
+    Returns {"thumb": {"webp": url, "jpeg": url, "width": w, "height": h}, ...}, or None when
+    Pillow is missing or the bytes are not a decodable image.
+    """
+    if Image is None:
+        logger.info("Pillow not installed; storing recipe image without renditions")
+        return None
+    try:
+        with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as img:
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGB")
+            out: dict = {}
+            for name, edge in RENDITIONS:
+                copy = img.copy()
+                copy.thumbnail((edge, edge), Image.LANCZOS)
+                entry = {"width": copy.width, "height": copy.height}
+                for fmt, ext, options in (
+                    ("WEBP", "webp", {"quality": _WEBP_QUALITY, "method": 4}),
+                    ("JPEG", "jpg", {"quality": _JPEG_QUALITY, "optimize": True, "progressive": True}),
+                ):
+                    buf = io.BytesIO()
+                    copy.save(buf, fmt, **options)
+                    entry["webp" if ext == "webp" else "jpeg"] = store(buf.getvalue(), ext)
+                out[name] = entry
+            return out
+    except (OSError, ValueError) as e:
+        logger.warning("Could not build image renditions: %s", e)
+        return None
+
+
+def srcset(renditions: dict | None, fmt: str = "webp") -> str | None:
+    """HTML srcset string, e.g. "/static/.../ab/ab12….webp 160w, /static/.../cd/cd34….webp 480w, ..."."""
+    if not renditions:
+        return None
+    parts = [f"{renditions[name][fmt]} {renditions[name]['width']}w" for name, _ in RENDITIONS if name in renditions]
+    return ", ".join(parts) or None
@@ -0,0 +1,282 @@
+"""
+Content-addressed storage for recipe image files (originals and renditions).
+
+Every file lives at {sha256[:2]}/{sha256}.{ext} under RECIPE_IMAGES_DIR, so identical bytes are
+stored once and a URL never changes content (/static serves these with an immutable
+Cache-Control). One image_blobs row per file counts the recipes and image-cache rows pointing at
+it; the counts move in the same flush that changes image_url / renditions (mapper listeners), and
+collect_garbage() deletes files nobody references any more.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, delete, event, insert, inspect, or_, update
+
+logger = logging.getLogger(__name__)
+
+# Directory for saved images; served at /static/recipe-images/
+_BASE_DIR = os.getenv(
+    "RECIPE_IMAGES_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "..", "static", "recipe-images"),
+)
+# URL path prefix stored in DB (no leading host)
+STATIC_URL_PREFIX = "/static/recipe-images"
+# A stored file that no row has referenced yet (request still running) is kept at least this long.
+GC_GRACE_S = int(os.getenv("RECIPE_IMAGE_GC_GRACE_S", "3600"))
+
+UPLOAD_CHUNK_BYTES = 64 * 1024
+_MAGIC = ((b"\xff\xd8\xff", "jpg"), (b"\x89PNG\r\n\x1a\n", "png"))
+
+_BLOB_RE = re.compile(r"([0-9a-f]{2})/(\1[0-9a-f]{62})\.(jpg|png|webp)")
+_LEGACY_RE = re.compile(r"[\w.-]+")
+
+
+def ensure_storage_dir() -> str:
+    os.makedirs(_BASE_DIR, exist_ok=True)
+    return _BASE_DIR
+
+
+def blob_hash(image_url: str | None) -> str | None:
+    """sha256 behind a content-addressed /static/recipe-images URL (None for legacy or external URLs)."""
+    if not image_url or not image_url.startswith(STATIC_URL_PREFIX + "/"):
+        return None
+    m = _BLOB_RE.fullmatch(image_url[len(STATIC_URL_PREFIX) + 1:])
+    return m.group(2) if m else None
+
+
+def content_hash_of_path(path: str) -> str | None:
+    """sha256 when a file path is inside the content-addressed layout (…/ab/ab12….webp)."""
+    parts = path.replace(os.sep, "/").rsplit("/", 2)
+    if len(parts) < 2:
+        return None
+    m = _BLOB_RE.fullmatch("/".join(parts[-2:]))
+    return m.group(2) if m else None
+
+
+def file_path(image_url: str | None) -> str | None:
+    """Local file behind a /static/recipe-images URL (None for other URLs)."""
+    if not image_url or not image_url.startswith(STATIC_URL_PREFIX + "/"):
+        return None
+    relative = image_url[len(STATIC_URL_PREFIX) + 1:]
+    if _BLOB_RE.fullmatch(relative) or (_LEGACY_RE.fullmatch(relative) and not relative.startswith(".")):
+        return os.path.join(_BASE_DIR, *relative.split("/"))
+    return None
+
+
+def referenced_hashes(image_url: str | None, renditions: dict | None) -> list[str]:
+    """Blob hashes an image_url plus its renditions point at (each file once)."""
+    urls = [image_url]
+    for entry in (renditions or {}).values():
+        if isinstance(entry, dict):
+            urls += [entry.get("webp"), entry.get("jpeg")]
+    return list(dict.fromkeys(h for h in map(blob_hash, urls) if h))
+
+
+def _write_atomic(path: str, content: bytes) -> None:
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _register(db, digest: str, extension: str, size: int) -> str:
+    """Insert (or re-protect) the blob row; returns its path relative to the storage dir."""
+    from ..models import ImageBlob
+
+    table = ImageBlob.__table__
+    now = datetime.now(timezone.utc)
+    # Re-storing protects the blob from a garbage collection that has not deleted it yet. When a
+    # collection deleted it meanwhile, nothing matches and the blob is registered afresh.
+    relative = db.execute(
+        update(table).where(table.c.hash == digest).values(stored_at=now, released_at=None).returning(table.c.path)
+    ).scalar()
+    if relative is not None:
+        return relative
+    relative = f"{digest[:2]}/{digest}.{extension}"
+    db.execute(insert(table).values(hash=digest, path=relative, size=size, ref_count=0, stored_at=now))
+    return relative
+
+
+def store(db, content: bytes, extension: str) -> str:
+    """
+    Store bytes (once per content) and return their URL. The blob starts unreferenced; it is
+    counted when a recipe or cache row pointing at the URL is flushed. Raises OSError on disk errors.
+    """
+    relative = _register(db, hashlib.sha256(content).hexdigest(), extension, len(content))
+    path = os.path.join(_BASE_DIR, *relative.split("/"))
+    if not os.path.exists(path):
+        _write_atomic(path, content)
+    return f"{STATIC_URL_PREFIX}/{relative}"
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """Extension ("jpg" or "png") from the file's magic bytes; None for anything else."""
+    for magic, extension in _MAGIC:
+        if head.startswith(magic):
+            return extension
+    return None
+
+
+class UploadRejected(ValueError):
+    """store_stream() refused the upload; reason is "too_large", "unsupported" or "empty"."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def store_stream(db, stream, max_bytes: int, chunk_size: int = UPLOAD_CHUNK_BYTES) -> tuple[str, str]:
+    """
+    Copy a JPEG/PNG file object into the store chunk by chunk, hashing as it goes: the type comes
+    from the magic bytes and reading stops as soon as max_bytes is exceeded. The data lands in a
+    temp file that is renamed into place, so an upload is never held in memory whole.
+    Returns (URL, local path). Raises UploadRejected, or OSError on disk errors.
+    """
+    incoming = os.path.join(ensure_storage_dir(), ".incoming")
+    os.makedirs(incoming, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=incoming)
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := stream.read(chunk_size):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected("too_large")
+                if len(head) < 8:
+                    head += chunk[:8]
+                    if len(head) >= 8 and sniff_image_type(head) is None:
+                        raise UploadRejected("unsupported")
+                digest.update(chunk)
+                f.write(chunk)
+        if size == 0:
+            raise UploadRejected("empty")
+        extension = sniff_image_type(head)
+        if extension is None:
+            raise UploadRejected("unsupported")
+        relative = _register(db, digest.hexdigest(), extension, size)
+        path = os.path.join(_BASE_DIR, *relative.split("/"))
+        if os.path.exists(path):
+            os.unlink(tmp)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return f"{STATIC_URL_PREFIX}/{relative}", path
+
+
+def _adjust(connection, counts: Counter) -> None:
+    from ..models import ImageBlob
+
+    table = ImageBlob.__table__
+    now = datetime.now(timezone.utc)
+    by_delta: dict[int, list[str]] = {}
+    for digest, delta in counts.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(digest)
+    for delta, hashes in by_delta.items():
+        values = {"ref_count": table.c.ref_count + delta}
+        if delta < 0:
+            values["released_at"] = now
+        connection.execute(update(table).where(table.c.hash.in_(sorted(hashes))).values(**values))
+
+
+def release(db, rows) -> None:
+    """Drop the references of (image_url, renditions) rows about to be bulk-deleted (no ORM events)."""
+    counts: Counter = Counter()
+    for image_url, renditions in rows:
+        counts.update({h: -1 for h in referenced_hashes(image_url, renditions)})
+    _adjust(db.connection(), counts)
+
+
+def register_image_ref_listeners(cls, url_attr: str, renditions_attr: str) -> None:
+    """Count references from cls rows (Recipe, RecipeImageCache) on insert, update and ORM delete."""
+
+    def _current(target) -> list[str]:
+        return referenced_hashes(getattr(target, url_attr), getattr(target, renditions_attr))
+
+    def _on_insert(mapper, connection, target):
+        _adjust(connection, Counter(_current(target)))
+
+    def _on_update(mapper, connection, target):
+        state = inspect(target)
+        old = []
+        for attr in (url_attr, renditions_attr):
+            history = state.attrs[attr].history
+            if history.has_changes():
+                old.append(history.deleted[0] if history.deleted else None)
+            else:
+                old.append(getattr(target, attr))
+        counts = Counter(_current(target))
+        counts.subtract(referenced_hashes(*old))
+        _adjust(connection, counts)
+
+    def _on_delete(mapper, connection, target):
+        _adjust(connection, Counter({h: -1 for h in _current(target)}))
+
+    event.listen(cls, "before_insert", _on_insert)
+    event.listen(cls, "before_update", _on_update)
+    event.listen(cls, "before_delete", _on_delete)
+
+
+def collect_garbage(db, grace_s: int | None = None) -> int:
+    """
+    Delete unreferenced blobs and their files: released ones at once, never-referenced ones after
+    the grace period. Commits. Returns the number of files removed.
+
+    Rows are deleted conditionally, so a concurrent store() that re-protected a blob wins. Each
+    file is renamed to a tombstone before that delete commits, and the tombstone is unlinked after.
+    A store() that re-registers the blob once the delete is committed finds no file at the path
+    and writes a new one, which this collection never touches.
+    """
+    from ..models import ImageBlob
+
+    table = ImageBlob.__table__
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=GC_GRACE_S if grace_s is None else grace_s)
+    unreferenced = and_(
+        table.c.ref_count <= 0,
+        or_(table.c.released_at.is_not(None), table.c.stored_at < cutoff),
+    )
+    paths = db.execute(delete(table).where(unreferenced).returning(table.c.path)).scalars().all()
+    tombstones: list[tuple[str, str]] = []
+    for relative in paths:
+        path = os.path.join(_BASE_DIR, *relative.split("/"))
+        tombstone = f"{path}.gc-{uuid.uuid4().hex}"
+        try:
+            os.rename(path, tombstone)
+            tombstones.append((path, tombstone))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Could not remove image file %s: %s", relative, e)
+    try:
+        db.commit()
+    except BaseException:
+        for path, tombstone in tombstones:  # the rows are back: so are their files
+            os.replace(tombstone, path)
+        raise
+    removed = 0
+    for path, tombstone in tombstones:
+        try:
+            os.remove(tombstone)
+            removed += 1
+        except OSError as e:
+            logger.warning("Could not remove image file %s: %s", tombstone, e)
+    return removed
@@ -1,14 +1,14 @@
 """AI-generated weekly meal plan (5–7 days)."""
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from openai import APIError, OpenAI, RateLimitError
 
-from .what_can_i_make_ai import (
-    _diet_list_for_prompt,
-    recipe_complies_with_allergens,
-    recipe_complies_with_diets,
-)
+from .. import metrics
+from . import overgenerate
+from .what_can_i_make_ai import _diet_list_for_prompt
 
 MEAL_PLAN_SYSTEM_PROMPT = """\
 You are a meal-planning assistant. Generate a weekly meal plan for 5–7 days.
@@ -85,78 +85,70 @@ def _classify_meal_protein(recipe: dict) -> str:
     return "other"
 
 
-def generate_weekly_meal_plan(
-    start_date: str,
-    num_days: int = 7,
-    meal_types: list[str] | None = None,
-    protein_types: list[str] | None = None,
-    meat_meals_per_week: int | None = None,
-    fish_meals_per_week: int | None = None,
-    diet_filters: list[str] | None = None,
-    allergens: list[str] | None = None,
-    custom_avoid_text: str | None = None,
-    household_adults: int | None = None,
-    household_kids: int | None = None,
-    max_time_minutes: int | None = None,
-    budget: str | None = None,
-    target_language: str = "en",
-    measurement_system: str = "metric",
-) -> list[dict]:
-    """
-    Return a list of day entries: [ {"date": "YYYY-MM-DD", "meal": { name, short_description, estimated_time_minutes, title, ingredients, steps } }, ... ].
-    Raises RuntimeError on missing API key or rate limit.
-    """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY is not configured on the server.")
-
-    num_days = max(1, min(7, num_days))
+def _plan_context(
+    meal_types: list[str] | None,
+    protein_types: list[str] | None,
+    meat_meals_per_week: int | None,
+    fish_meals_per_week: int | None,
+    diet_filters: list[str] | None,
+    allergens: list[str] | None,
+    custom_avoid_text: str | None,
+    household_adults: int | None,
+    household_kids: int | None,
+    max_time_minutes: int | None,
+    budget: str | None,
+    target_language: str,
+    measurement_system: str,
+) -> dict:
+    """Normalized constraints shared by the whole plan (and by every per-day prompt)."""
     meal_types_norm = [str(x).strip().lower() for x in (meal_types or []) if str(x).strip()] or ["dinner"]
     protein_types_norm = [str(x).strip().lower() for x in (protein_types or []) if str(x).strip()] or []
-    diet_list = _diet_list_for_prompt(diet_filters)
-    allergen_list = ", ".join((s or "").strip() for s in (allergens or []) if (s or "").strip()) or "none"
-    avoid_terms = (custom_avoid_text or "").strip() or "none"
     household = "any"
     if household_adults is not None or household_kids is not None:
         a = household_adults or 0
         k = household_kids or 0
         household = f"{a} adults, {k} kids"
-    max_time = str(max_time_minutes) if max_time_minutes and max_time_minutes > 0 else "no limit"
-    budget_str = (budget or "").strip() or "no constraint"
     output_lang = "English"
     if (target_language or "").strip().lower() in ("pl", "he", "es", "fr", "de"):
         output_lang = {"pl": "Polish", "he": "Hebrew", "es": "Spanish", "fr": "French", "de": "German"}.get(
             (target_language or "").strip().lower(), "English"
         )
-    measurement_units = "imperial" if (measurement_system or "").strip().lower() == "imperial" else "metric"
-
-    prompt = MEAL_PLAN_USER_TEMPLATE.format(
-        num_days=num_days,
-        start_date=start_date,
-        meal_types=", ".join(meal_types_norm),
-        protein_types=", ".join(protein_types_norm) if protein_types_norm else "any",
-        meat_meals_per_week=str(meat_meals_per_week) if meat_meals_per_week is not None else "no preference",
-        fish_meals_per_week=str(fish_meals_per_week) if fish_meals_per_week is not None else "no preference",
-        diet_list=diet_list,
-        allergen_list=allergen_list,
-        avoid_terms=avoid_terms,
-        household=household,
-        max_time=max_time,
-        budget=budget_str,
-        output_lang=output_lang,
-        measurement_units=measurement_units,
-    )
+    return {
+        "meal_types_norm": meal_types_norm,
+        "diet_filters": diet_filters,
+        "allergens": allergens,
+        "avoid_terms_list": [p.strip() for p in (custom_avoid_text or "").split(",") if (p or "").strip()] or None,
+        "meat_meals_per_week": meat_meals_per_week,
+        "fish_meals_per_week": fish_meals_per_week,
+        "prompt": {
+            "meal_types": ", ".join(meal_types_norm),
+            "protein_types": ", ".join(protein_types_norm) if protein_types_norm else "any",
+            "meat_meals_per_week": str(meat_meals_per_week) if meat_meals_per_week is not None else "no preference",
+            "fish_meals_per_week": str(fish_meals_per_week) if fish_meals_per_week is not None else "no preference",
+            "diet_list": _diet_list_for_prompt(diet_filters),
+            "allergen_list": ", ".join((s or "").strip() for s in (allergens or []) if (s or "").strip()) or "none",
+            "avoid_terms": (custom_avoid_text or "").strip() or "none",
+            "household": household,
+            "max_time": str(max_time_minutes) if max_time_minutes and max_time_minutes > 0 else "no limit",
+            "budget": (budget or "").strip() or "no constraint",
+            "output_lang": output_lang,
+            "measurement_units": "imperial" if (measurement_system or "").strip().lower() == "imperial" else "metric",
+        },
+    }
 
+
+def _chat_json(messages: list[dict], max_tokens: int) -> dict | None:
+    """One JSON-mode completion; None when the model returns nothing usable."""
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY is not configured on the server.")
     client = OpenAI(api_key=api_key)
     try:
         response = client.chat.completions.create(
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": MEAL_PLAN_SYSTEM_PROMPT},
-                {"role": "user", "content": prompt},
-            ],
+            messages=messages,
             response_format={"type": "json_object"},
-            max_tokens=4000,
+            max_tokens=max_tokens,
             temperature=0.5,
         )
     except RateLimitError as e:
@@ -169,65 +161,306 @@ def generate_weekly_meal_plan(
 
     content = response.choices[0].message.content
     if not content:
-        return []
-
+        return None
     try:
         data = json.loads(content)
     except json.JSONDecodeError:
-        return []
+        return None
+    return data if isinstance(data, dict) else None
 
-    raw_days = data.get("days") or []
-    avoid_terms_list = [p.strip() for p in (custom_avoid_text or "").split(",") if (p or "").strip()] or None
-    out = []
-    for day in raw_days[:7]:
-        if not isinstance(day, dict):
-            continue
-        date_val = day.get("date") or ""
-        meals = day.get("meals") or []
-        if not isinstance(meals, list) or not meals:
+
+def _normalize_day(day, ctx: dict, rejected: dict[str, int] | None = None, one_per_type: bool = False) -> dict | None:
+    """
+    Validate one day from the model: drop non-compliant meals, keep requested meal types.
+    Rejections are counted per filter into `rejected`; one_per_type keeps only the first
+    compliant meal of each type (when alternates were requested).
+    """
+    if not isinstance(day, dict):
+        return None
+    date_val = day.get("date") or ""
+    meals = day.get("meals") or []
+    if not isinstance(meals, list) or not meals:
+        return None
+    normalized_meals = []
+    for meal in meals:
+        if not isinstance(meal, dict) or not meal.get("title"):
             continue
-        normalized_meals = []
-        for meal in meals:
-            if not isinstance(meal, dict) or not meal.get("title"):
-                continue
-            rec = {
-                "title": str(meal.get("title", "")).strip(),
-                "ingredients": [str(x).strip() for x in meal.get("ingredients", []) if x],
-                "steps": [str(x).strip() for x in meal.get("steps", []) if x],
-            }
-            if not recipe_complies_with_diets(rec, diet_filters):
-                continue
-            if not recipe_complies_with_allergens(rec, allergens, avoid_terms_list):
-                continue
-            normalized_meals.append({
-                "meal_type": str(meal.get("meal_type") or "").strip().lower() or None,
-                "name": str(meal.get("name") or meal.get("title") or "").strip(),
-                "short_description": str(meal.get("short_description") or "").strip(),
-                "estimated_time_minutes": int(meal.get("estimated_time_minutes") or 30),
-                "title": rec["title"],
-                "ingredients": rec["ingredients"],
-                "steps": rec["steps"],
-            })
-        if not normalized_meals:
+        rec = {
+            "title": str(meal.get("title", "")).strip(),
+            "ingredients": [str(x).strip() for x in meal.get("ingredients", []) if x],
+            "steps": [str(x).strip() for x in meal.get("steps", []) if x],
+        }
+        failed = overgenerate.check(rec, ctx["diet_filters"], ctx["allergens"], ctx["avoid_terms_list"])
+        if failed:
+            if rejected is not None:
+                for key in failed:
+                    rejected[key] = rejected.get(key, 0) + 1
             continue
-        out.append({"date": date_val, "meals": normalized_meals})
-
-    # Best-effort enforcement of meal_types and meat/fish weekly counts.
-    if out:
-        # Ensure each day contains requested meal types (best effort; keep only requested).
-        req_types = set(meal_types_norm)
-        cleaned = []
-        for d in out:
-            meals = [m for m in (d.get("meals") or []) if (m.get("meal_type") or "").lower() in req_types]
-            if len(req_types) == 1 and not meals:
-                meals = d.get("meals") or []
-            d["meals"] = meals
-            cleaned.append(d)
-        out = cleaned
-    return out
+        try:
+            minutes = int(meal.get("estimated_time_minutes") or 30)
+        except (TypeError, ValueError):
+            minutes = 30
+        normalized_meals.append({
+            "meal_type": str(meal.get("meal_type") or "").strip().lower() or None,
+            "name": str(meal.get("name") or meal.get("title") or "").strip(),
+            "short_description": str(meal.get("short_description") or "").strip(),
+            "estimated_time_minutes": minutes,
+            "title": rec["title"],
+            "ingredients": rec["ingredients"],
+            "steps": rec["steps"],
+        })
+    if not normalized_meals:
+        return None
+    # Best-effort enforcement of meal_types (keep only requested).
+    req_types = set(ctx["meal_types_norm"])
+    kept = [m for m in normalized_meals if (m.get("meal_type") or "").lower() in req_types]
+    if len(req_types) == 1 and not kept:
+        kept = normalized_meals
+    if one_per_type:
+        seen_types = set()
+        kept = [m for m in kept if not (m["meal_type"] in seen_types or seen_types.add(m["meal_type"]))]
+    if not kept:
+        return None
+    return {"date": date_val, "meals": kept}
+
+
+def generate_weekly_meal_plan(
+    start_date: str,
+    num_days: int = 7,
+    meal_types: list[str] | None = None,
+    protein_types: list[str] | None = None,
+    meat_meals_per_week: int | None = None,
+    fish_meals_per_week: int | None = None,
+    diet_filters: list[str] | None = None,
+    allergens: list[str] | None = None,
+    custom_avoid_text: str | None = None,
+    household_adults: int | None = None,
+    household_kids: int | None = None,
+    max_time_minutes: int | None = None,
+    budget: str | None = None,
+    target_language: str = "en",
+    measurement_system: str = "metric",
+) -> list[dict]:
+    """
+    Return a list of day entries: [ {"date": "YYYY-MM-DD", "meal": { name, short_description, estimated_time_minutes, title, ingredients, steps } }, ... ].
+    Raises RuntimeError on missing API key or rate limit.
+    """
+    num_days = max(1, min(7, num_days))
+    ctx = _plan_context(
+        meal_types, protein_types, meat_meals_per_week, fish_meals_per_week, diet_filters, allergens,
+        custom_avoid_text, household_adults, household_kids, max_time_minutes, budget,
+        target_language, measurement_system,
+    )
+    prompt = MEAL_PLAN_USER_TEMPLATE.format(num_days=num_days, start_date=start_date, **ctx["prompt"])
+    data = _chat_json(
+        [
+            {"role": "system", "content": MEAL_PLAN_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+        max_tokens=4000,
+    )
+    if data is None:
+        return []
+
+    out = []
+    for day in (data.get("days") or [])[:7]:
+        normalized = _normalize_day(day, ctx)
+        if normalized is not None:
+            out.append(normalized)
     return out
 
 
+# --- Per-day generation (concurrent; used by the streaming endpoint) ---
+
+MEAL_PLAN_DAY_CONCURRENCY = int(os.getenv("MEAL_PLAN_DAY_CONCURRENCY", "4"))
+_DAY_ATTEMPTS = 2  # a malformed or fully rejected day is retried once instead of discarding the plan
+_ALTERNATES_BELOW_PASS_RATE = 0.85  # ask for a spare meal per type when filters reject more than this
+
+# Rotated across days so concurrently generated days don't all pick the same kind of dish.
+_DISH_STYLES = (
+    "soup",
+    "pasta or noodles",
+    "stir-fry",
+    "salad or grain bowl",
+    "oven-baked dish",
+    "stew or curry",
+    "grilled or pan-fried",
+    "rice dish",
+)
+_MAIN_MEAL_TYPES = ("dinner", "lunch")
+
+MEAL_PLAN_DAY_USER_TEMPLATE = """This is day {day_number} of a {num_days}-day meal plan. Generate ONLY the meals for {date}.
+
+Plan-wide constraints:
+- Meal types for this day: {meal_types}
+- Protein types to use (best effort): {protein_types}
+- Diet: {diet_list}
+- Allergens to avoid: {allergen_list}
+- Other avoid terms: {avoid_terms}
+- Household: {household}
+- Max time per meal (minutes): {max_time}
+- Budget: {budget}
+
+This day (the weekly meat/fish counts are already split across days; follow this exactly):
+- Protein for this day's {main_meal_type}: {protein_slot}
+- Dish style for this day's {main_meal_type}: {dish_style} (other days use: {other_styles}; do not repeat those)
+
+Output language: {output_lang}
+Measurement: {measurement_units} (use g, kg, ml, L for metric; oz, lb, cups, tbsp, tsp for imperial).
+
+Return exactly this JSON:
+{{
+  "date": "{date}",
+  "meals": [
+    {{
+      "meal_type": "dinner",
+      "name": "Display name",
+      "short_description": "One sentence.",
+      "estimated_time_minutes": 30,
+      "title": "Recipe title",
+      "ingredients": ["...", "..."],
+      "steps": ["...", "..."]
+    }}
+  ]
+}}
+"""
+
+_PROTEIN_SLOT_TEXT = {
+    "meat": "meat (e.g. chicken, turkey, beef)",
+    "fish": "fish or seafood",
+    "other": "no meat and no fish (vegetarian protein)",
+    "any": "any (respect the diet)",
+}
+
+
+def plan_protein_slots(num_days: int, meat_meals_per_week: int | None, fish_meals_per_week: int | None) -> list[str]:
+    """
+    Split the weekly meat/fish counts over the days' main meals, spread evenly
+    (e.g. 3 meat + 2 fish over 7 days -> meat, fish, other, meat, fish, other, meat).
+    Without counts every day is "any".
+    """
+    if meat_meals_per_week is None and fish_meals_per_week is None:
+        return ["any"] * num_days
+    targets = {
+        "meat": min(meat_meals_per_week or 0, num_days),
+        "fish": min(fish_meals_per_week or 0, num_days),
+    }
+    targets["fish"] = min(targets["fish"], num_days - targets["meat"])
+    targets["other"] = num_days - targets["meat"] - targets["fish"]
+    assigned = {k: 0 for k in targets}
+    slots = []
+    for i in range(num_days):
+        # Largest deficit against an even spread wins; ties go to meat, then fish.
+        best = max(targets, key=lambda k: (targets[k] * (i + 1) / num_days - assigned[k], k != "other", k == "meat"))
+        assigned[best] += 1
+        slots.append(best)
+    return slots
+
+
+def _day_messages(ctx: dict, dates: list[str], index: int, protein_slots: list[str]) -> list[dict]:
+    styles = [_DISH_STYLES[i % len(_DISH_STYLES)] for i in range(len(dates))]
+    main_meal_type = next((t for t in _MAIN_MEAL_TYPES if t in ctx["meal_types_norm"]), ctx["meal_types_norm"][0])
+    prompt = MEAL_PLAN_DAY_USER_TEMPLATE.format(
+        day_number=index + 1,
+        num_days=len(dates),
+        date=dates[index],
+        main_meal_type=main_meal_type,
+        protein_slot=_PROTEIN_SLOT_TEXT[protein_slots[index]],
+        dish_style=styles[index],
+        other_styles=", ".join(s for i, s in enumerate(styles) if i != index) or "none",
+        **ctx["prompt"],
+    )
+    return [
+        {"role": "system", "content": MEAL_PLAN_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _generate_day(ctx: dict, dates: list[str], index: int, protein_slots: list[str]) -> dict | None:
+    """
+    One day with over-generate-and-filter: when the learned rejection rate of the active filters is
+    high, ask for an alternate meal per type up front; a retry names the filters the last answer broke.
+    """
+    messages = _day_messages(ctx, dates, index, protein_slots)
+    keys = overgenerate.filter_keys(ctx["diet_filters"], ctx["allergens"], ctx["avoid_terms_list"])
+    alternates = bool(keys) and overgenerate.stats.pass_rate(keys) < _ALTERNATES_BELOW_PASS_RATE
+    if alternates:
+        messages[-1]["content"] += (
+            "\nAlso include one alternative meal per meal type (same fields, listed after the first); "
+            "only the first one that fits every constraint is kept.\n"
+        )
+    deadline = time.monotonic() + overgenerate.LATENCY_BUDGET_S
+    metrics.incr("meal_plan.day.requests")
+    for attempt in range(_DAY_ATTEMPTS):
+        rejected: dict[str, int] = {}
+        started = time.monotonic()
+        day = _normalize_day(_chat_json(messages, max_tokens=2500 if alternates else 1500), ctx, rejected, alternates)
+        if day is not None:
+            day["date"] = dates[index]
+            metrics.incr("meal_plan.day.fulfilled")
+            if attempt:
+                metrics.incr("meal_plan.day.fulfilled_by_retry")
+            return day
+        if attempt + 1 == _DAY_ATTEMPTS:
+            break
+        if time.monotonic() + (time.monotonic() - started) > deadline:
+            metrics.incr("meal_plan.day.retry_skipped")
+            break
+        if rejected:
+            hint = overgenerate.top_up_hint(rejected, [])
+            messages = [*messages[:-1], {**messages[-1], "content": messages[-1]["content"] + hint}]
+        metrics.incr("meal_plan.day.retry")
+    metrics.incr("meal_plan.day.short")
+    return None
+
+
+def iter_meal_plan_days(
+    dates: list[str],
+    meal_types: list[str] | None = None,
+    protein_types: list[str] | None = None,
+    meat_meals_per_week: int | None = None,
+    fish_meals_per_week: int | None = None,
+    diet_filters: list[str] | None = None,
+    allergens: list[str] | None = None,
+    custom_avoid_text: str | None = None,
+    household_adults: int | None = None,
+    household_kids: int | None = None,
+    max_time_minutes: int | None = None,
+    budget: str | None = None,
+    target_language: str = "en",
+    measurement_system: str = "metric",
+    max_workers: int | None = None,
+):
+    """
+    Generate each day with its own small completion, up to max_workers at once, and yield
+    (index, day_or_None) in completion order, so total time is about one day's latency.
+    The shared context (constraints, per-day protein slot, rotated dish styles) keeps
+    weekly counts and variety without the days seeing each other's output.
+    RuntimeError (config, rate limit) from any day is re-raised.
+    """
+    ctx = _plan_context(
+        meal_types, protein_types, meat_meals_per_week, fish_meals_per_week, diet_filters, allergens,
+        custom_avoid_text, household_adults, household_kids, max_time_minutes, budget,
+        target_language, measurement_system,
+    )
+    protein_slots = plan_protein_slots(len(dates), meat_meals_per_week, fish_meals_per_week)
+    workers = max(1, min(max_workers or MEAL_PLAN_DAY_CONCURRENCY, len(dates)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="meal-plan-day") as pool:
+        futures = {pool.submit(_generate_day, ctx, dates, i, protein_slots): i for i in range(len(dates))}
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    yield index, future.result()
+                except RuntimeError:
+                    raise
+                except Exception:
+                    yield index, None
+        finally:
+            for future in futures:
+                future.cancel()
+
+
 def generate_single_meal(
     diet_filters: list[str] | None = None,
     allergens: list[str] | None = None,
@@ -0,0 +1,116 @@
+"""
+Over-generate-and-filter for AI suggestions (discover, meal-plan days).
+
+The keyword compliance checks reject part of what the model returns. RejectionStats learns the
+rejection rate of each filter (per worker), so callers ask for a calibrated surplus up front and
+only make a targeted follow-up call when still short and there is time left in the latency budget.
+"""
+import math
+import os
+import threading
+
+from .what_can_i_make_ai import recipe_complies_with_allergens, recipe_complies_with_diets
+
+LATENCY_BUDGET_S = float(os.getenv("OVERGENERATE_LATENCY_BUDGET_S", "20"))
+MAX_ASK = 10  # largest batch a single discover prompt asks for
+_MIN_PASS_RATE = 0.25  # never ask for more than 4x what is needed
+# Prior: each filter starts as if 1 of 10 candidates was rejected, so early estimates are not 0 or 1.
+_PRIOR_REJECTED = 1.0
+_PRIOR_SEEN = 10.0
+
+
+def filter_keys(
+    diet_filters: list[str] | None,
+    allergens: list[str] | None,
+    avoid_terms: list[str] | None,
+) -> list[str]:
+    """One key per active filter: "diet:vegan", "allergen:milk", and "avoid" for free-text terms."""
+    keys = [f"diet:{d.strip().lower()}" for d in diet_filters or [] if (d or "").strip()]
+    keys += [f"allergen:{a.strip().lower()}" for a in allergens or [] if (a or "").strip()]
+    if any((t or "").strip() for t in avoid_terms or []):
+        keys.append("avoid")
+    return keys
+
+
+def _fails(recipe: dict, key: str, avoid_terms: list[str] | None) -> bool:
+    kind, _, name = key.partition(":")
+    if kind == "diet":
+        return not recipe_complies_with_diets(recipe, [name])
+    if kind == "allergen":
+        return not recipe_complies_with_allergens(recipe, [name], None)
+    return not recipe_complies_with_allergens(recipe, None, avoid_terms)
+
+
+class RejectionStats:
+    """Thread-safe per-filter counters of candidates checked and rejected."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen: dict[str, int] = {}
+        self._rejected: dict[str, int] = {}
+
+    def record(self, keys: list[str], failed: list[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._seen[key] = self._seen.get(key, 0) + 1
+            for key in failed:
+                self._rejected[key] = self._rejected.get(key, 0) + 1
+
+    def rate(self, key: str) -> float:
+        with self._lock:
+            seen, rejected = self._seen.get(key, 0), self._rejected.get(key, 0)
+        return (rejected + _PRIOR_REJECTED) / (seen + _PRIOR_SEEN)
+
+    def pass_rate(self, keys: list[str]) -> float:
+        """Expected share of candidates passing all filters (filters treated as independent)."""
+        p = 1.0
+        for key in keys:
+            p *= 1.0 - self.rate(key)
+        return p
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            keys = sorted(self._seen)
+            counts = {k: (self._seen[k], self._rejected.get(k, 0)) for k in keys}
+        return {k: {"checked": s, "rejected": r, "rate": round(r / s, 3) if s else 0.0} for k, (s, r) in counts.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._seen.clear()
+            self._rejected.clear()
+
+
+stats = RejectionStats()
+
+
+def check(
+    recipe: dict,
+    diet_filters: list[str] | None,
+    allergens: list[str] | None,
+    avoid_terms: list[str] | None,
+) -> list[str]:
+    """Return the filter keys this recipe fails (empty = compliant) and feed the rejection stats."""
+    keys = filter_keys(diet_filters, allergens, avoid_terms)
+    failed = [k for k in keys if _fails(recipe, k, avoid_terms)]
+    stats.record(keys, failed)
+    return failed
+
+
+def surplus_size(needed: int, keys: list[str], cap: int = MAX_ASK) -> int:
+    """How many candidates to ask for so that about `needed` survive the filters."""
+    if needed <= 0:
+        return 0
+    pass_rate = max(_MIN_PASS_RATE, stats.pass_rate(keys))
+    return max(needed, min(cap, math.ceil(needed / pass_rate)))
+
+
+def top_up_hint(rejected: dict[str, int], exclude_titles: list[str]) -> str:
+    """Prompt suffix for the follow-up call: which filters the last batch broke, which titles to skip."""
+    lines = ["", "Some earlier suggestions were rejected for breaking these constraints; be strict about them:"]
+    for key, count in sorted(rejected.items(), key=lambda kv: -kv[1]):
+        kind, _, name = key.partition(":")
+        label = {"diet": f"diet {name}", "allergen": f"allergen {name}"}.get(kind, "the avoid terms")
+        lines.append(f"- {label} ({count} rejected)")
+    if exclude_titles:
+        lines.append("Do not repeat these recipes: " + "; ".join(exclude_titles))
+    return "\n".join(lines) + "\n"
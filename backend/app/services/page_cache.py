@@ -0,0 +1,133 @@
+"""
+Cache of fetched recipe pages for URL import, keyed by normalized URL.
+
+Popular blog recipes get imported by many users. A cached page keeps the extracted text, the
+extraction result (translate-ready chunks) and the validators (ETag / Last-Modified). Within the
+freshness window an import skips the fetch; after it, a conditional GET that answers 304 reuses
+the cached extraction. Entries are evicted by age and, least recently used first, by total size.
+"""
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+FRESH_S = int(os.getenv("URL_PAGE_CACHE_FRESH_S", "21600"))  # 6 h without revalidation
+MAX_AGE_S = int(os.getenv("URL_PAGE_CACHE_MAX_AGE_S", str(30 * 24 * 3600)))
+MAX_BYTES = int(os.getenv("URL_PAGE_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+_TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "ref", "ref_src"}
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """Lowercase scheme/host, no default port, fragment or tracking parameters, sorted query."""
+    parts = urlsplit((url or "").strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def url_key(url: str) -> str:
+    return hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def lookup(db: Session, url: str):
+    from ..models import FetchedPageCache
+
+    return db.execute(select(FetchedPageCache).where(FetchedPageCache.url_key == url_key(url))).scalar_one_or_none()
+
+
+def is_fresh(entry) -> bool:
+    return _now() - _aware(entry.validated_at) < timedelta(seconds=FRESH_S)
+
+
+def conditional_headers(entry) -> dict:
+    """If-None-Match / If-Modified-Since for revalidating a cached page (empty when there is none)."""
+    headers = {}
+    if entry is not None and entry.etag:
+        headers["If-None-Match"] = entry.etag
+    if entry is not None and entry.last_modified:
+        headers["If-Modified-Since"] = entry.last_modified
+    return headers
+
+
+def mark_used(db: Session, entry, revalidated: bool = False) -> list[str]:
+    """Record a cache hit (and a successful revalidation). Commits. Returns the cached chunks."""
+    now = _now()
+    entry.last_used_at = now
+    entry.hit_count = (entry.hit_count or 0) + 1
+    if revalidated:
+        entry.validated_at = now
+    db.commit()
+    return list(entry.chunks)
+
+
+def store(
+    db: Session,
+    url: str,
+    headers,
+    page_text: str,
+    chunks: list[str],
+    source: str,
+) -> None:
+    """Insert or replace the entry for url with a fresh extraction, then evict. Commits."""
+    from ..models import FetchedPageCache
+
+    now = _now()
+    entry = lookup(db, url)
+    if entry is None:
+        entry = FetchedPageCache(url_key=url_key(url), url=normalize_url(url)[:2000])
+        db.add(entry)
+    entry.etag = headers.get("etag")
+    entry.last_modified = headers.get("last-modified")
+    entry.page_text = page_text
+    entry.chunks = chunks
+    entry.source = source
+    entry.size = len(page_text.encode("utf-8")) + sum(len(c.encode("utf-8")) for c in chunks)
+    entry.fetched_at = entry.validated_at = entry.last_used_at = now
+    try:
+        db.commit()
+    except IntegrityError:  # a concurrent import of the same page stored it first
+        db.rollback()
+        return
+    evict(db)
+
+
+def evict(db: Session, max_bytes: int | None = None, max_age_s: int | None = None) -> int:
+    """Drop entries not fetched for max_age_s, then least recently used ones above max_bytes. Commits."""
+    from ..models import FetchedPageCache
+
+    cache = FetchedPageCache
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    cutoff = _now() - timedelta(seconds=MAX_AGE_S if max_age_s is None else max_age_s)
+    removed = db.execute(delete(cache).where(cache.fetched_at < cutoff)).rowcount or 0
+    total = db.execute(select(func.coalesce(func.sum(cache.size), 0))).scalar_one()
+    if total > max_bytes:
+        doomed = []
+        for entry_id, size in db.execute(select(cache.id, cache.size).order_by(cache.last_used_at, cache.id)):
+            if total <= max_bytes:
+                break
+            doomed.append(entry_id)
+            total -= size
+        removed += db.execute(delete(cache).where(cache.id.in_(doomed))).rowcount or 0
+    db.commit()
+    return removed
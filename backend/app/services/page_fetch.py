@@ -0,0 +1,193 @@
+"""
+Bounded fetching of recipe pages for URL import.
+
+One pooled httpx client is shared by all imports (keep-alive per host, HTTP/2 when the optional
+h2 package is installed). A fetch streams the body, stops reading as soon as it passes the byte
+cap, decodes incrementally, and is bounded by a total deadline (connect + redirects + body), not
+only by a per-read timeout: every socket read gets the time left as its timeout. Redirects are followed by hand so every hop is checked as public.
+"""
+import codecs
+import ipaddress
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from urllib.parse import urljoin, urlparse
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (optional: enables HTTP/2 in httpx)
+
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+MAX_FETCH_BYTES = 1_000 * 1024  # 1 MB
+FETCH_DEADLINE_S = float(os.getenv("URL_IMPORT_DEADLINE_S", "15"))
+_CONNECT_TIMEOUT_S = 5.0
+_MAX_REDIRECTS = 5
+_USER_AGENT = "RecipeApp/1.0"
+_META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
+_client: httpx.Client | None = None
+_client_lock = threading.Lock()
+
+
+class PageFetchError(ValueError):
+    """Fetch refused or failed; str(e) is the message shown to the user."""
+
+
+@dataclass
+class FetchedPage:
+    url: str  # final URL after redirects
+    status_code: int
+    headers: httpx.Headers
+    text: str
+
+
+def is_safe_url(url: str) -> bool:
+    try:
+        parsed = urlparse(url)
+    except Exception:
+        return False
+    if parsed.scheme not in ("http", "https"):
+        return False
+    host = (parsed.hostname or "").strip().lower()
+    if host in ("localhost", "127.0.0.1", "::1", ""):
+        return False
+    try:
+        ip = ipaddress.ip_address(host)
+        if ip.is_private or ip.is_loopback or ip.is_reserved:
+            return False
+    except ValueError:
+        pass
+    return True
+
+
+def get_client() -> httpx.Client:
+    """Shared pooled client, created on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                http2=_HTTP2,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=30.0),
+                headers={"User-Agent": _USER_AGENT},
+                follow_redirects=False,
+            )
+        return _client
+
+
+def set_client(client: httpx.Client | None) -> None:
+    """Replace the shared client (tests use an httpx.MockTransport); None closes it and starts fresh."""
+    global _client
+    with _client_lock:
+        if _client is not None and client is not _client:
+            _client.close()
+        _client = client
+
+
+def _charset(response: httpx.Response, head: bytes) -> str:
+    for candidate in (response.charset_encoding, _meta_charset(head)):
+        if candidate:
+            try:
+                return codecs.lookup(candidate).name
+            except LookupError:
+                continue
+    return "utf-8"
+
+
+def _meta_charset(head: bytes) -> str | None:
+    m = _META_CHARSET_RE.search(head[:2048])
+    return m.group(1).decode("ascii", "ignore") if m else None
+
+
+def _remaining(deadline: float) -> float:
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise PageFetchError("Timed out fetching the page.")
+    return left
+
+
+def fetch_page(
+    url: str,
+    max_bytes: int = MAX_FETCH_BYTES,
+    deadline_s: float = FETCH_DEADLINE_S,
+    headers: dict | None = None,
+) -> FetchedPage:
+    """
+    GET a public http(s) page within max_bytes and deadline_s. Returns the decoded text (empty for
+    a 304 answer to conditional headers). Raises PageFetchError.
+    """
+    deadline = time.monotonic() + deadline_s
+    client = get_client()
+    for _ in range(_MAX_REDIRECTS + 1):
+        if not is_safe_url(url):
+            raise PageFetchError("Invalid or disallowed URL. Only public http(s) URLs are allowed.")
+        left = _remaining(deadline)
+        timeout = httpx.Timeout(left, connect=min(_CONNECT_TIMEOUT_S, left))
+        try:
+            with client.stream("GET", url, headers=headers, timeout=timeout) as resp:
+                if resp.is_redirect and resp.headers.get("location"):
+                    url = urljoin(str(resp.url), resp.headers["location"])
+                    continue
+                if resp.status_code == 304:
+                    return FetchedPage(str(resp.url), 304, resp.headers, "")
+                if resp.status_code >= 400:
+                    raise PageFetchError(f"Failed to fetch page: {resp.status_code}")
+                declared = resp.headers.get("content-length")
+                if declared and declared.isdigit() and int(declared) > max_bytes:
+                    raise PageFetchError("Page is too large to process.")
+                resp.stream = _DeadlineStream(resp.stream, resp.request, deadline)
+                return FetchedPage(str(resp.url), resp.status_code, resp.headers, _read_text(resp, max_bytes))
+        except httpx.TimeoutException as e:
+            raise PageFetchError("Timed out fetching the page.") from e
+        except httpx.RequestError as e:
+            raise PageFetchError("Failed to connect to the provided URL.") from e
+    raise PageFetchError("Too many redirects.")
+
+
+class _DeadlineStream(httpx.SyncByteStream):
+    """
+    Raw body stream that checks the deadline around every network read and shrinks the read
+    timeout to the time left, so a server trickling bytes cannot stretch a fetch past it.
+    """
+
+    def __init__(self, stream: httpx.SyncByteStream, request: httpx.Request, deadline: float):
+        self._stream = stream
+        self._request = request
+        self._deadline = deadline
+
+    def _shrink_read_timeout(self) -> None:
+        timeouts = self._request.extensions.get("timeout", {})
+        self._request.extensions["timeout"] = {**timeouts, "read": _remaining(self._deadline)}
+
+    def __iter__(self):
+        self._shrink_read_timeout()
+        for chunk in self._stream:
+            self._shrink_read_timeout()
+            yield chunk
+
+    def close(self) -> None:
+        self._stream.close()
+
+
+def _read_text(resp: httpx.Response, max_bytes: int) -> str:
+    decoder = None
+    parts: list[str] = []
+    received = 0
+    for chunk in resp.iter_bytes():
+        received += len(chunk)
+        if received > max_bytes:
+            raise PageFetchError("Page is too large to process.")
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder(_charset(resp, chunk))(errors="replace")
+        parts.append(decoder.decode(chunk))
+    if decoder is not None:
+        parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
@@ -0,0 +1,172 @@
+"""
+Visible text of a fetched recipe page for the extraction LLM.
+
+One tokenizer pass (html.parser, incremental and linear in the page size) instead of regexes over
+the whole page. Block elements become line breaks, headings and list items keep a marker
+("#", "-", "1."), table rows stay on one line, and scripts, styles and nav / footer / aside
+boilerplate (or the matching ARIA roles) are dropped, so the model gets compact text that still
+shows where the ingredient list and the steps are.
+"""
+import re
+import time
+from html.parser import HTMLParser
+
+# Content of these is never visible text.
+_SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "math", "iframe", "object", "canvas", "select", "button"}
+# Page chrome around the recipe.
+_BOILERPLATE_TAGS = {"nav", "footer", "aside", "form"}
+_BOILERPLATE_ROLES = {"navigation", "contentinfo", "complementary", "banner", "search"}
+_BLOCK_TAGS = {
+    "address", "article", "blockquote", "br", "dd", "div", "dl", "dt", "fieldset", "figcaption", "figure",
+    "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "ol", "p", "pre", "section", "table",
+    "tbody", "thead", "title", "tr", "ul",
+}
+_HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+_WS_RE = re.compile(r"\s+")
+_MARKER_ONLY_RE = re.compile(r"(?:-|#|\d+\.)")
+_FEED_CHARS = 32 * 1024
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: list[str] = []
+        self.chars = 0
+        self._line: list[str] = []
+        self._open: list[tuple[str, bool]] = []  # (tag, starts a skipped subtree)
+        self._open_count: dict[str, int] = {}
+        self._skip_depth = 0
+        self._lists: list[list] = []  # per open ul/ol: [ordered, next number]
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _VOID_TAGS:
+            if tag in ("br", "hr") and not self._skip_depth:
+                self._break()
+            return
+        skip = tag in _SKIP_TAGS or tag in _BOILERPLATE_TAGS
+        if not skip and attrs:
+            skip = (dict(attrs).get("role") or "").strip().lower() in _BOILERPLATE_ROLES
+        self._open.append((tag, skip))
+        self._open_count[tag] = self._open_count.get(tag, 0) + 1
+        if skip:
+            self._skip_depth += 1
+        if self._skip_depth:
+            return
+        if tag in _BLOCK_TAGS:
+            self._break()
+        if tag in ("ul", "ol"):
+            self._lists.append([tag == "ol", 1])
+        elif tag == "li":
+            if self._lists and self._lists[-1][0]:
+                self._line.append(f"{self._lists[-1][1]}. ")
+                self._lists[-1][1] += 1
+            else:
+                self._line.append("- ")
+        elif tag in _HEADINGS:
+            self._line.append("# ")
+        elif tag in ("td", "th") and self._line:
+            self._line.append(" | ")
+
+    def handle_endtag(self, tag):
+        if not self._open_count.get(tag):
+            return  # stray end tag
+        while self._open:
+            open_tag, skip = self._open.pop()
+            self._open_count[open_tag] -= 1
+            if not self._skip_depth and open_tag in ("ul", "ol") and self._lists:
+                self._lists.pop()
+            if skip:
+                self._skip_depth -= 1
+            elif not self._skip_depth and open_tag in _BLOCK_TAGS:
+                self._break()
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._line.append(data)
+
+    def _break(self) -> None:
+        line = _WS_RE.sub(" ", "".join(self._line)).strip()
+        self._line = []
+        if line and not _MARKER_ONLY_RE.fullmatch(line):
+            self.lines.append(line)
+            self.chars += len(line) + 1
+
+    def text(self) -> str:
+        self._break()
+        return "\n".join(self.lines)
+
+
+def html_to_text(page_html: str, max_chars: int | None = None) -> str:
+    """
+    Compact visible text of page_html: one line per block, list / heading markers kept. With
+    max_chars, parsing stops once that much text is collected and the result is cut to it.
+    """
+    parser = _TextExtractor()
+    page_html = page_html or ""
+    try:
+        for start in range(0, len(page_html), _FEED_CHARS):
+            parser.feed(page_html[start:start + _FEED_CHARS])
+            if max_chars is not None and parser.chars >= max_chars:
+                break
+        else:
+            parser.close()
+    except (AssertionError, ValueError):  # badly broken markup: keep what was read
+        pass
+    text = parser.text()
+    return text[:max_chars] if max_chars is not None else text
+
+
+def _regex_text(page_html: str) -> str:
+    """The previous script/style/tag regex chain, kept as the benchmark baseline."""
+    text = re.sub(r"<script[^>]*>[\s\S]*?</script>", " ", page_html, flags=re.IGNORECASE)
+    text = re.sub(r"<style[^>]*>[\s\S]*?</style>", " ", text, flags=re.IGNORECASE)
+    text = re.sub(r"<[^>]+>", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def large_test_pages(target_bytes: int = 1_000_000) -> dict[str, str]:
+    """
+    Synthetic pages for the benchmark: a typical blog post (mega menu, sidebar, a few comments),
+    the same padded with comments up to target_bytes, and a page of unterminated <script tags
+    (quadratic for the regex chain).
+    """
+    head = "<html><head><style>body{margin:0}</style><script>var x = 1;</script></head><body>"
+    chrome = (
+        "<nav><ul>" + "".join(f'<li><a href="/c/{i}">Category {i}</a></li>' for i in range(300)) + "</ul></nav>"
+        '<div role="complementary">' + "<p>Sponsored: kitchen gadgets on sale.</p>" * 20 + "</div>"
+    )
+    recipe = (
+        "<article><h1>Apple pie</h1><h2>Ingredients</h2><ul>"
+        + "".join(f"<li>{i} apples</li>" for i in range(1, 9))
+        + "</ul><h2>Method</h2><ol><li>Peel and slice.</li><li>Fill the crust.</li><li>Bake 45 minutes.</li></ol></article>"
+    )
+    comment = '<div class="comment"><p>Made this on Sunday, <b>loved it</b>! Would add cinnamon.</p></div>'
+    footer = "<footer><p>&copy; Recipe blog</p>" + '<a href="/about">About</a>' * 50 + "</footer></body></html>"
+    pages = {"synthetic_blog.html": head + chrome + recipe + comment * 20 + footer}
+    padding = max(0, (target_bytes - len(pages["synthetic_blog.html"])) // len(comment))
+    pages["synthetic_large_blog.html"] = head + chrome + recipe + comment * (20 + padding) + footer
+    pages["synthetic_unterminated_scripts.html"] = "<p>Pancakes</p>" + "<script x>" * (target_bytes // 200)
+    return pages
+
+
+def measure_extraction(pages: dict[str, str], max_chars: int = 10000) -> list[dict]:
+    """
+    Per page ({name: html}): size, time and output characters of the regex chain vs html_to_text,
+    both cut to max_chars (what URL import sends to the extraction model).
+    """
+    report = []
+    for name, page_html in pages.items():
+        row = {"page": name, "html_bytes": len(page_html.encode("utf-8"))}
+        for label, extract in (
+            ("regex", lambda h: _regex_text(h)[:max_chars]),
+            ("tokenizer", lambda h: html_to_text(h, max_chars=max_chars)),
+        ):
+            start = time.perf_counter()
+            text = extract(page_html)
+            row[f"{label}_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            row[f"{label}_chars"] = len(text)
+        report.append(row)
+    return report
@@ -0,0 +1,149 @@
+"""
+Incremental parser for a streamed top-level JSON object (LLM output with response_format=json_object).
+
+Feed text chunks as they arrive; feed() returns events for everything that became complete:
+  ("field", key, value)        a top-level value finished (e.g. "title_pl")
+  ("item", key, index, value)  one element of a top-level array finished (e.g. one of "steps_pl")
+Only complete values are decoded, so nothing is emitted twice or half-written.
+"""
+import json
+
+_WS = " \t\r\n"
+
+
+class PartialJSONObjectParser:
+    def __init__(self):
+        self._buf: list[str] = []
+        self._pos = 0
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+        # Top level (depth 1): "key" | "key_string" | "colon" | "value" | "in_value" | "comma"
+        self._expect = "key"
+        self._key: str | None = None
+        self._key_start: int | None = None
+        self._string_start: int | None = None
+        self._value_start: int | None = None
+        self._value_is_array = False
+        # Array elements (depth 2 inside a top-level array)
+        self._item_start: int | None = None
+        self._item_index = 0
+
+    def _text(self, start: int, end: int) -> str:
+        return "".join(self._buf[start:end])
+
+    def _decode(self, start: int, end: int):
+        try:
+            return json.loads(self._text(start, end))
+        except json.JSONDecodeError:
+            return None
+
+    def _end_value(self, end: int, events: list) -> None:
+        events.append(("field", self._key, self._decode(self._value_start, end)))
+        self._value_start = None
+        self._value_is_array = False
+        self._expect = "comma"
+
+    def _end_item(self, end: int, events: list) -> None:
+        events.append(("item", self._key, self._item_index, self._decode(self._item_start, end)))
+        self._item_start = None
+        self._item_index += 1
+
+    def _in_top_array(self) -> bool:
+        return len(self._stack) == 2 and self._value_is_array
+
+    def feed(self, chunk: str) -> list[tuple]:
+        events: list[tuple] = []
+        for c in chunk:
+            i = self._pos
+            self._buf.append(c)
+            self._pos += 1
+            depth = len(self._stack)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if depth == 1 and self._expect == "key_string":
+                        self._key = self._decode(self._key_start, i + 1)
+                        self._expect = "colon"
+                    elif depth == 1 and self._value_start is not None and not self._value_is_array:
+                        self._end_value(i + 1, events)
+                    elif self._in_top_array() and self._item_start is not None and self._item_start == self._string_start:
+                        self._end_item(i + 1, events)
+                continue
+
+            if c in _WS:
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                if depth == 1 and self._expect == "key":
+                    self._key_start = i
+                    self._expect = "key_string"
+                elif depth == 1 and self._expect == "value":
+                    self._value_start = i
+                    self._expect = "in_value"
+                elif self._in_top_array() and self._item_start is None:
+                    self._item_start = i
+                continue
+
+            if c in "{[":
+                if depth == 1 and self._expect == "value":
+                    self._value_start = i
+                    self._value_is_array = c == "["
+                    self._item_index = 0
+                    self._expect = "in_value"
+                elif self._in_top_array() and self._item_start is None:
+                    self._item_start = i
+                self._stack.append(c)
+                continue
+
+            if c in "}]":
+                if depth == 1:
+                    # End of the top-level object; flush a trailing scalar value.
+                    if self._value_start is not None:
+                        self._end_value(i, events)
+                    self._stack.pop()
+                    continue
+                if self._in_top_array() and c == "]":
+                    if self._item_start is not None:
+                        self._end_item(i, events)
+                    self._stack.pop()
+                    self._end_value(i + 1, events)
+                    continue
+                self._stack.pop()
+                if len(self._stack) == 1 and self._value_start is not None:
+                    self._end_value(i + 1, events)
+                elif self._in_top_array() and self._item_start is not None:
+                    self._end_item(i + 1, events)
+                continue
+
+            if c == ":" and depth == 1 and self._expect == "colon":
+                self._expect = "value"
+                continue
+
+            if c == ",":
+                if depth == 1:
+                    if self._value_start is not None:
+                        self._end_value(i, events)
+                    self._expect = "key"
+                elif self._in_top_array() and self._item_start is not None:
+                    self._end_item(i, events)
+                continue
+
+            # Start of a scalar (number, true, false, null)
+            if depth == 1 and self._expect == "value":
+                self._value_start = i
+                self._expect = "in_value"
+            elif self._in_top_array() and self._item_start is None:
+                self._item_start = i
+        return events
+
+    def text(self) -> str:
+        """Everything fed so far (for the final json.loads)."""
+        return "".join(self._buf)
@@ -0,0 +1,213 @@
+"""
+Precomputed diet/allergen compliance for stored recipes.
+
+Each Recipe row carries two bitmasks, recomputed whenever title/ingredients/steps change:
+- diet_flags: bit set = recipe satisfies that diet (DIET_FLAGS order)
+- allergen_flags: bit set = recipe contains that allergen (ALLERGEN_FLAGS order)
+so "safe for me" filtering is a bitwise SQL predicate instead of re-scanning ingredient text.
+"""
+import re
+
+from sqlalchemy import event, inspect, or_, select
+
+from .what_can_i_make_ai import recipe_complies_with_allergens, recipe_complies_with_diets
+
+# Bump when keyword rules change so the backfill command recomputes every row.
+COMPLIANCE_VERSION = 1
+
+# Bit positions are persisted: only ever append to these tuples.
+DIET_FLAGS = (
+    "vegetarian",
+    "vegan",
+    "dairy_free",
+    "gluten_free",
+    "nut_free",
+    "kosher",
+    "halal",
+    "low_fat",
+    "fat_free",
+    "for_kids",
+    "for_kids_under_1",
+)
+ALLERGEN_FLAGS = (
+    "gluten_cereals",
+    "crustaceans",
+    "eggs",
+    "fish",
+    "peanuts",
+    "soybeans",
+    "milk",
+    "tree_nuts",
+    "celery",
+    "mustard",
+    "sesame",
+    "sulphites",
+    "lupin",
+    "molluscs",
+)
+
+# Diets that are decided by allergen hits rather than recipe_complies_with_diets.
+_DIETS_FROM_ALLERGENS = {
+    "gluten_free": ("gluten_cereals",),
+    "nut_free": ("peanuts", "tree_nuts"),
+}
+
+# Polish meat/dairy stems (user libraries are mostly translated to Polish); English terms are
+# already covered by the regexes in what_can_i_make_ai.
+_PL_MEAT = re.compile(r"\b(mięs|kurczak|kurczę|wołow|wieprzow|schab|boczek|kiełbas|ryb|łoso|tuńczyk)", re.IGNORECASE)
+_PL_DAIRY = re.compile(r"\b(mlek|mleczn|śmietan|ser\b|sera\b|serem|serek|twaróg|twarog|masł|jogurt)", re.IGNORECASE)
+
+
+def _flatten_ingredient(item) -> str:
+    if isinstance(item, str):
+        return item.strip()
+    if isinstance(item, dict):
+        return f"{item.get('amount', '')} {item.get('name', '')}".strip()
+    return str(item).strip()
+
+
+def _recipe_dict(title: str | None, ingredients: list | None, steps: list | None) -> dict:
+    """Shape expected by recipe_complies_with_* (title, ingredients, steps as strings)."""
+    return {
+        "title": title or "",
+        "ingredients": [s for s in (_flatten_ingredient(i) for i in (ingredients or [])) if s],
+        "steps": [str(s).strip() for s in (steps or []) if s],
+    }
+
+
+def compute_compliance_flags(
+    title: str | None,
+    ingredients: list | None,
+    steps: list | None,
+) -> tuple[int, int]:
+    """Return (diet_flags, allergen_flags) bitmasks for the given recipe content."""
+    rec = _recipe_dict(title, ingredients, steps)
+    text = " ".join([rec["title"], *rec["ingredients"], *rec["steps"]]).lower()
+
+    allergen_flags = 0
+    hits: set[str] = set()
+    for i, code in enumerate(ALLERGEN_FLAGS):
+        if not recipe_complies_with_allergens(rec, [code], None):
+            allergen_flags |= 1 << i
+            hits.add(code)
+    if _PL_DAIRY.search(text):
+        allergen_flags |= 1 << ALLERGEN_FLAGS.index("milk")
+        hits.add("milk")
+
+    pl_meat = bool(_PL_MEAT.search(text))
+    diet_flags = 0
+    for i, diet in enumerate(DIET_FLAGS):
+        if diet in _DIETS_FROM_ALLERGENS:
+            ok = not any(code in hits for code in _DIETS_FROM_ALLERGENS[diet])
+        else:
+            ok = recipe_complies_with_diets(rec, [diet])
+            if diet in ("vegetarian", "vegan") and pl_meat:
+                ok = False
+            if diet in ("vegan", "dairy_free") and "milk" in hits:
+                ok = False
+        if ok:
+            diet_flags |= 1 << i
+    return diet_flags, allergen_flags
+
+
+def diet_mask(diet_filters: list[str] | None) -> int:
+    """Bitmask of the known diets in diet_filters (unknown diets cannot be precomputed and are ignored)."""
+    mask = 0
+    for d in diet_filters or []:
+        key = (d or "").strip().lower()
+        if key in DIET_FLAGS:
+            mask |= 1 << DIET_FLAGS.index(key)
+    return mask
+
+
+def allergen_mask(allergen_codes: list[str] | None) -> int:
+    """Bitmask of the known allergen codes in allergen_codes."""
+    mask = 0
+    for c in allergen_codes or []:
+        key = (c or "").strip().lower()
+        if key in ALLERGEN_FLAGS:
+            mask |= 1 << ALLERGEN_FLAGS.index(key)
+    return mask
+
+
+def flags_to_names(flags: int | None, names: tuple[str, ...]) -> list[str]:
+    """Decode a bitmask back to names (e.g. for display or debugging)."""
+    if not flags:
+        return []
+    return [name for i, name in enumerate(names) if flags & (1 << i)]
+
+
+def apply_compliance(recipe) -> None:
+    """Recompute and set diet_flags / allergen_flags / compliance_version on a Recipe."""
+    diet_flags, allergen_flags = compute_compliance_flags(
+        recipe.title_pl or recipe.title_original,
+        recipe.ingredients_pl,
+        recipe.steps_pl,
+    )
+    recipe.diet_flags = diet_flags
+    recipe.allergen_flags = allergen_flags
+    recipe.compliance_version = COMPLIANCE_VERSION
+
+
+def recipe_is_safe_for(recipe, diet_filters: list[str] | None, allergen_codes: list[str] | None) -> bool:
+    """In-memory equivalent of the safe-for-me SQL predicate (computes flags if the row is stale)."""
+    if recipe.compliance_version is None:
+        diet_flags, allergen_flags = compute_compliance_flags(
+            recipe.title_pl or recipe.title_original, recipe.ingredients_pl, recipe.steps_pl
+        )
+    else:
+        diet_flags, allergen_flags = recipe.diet_flags, recipe.allergen_flags
+    need_diets = diet_mask(diet_filters)
+    avoid = allergen_mask(allergen_codes)
+    return (diet_flags & need_diets) == need_diets and not (allergen_flags & avoid)
+
+
+_CONTENT_FIELDS = ("title_pl", "title_original", "ingredients_pl", "steps_pl")
+
+
+def _on_recipe_insert(mapper, connection, target) -> None:
+    apply_compliance(target)
+
+
+def _on_recipe_update(mapper, connection, target) -> None:
+    state = inspect(target)
+    if target.compliance_version is None or any(
+        state.attrs[name].history.has_changes() for name in _CONTENT_FIELDS
+    ):
+        apply_compliance(target)
+
+
+def register_compliance_listeners(recipe_cls) -> None:
+    """Keep compliance columns in sync on every flush that inserts or changes recipe content."""
+    event.listen(recipe_cls, "before_insert", _on_recipe_insert)
+    event.listen(recipe_cls, "before_update", _on_recipe_update)
+
+
+def backfill_compliance(db, batch_size: int = 500, recompute_all: bool = False) -> int:
+    """
+    Recompute compliance for stale rows (or all rows) in id-ordered batches, committing per batch.
+    Returns the number of recipes updated.
+    """
+    from .. import models
+
+    updated = 0
+    last_id = 0
+    while True:
+        stmt = select(models.Recipe).where(models.Recipe.id > last_id)
+        if not recompute_all:
+            stmt = stmt.where(
+                or_(
+                    models.Recipe.compliance_version.is_(None),
+                    models.Recipe.compliance_version != COMPLIANCE_VERSION,
+                )
+            )
+        batch = db.execute(stmt.order_by(models.Recipe.id).limit(batch_size)).scalars().all()
+        if not batch:
+            break
+        for recipe in batch:
+            apply_compliance(recipe)
+        last_id = batch[-1].id
+        updated += len(batch)
+        db.commit()
+        db.expunge_all()
+    return updated
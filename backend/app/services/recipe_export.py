@@ -0,0 +1,165 @@
+"""
+Export of a user's recipe library (GET /api/recipes/export) as JSON Lines, CSV or a zip.
+
+Rows are read as plain column tuples in yield_per batches (nothing enters the session's identity
+map), each batch's variants come from one IN query, and output is yielded batch by batch, so
+memory stays flat however many recipes a user has. The zip is written to a non-seekable sink
+(entries use data descriptors) and drained after every batch and image chunk.
+"""
+import csv
+import io
+import json
+import os
+import time
+import zipfile
+from collections.abc import Iterator
+from datetime import date, datetime
+from itertools import groupby
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import image_store
+
+EXPORT_FORMATS = ("jsonl", "csv", "zip")
+BATCH_SIZE = 200
+_FILE_CHUNK = 64 * 1024
+
+RECIPE_FIELDS = (
+    "id", "title_pl", "title_original", "ingredients_pl", "ingredients_original", "steps_pl", "tags",
+    "collections", "substitutions", "notes", "user_notes", "is_favorite", "raw_input", "author_name",
+    "author_bio", "author_image_url", "diet_tags", "prep_time_minutes", "cook_time_minutes", "user_rating",
+    "servings_override", "image_url", "detected_language", "target_language", "target_country", "target_city",
+    "created_at",
+)
+VARIANT_FIELDS = ("id", "variant_type", "title_pl", "ingredients_pl", "steps_pl", "notes", "created_at")
+CSV_COLUMNS = RECIPE_FIELDS + ("variants",)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, default=_json_default)
+
+
+def _recipe_batches(db: Session, user_id: int, batch_size: int) -> Iterator[list[dict]]:
+    """The user's recipes in id order, batch_size at a time, each with its "variants" list."""
+    stmt = (
+        select(*(getattr(models.Recipe, f) for f in RECIPE_FIELDS))
+        .where(models.Recipe.user_id == user_id)
+        .order_by(models.Recipe.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for partition in db.execute(stmt).partitions():
+        recipes = [dict(zip(RECIPE_FIELDS, row)) for row in partition]
+        variant_rows = db.execute(
+            select(models.RecipeVariant.recipe_id, *(getattr(models.RecipeVariant, f) for f in VARIANT_FIELDS))
+            .where(models.RecipeVariant.recipe_id.in_([r["id"] for r in recipes]))
+            .order_by(models.RecipeVariant.recipe_id, models.RecipeVariant.id)
+        )
+        variants = {
+            recipe_id: [dict(zip(VARIANT_FIELDS, row[1:])) for row in rows]
+            for recipe_id, rows in groupby(variant_rows, key=lambda row: row[0])
+        }
+        for recipe in recipes:
+            recipe["variants"] = variants.get(recipe["id"], [])
+        yield recipes
+
+
+def _image_entry(image_url: str | None) -> str | None:
+    """Name of the image inside the zip (images/<stored path>), None when it is not stored locally."""
+    path = image_store.file_path(image_url)
+    if path is None or not os.path.isfile(path):
+        return None
+    return "images/" + image_url[len(image_store.STATIC_URL_PREFIX) + 1:]
+
+
+def iter_jsonl(db: Session, user_id: int, batch_size: int = BATCH_SIZE, include_images: bool = False) -> Iterator[bytes]:
+    for batch in _recipe_batches(db, user_id, batch_size):
+        lines = []
+        for recipe in batch:
+            if include_images:
+                recipe["image_file"] = _image_entry(recipe["image_url"])
+            lines.append(_dumps(recipe) + "\n")
+        yield "".join(lines).encode("utf-8")
+
+
+def iter_csv(db: Session, user_id: int, batch_size: int = BATCH_SIZE) -> Iterator[bytes]:
+    """One row per recipe; list/dict columns (and the variants) as JSON text."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")  # BOM so spreadsheet apps read UTF-8
+    for batch in _recipe_batches(db, user_id, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        for recipe in batch:
+            writer.writerow(
+                [
+                    _dumps(v) if isinstance(v, (list, dict)) else (v.isoformat() if isinstance(v, datetime) else v)
+                    for v in (recipe[c] for c in CSV_COLUMNS)
+                ]
+            )
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, non-seekable buffer the zip is written into; drain() hands out what was written."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def _write_zip(sink: _ZipSink, db: Session, user_id: int, include_images: bool, batch_size: int) -> Iterator[None]:
+    """Write the archive into sink, pausing (yield) whenever there is output worth sending."""
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open("recipes.jsonl", mode="w") as entry:
+            for chunk in iter_jsonl(db, user_id, batch_size, include_images=include_images):
+                entry.write(chunk)
+                yield
+        if not include_images:
+            return
+        images = (
+            select(models.Recipe.image_url)
+            .where(models.Recipe.user_id == user_id, models.Recipe.image_url.is_not(None))
+            .distinct()
+            .order_by(models.Recipe.image_url)
+            .execution_options(yield_per=batch_size)
+        )
+        for (image_url,) in db.execute(images):
+            name = _image_entry(image_url)
+            if name is None:
+                continue
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED  # already compressed
+            with open(image_store.file_path(image_url), "rb") as src, archive.open(info, mode="w") as entry:
+                while chunk := src.read(_FILE_CHUNK):
+                    entry.write(chunk)
+                    yield
+
+
+def iter_zip(db: Session, user_id: int, include_images: bool = False, batch_size: int = BATCH_SIZE) -> Iterator[bytes]:
+    """recipes.jsonl (deflated) plus, with include_images, each stored image once under images/."""
+    sink = _ZipSink()
+    for _ in _write_zip(sink, db, user_id, include_images, batch_size):
+        data = sink.drain()
+        if data:
+            yield data
+    yield sink.drain()  # central directory
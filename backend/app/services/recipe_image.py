@@ -1,6 +1,14 @@
 """
 Recipe dish image: cache-first lookup by normalized title (and optional language),
 then on miss generate via OpenAI Images API and save to static storage.
+
+request_recipe_image() is the non-blocking entry point: an exact cache hit is applied at once, a
+miss marks the recipe image_status="pending" and queues one "recipes.image" job per cache key
+(recipes sharing a key wait on the same generation). Jobs run in their own lane of
+RECIPE_IMAGE_WORKERS workers, which bounds concurrent calls to the Images API. Files go through the
+content-addressed image_store, so an image shared by many recipes is stored once. Before generating,
+the job looks for a near-duplicate dish (services/dish_similarity) and reuses its image through an
+alias cache row. That scan is over the whole cache, so it never runs on the request path.
 """
 
 import base64
@@ -10,42 +18,44 @@ import re
 import unicodedata
 
 from openai import APIError, OpenAI, RateLimitError
-from sqlalchemy import select
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from .. import models
+from .. import metrics, models
+from ..jobs import JOB_QUEUED, JOB_RUNNING, enqueue_job, has_job
+from . import dish_similarity, image_store
+from .image_renditions import build_renditions
+from .image_store import STATIC_URL_PREFIX  # noqa: F401  (re-exported for callers of this module)
 
 logger = logging.getLogger(__name__)
 
-# Directory for saved images; served at /static/recipe-images/
-_BASE_DIR = os.getenv(
-    "RECIPE_IMAGES_DIR",
-    os.path.join(os.path.dirname(__file__), "..", "..", "static", "recipe-images"),
-)
-# URL path prefix stored in DB (no leading host)
-STATIC_URL_PREFIX = "/static/recipe-images"
+IMAGE_JOB_KIND = "recipes.image"
+IMAGE_JOB_LANE = "images"
+IMAGE_WORKERS = int(os.getenv("RECIPE_IMAGE_WORKERS", "2"))  # concurrent Images API calls per process
+IMAGE_PENDING = "pending"
+IMAGE_READY = "ready"
+IMAGE_FAILED = "failed"
 
 
 def get_storage_dir() -> str:
     """Return the directory path for recipe images (for user uploads)."""
-    _ensure_storage_dir()
-    return _BASE_DIR
+    return image_store.ensure_storage_dir()
+
+
+def _store(db: Session):
+    return lambda content, ext: image_store.store(db, content, ext)
 
 
-def save_user_upload(recipe_id: int, content: bytes, extension: str) -> str:
+def save_user_upload(db: Session, stream, max_bytes: int) -> tuple[str, dict | None]:
     """
-    Save user-uploaded image to disk. Returns the URL path to store on the recipe.
-    Does not update cache. extension should be e.g. 'jpg' or 'png'.
+    Stream a user-uploaded JPEG/PNG file object into the image store (see image_store.store_stream)
+    and build its responsive renditions from the stored file.
+    Returns (URL path to store on the recipe, renditions or None). Does not update cache.
+    Raises image_store.UploadRejected for empty, oversized or non-image uploads.
     """
-    _ensure_storage_dir()
-    ext = (extension or "jpg").lower().lstrip(".")
-    if ext not in ("jpg", "jpeg", "png"):
-        ext = "jpg"
-    filename = f"{recipe_id}-user.{ext}"
-    filepath = os.path.join(_BASE_DIR, filename)
-    with open(filepath, "wb") as f:
-        f.write(content)
-    return f"{STATIC_URL_PREFIX}/{filename}"
+    image_url, path = image_store.store_stream(db, stream, max_bytes)
+    return image_url, build_renditions(path, _store(db))
 
 
 _DESSERT_KEYWORDS = (
@@ -88,10 +98,6 @@ def _normalize_cache_key(
     return s[:220]  # cap length (slightly higher to allow _dessert)
 
 
-def _ensure_storage_dir() -> None:
-    os.makedirs(_BASE_DIR, exist_ok=True)
-
-
 def _generate_image_via_openai(prompt: str) -> bytes | None:
     """Call OpenAI Images API (DALL-E 2), return image bytes or None on failure."""
     api_key = os.getenv("OPENAI_API_KEY")
@@ -118,32 +124,16 @@ def _generate_image_via_openai(prompt: str) -> bytes | None:
         return None
 
 
-def get_or_create_recipe_image(
-    recipe: models.Recipe,
-    db: Session,
-) -> None:
-    """
-    Ensure recipe has an image_url: check cache by normalized title (+ language);
-    if cache hit, set recipe.image_url and return. On miss, generate image, save to disk,
-    insert cache row, set recipe.image_url. Commits at the end.
-    """
-    if recipe.image_url:
-        return
-    recipe_tags = getattr(recipe, "tags", None) or []
-    cache_key = _normalize_cache_key(
+def recipe_image_cache_key(recipe: models.Recipe) -> str:
+    return _normalize_cache_key(
         recipe.title_pl or recipe.title_original,
         recipe.target_language,
-        recipe_tags,
+        getattr(recipe, "tags", None) or [],
     )
-    # Cache lookup
-    cached = db.execute(
-        select(models.RecipeImageCache).where(models.RecipeImageCache.cache_key == cache_key)
-    ).scalars().first()
-    if cached:
-        recipe.image_url = cached.image_url
-        db.commit()
-        return
-    # Cache miss: generate and save
+
+
+def _image_prompt(recipe: models.Recipe) -> str:
+    recipe_tags = getattr(recipe, "tags", None) or []
     title = recipe.title_pl or recipe.title_original or "Dish"
     # Use tags + key ingredients to steer the image toward the actual dish
     tag_hint = ""
@@ -167,26 +157,323 @@ def get_or_create_recipe_image(
     if recipe_tags:
         tags_clause = " Tags for this recipe: " + ", ".join(str(t) for t in recipe_tags[:8]) + "."
     # Prefer no image over a wrong one: prompt must describe the exact dish (e.g. cheesecake → cheesecake, not a generic meal).
-    prompt = (
+    return (
         f"Realistic food photo of one finished dish only: '{title}'. The image must show exactly this type of dish — nothing else."
         f"{ingredients_clause}{tags_clause}{tag_hint}"
         " Show the cooked/plated dish only (no raw ingredients on their own), on a plate or in a bowl."
         " Natural lighting, close-up, high quality. No people, no hands, no text, no logos. Single dish that matches the recipe name."
     )
-    image_bytes = _generate_image_via_openai(prompt)
+
+
+def _cached_image(db: Session, cache_key: str) -> models.RecipeImageCache | None:
+    return db.execute(
+        select(models.RecipeImageCache).where(models.RecipeImageCache.cache_key == cache_key)
+    ).scalars().first()
+
+
+def _signature(recipe: models.Recipe) -> tuple[list[str], list[str]]:
+    return dish_similarity.dish_signature(
+        [recipe.title_pl, recipe.title_original], getattr(recipe, "ingredients_pl", None)
+    )
+
+
+def _row_signature(cache_key: str, title_tokens: list | None, ingredient_tokens: list | None):
+    if title_tokens is not None:
+        return title_tokens, ingredient_tokens or []
+    # Rows from before similarity tracking: recover title words from the key ("zupa_pomidorowa_pl_dessert").
+    parts = cache_key.split("_")
+    if parts and parts[-1] == "dessert":
+        parts = parts[:-1]
+    if len(parts) > 1 and len(parts[-1]) == 2:
+        parts = parts[:-1]
+    return sorted(dish_similarity.tokens(" ".join(parts))), []
+
+
+def _similar_image(db: Session, recipe: models.Recipe, cache_key: str) -> models.RecipeImageCache | None:
+    """
+    Most similar generated image (same dessert flag) scoring at least SIMILARITY_THRESHOLD, added as
+    an alias cache row under cache_key (not committed) so the next recipe with this key is an exact hit.
+    """
+    signature = _signature(recipe)
+    if not signature[0]:
+        return None
+    cache = models.RecipeImageCache
+    dessert = cache.cache_key.like("%\\_dessert", escape="\\")
+    candidates = db.execute(
+        select(cache.id, cache.cache_key, cache.title_tokens, cache.ingredient_tokens).where(
+            cache.canonical_key.is_(None),
+            dessert if cache_key.endswith("_dessert") else ~dessert,
+        )
+    ).all()
+    best_id, best_score = None, dish_similarity.SIMILARITY_THRESHOLD
+    for row_id, row_key, title_tokens, ingredient_tokens in candidates:
+        score = dish_similarity.similarity(signature, _row_signature(row_key, title_tokens, ingredient_tokens))
+        if score >= best_score and (best_id is None or score > best_score):
+            best_id, best_score = row_id, score
+    if best_id is None:
+        return None
+    source = db.get(cache, best_id)
+    alias = cache(
+        cache_key=cache_key,
+        image_url=source.image_url,
+        renditions=source.renditions,
+        canonical_key=source.cache_key,
+        title_tokens=signature[0],
+        ingredient_tokens=signature[1],
+        hit_count=0,
+    )
+    db.add(alias)
+    logger.info("Reusing image of %s for %s (similarity %.2f)", source.cache_key, cache_key, best_score)
+    return alias
+
+
+def _reusable_image(
+    db: Session, recipe: models.Recipe, cache_key: str, similar: bool = True
+) -> models.RecipeImageCache | None:
+    """
+    Exact cache hit, else (with similar) a near-duplicate's image; counts the hit on the row (not
+    committed). The near-duplicate scan reads the whole cache: keep it off the request path.
+    """
+    image = _cached_image(db, cache_key)
+    if image is not None:
+        metrics.incr("recipe_image.cache_hit")
+    else:
+        image = _similar_image(db, recipe, cache_key) if similar else None
+        if image is None:
+            return None
+        metrics.incr("recipe_image.similar_hit")
+    image.hit_count = (image.hit_count or 0) + 1
+    return image
+
+
+def _generate_and_store(db: Session, recipe: models.Recipe, cache_key: str) -> models.RecipeImageCache | None:
+    """
+    Generate the image for this recipe, save it with renditions and add the cache row (not committed).
+    When another worker stored a row for cache_key meanwhile, that row is returned instead.
+    """
+    image_bytes = _generate_image_via_openai(_image_prompt(recipe))
     if not image_bytes:
-        return
-    _ensure_storage_dir()
-    filename = f"{recipe.id}.jpg"
-    filepath = os.path.join(_BASE_DIR, filename)
+        return None
     try:
-        with open(filepath, "wb") as f:
-            f.write(image_bytes)
+        image_url = image_store.store(db, image_bytes, "jpg")
     except OSError as e:
-        logger.warning("Could not save recipe image to %s: %s", filepath, e)
+        logger.warning("Could not save image for recipe %s: %s", recipe.id, e)
+        return None
+    title_tokens, ingredient_tokens = _signature(recipe)
+    cache_row = models.RecipeImageCache(
+        cache_key=cache_key,
+        image_url=image_url,
+        renditions=build_renditions(image_bytes, _store(db)),
+        title_tokens=title_tokens,
+        ingredient_tokens=ingredient_tokens,
+    )
+    try:
+        with db.begin_nested():
+            db.add(cache_row)
+    except IntegrityError:  # the stored files stay unreferenced until garbage collection
+        logger.info("Image for %s was stored by another worker meanwhile", cache_key)
+        return _cached_image(db, cache_key)
+    return cache_row
+
+
+def _apply_image(recipe: models.Recipe, image: models.RecipeImageCache) -> None:
+    recipe.image_url = image.image_url
+    recipe.image_renditions = image.renditions
+    recipe.image_status = IMAGE_READY
+
+
+def get_or_create_recipe_image(
+    recipe: models.Recipe,
+    db: Session,
+) -> None:
+    """
+    Ensure recipe has an image_url: check cache by normalized title (+ language);
+    if cache hit, set recipe.image_url and return. On miss, generate image, save to disk,
+    insert cache row, set recipe.image_url. Commits at the end.
+    Blocks for the whole generation; request handlers use request_recipe_image() instead.
+    """
+    if recipe.image_url:
+        return
+    cache_key = recipe_image_cache_key(recipe)
+    image = _reusable_image(db, recipe, cache_key) or _generate_and_store(db, recipe, cache_key)
+    if image is None:
         return
-    image_url = f"{STATIC_URL_PREFIX}/{filename}"
-    cache_row = models.RecipeImageCache(cache_key=cache_key, image_url=image_url)
-    db.add(cache_row)
-    recipe.image_url = image_url
+    _apply_image(recipe, image)
     db.commit()
+
+
+def request_recipe_image(recipe: models.Recipe, db: Session) -> str | None:
+    """
+    Non-blocking: apply an exact cache hit now, or mark the recipe pending and queue a job, which
+    reuses a near-duplicate's image or generates one (at most one queued or running job per cache
+    key). Commits. Returns the recipe's image_status.
+    """
+    if recipe.image_url:
+        return recipe.image_status
+    cache_key = recipe_image_cache_key(recipe)
+    image = _reusable_image(db, recipe, cache_key, similar=False)
+    if image is None:
+        recipe.image_status = IMAGE_PENDING
+        recipe.image_cache_key = cache_key
+        db.commit()
+        # A running job sweeps up pending recipes after committing its image: look again, in case
+        # that sweep ran before this recipe was marked pending.
+        image = _reusable_image(db, recipe, cache_key, similar=False)
+    if image is not None:
+        _apply_image(recipe, image)
+        db.commit()
+        return IMAGE_READY
+    if has_job(db, IMAGE_JOB_KIND, cache_key, (JOB_QUEUED, JOB_RUNNING)) or enqueue_job(
+        db, IMAGE_JOB_KIND, {"cache_key": cache_key, "recipe_id": recipe.id}, dedup_key=cache_key
+    ) is None:
+        metrics.incr("recipe_image.deduplicated")
+    else:
+        metrics.incr("recipe_image.enqueued")
+    db.refresh(recipe)
+    return recipe.image_status
+
+
+def _pending_recipes_for_key(db: Session, cache_key: str) -> list[models.Recipe]:
+    return list(
+        db.execute(
+            select(models.Recipe).where(
+                models.Recipe.image_cache_key == cache_key,
+                models.Recipe.image_status == IMAGE_PENDING,
+                models.Recipe.image_url.is_(None),
+            )
+        ).scalars()
+    )
+
+
+def _apply_to_waiting(
+    db: Session, waiting: list[models.Recipe], image: models.RecipeImageCache | None, generated: bool
+) -> None:
+    for recipe in waiting:
+        if image is not None:
+            _apply_image(recipe, image)
+        else:
+            recipe.image_status = IMAGE_FAILED
+    if image is not None and waiting:
+        # Every waiting recipe but the one the image was generated for is served by the cache.
+        image.hit_count = (image.hit_count or 0) + len(waiting) - int(generated)
+    db.commit()
+
+
+def generate_pending_image(db: Session, cache_key: str, recipe_id: int | None = None) -> dict:
+    """
+    Worker side of request_recipe_image: generate once for cache_key and apply the image to every
+    recipe pending on that key, including those that started waiting during the generation (marks
+    them failed when generation fails). Commits.
+    """
+    waiting = _pending_recipes_for_key(db, cache_key)
+    image = _cached_image(db, cache_key)
+    generated = False
+    if image is None and waiting:
+        source = next((r for r in waiting if r.id == recipe_id), waiting[0])
+        # A near-duplicate may have been generated since this job was queued.
+        image = _similar_image(db, source, cache_key)
+        if image is None:
+            with metrics.timed("recipe_image.generate"):
+                image = _generate_and_store(db, source, cache_key)
+            generated = True
+        else:
+            metrics.incr("recipe_image.similar_hit")
+    _apply_to_waiting(db, waiting, image, generated)
+    # Recipes deduplicated against this running job since it collected its waiting list.
+    late = _pending_recipes_for_key(db, cache_key)
+    _apply_to_waiting(db, late, image, False)
+    waiting += late
+    status = IMAGE_READY if image is not None else IMAGE_FAILED
+    metrics.incr(f"recipe_image.{status}")
+    image_url = image.image_url if image is not None else None
+    return {"status": status, "image_url": image_url, "recipe_ids": [r.id for r in waiting]}
+
+
+def backfill_renditions(db: Session) -> int:
+    """Build renditions for stored images that have none (cache rows first, then recipes). Commits."""
+    built: dict[str, dict | None] = {}
+
+    def _for_url(image_url: str) -> dict | None:
+        if image_url not in built:
+            path = image_store.file_path(image_url)
+            renditions = None
+            if path and os.path.exists(path):
+                with open(path, "rb") as f:
+                    renditions = build_renditions(f.read(), _store(db))
+            built[image_url] = renditions
+        return built[image_url]
+
+    updated = 0
+    cache_rows = db.execute(
+        select(models.RecipeImageCache).where(models.RecipeImageCache.renditions.is_(None))
+    ).scalars()
+    for row in cache_rows:
+        row.renditions = _for_url(row.image_url)
+    for recipe in db.execute(
+        select(models.Recipe).where(models.Recipe.image_url.is_not(None), models.Recipe.image_renditions.is_(None))
+    ).scalars():
+        recipe.image_renditions = _for_url(recipe.image_url)
+        updated += recipe.image_renditions is not None
+    db.commit()
+    return updated
+
+
+def list_page_image_bytes(db: Session, page_size: int = 20) -> dict:
+    """
+    Bytes a recipe list page downloads for images: the original file per recipe ("before") versus
+    the WebP thumbnail ("after"; the original when a recipe has no renditions). Newest recipes first.
+    """
+    recipes = db.execute(
+        select(models.Recipe.image_url, models.Recipe.image_renditions)
+        .where(models.Recipe.image_url.is_not(None))
+        .order_by(models.Recipe.created_at.desc())
+        .limit(page_size)
+    ).all()
+
+    def _size(url: str | None) -> int:
+        path = image_store.file_path(url)
+        return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+    before = after = 0
+    for image_url, renditions in recipes:
+        original = _size(image_url)
+        thumb = (renditions or {}).get("thumb", {}).get("webp")
+        before += original
+        after += _size(thumb) if thumb else original
+    return {"recipes": len(recipes), "before_bytes": before, "after_bytes": after}
+
+
+def image_reuse_report(db: Session, top: int = 10) -> dict:
+    """
+    How many Images API generations the cache avoided: exact-key hits on generated rows, and
+    near-duplicate reuse (alias rows plus later exact hits on them), with the most reused dishes.
+    """
+    cache = models.RecipeImageCache
+    is_alias = cache.canonical_key.is_not(None)
+
+    def _totals(condition) -> tuple[int, int]:
+        rows, hits = db.execute(
+            select(func.count(cache.id), func.coalesce(func.sum(cache.hit_count), 0)).where(condition)
+        ).one()
+        return int(rows), int(hits)
+
+    generated, exact_hits = _totals(~is_alias)
+    aliases, similar_hits = _totals(is_alias)
+    top_rows = db.execute(
+        select(cache.canonical_key, func.count(cache.id), func.sum(cache.hit_count))
+        .where(is_alias)
+        .group_by(cache.canonical_key)
+        .order_by(func.sum(cache.hit_count).desc(), cache.canonical_key)
+        .limit(top)
+    ).all()
+    return {
+        "generated": generated,
+        "reused_exact": exact_hits,
+        "reused_similar": similar_hits,
+        "similar_aliases": aliases,
+        "generations_avoided": exact_hits + similar_hits,
+        "similarity_threshold": dish_similarity.SIMILARITY_THRESHOLD,
+        "top_reused": [
+            {"cache_key": key, "aliases": int(count), "hits": int(hits or 0)} for key, count, hits in top_rows
+        ],
+    }
@@ -1,9 +1,20 @@
-"""Starter recipes for new users: 3 recipes from famous cooks per country (AI + fallback)."""
+"""
+Starter recipes for new users: 3 recipes from famous cooks per country (AI + fallback).
+
+Sets depend only on (country, language, dish preferences, diets), so vetted AI sets are kept in the
+starter_recipe_sets catalog: onboarding reads it, and the LLM runs only for unseen combinations
+(or ahead of time via `python -m app.cli warm-starter-catalog`).
+"""
+import hashlib
 import json
 import logging
 import os
 
 from openai import APIError, OpenAI, RateLimitError
+from sqlalchemy.exc import IntegrityError
+
+from .. import metrics
+from .what_can_i_make_ai import recipe_complies_with_diets
 
 logger = logging.getLogger(__name__)
 
@@ -242,6 +253,110 @@ def get_starter_recipes(
     return out[:3]
 
 
+# Locales warmed by default (country, language); diets warmed for each: none plus the common ones.
+TOP_LOCALES = (
+    ("PL", "pl"), ("IL", "he"), ("US", "en"), ("GB", "en"), ("DE", "de"), ("FR", "fr"), ("ES", "es"), ("IT", "it"),
+)
+TOP_DIET_SETS = ((), ("vegetarian",), ("vegan",), ("kosher",), ("gluten_free",))
+
+
+def _norm_list(values: list[str] | None) -> list[str]:
+    return sorted({(v or "").strip().lower() for v in (values or []) if (v or "").strip()})
+
+
+def catalog_key(
+    target_country: str,
+    target_language: str,
+    dish_preferences: list[str] | None = None,
+    diet_filters: list[str] | None = None,
+) -> str:
+    """Stable key for a starter set: order and case of dish preferences / diets do not matter."""
+    parts = {
+        "country": (target_country or "").strip().upper(),
+        "language": (target_language or "en").strip().lower(),
+        "dishes": _norm_list(dish_preferences),
+        "diets": _norm_list(diet_filters),
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _is_vetted(recipes_data: list[dict], target_language: str, diet_filters: list[str] | None) -> bool:
+    """Only full AI sets go into the catalog: 3 recipes, no fallback padding, diet-compliant."""
+    fallback = _fallback_recipes(target_language)
+    if len(recipes_data) != 3 or any(r in fallback for r in recipes_data):
+        return False
+    return all(
+        r.get("ingredients") and r.get("steps") and recipe_complies_with_diets(r, diet_filters) for r in recipes_data
+    )
+
+
+def get_catalog_starter_recipes(
+    db,
+    target_country: str,
+    target_language: str,
+    dish_preferences: list[str] | None = None,
+    diet_filters: list[str] | None = None,
+    refresh: bool = False,
+) -> list[dict]:
+    """
+    Starter set from the catalog; on a miss (or refresh) generate it with get_starter_recipes and
+    store it when vetted. Fallback sets are returned but never cached, so the next call retries AI.
+    """
+    from .. import models
+
+    key = catalog_key(target_country, target_language, dish_preferences, diet_filters)
+    row = db.query(models.StarterRecipeSet).filter(models.StarterRecipeSet.catalog_key == key).first()
+    if row is not None and not refresh:
+        metrics.incr("starter.catalog.hit")
+        return list(row.recipes_data)
+    metrics.incr("starter.catalog.miss")
+    recipes_data = get_starter_recipes(
+        target_country, target_language, dish_preferences=dish_preferences, diet_filters=diet_filters
+    )
+    if not _is_vetted(recipes_data, target_language, diet_filters):
+        metrics.incr("starter.catalog.not_vetted")
+        return recipes_data
+    if row is None:
+        row = models.StarterRecipeSet(
+            catalog_key=key,
+            target_country=(target_country or "").strip().upper(),
+            target_language=(target_language or "en").strip().lower(),
+            dish_preferences=_norm_list(dish_preferences),
+            diet_filters=_norm_list(diet_filters),
+            recipes_data=recipes_data,
+        )
+        db.add(row)
+    else:
+        row.recipes_data = recipes_data
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()  # a concurrent request stored the same combination first
+    return recipes_data
+
+
+def warm_starter_catalog(
+    db,
+    locales: list[tuple[str, str]],
+    diet_sets: list[tuple[str, ...]],
+    refresh: bool = False,
+) -> tuple[int, int]:
+    """Populate the catalog for every locale x diet set (no dish preferences). Returns (generated, already_present)."""
+    from .. import models
+
+    generated = present = 0
+    for country, language in locales:
+        for diets in diet_sets:
+            key = catalog_key(country, language, None, list(diets))
+            exists = db.query(models.StarterRecipeSet.id).filter(models.StarterRecipeSet.catalog_key == key).first()
+            if exists and not refresh:
+                present += 1
+                continue
+            get_catalog_starter_recipes(db, country, language, None, list(diets) or None, refresh=refresh)
+            generated += 1
+    return generated, present
+
+
 def ensure_starter_recipes_for_user(user, db) -> None:
     """
     If this user has 0 recipes and has not yet received starter recipes, create 3 and set starter_recipes_added.
@@ -254,7 +369,8 @@ def ensure_starter_recipes_for_user(user, db) -> None:
     count = db.query(models.Recipe).filter(models.Recipe.user_id == user.id).count()
     if count > 0:
         return
-    recipes_data = get_starter_recipes(
+    recipes_data = get_catalog_starter_recipes(
+        db,
         user.target_country,
         user.target_language,
         dish_preferences=user.dish_preferences or None,
@@ -0,0 +1,256 @@
+"""
+Recipes embedded as structured data in a page's HTML: schema.org Recipe in JSON-LD, schema.org
+microdata, or the microformats2 h-recipe class names.
+
+Most recipe sites publish one of these, so URL import can build translate input straight from the
+markup and skip the extraction LLM call. extract_structured_recipes() only returns complete
+recipes (ingredients and instructions); anything less falls back to the text + LLM path.
+"""
+import html
+import json
+import re
+import time
+from html.parser import HTMLParser
+
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+_BLOCK_TAGS = {"p", "li", "div", "br", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "ol", "ul"}
+_TAG_RE = re.compile(r"<[^>]+>")
+_WS_RE = re.compile(r"[ \t\r\f\v]+")
+
+_MICRODATA_FIELDS = {
+    "name": "title",
+    "recipeIngredient": "ingredients",
+    "ingredients": "ingredients",
+    "recipeInstructions": "instructions",
+}
+_H_RECIPE_FIELDS = {
+    "p-name": "title",
+    "p-ingredient": "ingredients",
+    "e-instructions": "instructions",
+    "p-instructions": "instructions",
+}
+
+
+def _clean(value) -> str:
+    text = html.unescape(_TAG_RE.sub(" ", str(value or "")))
+    return _WS_RE.sub(" ", text).strip()
+
+
+def _lines(value) -> list[str]:
+    """Non-empty cleaned lines of a text block (one step / ingredient per line)."""
+    text = html.unescape(_TAG_RE.sub("\n", str(value or "")))
+    return [line for line in (_WS_RE.sub(" ", part).strip() for part in text.split("\n")) if line]
+
+
+def _is_recipe_type(value) -> bool:
+    types = value if isinstance(value, list) else [value]
+    return any(isinstance(t, str) and t.rsplit("/", 1)[-1] == "Recipe" for t in types)
+
+
+def _json_ld_instructions(value) -> list[str]:
+    if isinstance(value, str):
+        return _lines(value)
+    if isinstance(value, list):
+        out: list[str] = []
+        for item in value:
+            out.extend(_json_ld_instructions(item))
+        return out
+    if isinstance(value, dict):
+        # HowToSection / ItemList nest steps; HowToStep carries text (or only a name).
+        if "itemListElement" in value:
+            return _json_ld_instructions(value["itemListElement"])
+        step = _clean(value.get("text") or value.get("name") or "")
+        return [step] if step else []
+    return []
+
+
+def _json_ld_ingredients(value) -> list[str]:
+    if isinstance(value, str):
+        return _lines(value)
+    if isinstance(value, list):
+        return [s for s in (_clean(v) for v in value if isinstance(v, (str, int, float))) if s]
+    return []
+
+
+def _walk_json_ld(node, found: list[dict]) -> None:
+    if isinstance(node, list):
+        for item in node:
+            _walk_json_ld(item, found)
+        return
+    if not isinstance(node, dict):
+        return
+    if _is_recipe_type(node.get("@type")):
+        found.append(
+            {
+                "title": _clean(node.get("name")) or "Untitled",
+                "ingredients": _json_ld_ingredients(node.get("recipeIngredient") or node.get("ingredients")),
+                "instructions": _json_ld_instructions(node.get("recipeInstructions")),
+            }
+        )
+        return
+    for key in ("@graph", "mainEntity", "mainEntityOfPage", "hasPart", "itemListElement", "item"):
+        if key in node:
+            _walk_json_ld(node[key], found)
+
+
+class _StructuredDataParser(HTMLParser):
+    """One pass over the HTML collecting JSON-LD blocks and microdata / h-recipe scopes."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.json_ld: list[str] = []
+        self.microdata: list[dict] = []
+        self.h_recipes: list[dict] = []
+        self._ld_parts: list[str] | None = None
+        self._depth = 0
+        self._open: list[str] = []
+        self._scopes: list[dict] = []  # {"kind", "depth", "data"}
+        self._ignore_depth: int | None = None  # nested non-recipe itemscope (author, nutrition, ...)
+        self._capture: dict | None = None  # {"scope", "field", "depth", "parts"}
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "script":
+            if (attrs.get("type") or "").strip().lower() == "application/ld+json":
+                self._ld_parts = []
+        if tag in _BLOCK_TAGS and self._capture is not None:
+            self._capture["parts"].append("\n")
+        if tag in _VOID_TAGS:
+            if tag == "meta" and attrs.get("itemprop") and attrs.get("content") is not None:
+                self._field_value(attrs["itemprop"], attrs["content"])
+            return
+        self._open.append(tag)
+        self._depth += 1
+        classes = (attrs.get("class") or "").split()
+        itemprop = attrs.get("itemprop") or ""
+        if "itemscope" in attrs and _is_recipe_type((attrs.get("itemtype") or "").split()):
+            self._scopes.append({"kind": "microdata", "depth": self._depth, "data": _empty()})
+            return
+        if "h-recipe" in classes:
+            self._scopes.append({"kind": "h", "depth": self._depth, "data": _empty()})
+            return
+        if not self._scopes or self._capture is not None or self._ignore_depth is not None:
+            return
+        scope = self._scopes[-1]
+        if scope["kind"] == "microdata":
+            if "itemscope" in attrs and itemprop != "recipeInstructions":
+                self._ignore_depth = self._depth
+                return
+            field = _MICRODATA_FIELDS.get(itemprop)
+        else:
+            field = next((_H_RECIPE_FIELDS[c] for c in classes if c in _H_RECIPE_FIELDS), None)
+        if field:
+            self._capture = {"scope": scope, "field": field, "depth": self._depth, "parts": []}
+
+    def handle_endtag(self, tag):
+        if tag == "script" and self._ld_parts is not None:
+            self.json_ld.append("".join(self._ld_parts))
+            self._ld_parts = None
+        if tag not in self._open:
+            return  # stray end tag
+        while self._open:
+            closed = self._open.pop()
+            self._close_depth(self._depth)
+            self._depth -= 1
+            if closed == tag:
+                break
+
+    def handle_data(self, data):
+        if self._ld_parts is not None:
+            self._ld_parts.append(data)
+        elif self._capture is not None:
+            self._capture["parts"].append(data)
+
+    def _close_depth(self, depth: int) -> None:
+        if self._capture is not None and self._capture["depth"] == depth:
+            capture, self._capture = self._capture, None
+            _add(capture["scope"]["data"], capture["field"], "".join(capture["parts"]))
+        if self._ignore_depth == depth:
+            self._ignore_depth = None
+        if self._scopes and self._scopes[-1]["depth"] == depth:
+            scope = self._scopes.pop()
+            (self.microdata if scope["kind"] == "microdata" else self.h_recipes).append(scope["data"])
+
+    def _field_value(self, itemprop: str, value: str) -> None:
+        if self._scopes and self._scopes[-1]["kind"] == "microdata" and self._ignore_depth is None:
+            field = _MICRODATA_FIELDS.get(itemprop)
+            if field:
+                _add(self._scopes[-1]["data"], field, value)
+
+
+def _empty() -> dict:
+    return {"title": "", "ingredients": [], "instructions": []}
+
+
+def _add(data: dict, field: str, text: str) -> None:
+    if field == "title":
+        data["title"] = data["title"] or _clean(text)
+    elif field == "ingredients":
+        value = _clean(text)
+        if value:
+            data["ingredients"].append(value)
+    else:
+        data["instructions"].extend(_lines(text))
+
+
+def _complete(recipes: list[dict]) -> list[dict]:
+    out = []
+    for r in recipes:
+        if r["ingredients"] and r["instructions"]:
+            out.append({**r, "title": r["title"] or "Untitled"})
+    return out
+
+
+def extract_structured_recipes(page_html: str) -> list[dict]:
+    """
+    Complete recipes ({"title", "ingredients", "instructions"}, the shape extract_recipes_from_page
+    returns) from JSON-LD, else microdata, else h-recipe markup. Empty when none is complete.
+    """
+    if not page_html:
+        return []
+    parser = _StructuredDataParser()
+    try:
+        parser.feed(page_html)
+        parser.close()
+    except (AssertionError, ValueError):  # badly broken markup
+        pass
+    found: list[dict] = []
+    for block in parser.json_ld:
+        try:
+            _walk_json_ld(json.loads(block.strip()), found)
+        except ValueError:
+            continue
+    for source in (found, parser.microdata, parser.h_recipes):
+        recipes = _complete(source)
+        if recipes:
+            return recipes
+    return []
+
+
+def measure_corpus(pages: dict[str, str], llm_extract=None) -> dict:
+    """
+    Coverage of the structured-data path over saved pages ({name: html}) and its parse time.
+    With llm_extract(html), also time the LLM extraction the structured pages no longer need.
+    """
+    covered, parse_ms, llm_ms = [], 0.0, []
+    for name, page_html in sorted(pages.items()):
+        start = time.perf_counter()
+        recipes = extract_structured_recipes(page_html)
+        parse_ms += (time.perf_counter() - start) * 1000
+        if not recipes:
+            continue
+        covered.append({"page": name, "recipes": len(recipes)})
+        if llm_extract is not None:
+            start = time.perf_counter()
+            llm_extract(page_html)
+            llm_ms.append((time.perf_counter() - start) * 1000)
+    report = {
+        "pages": len(pages),
+        "covered": covered,
+        "recipes": sum(c["recipes"] for c in covered),
+        "parse_ms": round(parse_ms, 2),
+    }
+    if llm_ms:
+        report["llm_ms_avg"] = round(sum(llm_ms) / len(llm_ms), 1)
+        report["llm_ms_saved"] = round(sum(llm_ms), 1)
+    return report
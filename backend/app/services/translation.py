@@ -121,6 +121,71 @@ def _is_recipe(raw_input: str, client: OpenAI) -> bool:
     return bool(data.get("is_recipe", True))
 
 
+def _looks_like_recipe_heuristic(text: str) -> bool:
+    """Heuristic fallback so obviously recipe-like text is accepted even if classifier is unsure."""
+    lowered = (text or "").lower()
+    keywords = [
+        "ingredients",
+        "ingredienti",
+        "sk\u0142adniki",  # PL
+        "\u05de\u05e6\u05e8\u05db\u05d9\u05dd",  # he: ingredients
+        "instructions",
+        "preparation",
+        "\u05d4\u05d5\u05e8\u05d0\u05d5\u05ea \u05d4\u05db\u05e0\u05d4",  # he: preparation steps
+        "step 1",
+        "step 2",
+    ]
+    if any(k in lowered for k in keywords):
+        return True
+    # Long-ish text with numbered steps is very likely to be a recipe.
+    if lowered.count("\n") >= 5 and any(token in lowered for token in ["1.", "2.", "3."]):
+        return True
+    return False
+
+
+def _translation_messages(
+    raw_input: str,
+    client: OpenAI,
+    target_language: str,
+    target_country: str,
+) -> tuple[list[dict], str]:
+    """Classify + detect language, then build the translate prompt. Returns (messages, source_lang)."""
+    if not _is_recipe(raw_input, client) and not _looks_like_recipe_heuristic(raw_input):
+        raise ValueError("NOT_A_RECIPE: classifier=false")
+    source_lang = detect_language(raw_input, client)
+
+    local_lang = COUNTRY_TO_LOCAL_LANG.get((target_country or "").strip().upper()) or target_language
+    recipe_lang_name = LANG_DISPLAY_NAMES.get((target_language or "").strip().lower(), (target_language or "English"))
+    local_lang_name = LANG_DISPLAY_NAMES.get((local_lang or "").strip().lower(), (local_lang or ""))
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": USER_PROMPT_TEMPLATE.format(
+                source_lang=source_lang,
+                target_lang=target_language,
+                target_country=target_country,
+                raw_input=raw_input,
+                recipe_lang_name=recipe_lang_name,
+                local_lang_name=local_lang_name,
+            ),
+        },
+    ]
+    return messages, source_lang
+
+
+def _raise_openai_error(e: Exception):
+    """Map OpenAI rate-limit/quota errors to RuntimeError (routers turn these into 503)."""
+    if isinstance(e, RateLimitError):
+        raise RuntimeError("OpenAI rate limit exceeded, please try again later.") from e
+    message = str(e)
+    if "insufficient_quota" in message or "exceeded your current quota" in message:
+        raise RuntimeError(
+            "OpenAI quota exceeded, please check your plan and billing."
+        ) from e
+    raise e
+
+
 def translate_recipe(
     raw_input: str,
     target_language: str,
@@ -137,65 +202,17 @@ def translate_recipe(
         raise RuntimeError("OPENAI_API_KEY is not configured on the server.")
 
     client = OpenAI(api_key=api_key)
-
-    def _looks_like_recipe_heuristic(text: str) -> bool:
-        """Heuristic fallback so obviously recipe-like text is accepted even if classifier is unsure."""
-        lowered = (text or "").lower()
-        keywords = [
-            "ingredients",
-            "ingredienti",
-            "sk\u0142adniki",  # PL
-            "\u05de\u05e6\u05e8\u05db\u05d9\u05dd",  # he: ingredients
-            "instructions",
-            "preparation",
-            "\u05d4\u05d5\u05e8\u05d0\u05d5\u05ea \u05d4\u05db\u05e0\u05d4",  # he: preparation steps
-            "step 1",
-            "step 2",
-        ]
-        if any(k in lowered for k in keywords):
-            return True
-        # Long-ish text with numbered steps is very likely to be a recipe.
-        if lowered.count("\n") >= 5 and any(token in lowered for token in ["1.", "2.", "3."]):
-            return True
-        return False
-
-    if not _is_recipe(raw_input, client) and not _looks_like_recipe_heuristic(raw_input):
-        raise ValueError("NOT_A_RECIPE: classifier=false")
-    source_lang = detect_language(raw_input, client)
-
-    local_lang = COUNTRY_TO_LOCAL_LANG.get((target_country or "").strip().upper()) or target_language
-    recipe_lang_name = LANG_DISPLAY_NAMES.get((target_language or "").strip().lower(), (target_language or "English"))
-    local_lang_name = LANG_DISPLAY_NAMES.get((local_lang or "").strip().lower(), (local_lang or ""))
+    messages, source_lang = _translation_messages(raw_input, client, target_language, target_country)
 
     try:
         response = client.chat.completions.create(
             model="gpt-4o",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {
-                    "role": "user",
-                    "content": USER_PROMPT_TEMPLATE.format(
-                        source_lang=source_lang,
-                        target_lang=target_language,
-                        target_country=target_country,
-                        raw_input=raw_input,
-                        recipe_lang_name=recipe_lang_name,
-                        local_lang_name=local_lang_name,
-                    ),
-                },
-            ],
+            messages=messages,
             response_format={"type": "json_object"},
             temperature=0.2,
         )
-    except RateLimitError as e:
-        raise RuntimeError("OpenAI rate limit exceeded, please try again later.") from e
-    except APIError as e:
-        message = str(e)
-        if "insufficient_quota" in message or "exceeded your current quota" in message:
-            raise RuntimeError(
-                "OpenAI quota exceeded, please check your plan and billing."
-            ) from e
-        raise
+    except (RateLimitError, APIError) as e:
+        _raise_openai_error(e)
 
     content = response.choices[0].message.content
     try:
@@ -207,6 +224,58 @@ def translate_recipe(
     return result
 
 
+def translate_recipe_stream(
+    raw_input: str,
+    target_language: str,
+    target_country: str,
+    target_city: str,
+):
+    """
+    Streaming variant of translate_recipe. Yields events as the model writes its JSON:
+      ("field", key, value) / ("item", key, index, value) from PartialJSONObjectParser,
+    and finally ("result", dict) with the same shape translate_recipe returns.
+    Classification and language detection run first (small, fast calls), so NOT_A_RECIPE
+    and configuration errors are raised before anything is yielded.
+    """
+    from .partial_json import PartialJSONObjectParser
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY is not configured on the server.")
+
+    client = OpenAI(api_key=api_key)
+    messages, source_lang = _translation_messages(raw_input, client, target_language, target_country)
+
+    try:
+        stream = client.chat.completions.create(
+            model="gpt-4o",
+            messages=messages,
+            response_format={"type": "json_object"},
+            temperature=0.2,
+            stream=True,
+        )
+    except (RateLimitError, APIError) as e:
+        _raise_openai_error(e)
+
+    parser = PartialJSONObjectParser()
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            if delta:
+                yield from parser.feed(delta)
+    except (RateLimitError, APIError) as e:
+        _raise_openai_error(e)
+
+    try:
+        result = json.loads(parser.text())
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Model returned invalid JSON: {e}") from e
+    result["detected_language"] = source_lang
+    yield ("result", result)
+
+
 EXTRACT_RECIPES_SYSTEM = """You are extracting recipes from a webpage.
 
 Your goal is to detect ALL complete recipes that appear on the page.
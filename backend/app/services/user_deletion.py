@@ -3,6 +3,7 @@
 from sqlalchemy.orm import Session
 
 from .. import models
+from . import image_store
 
 
 def delete_user_and_data(user_id: int, db: Session) -> None:
@@ -15,12 +16,22 @@ def delete_user_and_data(user_id: int, db: Session) -> None:
     db.query(models.ShoppingListCache).filter(models.ShoppingListCache.user_id == user_id).delete(
         synchronize_session=False
     )
-    # Recipes (RecipeVariant cascades via relationship)
+    # Recipes (RecipeVariant cascades via relationship); the bulk delete skips ORM events, so drop
+    # their image references here and let the caller collect_garbage() after commit
+    image_store.release(
+        db,
+        db.query(models.Recipe.image_url, models.Recipe.image_renditions)
+        .filter(models.Recipe.user_id == user_id, models.Recipe.image_url.is_not(None))
+        .all(),
+    )
     db.query(models.Recipe).filter(models.Recipe.user_id == user_id).delete(synchronize_session=False)
     # Unlink ingredient substitutions created by this user
     db.query(models.IngredientSubstitution).filter(
         models.IngredientSubstitution.created_by_user_id == user_id
     ).update({models.IngredientSubstitution.created_by_user_id: None})
+    db.query(models.QuotaLedgerEntry).filter(models.QuotaLedgerEntry.user_id == user_id).delete(
+        synchronize_session=False
+    )
     # User
     user = db.get(models.User, user_id)
     if user:
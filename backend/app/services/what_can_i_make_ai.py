@@ -2,9 +2,12 @@
 import json
 import os
 import re
+import time
 
 from openai import APIError, OpenAI, RateLimitError
 
+from .. import metrics
+
 
 def _recipe_text(recipe: dict) -> str:
     """Full recipe text (title + ingredients + steps) for diet compliance checks."""
@@ -358,50 +361,8 @@ Return exactly this JSON (up to {num_recipes} recipes):
 """
 
 
-def suggest_recipes_from_preferences(
-    dish_types: list[str] | None = None,
-    diet_filters: list[str] | None = None,
-    num_recipes: int = 3,
-    servings: int | None = None,
-    max_time_minutes: int | None = None,
-    target_language: str = "en",
-    keywords: str | None = None,
-    ingredients_text: str | None = None,
-    measurement_system: str = "metric",
-    allergens: list[str] | None = None,
-    custom_avoid_text: str | None = None,
-) -> list[dict]:
-    """
-    Return up to N suggested recipes matching preferences: [{ title, ingredients, steps }, ...].
-    Raises RuntimeError on missing API key or rate limit.
-    """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY is not configured on the server.")
-    dish_list = ", ".join((s or "").strip() for s in (dish_types or []) if (s or "").strip()) or "any"
-    diet_list = _diet_list_for_prompt(diet_filters)
-    allergen_list = ", ".join((s or "").strip() for s in (allergens or []) if (s or "").strip()) or "none"
-    avoid_terms = (custom_avoid_text or "").strip() or "none"
-    max_time = str(max_time_minutes) if max_time_minutes and max_time_minutes > 0 else "no limit"
-    keywords_text = (keywords or "").strip() or "none specified"
-    ingredients_focus = (ingredients_text or "").strip() or "none specified"
-    output_lang = _output_lang_name(target_language)
-    measurement_units = "imperial" if (measurement_system or "").strip().lower() == "imperial" else "metric"
-    servings_str = str(int(servings)) if servings is not None and int(servings) > 0 else "default"
-    prompt = DISCOVER_USER_TEMPLATE.format(
-        dish_list=dish_list,
-        diet_list=diet_list,
-        num_recipes=str(max(1, min(10, int(num_recipes or 3)))),
-        servings=servings_str,
-        max_time=max_time,
-        allergen_list=allergen_list,
-        avoid_terms=avoid_terms,
-        keywords=keywords_text,
-        ingredients_text=ingredients_focus,
-        output_lang=output_lang,
-        measurement_units=measurement_units,
-    )
-    client = OpenAI(api_key=api_key)
+def _discover_completion(client: OpenAI, prompt: str) -> list[dict]:
+    """One discover call; returns normalized candidates (not yet compliance-checked)."""
     try:
         response = client.chat.completions.create(
             model="gpt-4o-mini",
@@ -427,10 +388,8 @@ def suggest_recipes_from_preferences(
         data = json.loads(content)
     except json.JSONDecodeError:
         return []
-    recipes = data.get("recipes") or data.get("suggestions") or []
     out = []
-    n = max(1, min(10, int(num_recipes or 3)))
-    for r in recipes[:n]:
+    for r in data.get("recipes") or data.get("suggestions") or []:
         if isinstance(r, dict) and r.get("title"):
             calories_raw = r.get("estimated_calories", r.get("calories"))
             try:
@@ -439,18 +398,95 @@ def suggest_recipes_from_preferences(
                     calories = None
             except Exception:
                 calories = None
-            rec = {
+            out.append({
                 "title": str(r.get("title", "")).strip(),
                 "estimated_calories": calories,
                 "ingredients": [str(x).strip() for x in r.get("ingredients", []) if x],
                 "steps": [str(x).strip() for x in r.get("steps", []) if x],
                 "missing_ingredients": None,
-            }
-            # Only include recipes that comply with diets and allergens (full recipe check).
-            if not recipe_complies_with_diets(rec, diet_filters):
+            })
+    return out
+
+
+def suggest_recipes_from_preferences(
+    dish_types: list[str] | None = None,
+    diet_filters: list[str] | None = None,
+    num_recipes: int = 3,
+    servings: int | None = None,
+    max_time_minutes: int | None = None,
+    target_language: str = "en",
+    keywords: str | None = None,
+    ingredients_text: str | None = None,
+    measurement_system: str = "metric",
+    allergens: list[str] | None = None,
+    custom_avoid_text: str | None = None,
+) -> list[dict]:
+    """
+    Return up to N suggested recipes matching preferences: [{ title, ingredients, steps }, ...].
+    Asks for a calibrated surplus (learned per-filter rejection rates) and, when the compliance
+    filters still leave it short, makes one targeted follow-up call if the latency budget allows.
+    Raises RuntimeError on missing API key or rate limit.
+    """
+    from . import overgenerate  # imports this module's compliance checks
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY is not configured on the server.")
+    n = max(1, min(10, int(num_recipes or 3)))
+    avoid_terms_list = [p.strip() for p in (custom_avoid_text or "").split(",") if (p or "").strip()]
+    filter_keys = overgenerate.filter_keys(diet_filters, allergens, avoid_terms_list)
+    template_args = {
+        "dish_list": ", ".join((s or "").strip() for s in (dish_types or []) if (s or "").strip()) or "any",
+        "diet_list": _diet_list_for_prompt(diet_filters),
+        "servings": str(int(servings)) if servings is not None and int(servings) > 0 else "default",
+        "max_time": str(max_time_minutes) if max_time_minutes and max_time_minutes > 0 else "no limit",
+        "allergen_list": ", ".join((s or "").strip() for s in (allergens or []) if (s or "").strip()) or "none",
+        "avoid_terms": (custom_avoid_text or "").strip() or "none",
+        "keywords": (keywords or "").strip() or "none specified",
+        "ingredients_text": (ingredients_text or "").strip() or "none specified",
+        "output_lang": _output_lang_name(target_language),
+        "measurement_units": "imperial" if (measurement_system or "").strip().lower() == "imperial" else "metric",
+    }
+    client = OpenAI(api_key=api_key)
+    deadline = time.monotonic() + overgenerate.LATENCY_BUDGET_S
+    ask = overgenerate.surplus_size(n, filter_keys)
+    out: list[dict] = []
+    titles: set[str] = set()
+    rejected: dict[str, int] = {}
+    calls = 0
+    while True:
+        prompt = DISCOVER_USER_TEMPLATE.format(num_recipes=str(ask), **template_args)
+        if calls:
+            prompt += overgenerate.top_up_hint(rejected, [r["title"] for r in out])
+        started = time.monotonic()
+        candidates = _discover_completion(client, prompt)
+        calls += 1
+        for rec in candidates:
+            if rec["title"].lower() in titles:
                 continue
-            avoid_terms_list = [p.strip() for p in (custom_avoid_text or "").split(",") if (p or "").strip()]
-            if not recipe_complies_with_allergens(rec, allergens, avoid_terms_list if avoid_terms_list else None):
+            # Only include recipes that comply with diets and allergens (full recipe check).
+            failed = overgenerate.check(rec, diet_filters, allergens, avoid_terms_list)
+            if failed:
+                for key in failed:
+                    rejected[key] = rejected.get(key, 0) + 1
                 continue
+            titles.add(rec["title"].lower())
             out.append(rec)
-    return out
+        if len(out) >= n or calls > 1:
+            break
+        if time.monotonic() + (time.monotonic() - started) > deadline:
+            metrics.incr("discover.ai.top_up_skipped")
+            break
+        metrics.incr("discover.ai.top_up")
+        ask = overgenerate.surplus_size(n - len(out), filter_keys)
+
+    metrics.incr("discover.ai.requests")
+    metrics.incr("discover.ai.calls", calls)
+    metrics.incr("discover.ai.candidates_rejected", sum(rejected.values()))
+    if len(out) >= n:
+        metrics.incr("discover.ai.fulfilled")
+        if calls > 1:
+            metrics.incr("discover.ai.fulfilled_by_top_up")  # a user retry saved
+    else:
+        metrics.incr("discover.ai.short")
+    return out[:n]
@@ -0,0 +1,20 @@
+"""Server-Sent Events helpers shared by streaming endpoints (jobs, translation, meal plans)."""
+import json
+
+# Disable proxy buffering (nginx/Railway) so events reach the client as they are produced.
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+def sse_event(event: str, data) -> str:
+    """Format one SSE message; data is JSON-encoded on a single line."""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def sse_comment(text: str = "keep-alive") -> str:
+    """SSE comment line; ignored by EventSource but keeps idle connections open."""
+    return f": {text}\n\n"
@@ -6,6 +6,7 @@ modules, so the app engine is created against the test DB.
 """
 import base64
 import hashlib
+import json
 import os
 from pathlib import Path
 from unittest.mock import patch
@@ -17,6 +18,7 @@ os.environ["SECRET_KEY"] = "test-secret-for-tests-only"
 os.environ["OPENAI_API_KEY"] = "test-openai-key"
 os.environ["ADMIN_TOKEN"] = "test-admin-token"
 os.environ["TESTING"] = "1"
+os.environ["JOB_BACKEND"] = "inline"  # background jobs run synchronously inside the request
 
 import pytest
 from fastapi.testclient import TestClient
@@ -25,7 +27,8 @@ from sqlalchemy.orm import sessionmaker
 
 from app.database import Base, get_db
 from app.main import app
-from app import models
+from app import auth_cache, models
+from app.quota import settle_reservations
 
 TEST_DATABASE_URL = f"sqlite:///{_TEST_DB_PATH.as_posix()}"
 
@@ -36,7 +39,8 @@ TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 def override_get_db():
     db = TestSessionLocal()
     try:
-        yield db
+        with settle_reservations(db):
+            yield db
     finally:
         db.close()
 
@@ -81,6 +85,7 @@ def clean_tables():
         db.commit()
     finally:
         db.close()
+    auth_cache.clear()  # ids are reused once the tables are emptied
 
 
 @pytest.fixture
@@ -183,6 +188,58 @@ MOCK_TRANSLATED = {
 }
 
 
+def add_recipe(db, user_id: int, title: str = "Zupa pomidorowa", ingredients: list | None = None, **overrides):
+    """Insert a recipe straight into the DB (no AI call) and commit it; overrides set any other column."""
+    ingredients = ingredients or ["500g pomidory"]
+    fields = {
+        "user_id": user_id,
+        "title_pl": title,
+        "title_original": title,
+        "ingredients_pl": ingredients,
+        "ingredients_original": ingredients,
+        "steps_pl": ["Gotuj."],
+        "tags": [],
+        "substitutions": {},
+        "notes": {},
+        "raw_input": title,
+        "target_language": "pl",
+        "target_country": "PL",
+    }
+    recipe = models.Recipe(**{**fields, **overrides})
+    db.add(recipe)
+    db.commit()
+    db.refresh(recipe)
+    return recipe
+
+
+def set_quota(user_id: int, used: int, limit: int) -> None:
+    db = TestSessionLocal()
+    try:
+        user = db.get(models.User, user_id)
+        user.transformations_used, user.transformations_limit = used, limit
+        db.commit()
+    finally:
+        db.close()
+
+
+def transformations_used(user_id: int) -> int:
+    db = TestSessionLocal()
+    try:
+        return db.get(models.User, user_id).transformations_used
+    finally:
+        db.close()
+
+
+def sse_events(body: str) -> list[tuple[str, dict]]:
+    """(event, data) pairs of a text/event-stream body; comments and keep-alives are skipped."""
+    out = []
+    for block in body.split("\n\n"):
+        if block.startswith("event: "):
+            head, data = block.split("\n", 1)
+            out.append((head[len("event: "):], json.loads(data[len("data: "):])))
+    return out
+
+
 @pytest.fixture
 def recipe(client, auth_headers):
     """Create a recipe via the API (translate_recipe is mocked)."""
@@ -342,11 +342,11 @@ def test_adapt_recipe_without_openai_key_returns_503(client, auth_headers, recip
 
 
 def test_adapt_recipe_multiple_types_chained(client, auth_headers, recipe):
-    """POST with variant_types applies adaptations in order and stores composite variant_type."""
+    """Diets that can't share one prompt (kosher) are applied in order; the intermediate is saved too."""
     first = {**MOCK_VARIANT, "title_pl": "Zupa wegetariańska"}
     second = {**MOCK_VARIANT, "title_pl": "Zupa wegetariańska koszerna", "ingredients_pl": ["500g pomidory", "1 cebula"]}
 
-    def side_effect(rec, variant_type, custom_instruction=None, target_language="en", target_country=None):
+    def side_effect(rec, variant_type, custom_instruction=None, target_language="en", target_country=None, avoid_terms=None):
         if variant_type == "vegetarian":
             return first
         if variant_type == "kosher":
@@ -366,7 +366,73 @@ def test_adapt_recipe_multiple_types_chained(client, auth_headers, recipe):
     assert data["variant"]["title_pl"] == second["title_pl"]
 
     variants = client.get(f"/api/recipes/{recipe['id']}/variants", headers=auth_headers).json()
-    assert any(v["variant_type"] == "vegetarian,kosher" for v in variants)
+    by_type = {v["variant_type"]: v for v in variants}
+    assert set(by_type) == {"vegetarian", "vegetarian,kosher"}
+    assert by_type["vegetarian"]["title_pl"] == first["title_pl"]
+
+
+def test_adapt_recipe_combinable_types_use_single_prompt(client, auth_headers, recipe):
+    """vegan + gluten_free are plain exclusions: one adapt call with the composite type."""
+    with patch("app.routers.recipes.adapt_recipe", return_value=MOCK_VARIANT) as mock_adapt:
+        r = client.post(
+            f"/api/recipes/{recipe['id']}/adapt",
+            json={"variant_types": ["vegan", "gluten_free"]},
+            headers=auth_headers,
+        )
+    assert r.status_code == 200
+    assert r.json()["variant"]["variant_type"] == "vegan,gluten_free"
+    assert mock_adapt.call_count == 1
+    assert mock_adapt.call_args[0][1] == "vegan,gluten_free"
+
+    # Same diets in another order are served from the saved variant.
+    with patch("app.routers.recipes.adapt_recipe") as mock_again:
+        r = client.post(
+            f"/api/recipes/{recipe['id']}/adapt",
+            json={"variant_types": ["gluten_free", "vegan"]},
+            headers=auth_headers,
+        )
+    assert r.status_code == 200
+    assert r.json()["variant"]["variant_type"] == "vegan,gluten_free"
+    mock_again.assert_not_called()
+
+
+def test_adapt_recipe_composite_starts_from_saved_prefix_variant(client, auth_headers, recipe):
+    """An existing "vegan" variant is the starting point for vegan+kosher: only kosher is applied."""
+    vegan = {**MOCK_VARIANT, "title_pl": "Zupa wegańska", "ingredients_pl": ["500g pomidory", "tofu"]}
+    with patch("app.routers.recipes.adapt_recipe", return_value=vegan):
+        client.post(f"/api/recipes/{recipe['id']}/adapt", json={"variant_type": "vegan"}, headers=auth_headers)
+
+    with patch("app.routers.recipes.adapt_recipe", return_value=MOCK_VARIANT) as mock_adapt:
+        r = client.post(
+            f"/api/recipes/{recipe['id']}/adapt",
+            json={"variant_types": ["vegan", "kosher"]},
+            headers=auth_headers,
+        )
+    assert r.status_code == 200
+    assert mock_adapt.call_count == 1
+    base, variant_type = mock_adapt.call_args[0][:2]
+    assert variant_type == "kosher"
+    assert base["ingredients_pl"] == ["500g pomidory", "tofu"]
+
+
+def test_adapt_recipe_combinable_types_start_from_saved_subset_in_any_order(client, auth_headers, recipe):
+    """A saved "gluten_free" variant is reused for ["vegan", "gluten_free"] although it is not a prefix."""
+    gluten_free = {**MOCK_VARIANT, "title_pl": "Zupa bezglutenowa", "ingredients_pl": ["500g pomidory", "ryż"]}
+    with patch("app.routers.recipes.adapt_recipe", return_value=gluten_free):
+        client.post(f"/api/recipes/{recipe['id']}/adapt", json={"variant_type": "gluten_free"}, headers=auth_headers)
+
+    with patch("app.routers.recipes.adapt_recipe", return_value=MOCK_VARIANT) as mock_adapt:
+        r = client.post(
+            f"/api/recipes/{recipe['id']}/adapt",
+            json={"variant_types": ["vegan", "gluten_free"]},
+            headers=auth_headers,
+        )
+    assert r.status_code == 200
+    assert r.json()["variant"]["variant_type"] == "vegan,gluten_free"
+    assert mock_adapt.call_count == 1
+    base, variant_type = mock_adapt.call_args[0][:2]
+    assert variant_type == "vegan"
+    assert base["ingredients_pl"] == ["500g pomidory", "ryż"]
 
 
 def test_delete_variant(client, auth_headers, recipe):
@@ -0,0 +1,105 @@
+"""Auth resolution cache: decoded tokens and user rows reused across requests, invalidated on change."""
+import copy
+import re
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import event
+
+from app import auth
+from tests.conftest import MOCK_TRANSLATED, engine
+
+ADMIN_HEADERS = {"X-Admin-Token": "test-admin-token"}
+_USERS_SELECT_RE = re.compile(r"^\s*SELECT\b.*\bFROM users\b", re.IGNORECASE | re.DOTALL)
+_FLAGS_SELECT = "SELECT users.is_blocked, users.is_verified \nFROM users"
+
+
+@contextmanager
+def _count_queries():
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def _user_selects(statements: list[str]) -> int:
+    """SELECTs loading the user row (not the access-flag check run on every cached hit)."""
+    return sum(1 for s in statements if _USERS_SELECT_RE.match(s) and not s.startswith(_FLAGS_SELECT))
+
+
+@pytest.mark.parametrize(
+    "method, path, body, queries",
+    [
+        ("get", "/api/users/me", None, 1),
+        ("get", "/api/recipes/", None, 2),
+        ("get", "/api/recipes/collections", None, 2),
+        # flags SELECT, quota UPDATE + ledger INSERT, recipe INSERT, refresh SELECT, ledger commit
+        ("post", "/api/recipes/", {"raw_input": "Omelette: 2 eggs. Whisk and fry."}, 6),
+    ],
+)
+def test_warm_requests_do_not_reselect_the_user(client, auth_headers, method, path, body, queries):
+    client.get("/api/users/me", headers=auth_headers)  # warm the cache
+    translated = copy.deepcopy(MOCK_TRANSLATED)
+    with patch("app.routers.recipes.translate_recipe", return_value=translated), _count_queries() as statements:
+        r = getattr(client, method)(path, headers=auth_headers, **({"json": body} if body else {}))
+    assert r.status_code in (200, 201), r.text
+    assert _user_selects(statements) == 0
+    assert len(statements) == queries, statements
+
+
+def test_token_decoded_once_and_settings_or_admin_changes_invalidate(client, auth_headers, registered_user):
+    with patch("app.auth.jwt.decode", wraps=auth.jwt.decode) as decode:
+        for _ in range(3):
+            assert client.get("/api/users/me", headers=auth_headers).status_code == 200
+    assert decode.call_count == 1
+
+    r = client.patch("/api/users/me/settings", json={"default_servings": 6}, headers=auth_headers)
+    assert r.status_code == 200
+    with _count_queries() as statements:
+        assert client.get("/api/users/me", headers=auth_headers).json()["default_servings"] == 6
+    assert _user_selects(statements) == 1  # reloaded once after the change
+
+    r = client.post(f"/api/admin/users/{registered_user['id']}/block", headers=ADMIN_HEADERS)
+    assert r.status_code == 200
+    assert client.get("/api/users/me", headers=auth_headers).status_code == 403
+
+
+def test_quota_charge_is_not_lost_on_a_cached_user(client, auth_headers, registered_user, db_session):
+    from app import models
+
+    client.get("/api/users/me", headers=auth_headers)
+    # Another worker charged quota meanwhile; this process still holds the older snapshot.
+    db_session.execute(
+        models.User.__table__.update().where(models.User.id == registered_user["id"]).values(transformations_used=3)
+    )
+    db_session.commit()
+    with patch("app.routers.recipes.translate_recipe", return_value=copy.deepcopy(MOCK_TRANSLATED)):
+        r = client.post("/api/recipes/", json={"raw_input": "Toast: bread. Toast it."}, headers=auth_headers)
+    assert r.status_code == 201
+    db_session.expire_all()
+    assert db_session.get(models.User, registered_user["id"]).transformations_used == 4
+
+
+def test_block_or_deletion_by_another_worker_applies_at_once(client, auth_headers, registered_user, db_session):
+    from app import models
+
+    assert client.get("/api/users/me", headers=auth_headers).status_code == 200  # cached here
+    users = models.User.__table__
+    # Core statements fire no ORM events: this process's cache is not told, as with another worker.
+    db_session.execute(users.update().where(users.c.id == registered_user["id"]).values(is_blocked=True))
+    db_session.commit()
+    assert client.get("/api/users/me", headers=auth_headers).status_code == 403
+
+    db_session.execute(users.update().where(users.c.id == registered_user["id"]).values(is_blocked=False))
+    db_session.commit()
+    assert client.get("/api/users/me", headers=auth_headers).status_code == 200
+    db_session.execute(users.delete().where(users.c.id == registered_user["id"]))
+    db_session.commit()
+    assert client.get("/api/users/me", headers=auth_headers).status_code == 401
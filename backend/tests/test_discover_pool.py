@@ -0,0 +1,154 @@
+"""Pre-generated discover suggestion pool: fingerprinting, hits/misses, refill and per-user variety."""
+import random
+import threading
+from unittest.mock import patch
+
+from app import metrics, models
+from app.services import discover_pool
+from tests.conftest import TestSessionLocal
+
+
+def _suggestions(n: int, prefix: str = "Dish") -> list[dict]:
+    return [
+        {"title": f"{prefix} {i}", "estimated_calories": 400, "ingredients": ["rice", "peas"], "steps": ["Cook."]}
+        for i in range(n)
+    ]
+
+
+def _discover(client, headers, **extra):
+    body = {"dish_types": ["Soups", "pasta"], "diet_filters": ["vegetarian"], "num_recipes": 2, **extra}
+    r = client.post("/api/recipes/discover", json=body, headers=headers)
+    assert r.status_code == 200
+    return [s["title"] for s in r.json()["suggestions"]]
+
+
+def test_fingerprint_ignores_order_and_case():
+    a = discover_pool.pool_params(["Soups", "pasta"], ["vegan"], None, 30, "EN", "metric")
+    b = discover_pool.pool_params(["pasta", "soups "], ["vegan"], [], 30, "en", "")
+    assert discover_pool.pool_fingerprint(a) == discover_pool.pool_fingerprint(b)
+    c = discover_pool.pool_params(["pasta"], ["vegan"], None, 30, "en", "metric")
+    assert discover_pool.pool_fingerprint(a) != discover_pool.pool_fingerprint(c)
+
+
+def test_miss_serves_live_and_refills_then_next_request_hits_pool(client, auth_headers):
+    metrics.reset()
+    with patch("app.routers.recipes.suggest_recipes_from_preferences") as mock_suggest:
+        mock_suggest.side_effect = lambda **kw: _suggestions(kw["num_recipes"])
+        first = _discover(client, auth_headers)
+        assert mock_suggest.call_count == 2  # live answer + inline refill job
+        assert mock_suggest.call_args.kwargs["num_recipes"] == discover_pool.REFILL_BATCH
+
+        second = _discover(client, auth_headers)
+        assert mock_suggest.call_count == 2  # served from the pool, no AI call
+    assert len(first) == len(second) == 2
+
+    counters = metrics.snapshot()["counters"]
+    assert counters["discover.pool.miss"] == 1
+    assert counters["discover.pool.hit"] == 1
+    assert counters["discover.pool.refill"] == 1
+    assert counters["discover.pool.added"] == discover_pool.REFILL_BATCH
+
+
+def test_same_user_never_gets_the_same_pool_entry_twice(client, auth_headers):
+    params = discover_pool.pool_params(["Soups", "pasta"], ["vegetarian"], None, None, "pl", "metric", 4)
+    fingerprint = discover_pool.pool_fingerprint(params)
+    db = TestSessionLocal()
+    try:
+        assert discover_pool.add_to_pool(db, fingerprint, params, _suggestions(4, "Pooled")) == 4
+        db.commit()
+    finally:
+        db.close()
+
+    with patch("app.routers.recipes.suggest_recipes_from_preferences", return_value=_suggestions(2, "Live")), patch(
+        "app.services.discover_pool.POOL_LOW_WATER", 0
+    ):
+        first = _discover(client, auth_headers)
+        second = _discover(client, auth_headers)
+        third = _discover(client, auth_headers)
+    assert all(t.startswith("Pooled") for t in first + second)
+    assert len(set(first + second)) == 4
+    assert third == ["Live 0", "Live 1"]  # pool exhausted for this user
+
+
+def test_add_to_pool_rejects_non_compliant_suggestions():
+    params = discover_pool.pool_params(None, ["vegetarian"], ["milk"], None, "en", "metric")
+    fingerprint = discover_pool.pool_fingerprint(params)
+    recipes = [
+        {"title": "Beef stew", "ingredients": ["beef", "carrots"], "steps": ["Stew."]},
+        {"title": "Cheese pasta", "ingredients": ["pasta", "cheese"], "steps": ["Boil."]},
+        {"title": "Lentil soup", "ingredients": ["lentils", "onion"], "steps": ["Simmer."]},
+    ]
+    db = TestSessionLocal()
+    try:
+        assert discover_pool.add_to_pool(db, fingerprint, params, recipes) == 1
+        db.commit()
+        assert [e.recipe["title"] for e in db.query(models.DiscoverPoolEntry).all()] == ["Lentil soup"]
+    finally:
+        db.close()
+
+
+def test_free_text_requests_bypass_pool(client, auth_headers):
+    metrics.reset()
+    with patch("app.routers.recipes.suggest_recipes_from_preferences", return_value=_suggestions(2)) as mock_suggest:
+        _discover(client, auth_headers, keywords="spicy")
+    assert mock_suggest.call_count == 1
+    assert metrics.snapshot()["counters"]["discover.pool.bypass"] == 1
+    db = TestSessionLocal()
+    try:
+        assert db.query(models.DiscoverPoolEntry).count() == 0
+    finally:
+        db.close()
+
+
+def _race_take(fingerprint: str, identities: list[str]) -> list:
+    """take_from_pool from one thread per identity, all reading the pool before any claims an entry."""
+    barrier = threading.Barrier(len(identities))
+    shuffle = random.shuffle
+    results: list = []
+
+    def take(identity):
+        db = TestSessionLocal()
+        try:
+            results.append(discover_pool.take_from_pool(db, fingerprint, 2, identity))
+        finally:
+            db.close()
+
+    def shuffle_after_all_read(items):
+        barrier.wait(timeout=5)
+        shuffle(items)
+
+    with patch("app.services.discover_pool.random.shuffle", side_effect=shuffle_after_all_read):
+        threads = [threading.Thread(target=take, args=(i,)) for i in identities]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    return results
+
+
+def test_concurrent_takes_claim_each_entry_once():
+    params = discover_pool.pool_params(["Soups"], None, None, None, "en", "metric")
+    fingerprint = discover_pool.pool_fingerprint(params)
+    db = TestSessionLocal()
+    try:
+        discover_pool.add_to_pool(db, fingerprint, params, _suggestions(2))
+        db.commit()
+    finally:
+        db.close()
+
+    results = _race_take(fingerprint, ["u:1", "u:1"])
+    assert sorted(results, key=lambda r: r is None)[1] is None  # the lost claim is a miss
+    db = TestSessionLocal()
+    try:
+        assert [(e.served_count, e.served_to) for e in db.query(models.DiscoverPoolEntry)] == [(1, ["u:1"])] * 2
+    finally:
+        db.close()
+
+    with patch("app.services.discover_pool.POOL_MAX_SERVES", 2):
+        results = _race_take(fingerprint, ["u:2", "u:3"])  # both try to retire the same entries
+    assert [r is None for r in sorted(results, key=lambda r: r is None)] == [False, True]
+    db = TestSessionLocal()
+    try:
+        assert discover_pool.pool_size(db, fingerprint) == 0
+    finally:
+        db.close()
@@ -0,0 +1,127 @@
+"""Fast list serialization: same JSON as the response models, cached variant payloads."""
+import json
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import event, update
+
+from app import fast_json, models, schemas
+from app.routers import recipes as recipes_router
+from tests.conftest import TestSessionLocal, add_recipe, engine
+
+
+def _make_recipe(user_id: int, **overrides) -> int:
+    """A recipe with a vegan and a kosher variant."""
+    db = TestSessionLocal()
+    try:
+        recipe = add_recipe(db, user_id, **overrides)
+        db.add_all(
+            [
+                models.RecipeVariant(recipe_id=recipe.id, variant_type=t, title_pl=f"Zupa {t}", ingredients_pl=["woda"], steps_pl=[])
+                for t in ("vegan", "kosher")
+            ]
+        )
+        db.commit()
+        return recipe.id
+    finally:
+        db.close()
+
+
+def _expected(schema, rows) -> list:
+    return [schema.model_validate(r).model_dump(mode="json") for r in rows]
+
+
+@pytest.mark.parametrize("with_orjson", [True, False])
+def test_recipe_list_matches_the_response_model(client, auth_headers, registered_user, monkeypatch, with_orjson):
+    if not with_orjson:
+        monkeypatch.setattr(fast_json, "orjson", None)  # TypeAdapter fallback
+    _make_recipe(registered_user["id"], is_favorite=True, collections=["Obiady"])
+    _make_recipe(
+        registered_user["id"],
+        image_renditions={"thumb": {"webp": "/t.webp", "jpeg": "/t.jpg", "width": 320, "height": 240}},
+        user_rating=4,
+    )
+    r = client.get("/api/recipes/", headers=auth_headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/json"
+    db = TestSessionLocal()
+    try:
+        rows = db.query(models.Recipe).order_by(models.Recipe.id).all()
+        assert r.json() == _expected(schemas.RecipeOut, rows)
+    finally:
+        db.close()
+    assert r.json()[1]["image_srcset"] == "/t.webp 320w"
+    assert [x["title_pl"] for x in client.get("/api/recipes/?collection=obiady", headers=auth_headers).json()] == [
+        "Zupa pomidorowa"
+    ]
+
+
+def test_row_serializer_writes_datetimes_like_pydantic(monkeypatch):
+    recipe = models.Recipe(
+        id=1, user_id=None, title_pl="a", title_original="a", ingredients_pl=[], ingredients_original=[],
+        steps_pl=[], tags=[], substitutions={}, notes={}, user_notes=None, is_favorite=False, raw_input="a",
+        detected_language=None, target_language="pl", target_country="PL", target_city="",
+        created_at=datetime(2026, 10, 19, 8, 30, tzinfo=timezone.utc), diet_tags=[], collections=[],
+    )
+    rows = fast_json.RowSerializer(schemas.RecipeOut)
+    expected = schemas.RecipeOut.model_validate(recipe).model_dump_json().encode()
+    assert rows.dump_one(recipe) == expected
+    monkeypatch.setattr(fast_json, "orjson", None)
+    assert rows.dump_one(recipe) == expected
+
+
+def test_variant_payloads_are_cached_and_dropped_when_a_variant_changes(client, auth_headers, registered_user):
+    recipes_router._variant_payloads.clear()
+    recipe_id = _make_recipe(registered_user["id"])
+    first = client.get(f"/api/recipes/{recipe_id}/variants", headers=auth_headers)
+    assert first.status_code == 200
+    db = TestSessionLocal()
+    try:
+        variants = db.query(models.RecipeVariant).order_by(models.RecipeVariant.id).all()
+        assert first.json() == _expected(schemas.RecipeVariantOut, variants)
+    finally:
+        db.close()
+
+    statements: list[str] = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        assert client.get(f"/api/recipes/{recipe_id}/variants", headers=auth_headers).json() == first.json()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert not any("ingredients_pl" in s and "recipe_variants" in s for s in statements)  # served from the cache
+
+    r = client.post(
+        f"/api/recipes/{recipe_id}/replace-ingredient",
+        json={"variant_type": "kosher", "ingredient_index": 0, "new_ingredient": "bulion"},
+        headers=auth_headers,
+    )
+    assert r.status_code == 200
+    after = client.get(f"/api/recipes/{recipe_id}/variants", headers=auth_headers).json()
+    assert [v["ingredients_pl"] for v in after] == [["woda"], ["bulion"]]
+
+
+def test_variant_edited_by_another_worker_is_not_served_from_the_cache(client, auth_headers, registered_user):
+    recipes_router._variant_payloads.clear()
+    recipe_id = _make_recipe(registered_user["id"])
+    assert client.get(f"/api/recipes/{recipe_id}/variants", headers=auth_headers).json()[0]["ingredients_pl"] == ["woda"]
+    db = TestSessionLocal()
+    try:
+        # A bulk UPDATE fires no ORM events, like an edit made in another process.
+        db.execute(
+            update(models.RecipeVariant)
+            .where(models.RecipeVariant.recipe_id == recipe_id, models.RecipeVariant.variant_type == "vegan")
+            .values(ingredients_pl=["bulion"])
+        )
+        db.commit()
+    finally:
+        db.close()
+    after = client.get(f"/api/recipes/{recipe_id}/variants", headers=auth_headers).json()
+    assert [v["ingredients_pl"] for v in after] == [["bulion"], ["woda"]]
+
+
+def test_fast_json_response_renders_models_and_passes_bytes_through():
+    out = {"variant": schemas.IngredientSubstitutionOut(id=1, ingredient_name="ser", source_country="US", target_country="PL", substitution="twaróg")}
+    body = fast_json.FastJSONResponse(out).body
+    assert json.loads(body) == {"variant": out["variant"].model_dump()}
+    assert fast_json.FastJSONResponse(b"[1,2]").body == b"[1,2]"
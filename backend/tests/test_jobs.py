@@ -0,0 +1,360 @@
+"""Background jobs (?background=true): 202 + job id, polling, SSE events, quota tied to success."""
+import copy
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import httpx
+from fastapi import HTTPException
+
+from app import jobs, models
+from app.auth import create_trial_token
+from app.services.page_fetch import FetchedPage
+from tests.conftest import MOCK_TRANSLATED, TestSessionLocal, transformations_used
+
+MOCK_DAYS = [
+    {
+        "date": "2026-01-05",
+        "meals": [
+            {
+                "meal_type": "dinner",
+                "name": "Soup",
+                "short_description": "Warm soup",
+                "estimated_time_minutes": 30,
+                "title": "Tomato soup",
+                "ingredients": ["500 g tomatoes"],
+                "steps": ["Cook."],
+            }
+        ],
+    }
+]
+
+MOCK_VARIANT = {
+    "can_adapt": True,
+    "title_pl": "Zupa (wegańska)",
+    "ingredients_pl": ["500g pomidory"],
+    "steps_pl": ["Gotuj."],
+    "notes": {},
+    "alternatives": [],
+}
+
+
+def _trial_headers_with_recipe() -> tuple[dict, int, int]:
+    db = TestSessionLocal()
+    try:
+        session = models.TrialSession(
+            token_id="jobs-trial-token",
+            country="PL",
+            language="pl",
+            used_actions=0,
+            created_at=datetime.now(timezone.utc),
+            last_seen_at=datetime.now(timezone.utc),
+        )
+        db.add(session)
+        db.flush()
+        recipe = models.Recipe(
+            trial_session_id=session.id,
+            title_pl="Zupa",
+            title_original="Zupa",
+            ingredients_pl=["500g pomidory"],
+            ingredients_original=["500g pomidory"],
+            steps_pl=["Gotuj."],
+            tags=[],
+            substitutions={},
+            notes={},
+            raw_input="Zupa",
+            target_language="pl",
+            target_country="PL",
+        )
+        db.add(recipe)
+        db.commit()
+        return {"Authorization": f"Bearer {create_trial_token('jobs-trial-token')}"}, session.id, recipe.id
+    finally:
+        db.close()
+
+
+def test_meal_plan_background_returns_202_and_charges_on_success(client, auth_headers, registered_user):
+    with patch("app.routers.meal_plan.generate_weekly_meal_plan", return_value=MOCK_DAYS):
+        r = client.post("/api/meal-plan/generate?background=true", json={"num_days": 1}, headers=auth_headers)
+    assert r.status_code == 202
+    accepted = r.json()
+    assert accepted["kind"] == "meal_plan.generate"
+    assert accepted["status_url"] == f"/api/jobs/{accepted['job_id']}"
+
+    r = client.get(accepted["status_url"], headers=auth_headers)
+    assert r.status_code == 200
+    job = r.json()
+    assert job["status"] == "succeeded"
+    assert job["result"]["days"][0]["meals"][0]["title"] == "Tomato soup"
+    assert transformations_used(registered_user["id"]) == 1
+
+
+def test_meal_plan_background_failure_does_not_charge(client, auth_headers, registered_user):
+    with patch("app.routers.meal_plan.generate_weekly_meal_plan", return_value=[]):
+        r = client.post("/api/meal-plan/generate?background=true", json={"num_days": 1}, headers=auth_headers)
+    job = client.get(r.json()["status_url"], headers=auth_headers).json()
+    assert job["status"] == "failed"
+    assert job["error"]["status_code"] == 503
+    assert transformations_used(registered_user["id"]) == 0
+
+
+def test_url_import_background_creates_each_recipe(client, auth_headers, registered_user):
+    page = FetchedPage("https://example.com/recipes", 200, httpx.Headers(), "<p>Two recipes page</p>")
+    with patch("app.routers.recipes._fetch_page", return_value=page), patch(
+        "app.routers.recipes.split_page_into_recipes", return_value=["recipe one", "recipe two"]
+    ), patch("app.routers.recipes.translate_recipe", return_value=dict(MOCK_TRANSLATED)):
+        r = client.post(
+            "/api/recipes/?background=true",
+            json={"source_url": "https://example.com/recipes"},
+            headers=auth_headers,
+        )
+    assert r.status_code == 202
+    job = client.get(r.json()["status_url"], headers=auth_headers).json()
+    assert job["status"] == "succeeded"
+    assert len(job["result"]["recipes"]) == 2
+    assert job["result"]["recipes"][0]["notes"]["source_url"] == "https://example.com/recipes"
+    assert transformations_used(registered_user["id"]) == 2
+
+
+def test_chained_adapt_background_streams_events(client, auth_headers, recipe, registered_user):
+    used_before = transformations_used(registered_user["id"])
+    with patch("app.routers.recipes.adapt_recipe", return_value=MOCK_VARIANT):
+        r = client.post(
+            f"/api/recipes/{recipe['id']}/adapt?background=true",
+            json={"variant_types": ["vegan", "gluten_free"]},
+            headers=auth_headers,
+        )
+    assert r.status_code == 202
+
+    with client.stream("GET", r.json()["events_url"], headers=auth_headers) as resp:
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        body = "".join(resp.iter_text())
+    events = [block for block in body.split("\n\n") if block.startswith("event: ")]
+    assert events[-1].startswith("event: done")
+    done = json.loads(events[-1].split("data: ", 1)[1])
+    assert done["status"] == "succeeded"
+    assert done["result"]["variant"]["variant_type"] == "vegan,gluten_free"
+    assert transformations_used(registered_user["id"]) == used_before + 1
+
+
+def test_trial_adapt_job_failure_refunds_trial_action(client):
+    headers, trial_id, recipe_id = _trial_headers_with_recipe()
+    with patch("app.routers.recipes.adapt_recipe", side_effect=Exception("boom")):
+        r = client.post(
+            f"/api/recipes/{recipe_id}/adapt?background=true",
+            json={"variant_type": "vegan"},
+            headers=headers,
+        )
+    assert r.status_code == 202
+    job = client.get(r.json()["status_url"], headers=headers).json()
+    assert job["status"] == "failed"
+    assert job["error"]["status_code"] == 502
+
+    db = TestSessionLocal()
+    try:
+        assert db.get(models.TrialSession, trial_id).used_actions == 0
+    finally:
+        db.close()
+
+
+def test_job_not_visible_to_other_identities(client, auth_headers):
+    with patch("app.routers.meal_plan.generate_weekly_meal_plan", return_value=MOCK_DAYS):
+        r = client.post("/api/meal-plan/generate?background=true", json={"num_days": 1}, headers=auth_headers)
+    status_url = r.json()["status_url"]
+    headers, _, _ = _trial_headers_with_recipe()
+    assert client.get(status_url, headers=headers).status_code == 404
+    assert client.get(status_url).status_code == 401
+
+
+def _set_limit(user_id: int, limit: int) -> None:
+    db = TestSessionLocal()
+    try:
+        db.get(models.User, user_id).transformations_limit = limit
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_background_jobs_reserve_quota_at_enqueue(client, auth_headers, recipe, registered_user):
+    _set_limit(registered_user["id"], transformations_used(registered_user["id"]) + 1)
+    second = []
+
+    def plan_while_another_job_is_queued(**kwargs):
+        second.append(
+            client.post(f"/api/recipes/{recipe['id']}/adapt?background=true", json={"variant_type": "vegan"}, headers=auth_headers)
+        )
+        return MOCK_DAYS
+
+    with patch("app.routers.meal_plan.generate_weekly_meal_plan", side_effect=plan_while_another_job_is_queued):
+        r = client.post("/api/meal-plan/generate?background=true", json={"num_days": 1}, headers=auth_headers)
+    assert client.get(r.json()["status_url"], headers=auth_headers).json()["status"] == "succeeded"
+    assert second[0].status_code == 402  # the last unit was reserved by the queued meal-plan job
+    db = TestSessionLocal()
+    try:
+        assert db.get(models.User, registered_user["id"]).transformations_used == 2  # recipe + plan, no more
+        assert sorted(e.state for e in db.query(models.QuotaLedgerEntry)) == ["committed", "committed"]
+    finally:
+        db.close()
+
+
+def test_bulk_import_reports_each_item_with_bounded_concurrency(client, auth_headers, registered_user):
+    in_flight, peak, lock = [0], [0], threading.Lock()
+
+    def translate(**kwargs):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        return copy.deepcopy(MOCK_TRANSLATED)
+
+    def fetch(url, headers=None):
+        if url.endswith("/broken"):
+            raise HTTPException(status_code=400, detail="Failed to fetch page: 404")
+        return FetchedPage(url, 200, httpx.Headers(), "<p>Pancakes with flour and milk</p>")
+
+    items = [
+        {"source_url": "https://example.com/a"},
+        {"source_url": "https://example.com/b"},
+        {"source_url": "https://EXAMPLE.com/a?utm_source=newsletter"},
+        {"source_url": "https://example.com/broken"},
+        {"raw_input": "Omelette: 2 eggs, butter. Whisk and fry."},
+        {"raw_input": "Toast: bread. Toast it."},
+    ]
+    with patch("app.routers.recipes.BULK_IMPORT_CONCURRENCY", 2), patch(
+        "app.routers.recipes._fetch_page", side_effect=fetch
+    ), patch("app.routers.recipes.split_page_into_recipes", return_value=["pancakes"]), patch(
+        "app.routers.recipes.translate_recipe", side_effect=translate
+    ):
+        r = client.post("/api/recipes/bulk-import", json={"items": items}, headers=auth_headers)
+    assert r.status_code == 202
+    job = client.get(r.json()["status_url"], headers=auth_headers).json()
+    assert job["status"] == "succeeded"
+    statuses = [item["status"] for item in job["result"]["items"]]
+    assert statuses == ["succeeded", "succeeded", "duplicate", "failed", "succeeded", "succeeded"]
+    assert job["result"]["items"][2]["duplicate_of"] == 0
+    assert job["result"]["items"][3]["error"] == {"status_code": 400, "detail": "Failed to fetch page: 404"}
+    assert job["result"]["created"] == 4
+    assert job["progress"]["current"] == 6
+    assert 1 < peak[0] <= 2
+    assert transformations_used(registered_user["id"]) == 4
+    assert len(client.get("/api/recipes/", headers=auth_headers).json()) == 4
+
+
+def test_bulk_import_stops_at_quota_and_allows_one_job_per_user(client, auth_headers, registered_user):
+    _set_limit(registered_user["id"], 2)
+    items = [{"raw_input": f"Recipe {i}: water. Boil it."} for i in range(4)]
+    with patch("app.routers.recipes.BULK_IMPORT_CONCURRENCY", 1), patch(
+        "app.routers.recipes.translate_recipe", side_effect=lambda **kw: copy.deepcopy(MOCK_TRANSLATED)
+    ):
+        r = client.post("/api/recipes/bulk-import", json={"items": items}, headers=auth_headers)
+    result = client.get(r.json()["status_url"], headers=auth_headers).json()["result"]
+    assert [item["status"] for item in result["items"]] == ["succeeded", "succeeded", "skipped", "skipped"]
+    assert result["items"][2]["error"]["status_code"] == 402
+    assert transformations_used(registered_user["id"]) == 2
+
+    _set_limit(registered_user["id"], 100)
+    db = TestSessionLocal()
+    try:
+        job = db.query(models.Job).filter(models.Job.kind == "recipes.bulk_import").one()
+        job.status = "running"
+        db.commit()
+    finally:
+        db.close()
+    r = client.post("/api/recipes/bulk-import", json={"items": items[:1]}, headers=auth_headers)
+    assert r.status_code == 409
+
+
+def test_parallel_bulk_imports_of_one_user_start_one_job(client, auth_headers):
+    class HoldingBackend(jobs.JobBackend):
+        def submit(self, job_id: str, lane: str = jobs.DEFAULT_LANE) -> None:
+            pass  # stays queued: the import is still unfinished when the other request arrives
+
+    jobs.set_job_backend(HoldingBackend())
+    barrier = threading.Barrier(4)
+    statuses = []
+
+    def post():
+        barrier.wait(timeout=5)
+        r = client.post("/api/recipes/bulk-import", json={"items": [{"raw_input": "Water. Boil it."}]}, headers=auth_headers)
+        statuses.append(r.status_code)
+
+    try:
+        threads = [threading.Thread(target=post) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        jobs.set_job_backend(None)
+    assert sorted(statuses) == [202, 409, 409, 409]
+
+
+def test_job_runs_once_and_recovery_skips_jobs_held_by_live_workers(monkeypatch):
+    runs = []
+    monkeypatch.setitem(jobs._HANDLERS, "tests.count", lambda ctx: runs.append(ctx.job_id) or {})
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(seconds=jobs.STALE_AFTER_S + 60)
+    db = TestSessionLocal()
+    try:
+        db.add_all(
+            [
+                models.Job(id="q" * 32, kind="tests.count", status="queued", heartbeat_at=now),
+                models.Job(id="r" * 32, kind="tests.count", status="running", heartbeat_at=now),
+                models.Job(id="d" * 32, kind="tests.count", status="running", heartbeat_at=stale),
+                models.Job(id="o" * 32, kind="tests.count", status="queued", heartbeat_at=stale),
+            ]
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    threads = [threading.Thread(target=jobs.run_job, args=("q" * 32,)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert runs == ["q" * 32]  # four runners, one claim
+
+    jobs.recover_jobs()
+    jobs.recover_jobs()  # a second worker starting at the same time finds nothing left to take over
+    db = TestSessionLocal()
+    try:
+        statuses = {job.id[0]: job.status for job in db.query(models.Job)}
+    finally:
+        db.close()
+    assert statuses == {"q": "succeeded", "r": "running", "d": "failed", "o": "succeeded"}
+    assert runs == ["q" * 32, "o" * 32]
+
+
+def test_job_events_stream_follows_a_running_job_to_done(client, auth_headers, registered_user, monkeypatch):
+    monkeypatch.setattr("app.routers.jobs._POLL_INTERVAL_SECONDS", 0.05)
+    db = TestSessionLocal()
+    try:
+        db.add(models.Job(id="s" * 32, kind="meal_plan.generate", status="running", user_id=registered_user["id"]))
+        db.commit()
+    finally:
+        db.close()
+
+    def finish() -> None:
+        time.sleep(0.3)
+        db = TestSessionLocal()
+        try:
+            job = db.get(models.Job, "s" * 32)
+            job.progress = {"current": 1, "total": 1}
+            job.status, job.result = "succeeded", {"ok": True}
+            db.commit()
+        finally:
+            db.close()
+
+    finisher = threading.Thread(target=finish)
+    finisher.start()
+    with client.stream("GET", f"/api/jobs/{'s' * 32}/events", headers=auth_headers) as resp:
+        body = "".join(resp.iter_text())
+    finisher.join()
+    events = [block.split("\n", 1)[0] for block in body.split("\n\n") if block.startswith("event: ")]
+    assert events == ["event: status", "event: progress", "event: status", "event: progress", "event: done"]
@@ -0,0 +1,167 @@
+"""Meal plan generation streamed per day (POST /api/meal-plan/generate/stream)."""
+import threading
+import time
+from unittest.mock import patch
+
+from app import models
+from app.routers import meal_plan as meal_plan_router
+from app.services.meal_plan_ai import iter_meal_plan_days, plan_protein_slots
+from tests.conftest import TestSessionLocal, set_quota, sse_events
+
+
+def _meal(title: str) -> dict:
+    return {
+        "meal_type": "dinner",
+        "name": title,
+        "short_description": "",
+        "estimated_time_minutes": 20,
+        "title": title,
+        "ingredients": ["200 g rice"],
+        "steps": ["Cook."],
+    }
+
+
+def test_plan_protein_slots_match_weekly_counts():
+    slots = plan_protein_slots(7, 3, 2)
+    assert slots.count("meat") == 3
+    assert slots.count("fish") == 2
+    assert all(not (a == b == "meat") for a, b in zip(slots, slots[1:]))  # spread, not bunched
+    assert plan_protein_slots(3, None, None) == ["any", "any", "any"]
+
+
+def test_iter_meal_plan_days_runs_days_concurrently_and_retries_malformed_day():
+    prompts = []
+    calls = {"n": 0}
+    lock = threading.Lock()
+
+    def fake_chat_json(messages, max_tokens):
+        with lock:
+            calls["n"] += 1
+            first_call = calls["n"] == 1
+            prompts.append(messages[-1]["content"])
+        time.sleep(0.2)
+        if first_call:
+            return None  # malformed output; the day is retried
+        return {"date": "x", "meals": [_meal("Rice bowl")]}
+
+    dates = ["2026-01-05", "2026-01-06", "2026-01-07", "2026-01-08"]
+    started = time.perf_counter()
+    with patch("app.services.meal_plan_ai._chat_json", side_effect=fake_chat_json):
+        results = dict(iter_meal_plan_days(dates, meat_meals_per_week=2, fish_meals_per_week=1, max_workers=4))
+    elapsed = time.perf_counter() - started
+
+    assert sorted(results) == [0, 1, 2, 3]
+    assert all(day is not None for day in results.values())
+    assert [results[i]["date"] for i in range(4)] == dates
+    assert elapsed < 0.75  # ~two rounds of one day's latency, not four sequential days
+    assert sum("Protein for this day's dinner: meat" in p for p in prompts) >= 2
+    assert any("Protein for this day's dinner: fish" in p for p in prompts)
+
+
+def test_generate_stream_pushes_days_persists_partial_plan_and_charges_once(client, auth_headers, registered_user):
+    def fake_days(dates, **kwargs):
+        yield 1, {"date": dates[1], "meals": [_meal("Soup")]}
+        yield 0, None
+        yield 2, {"date": dates[2], "meals": [_meal("Stew")]}
+
+    with patch("app.routers.meal_plan.iter_meal_plan_days", side_effect=fake_days):
+        with client.stream(
+            "POST",
+            "/api/meal-plan/generate/stream",
+            json={"num_days": 3, "start_date": "2026-01-05"},
+            headers=auth_headers,
+        ) as r:
+            assert r.status_code == 200
+            events = sse_events("".join(r.iter_text()))
+
+    assert [name for name, _ in events] == ["plan", "day", "day_failed", "day", "done"]
+    assert events[1][1]["day"]["date"] == "2026-01-06"
+    done = events[-1][1]
+    assert done["status"] == "partial"
+    assert [d["date"] for d in done["days"]] == ["2026-01-06", "2026-01-07"]
+
+    db = TestSessionLocal()
+    try:
+        plan = db.get(models.MealPlan, done["id"])
+        assert [d["meals"][0]["title"] for d in plan.data["days"]] == ["Soup", "Stew"]
+        assert db.get(models.User, registered_user["id"]).transformations_used == 1
+    finally:
+        db.close()
+
+
+def test_generate_stream_without_any_day_deletes_plan_and_does_not_charge(client, auth_headers, registered_user):
+    def no_days(dates, **kwargs):
+        for i in range(len(dates)):
+            yield i, None
+
+    with patch("app.routers.meal_plan.iter_meal_plan_days", side_effect=no_days):
+        with client.stream("POST", "/api/meal-plan/generate/stream", json={"num_days": 2}, headers=auth_headers) as r:
+            events = sse_events("".join(r.iter_text()))
+
+    assert events[-1][0] == "error"
+    db = TestSessionLocal()
+    try:
+        assert db.query(models.MealPlan).count() == 0
+        assert db.get(models.User, registered_user["id"]).transformations_used == 0
+    finally:
+        db.close()
+
+
+def test_generate_stream_reserves_quota_before_streaming(client, auth_headers, registered_user):
+    set_quota(registered_user["id"], 0, 1)
+    second = []
+
+    def fake_days(dates, **kwargs):
+        # A second stream started while this one runs finds the last unit already reserved.
+        second.append(client.post("/api/meal-plan/generate/stream", json={"num_days": 1}, headers=auth_headers))
+        yield 0, {"date": dates[0], "meals": [_meal("Soup")]}
+
+    with patch("app.routers.meal_plan.iter_meal_plan_days", side_effect=fake_days):
+        with client.stream("POST", "/api/meal-plan/generate/stream", json={"num_days": 1}, headers=auth_headers) as r:
+            events = sse_events("".join(r.iter_text()))
+
+    assert events[-1][0] == "done"
+    assert second[0].status_code == 402
+    db = TestSessionLocal()
+    try:
+        assert db.get(models.User, registered_user["id"]).transformations_used == 1
+        assert [e.state for e in db.query(models.QuotaLedgerEntry)] == ["committed"]
+    finally:
+        db.close()
+
+
+def test_generate_stream_disconnect_keeps_finished_days_and_settles_quota(client, auth_headers, registered_user):
+    def two_days(dates, **kwargs):
+        yield 0, {"date": dates[0], "meals": [_meal("Soup")]}
+        yield 1, {"date": dates[1], "meals": [_meal("Stew")]}
+
+    def open_stream() -> tuple:
+        """Run the endpoint, then drive its body by hand as the server would."""
+        with patch("app.routers.meal_plan.StreamingResponse", side_effect=lambda body, **kw: body):
+            db = TestSessionLocal()
+            try:
+                user = db.get(models.User, registered_user["id"])
+                body = meal_plan_router.generate_plan_stream(
+                    meal_plan_router.schemas.MealPlanGenerateRequest(num_days=2), db=db, current_user=user
+                )
+            finally:
+                db.close()
+        return body
+
+    with patch("app.routers.meal_plan.iter_meal_plan_days", side_effect=two_days):
+        body = open_stream()
+        assert next(body).startswith("event: plan")
+        assert next(body).startswith("event: day")
+        body.close()  # client gone after the first day
+        body = open_stream()
+        next(body)
+        body.close()  # client gone before any day
+
+    db = TestSessionLocal()
+    try:
+        plans = db.query(models.MealPlan).all()
+        assert [(p.data["status"], len(p.data["days"])) for p in plans] == [("partial", 1)]
+        assert db.get(models.User, registered_user["id"]).transformations_used == 1
+        assert sorted(e.state for e in db.query(models.QuotaLedgerEntry)) == ["committed", "released"]
+    finally:
+        db.close()
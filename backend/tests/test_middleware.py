@@ -0,0 +1,76 @@
+"""Fused CORS + security-header middleware: same headers as the stack it replaced, preflight first."""
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app import rate_limit
+from app.middleware import CORSAndSecurityHeadersMiddleware, _legacy_stack
+from app.rate_limit import MemoryStore
+
+_CHECKED = (
+    "access-control-allow-origin",
+    "access-control-allow-methods",
+    "access-control-allow-headers",
+    "access-control-max-age",
+    "vary",
+    "x-content-type-options",
+    "x-frame-options",
+    "x-xss-protection",
+)
+
+
+def _inner() -> FastAPI:
+    inner = FastAPI()
+
+    @inner.get("/plain")
+    def plain():
+        return {"ok": True}
+
+    @inner.get("/varied")
+    def varied():
+        return JSONResponse({"ok": True}, headers={"Vary": "Accept-Encoding"})
+
+    return inner
+
+
+@pytest.mark.parametrize("allow_origins", [["*"], ["https://a.example", "https://b.example"]])
+@pytest.mark.parametrize(
+    "method, path, headers",
+    [
+        ("get", "/plain", {}),
+        ("get", "/plain", {"Origin": "https://b.example"}),
+        ("get", "/plain", {"Origin": "https://evil.example"}),
+        ("get", "/plain", {"Origin": "https://b.example", "Cookie": "a=1"}),
+        ("get", "/varied", {"Origin": "https://a.example"}),
+        ("get", "/missing", {"Origin": "https://a.example"}),
+        ("options", "/plain", {"Origin": "https://b.example", "Access-Control-Request-Method": "POST"}),
+        ("options", "/plain", {"Origin": "https://evil.example"}),
+    ],
+)
+def test_fused_middleware_sets_the_same_headers_as_the_old_stack(allow_origins, method, path, headers):
+    inner = _inner()
+    old = getattr(TestClient(_legacy_stack(inner, allow_origins)), method)(path, headers=headers)
+    new = getattr(TestClient(CORSAndSecurityHeadersMiddleware(inner, allow_origins)), method)(path, headers=headers)
+    assert new.status_code == old.status_code
+    assert new.content == old.content
+    assert {k: new.headers.get(k) for k in _CHECKED} == {k: old.headers.get(k) for k in _CHECKED}
+
+
+def test_app_answers_preflight_before_rate_limits_and_adds_headers_to_429(client, monkeypatch):
+    monkeypatch.setattr(rate_limit, "ENABLED", True)
+    rate_limit.set_rate_limit_store(MemoryStore())
+    try:
+        for _ in range(10):
+            client.get("/health")
+        r = client.get("/health", headers={"Origin": "https://myrecipes.cloud"})
+        assert r.status_code == 429
+        assert r.headers["access-control-allow-origin"] == "*"  # the browser can read the 429
+        assert r.headers["x-frame-options"] == "DENY"
+
+        r = client.options("/api/recipes/", headers={"Origin": "https://myrecipes.cloud"})
+        assert r.status_code == 200
+        assert r.headers["access-control-allow-methods"] == "GET, POST, PUT, PATCH, DELETE, OPTIONS"
+        assert r.headers["x-content-type-options"] == "nosniff"
+    finally:
+        rate_limit.set_rate_limit_store(None)
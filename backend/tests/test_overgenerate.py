@@ -0,0 +1,92 @@
+"""Over-generate-and-filter: calibrated surplus, targeted top-up calls, per-filter rejection stats."""
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app import metrics
+from app.services import overgenerate
+from app.services.meal_plan_ai import _generate_day, _plan_context
+from app.services.what_can_i_make_ai import suggest_recipes_from_preferences
+
+
+@pytest.fixture(autouse=True)
+def _fresh_stats(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    overgenerate.stats.reset()
+    metrics.reset()
+    yield
+    overgenerate.stats.reset()
+
+
+def _completion(recipes: list[dict]):
+    content = json.dumps({"recipes": recipes})
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _rec(title: str, *ingredients: str) -> dict:
+    return {"title": title, "ingredients": list(ingredients), "steps": ["Cook."]}
+
+
+def test_surplus_grows_with_learned_rejection_rate():
+    keys = ["diet:vegetarian"]
+    assert overgenerate.surplus_size(3, keys) == 4  # prior: ~10% rejected
+    for i in range(20):
+        failed = overgenerate.check(_rec(f"r{i}", "beef" if i % 2 else "rice"), ["vegetarian"], None, None)
+        assert failed == (["diet:vegetarian"] if i % 2 else [])
+    assert overgenerate.surplus_size(3, keys) == 5  # half rejected, smoothed by the prior
+    assert overgenerate.surplus_size(8, keys) == overgenerate.MAX_ASK
+    assert overgenerate.stats.snapshot()["diet:vegetarian"] == {"checked": 20, "rejected": 10, "rate": 0.5}
+
+
+def test_discover_tops_up_with_targeted_call_when_filters_leave_it_short():
+    first = [_rec("Beef stew", "beef"), _rec("Pea soup", "peas"), _rec("Milk rice", "rice", "milk")]
+    second = [_rec("Pea soup", "peas"), _rec("Lentil curry", "lentils"), _rec("Bean chili", "beans")]
+    with patch("app.services.what_can_i_make_ai.OpenAI") as mock_openai:
+        create = mock_openai.return_value.chat.completions.create
+        create.side_effect = [_completion(first), _completion(second)]
+        out = suggest_recipes_from_preferences(diet_filters=["vegetarian"], allergens=["milk"], num_recipes=3)
+
+    assert [r["title"] for r in out] == ["Pea soup", "Lentil curry", "Bean chili"]
+    assert create.call_count == 2
+    follow_up = create.call_args_list[1].kwargs["messages"][-1]["content"]
+    assert "diet vegetarian (1 rejected)" in follow_up
+    assert "allergen milk (1 rejected)" in follow_up
+    assert "Do not repeat these recipes: Pea soup" in follow_up
+    counters = metrics.snapshot()["counters"]
+    assert counters["discover.ai.fulfilled_by_top_up"] == 1
+    assert counters["discover.ai.calls"] == 2
+
+
+def test_discover_skips_top_up_outside_latency_budget():
+    with patch("app.services.what_can_i_make_ai.OpenAI") as mock_openai, patch.object(
+        overgenerate, "LATENCY_BUDGET_S", 0.0
+    ):
+        create = mock_openai.return_value.chat.completions.create
+        create.return_value = _completion([_rec("Beef stew", "beef"), _rec("Pea soup", "peas")])
+        out = suggest_recipes_from_preferences(diet_filters=["vegetarian"], num_recipes=2)
+    assert [r["title"] for r in out] == ["Pea soup"]
+    assert create.call_count == 1
+    counters = metrics.snapshot()["counters"]
+    assert counters["discover.ai.top_up_skipped"] == 1
+    assert counters["discover.ai.short"] == 1
+
+
+def test_meal_plan_day_requests_alternates_when_filters_reject_often():
+    for i in range(10):
+        overgenerate.check(_rec(f"r{i}", "beef"), ["vegetarian"], None, None)
+    ctx = _plan_context(["dinner"], None, None, None, ["vegetarian"], None, None, None, None, None, None, "en", "metric")
+    meal = {"meal_type": "dinner", "estimated_time_minutes": 20, "steps": ["Cook."]}
+    answer = {
+        "meals": [
+            {**meal, "title": "Beef stew", "ingredients": ["beef"]},
+            {**meal, "title": "Pea soup", "ingredients": ["peas"]},
+            {**meal, "title": "Bean chili", "ingredients": ["beans"]},
+        ]
+    }
+    with patch("app.services.meal_plan_ai._chat_json", return_value=answer) as chat:
+        day = _generate_day(ctx, ["2026-01-05"], 0, ["any"])
+    assert "alternative meal per meal type" in chat.call_args.args[0][-1]["content"]
+    assert [m["title"] for m in day["meals"]] == ["Pea soup"]
+    assert metrics.snapshot()["counters"]["meal_plan.day.fulfilled"] == 1
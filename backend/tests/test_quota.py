@@ -0,0 +1,211 @@
+"""Atomic quota and its ledger: reserve -> commit / release, refunds on AI failure, sweeper, no overshoot."""
+import copy
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+from app import models, quota
+from app.auth import create_trial_token
+from tests.conftest import MOCK_TRANSLATED, TestSessionLocal, set_quota, transformations_used
+
+ADMIN_HEADERS = {"X-Admin-Token": "test-admin-token"}
+
+
+def _ledger() -> list[tuple[int | None, int | None, int, str]]:
+    db = TestSessionLocal()
+    try:
+        rows = db.query(models.QuotaLedgerEntry).order_by(models.QuotaLedgerEntry.id).all()
+        return [(r.user_id, r.trial_session_id, r.units, r.state) for r in rows]
+    finally:
+        db.close()
+
+
+def _trial(used_actions: int = 0) -> int:
+    db = TestSessionLocal()
+    try:
+        session = models.TrialSession(
+            token_id="quota-trial-token",
+            country="PL",
+            language="pl",
+            used_actions=used_actions,
+            created_at=datetime.now(timezone.utc),
+            last_seen_at=datetime.now(timezone.utc),
+        )
+        db.add(session)
+        db.commit()
+        return session.id
+    finally:
+        db.close()
+
+
+def _hammer(consume, attempts: int) -> tuple[int, int]:
+    """Run consume(db) from `attempts` threads released together; (successes, 402s)."""
+    barrier = threading.Barrier(attempts)
+    results: list[int] = []
+    lock = threading.Lock()
+
+    def worker() -> None:
+        db = TestSessionLocal()
+        try:
+            barrier.wait()
+            try:
+                consume(db)
+                outcome = 200
+            except HTTPException as e:
+                outcome = e.status_code
+            with lock:
+                results.append(outcome)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(attempts)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results.count(200), results.count(402)
+
+
+def test_concurrent_consumers_never_exceed_the_user_limit(registered_user):
+    set_quota(registered_user["id"], used=2, limit=7)
+
+    def consume(db):
+        quota.consume_user_quota(db, db.get(models.User, registered_user["id"]))
+
+    assert _hammer(consume, attempts=16) == (5, 11)
+    assert transformations_used(registered_user["id"]) == 7
+
+
+def test_concurrent_trial_actions_never_exceed_the_trial_limit():
+    trial_id = _trial(used_actions=1)
+
+    def consume(db):
+        quota.consume_trial_action(db, db.get(models.TrialSession, trial_id))
+
+    assert _hammer(consume, attempts=12) == (quota.MAX_TRIAL_ACTIONS - 1, 12 - (quota.MAX_TRIAL_ACTIONS - 1))
+    db = TestSessionLocal()
+    try:
+        assert db.get(models.TrialSession, trial_id).used_actions == quota.MAX_TRIAL_ACTIONS
+    finally:
+        db.close()
+
+
+def test_multi_unit_consume_and_refunds_stay_within_bounds(registered_user, db_session):
+    set_quota(registered_user["id"], used=0, limit=3)
+    user = db_session.get(models.User, registered_user["id"])
+    with pytest.raises(HTTPException) as exc:
+        quota.consume_user_quota(db_session, user, count=4)
+    assert exc.value.status_code == 402
+    quota.consume_user_quota(db_session, user, count=3)
+    assert user.transformations_used == 3  # taken from RETURNING, no reload
+
+    quota.refund_user_quota(db_session, user.id, count=5)
+    db_session.commit()
+    assert transformations_used(registered_user["id"]) == 0
+
+    set_quota(registered_user["id"], used=0, limit=-1)
+    db_session.expire_all()
+    quota.consume_user_quota(db_session, db_session.get(models.User, registered_user["id"]), count=50)
+    assert transformations_used(registered_user["id"]) == 50  # -1 means unlimited
+
+
+@pytest.mark.parametrize(
+    "path, target, body",
+    [
+        ("/api/recipes/", "app.routers.recipes.translate_recipe", {"raw_input": "Toast: bread. Toast it."}),
+        ("/api/recipes/discover", "app.routers.recipes.suggest_recipes_from_preferences", {"keywords": "xyz"}),
+        (
+            "/api/recipes/what-can-i-make",
+            "app.routers.recipes.suggest_recipe_from_ingredients",
+            {"ingredients": ["egg"], "source": "ai"},
+        ),
+    ],
+)
+def test_ai_failure_refunds_the_consumed_unit(client, auth_headers, registered_user, path, target, body):
+    set_quota(registered_user["id"], used=4, limit=5)
+    with patch(target, side_effect=RuntimeError("OpenAI is rate limited")):
+        r = client.post(path, json=body, headers=auth_headers)
+    assert r.status_code == 503
+    assert transformations_used(registered_user["id"]) == 4
+    assert _ledger() == [(registered_user["id"], None, 1, quota.LEDGER_RELEASED)]
+
+
+def test_trial_action_is_refunded_when_translation_fails(client):
+    trial_id = _trial(used_actions=0)
+    headers = {"Authorization": f"Bearer {create_trial_token('quota-trial-token')}"}
+    with patch("app.routers.recipes.translate_recipe", side_effect=Exception("bad JSON")):
+        r = client.post("/api/recipes/", json={"raw_input": "Toast: bread. Toast it."}, headers=headers)
+    assert r.status_code == 502
+    db = TestSessionLocal()
+    try:
+        assert db.get(models.TrialSession, trial_id).used_actions == 0
+    finally:
+        db.close()
+
+
+def test_successful_request_commits_its_reservation_and_admin_sees_usage_per_day(
+    client, auth_headers, registered_user
+):
+    with patch("app.routers.recipes.translate_recipe", return_value=copy.deepcopy(MOCK_TRANSLATED)):
+        assert client.post("/api/recipes/", json={"raw_input": "Toast"}, headers=auth_headers).status_code == 201
+    with patch("app.routers.recipes.translate_recipe", side_effect=RuntimeError("down")):
+        assert client.post("/api/recipes/", json={"raw_input": "Toast"}, headers=auth_headers).status_code == 503
+    assert _ledger() == [
+        (registered_user["id"], None, 1, quota.LEDGER_COMMITTED),
+        (registered_user["id"], None, 1, quota.LEDGER_RELEASED),
+    ]
+
+    r = client.get("/api/admin/quota-usage?days=7", headers=ADMIN_HEADERS)
+    assert r.status_code == 200
+    assert r.json() == [
+        {
+            "user_id": registered_user["id"],
+            "email": registered_user["email"],
+            "day": datetime.now(timezone.utc).date().isoformat(),
+            "used": 1,
+            "reserved": 0,
+            "released": 1,
+        }
+    ]
+    assert client.get("/api/admin/quota-usage").status_code == 401
+
+
+def test_sweeper_releases_expired_reservations_and_late_commit_charges_again(registered_user):
+    set_quota(registered_user["id"], used=0, limit=5)
+    db = TestSessionLocal()
+    try:
+        quota.consume_user_quota(db, db.get(models.User, registered_user["id"]))
+        ids = quota.take_reservations(db)  # as if the worker died before settling
+    finally:
+        db.close()
+    assert transformations_used(registered_user["id"]) == 1
+
+    db = TestSessionLocal()
+    try:
+        assert quota.sweep_expired_reservations(db) == 0  # not expired yet
+        later = datetime.now(timezone.utc) + timedelta(seconds=quota.RESERVATION_TTL_S + 1)
+        assert quota.sweep_expired_reservations(db, now=later) == 1
+        assert transformations_used(registered_user["id"]) == 0
+        assert _ledger()[0][3] == quota.LEDGER_RELEASED
+
+        # The work finished after all: committing the swept reservation charges it again.
+        quota.commit_reservations(db, ids)
+    finally:
+        db.close()
+    assert transformations_used(registered_user["id"]) == 1
+    assert _ledger() == [(registered_user["id"], None, 1, quota.LEDGER_COMMITTED)]
+
+
+def test_request_failing_outside_the_ai_call_releases_the_trial_action(client):
+    trial_id = _trial(used_actions=0)
+    headers = {"Authorization": f"Bearer {create_trial_token('quota-trial-token')}"}
+    with patch(
+        "app.routers.recipes._split_url_into_chunks",
+        side_effect=HTTPException(status_code=400, detail="Could not fetch the page"),
+    ):
+        r = client.post("/api/recipes/", json={"source_url": "https://example.com/r"}, headers=headers)
+    assert r.status_code == 400
+    assert _ledger() == [(None, trial_id, 1, quota.LEDGER_RELEASED)]
@@ -0,0 +1,196 @@
+"""Token-bucket rate limiting: per route / caller / tier, and stores shared across worker processes."""
+import multiprocessing
+import socketserver
+import threading
+import time
+
+import pytest
+
+from app import auth_cache, metrics, models, rate_limit
+from app.auth import create_trial_token
+from app.rate_limit import Limit, MemoryStore, RedisStore, SQLiteStore
+from tests.conftest import TestSessionLocal
+
+SHARED_BURST = 25
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    monkeypatch.setattr(rate_limit, "ENABLED", True)
+    rate_limit.set_rate_limit_store(MemoryStore())
+    yield
+    rate_limit.set_rate_limit_store(None)
+
+
+class _RespStandIn(socketserver.ThreadingTCPServer):
+    """
+    Just enough of the Redis protocol for RedisStore: EVAL / EVALSHA of the token-bucket script
+    (run here in Python, under one lock, like Redis runs a script), AUTH, SELECT and PING.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _RespHandler)
+        self.lock = threading.Lock()
+        self.buckets: dict[str, tuple[float, float]] = {}
+        self.scripts: set[str] = set()
+
+    def run_bucket(self, key: str, burst: float, rate: float, cost: float) -> str:
+        with self.lock:
+            now = time.time()
+            tokens, updated = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self.buckets[key] = (tokens, now)
+            return repr(wait)
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def _reply(self, value) -> None:
+        if isinstance(value, Exception):
+            self.wfile.write(b"-%s\r\n" % str(value).encode())
+        elif value is None:
+            self.wfile.write(b"+OK\r\n")
+        else:
+            data = value.encode()
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(data), data))
+
+    def handle(self) -> None:
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                size = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(size + 2)[:-2].decode())
+            command = args[0].upper()
+            if command in ("EVAL", "EVALSHA"):
+                sha = rate_limit.TOKEN_BUCKET_SHA if command == "EVAL" else args[1]
+                if command == "EVAL":
+                    self.server.scripts.add(sha)
+                if sha not in self.server.scripts:
+                    self._reply(Exception("NOSCRIPT No matching script."))
+                    continue
+                key, burst, rate, cost = args[3], float(args[4]), float(args[5]), float(args[6])
+                self._reply(self.server.run_bucket(key, burst, rate, cost))
+            elif command == "PING":
+                self._reply("PONG")
+            else:
+                self._reply(None)
+
+
+@pytest.fixture
+def resp_server():
+    server = _RespStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"redis://127.0.0.1:{server.server_address[1]}/0"
+    server.shutdown()
+    server.server_close()
+
+
+def _make_store(kind: str, location: str):
+    return {"sqlite": SQLiteStore, "redis": RedisStore}[kind](location)
+
+
+def _take_shared_bucket(kind: str, location: str, attempts: int, start_at: float, results) -> None:
+    """Worker process: wait for the common start, then hammer one bucket; report how many takes succeeded."""
+    store = _make_store(kind, location)
+    limit = Limit(per_minute=0.001, burst=SHARED_BURST)  # no meaningful refill during the test
+    time.sleep(max(0.0, start_at - time.time()))
+    results.put(sum(1 for _ in range(attempts) if store.take("shared", limit) == 0.0))
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "redis"])
+def test_limit_holds_across_four_worker_processes(kind, tmp_path, resp_server):
+    location = str(tmp_path / "buckets.sqlite3") if kind == "sqlite" else resp_server
+    _make_store(kind, location)  # create the SQLite table before the workers race for it
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    start_at = time.time() + 3.0
+    workers = [ctx.Process(target=_take_shared_bucket, args=(kind, location, 20, start_at, results)) for _ in range(4)]
+    for w in workers:
+        w.start()
+    allowed = [results.get(timeout=60) for _ in workers]
+    for w in workers:
+        w.join()
+    assert sum(allowed) == SHARED_BURST, allowed  # 80 attempts from 4 processes, one bucket's worth let through
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite", "redis"])
+def test_bucket_refills_at_its_rate(kind, tmp_path, resp_server):
+    store = MemoryStore() if kind == "memory" else _make_store(
+        kind, str(tmp_path / "buckets.sqlite3") if kind == "sqlite" else resp_server
+    )
+    limit = Limit(per_minute=600, burst=3)  # 10 tokens/s
+    assert [store.take("k", limit) for _ in range(3)] == [0.0, 0.0, 0.0]
+    wait = store.take("k", limit)
+    assert 0 < wait <= 0.1
+    assert store.take("other", limit) == 0.0  # buckets are per key
+    time.sleep(0.15)
+    assert store.take("k", limit) == 0.0
+
+
+def test_anonymous_callers_are_limited_per_ip_with_retry_after(client, limited):
+    statuses = [client.get("/health").status_code for _ in range(11)]
+    assert statuses == [200] * 10 + [429]
+    r = client.get("/health")
+    assert r.json() == {"detail": rate_limit.TOO_MANY_REQUESTS_DETAIL}
+    assert int(r.headers["retry-after"]) >= 1
+    assert client.get("/static/missing.png").status_code == 404  # static files are not limited
+
+
+def test_ai_routes_are_limited_per_user_and_tier(client, auth_headers, registered_user, limited):
+    statuses = [client.post("/api/recipes/", json={}, headers=auth_headers).status_code for _ in range(6)]
+    assert statuses[:5] == [422] * 5 and statuses[5] == 429  # free tier: burst of 5 AI calls
+    assert client.get("/api/recipes/", headers=auth_headers).status_code == 200  # other routes: own bucket
+    assert client.get("/health").status_code == 200  # not the anonymous per-IP bucket
+
+    db = TestSessionLocal()
+    try:
+        db.get(models.User, registered_user["id"]).account_tier = "paid"
+        db.commit()
+    finally:
+        db.close()
+    auth_cache.clear()
+    renewed = client.get("/api/users/me", headers=auth_headers).json()["renewed_token"]
+    rate_limit.set_rate_limit_store(MemoryStore())
+    statuses = [client.post("/api/recipes/", json={}, headers=auth_headers).status_code for _ in range(11)]
+    assert statuses.count(429) == 1 and statuses[-1] == 429  # tier from this process's cached user
+
+    # A worker with no cached user reads the tier claim of the renewed token.
+    auth_cache.clear()
+    rate_limit.set_rate_limit_store(MemoryStore())
+    paid = {"Authorization": f"Bearer {renewed}"}
+    assert rate_limit.caller({"headers": [(b"authorization", paid["Authorization"].encode())]})[1] == "paid"
+    statuses = [client.post("/api/recipes/", json={}, headers=paid).status_code for _ in range(11)]
+    assert statuses.count(429) == 1 and statuses[-1] == 429
+
+    trial = {"Authorization": f"Bearer {create_trial_token('rate-limit-trial')}"}
+    statuses = [client.post("/api/recipes/discover", json={}, headers=trial).status_code for _ in range(4)]
+    assert statuses[-1] == 429 and 429 not in statuses[:3]
+
+
+def test_login_is_limited_per_ip_and_store_errors_fail_open(client, auth_headers, limited):
+    statuses = [
+        client.post("/api/auth/login", data={"username": "x@example.com", "password": "nope"}, headers=auth_headers)
+        .status_code
+        for _ in range(11)
+    ]
+    assert statuses[-1] == 429 and 429 not in statuses[:10]
+
+    class BrokenStore(MemoryStore):
+        def take(self, key, limit, cost=1):
+            raise ConnectionError("redis down")
+
+    rate_limit.set_rate_limit_store(BrokenStore())
+    before = metrics.snapshot()["counters"].get("rate_limit.store_errors", 0)
+    assert client.get("/health").status_code == 200
+    assert metrics.snapshot()["counters"]["rate_limit.store_errors"] == before + 1
@@ -0,0 +1,96 @@
+"""Precomputed recipe compliance flags and the safe_for_me listing filter."""
+from app import models
+from app.services.recipe_compliance import (
+    ALLERGEN_FLAGS,
+    COMPLIANCE_VERSION,
+    DIET_FLAGS,
+    backfill_compliance,
+    compute_compliance_flags,
+    flags_to_names,
+)
+from tests.conftest import TestSessionLocal, add_recipe
+
+
+def test_compute_compliance_flags_detects_meat_and_dairy():
+    diet_flags, allergen_flags = compute_compliance_flags(
+        "Cheeseburger", ["200 g ground beef", "1 slice cheddar cheese", "1 bun"], ["Grill."]
+    )
+    diets = flags_to_names(diet_flags, DIET_FLAGS)
+    allergens = flags_to_names(allergen_flags, ALLERGEN_FLAGS)
+    assert "vegetarian" not in diets
+    assert "kosher" not in diets
+    assert "milk" in allergens
+
+
+def test_compute_compliance_flags_polish_dairy_not_matched_inside_deser():
+    """'deser' contains 'ser' but is not cheese."""
+    _, allergen_flags = compute_compliance_flags("Deser owocowy", ["2 jabłka", "1 gruszka"], ["Pokrój owoce."])
+    assert "milk" not in flags_to_names(allergen_flags, ALLERGEN_FLAGS)
+    _, allergen_flags = compute_compliance_flags("Pierogi", ["200 g sera białego"], ["Ulep pierogi."])
+    assert "milk" in flags_to_names(allergen_flags, ALLERGEN_FLAGS)
+
+
+def test_flags_recomputed_when_ingredients_change(registered_user):
+    db = TestSessionLocal()
+    try:
+        recipe = add_recipe(db, registered_user["id"], "Salad", ["lettuce", "tomato"])
+        assert recipe.compliance_version == COMPLIANCE_VERSION
+        assert "vegan" in flags_to_names(recipe.diet_flags, DIET_FLAGS)
+
+        recipe.ingredients_pl = ["lettuce", "tomato", "feta cheese"]
+        db.commit()
+        db.refresh(recipe)
+        assert "vegan" not in flags_to_names(recipe.diet_flags, DIET_FLAGS)
+        assert "milk" in flags_to_names(recipe.allergen_flags, ALLERGEN_FLAGS)
+    finally:
+        db.close()
+
+
+def test_list_recipes_safe_for_me_filters_by_user_diet_and_allergens(client, auth_headers, registered_user):
+    db = TestSessionLocal()
+    try:
+        add_recipe(db, registered_user["id"], "Lentil soup", ["lentils", "carrot", "onion"])
+        add_recipe(db, registered_user["id"], "Chicken curry", ["chicken", "curry paste"])
+        add_recipe(db, registered_user["id"], "Peanut noodles", ["rice noodles", "peanut butter"])
+    finally:
+        db.close()
+    r = client.patch(
+        "/api/users/me/settings",
+        json={"diet_filters": ["vegetarian"], "allergens": ["peanuts"]},
+        headers=auth_headers,
+    )
+    assert r.status_code == 200
+
+    r = client.get("/api/recipes/", headers=auth_headers)
+    assert len(r.json()) == 3
+
+    r = client.get("/api/recipes/?safe_for_me=true", headers=auth_headers)
+    assert r.status_code == 200
+    assert [x["title_pl"] for x in r.json()] == ["Lentil soup"]
+
+    # Rows from before the compliance columns (not backfilled yet) are checked in memory.
+    db = TestSessionLocal()
+    try:
+        db.query(models.Recipe).update({models.Recipe.compliance_version: None, models.Recipe.diet_flags: 0})
+        db.commit()
+    finally:
+        db.close()
+    r = client.get("/api/recipes/?safe_for_me=true", headers=auth_headers)
+    assert [x["title_pl"] for x in r.json()] == ["Lentil soup"]
+
+
+def test_backfill_compliance_processes_stale_rows_in_batches(registered_user):
+    db = TestSessionLocal()
+    try:
+        for i in range(5):
+            add_recipe(db, registered_user["id"], f"Soup {i}", ["water", "carrot"])
+        db.query(models.Recipe).update({models.Recipe.compliance_version: None, models.Recipe.diet_flags: 0})
+        db.commit()
+
+        assert backfill_compliance(db, batch_size=2) == 5
+        assert backfill_compliance(db, batch_size=2) == 0
+        rows = db.query(models.Recipe).all()
+        assert all(r.compliance_version == COMPLIANCE_VERSION for r in rows)
+        assert all("vegan" in flags_to_names(r.diet_flags, DIET_FLAGS) for r in rows)
+    finally:
+        db.close()
@@ -0,0 +1,87 @@
+"""Library export: streamed JSON Lines / CSV / zip with variants and optional images."""
+import csv
+import io
+import json
+import zipfile
+
+import pytest
+
+from app import models
+from app.services import image_store, recipe_export
+from tests.conftest import TestSessionLocal, add_recipe
+
+
+@pytest.fixture(autouse=True)
+def _image_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_store, "_BASE_DIR", str(tmp_path))
+
+
+def _make_recipes(user_id: int, count: int, image_url: str | None = None) -> list[int]:
+    db = TestSessionLocal()
+    try:
+        ids = [
+            add_recipe(db, user_id, f"Zupa {i}", ["500 g pomidorów"], steps_pl=['Gotuj, "powoli".'], image_url=image_url).id
+            for i in range(count)
+        ]
+        db.add(models.RecipeVariant(recipe_id=ids[0], variant_type="vegan", title_pl="Zupa wegańska", ingredients_pl=[], steps_pl=[]))
+        db.commit()
+        return ids
+    finally:
+        db.close()
+
+
+def test_jsonl_export_streams_batches_without_loading_orm_objects(client, auth_headers, registered_user):
+    ids = _make_recipes(registered_user["id"], 5)
+    r = client.get("/api/recipes/export?format=jsonl", headers=auth_headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/x-ndjson"
+    assert r.headers["content-disposition"].startswith('attachment; filename="recipes-')
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [row["id"] for row in rows] == ids
+    assert rows[0]["variants"][0]["title_pl"] == "Zupa wegańska"
+    assert rows[1]["variants"] == []
+    assert "raw_input" in rows[0] and "diet_flags" not in rows[0]
+
+    db = TestSessionLocal()
+    try:
+        chunks = list(recipe_export.iter_jsonl(db, registered_user["id"], batch_size=2))
+        assert len(chunks) == 3
+        assert len(db.identity_map) == 0
+    finally:
+        db.close()
+
+    assert client.get("/api/recipes/export?format=xml", headers=auth_headers).status_code == 400
+    assert client.get("/api/recipes/export").status_code == 401
+
+
+def test_csv_export_has_one_row_per_recipe_with_json_columns(client, auth_headers, registered_user):
+    _make_recipes(registered_user["id"], 2)
+    r = client.get("/api/recipes/export?format=csv", headers=auth_headers)
+    assert r.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(r.content.decode("utf-8-sig"))))
+    assert len(rows) == 2
+    assert json.loads(rows[0]["steps_pl"]) == ['Gotuj, "powoli".']
+    assert json.loads(rows[0]["variants"])[0]["variant_type"] == "vegan"
+
+
+def test_zip_export_includes_each_stored_image_once(client, auth_headers, registered_user):
+    db = TestSessionLocal()
+    try:
+        image_url = image_store.store(db, b"\xff\xd8\xff" + b"jpeg" * 100, "jpg")
+        db.commit()
+    finally:
+        db.close()
+    _make_recipes(registered_user["id"], 3, image_url=image_url)
+
+    r = client.get("/api/recipes/export?format=zip&include_images=true", headers=auth_headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/zip"
+    archive = zipfile.ZipFile(io.BytesIO(r.content))
+    image_entry = "images/" + image_url.rsplit("/recipe-images/", 1)[1]
+    assert archive.namelist() == ["recipes.jsonl", image_entry]
+    assert archive.read(image_entry) == b"\xff\xd8\xff" + b"jpeg" * 100
+    rows = [json.loads(line) for line in archive.read("recipes.jsonl").decode("utf-8").splitlines()]
+    assert {row["image_file"] for row in rows} == {image_entry}
+
+    r = client.get("/api/recipes/export?format=zip", headers=auth_headers)
+    assert zipfile.ZipFile(io.BytesIO(r.content)).namelist() == ["recipes.jsonl"]
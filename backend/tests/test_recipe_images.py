@@ -0,0 +1,400 @@
+"""Dish images: background generation, responsive renditions, content-addressed reference-counted storage."""
+import hashlib
+import os
+from unittest.mock import patch
+
+import pytest
+
+from app import jobs, models
+from app.jobs import JobBackend, ThreadPoolJobBackend, run_job, set_job_backend
+from app.services import image_store, recipe_image
+from tests.conftest import TestSessionLocal, add_recipe
+
+
+class _RecordingBackend(JobBackend):
+    """Keeps submitted jobs queued so the test decides when workers run."""
+
+    def __init__(self):
+        self.submitted: list[tuple[str, str]] = []
+
+    def submit(self, job_id: str, lane: str = jobs.DEFAULT_LANE) -> None:
+        self.submitted.append((job_id, lane))
+
+
+@pytest.fixture(autouse=True)
+def _image_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_store, "_BASE_DIR", str(tmp_path))
+    yield
+    set_job_backend(None)
+
+
+def test_same_cache_key_enqueues_one_generation_for_all_waiting_recipes(registered_user):
+    backend = _RecordingBackend()
+    set_job_backend(backend)
+    db = TestSessionLocal()
+    try:
+        first = add_recipe(db, registered_user["id"], "Zupa pomidorowa")
+        second = add_recipe(db, registered_user["id"], "Zupa  Pomidorowa")
+        assert recipe_image.request_recipe_image(first, db) == recipe_image.IMAGE_PENDING
+        assert recipe_image.request_recipe_image(second, db) == recipe_image.IMAGE_PENDING
+        first_id, second_id = first.id, second.id
+    finally:
+        db.close()
+
+    assert len(backend.submitted) == 1
+    job_id, lane = backend.submitted[0]
+    assert lane == recipe_image.IMAGE_JOB_LANE
+
+    with patch("app.services.recipe_image._generate_image_via_openai", return_value=b"jpeg") as gen:
+        run_job(job_id)
+    assert gen.call_count == 1
+
+    db = TestSessionLocal()
+    try:
+        a, b = db.get(models.Recipe, first_id), db.get(models.Recipe, second_id)
+        assert a.image_status == b.image_status == recipe_image.IMAGE_READY
+        digest = hashlib.sha256(b"jpeg").hexdigest()
+        assert a.image_url == b.image_url == f"{recipe_image.STATIC_URL_PREFIX}/{digest[:2]}/{digest}.jpg"
+        # A later recipe with the same key is served from the cache without a job.
+        third = add_recipe(db, registered_user["id"], "zupa pomidorowa")
+        assert recipe_image.request_recipe_image(third, db) == recipe_image.IMAGE_READY
+    finally:
+        db.close()
+    assert len(backend.submitted) == 1
+
+
+def test_recipe_pending_while_its_key_is_generating_is_served_by_the_running_job(registered_user):
+    backend = _RecordingBackend()
+    set_job_backend(backend)
+    db = TestSessionLocal()
+    try:
+        first = add_recipe(db, registered_user["id"], "Zupa pomidorowa")
+        recipe_image.request_recipe_image(first, db)
+        late_ids = []
+
+        def generate(prompt):
+            # Marked pending after the running job collected its waiting recipes.
+            late = add_recipe(db, registered_user["id"], "Zupa pomidorowa")
+            assert recipe_image.request_recipe_image(late, db) == recipe_image.IMAGE_PENDING
+            late_ids.append(late.id)
+            return b"jpeg"
+
+        with patch("app.services.recipe_image._generate_image_via_openai", side_effect=generate) as gen:
+            run_job(backend.submitted[0][0])
+        assert gen.call_count == 1 and len(backend.submitted) == 1
+        db.expire_all()
+        assert db.get(models.Recipe, late_ids[0]).image_status == recipe_image.IMAGE_READY
+    finally:
+        db.close()
+
+
+def test_generation_racing_another_worker_reuses_its_image(registered_user):
+    backend = _RecordingBackend()
+    set_job_backend(backend)
+    db = TestSessionLocal()
+    try:
+        recipe = add_recipe(db, registered_user["id"], "Zupa pomidorowa")
+        recipe_image.request_recipe_image(recipe, db)
+        cache_key = recipe.image_cache_key
+
+        def generate(prompt):
+            # Another worker (e.g. a re-submitted job) stores this key first.
+            other = TestSessionLocal()
+            try:
+                other.add(models.RecipeImageCache(cache_key=cache_key, image_url="/static/recipe-images/other.jpg"))
+                other.commit()
+            finally:
+                other.close()
+            return b"jpeg"
+
+        with patch("app.services.recipe_image._generate_image_via_openai", side_effect=generate):
+            run_job(backend.submitted[0][0])
+        db.expire_all()
+        assert db.get(models.Recipe, recipe.id).image_url == "/static/recipe-images/other.jpg"
+        assert db.get(models.Job, backend.submitted[0][0]).status == "succeeded"
+        assert db.query(models.RecipeImageCache).count() == 1
+    finally:
+        db.close()
+
+
+def test_generate_endpoint_returns_immediately_and_reports_failure(client, auth_headers, recipe):
+    backend = _RecordingBackend()
+    set_job_backend(backend)
+    r = client.post(f"/api/recipes/{recipe['id']}/image/generate", headers=auth_headers)
+    assert r.status_code == 202
+    assert r.json()["image_status"] == "pending"
+    assert r.json()["image_url"] is None
+
+    with patch("app.services.recipe_image._generate_image_via_openai", return_value=None):
+        run_job(backend.submitted[0][0])
+    body = client.get(f"/api/recipes/{recipe['id']}", headers=auth_headers).json()
+    assert body["image_status"] == "failed"
+    db = TestSessionLocal()
+    try:
+        job = db.get(models.Job, backend.submitted[0][0])
+        assert job.status == "failed"
+    finally:
+        db.close()
+
+    # Retrying is allowed and queues a fresh generation.
+    r = client.post(f"/api/recipes/{recipe['id']}/image/generate", headers=auth_headers)
+    assert r.json()["image_status"] == "pending"
+    assert len(backend.submitted) == 2
+
+
+def test_image_jobs_run_in_their_own_bounded_lane():
+    backend = ThreadPoolJobBackend(max_workers=4)
+    try:
+        assert backend._executor(recipe_image.IMAGE_JOB_LANE)._max_workers == recipe_image.IMAGE_WORKERS
+        assert backend._executor(jobs.DEFAULT_LANE)._max_workers == 4
+    finally:
+        backend.shutdown()
+
+
+def _png_bytes(width: int, height: int) -> bytes:
+    import io
+    import random
+
+    from PIL import Image
+
+    rng = random.Random(0)
+    img = Image.new("RGB", (width, height))
+    img.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(width * height)])
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_upload_builds_webp_and_jpeg_renditions_with_srcset(client, auth_headers, recipe, tmp_path, capsys):
+    pytest.importorskip("PIL")
+    from app.cli import main as cli_main
+
+    content = _png_bytes(800, 600)
+    r = client.post(
+        f"/api/recipes/{recipe['id']}/image-upload",
+        files={"file": ("dish.png", content, "image/png")},
+        headers=auth_headers,
+    )
+    assert r.status_code == 200
+    body = r.json()
+    thumb = body["image_renditions"]["thumb"]
+    assert (thumb["width"], thumb["height"]) == (160, 120)
+    assert body["image_renditions"]["full"]["width"] == 800  # never upscaled
+    assert body["image_srcset"].startswith(f"{thumb['webp']} 160w, ")
+    assert body["image_srcset_jpeg"].endswith(".jpg 800w")
+    thumb_file = tmp_path / thumb["webp"].removeprefix("/static/recipe-images/")
+    assert thumb_file.exists() and thumb_file.stat().st_size < len(content) // 10
+
+    assert cli_main(["bench-image-bytes"]) == 0
+    out = capsys.readouterr().out
+    assert f"{len(content)} bytes as originals, {thumb_file.stat().st_size} bytes as thumbnails" in out
+
+    r = client.delete(f"/api/recipes/{recipe['id']}/image", headers=auth_headers)
+    assert r.json()["image_renditions"] is None and r.json()["image_srcset"] is None
+
+
+def _blobs() -> dict[str, int]:
+    db = TestSessionLocal()
+    try:
+        return {b.hash: b.ref_count for b in db.query(models.ImageBlob).all()}
+    finally:
+        db.close()
+
+
+def _upload(client, auth_headers, recipe_id: int, content: bytes) -> dict:
+    r = client.post(
+        f"/api/recipes/{recipe_id}/image-upload",
+        files={"file": ("dish.png", content, "image/png")},
+        headers=auth_headers,
+    )
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_identical_images_are_stored_once_and_removed_with_the_last_recipe(
+    client, auth_headers, recipe, registered_user, tmp_path
+):
+    pytest.importorskip("PIL")
+    content = _png_bytes(64, 48)
+    db = TestSessionLocal()
+    try:
+        other_id = add_recipe(db, registered_user["id"], "Bigos").id
+    finally:
+        db.close()
+
+    first = _upload(client, auth_headers, recipe["id"], content)
+    second = _upload(client, auth_headers, other_id, content)
+    digest = hashlib.sha256(content).hexdigest()
+    assert first["image_url"] == second["image_url"] == f"/static/recipe-images/{digest[:2]}/{digest}.png"
+    files = [p for p in tmp_path.rglob("*") if p.is_file()]
+    assert len(files) == len(_blobs()) == 3  # original, WebP, JPEG: below 160px all renditions are one file
+    assert set(_blobs().values()) == {2}
+
+    assert client.delete(f"/api/recipes/{recipe['id']}", headers=auth_headers).status_code == 204
+    assert set(_blobs().values()) == {1}
+    assert (tmp_path / digest[:2] / f"{digest}.png").exists()
+
+    # Replacing the last user's photo releases the old files at once.
+    _upload(client, auth_headers, other_id, _png_bytes(32, 32))
+    assert not (tmp_path / digest[:2] / f"{digest}.png").exists()
+    assert len([p for p in tmp_path.rglob("*") if p.is_file()]) == len(_blobs()) == 3
+
+
+def test_deleting_the_user_removes_their_image_files(client, auth_headers, recipe, tmp_path):
+    pytest.importorskip("PIL")
+    _upload(client, auth_headers, recipe["id"], _png_bytes(40, 30))
+    assert _blobs()
+    assert client.delete("/api/users/me", headers=auth_headers).status_code == 204
+    assert _blobs() == {}
+    assert not [p for p in tmp_path.rglob("*") if p.is_file()]
+
+
+def test_unreferenced_files_survive_the_grace_period_only():
+    db = TestSessionLocal()
+    try:
+        url = image_store.store(db, b"orphan", "jpg")
+        db.commit()
+        assert image_store.collect_garbage(db) == 0
+        assert image_store.collect_garbage(db, grace_s=-1) == 1
+        assert not os.path.exists(image_store.file_path(url))
+    finally:
+        db.close()
+
+
+def test_store_racing_a_collection_keeps_its_file():
+    db, other = TestSessionLocal(), TestSessionLocal()
+    try:
+        url = image_store.store(db, b"orphan", "jpg")
+        db.commit()
+        real_commit = db.commit
+
+        def commit_then_store():
+            real_commit()  # the blob row is gone; a concurrent request stores the same bytes again
+            assert image_store.store(other, b"orphan", "jpg") == url
+            other.commit()
+
+        with patch.object(db, "commit", commit_then_store):
+            assert image_store.collect_garbage(db, grace_s=-1) == 1
+        with open(image_store.file_path(url), "rb") as f:
+            assert f.read() == b"orphan"
+        assert url.endswith(next(iter(_blobs())) + ".jpg")
+        assert os.listdir(os.path.dirname(image_store.file_path(url))) == [os.path.basename(url)]
+    finally:
+        db.close()
+        other.close()
+
+
+def test_static_images_are_immutable_with_etag_and_304(client):
+    from app.main import _static_dir
+
+    digest = hashlib.sha256(b"static-test").hexdigest()
+    path = _static_dir / "recipe-images" / digest[:2] / f"{digest}.jpg"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"static-test")
+    try:
+        url = f"/static/recipe-images/{digest[:2]}/{digest}.jpg"
+        r = client.get(url)
+        assert r.status_code == 200 and r.content == b"static-test"
+        assert r.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert r.headers["etag"] == f'"{digest}"'
+        r = client.get(url, headers={"If-None-Match": f'"{digest}"'})
+        assert r.status_code == 304
+        assert r.headers["cache-control"] == "public, max-age=31536000, immutable"
+    finally:
+        path.unlink()
+        if not any(path.parent.iterdir()):
+            path.parent.rmdir()
+
+
+def test_upload_is_streamed_with_size_cap_and_magic_byte_check(client, auth_headers, recipe, tmp_path):
+    class _CountingReader:
+        def __init__(self, data: bytes):
+            self._data, self.read_bytes = data, 0
+
+        def read(self, size: int) -> bytes:
+            chunk = self._data[self.read_bytes:self.read_bytes + size]
+            self.read_bytes += len(chunk)
+            return chunk
+
+    db = TestSessionLocal()
+    try:
+        big = _CountingReader(b"\x89PNG\r\n\x1a\n" + b"\0" * (10 * 1024 * 1024))
+        with pytest.raises(image_store.UploadRejected) as exc:
+            image_store.store_stream(db, big, max_bytes=1024 * 1024, chunk_size=64 * 1024)
+        assert exc.value.reason == "too_large"
+        assert big.read_bytes <= 1024 * 1024 + 64 * 1024  # stopped at the cap, not at end of file
+        with pytest.raises(image_store.UploadRejected) as exc:
+            image_store.store_stream(db, _CountingReader(b"GIF89a" + b"\0" * 100), max_bytes=1024)
+        assert exc.value.reason == "unsupported"
+    finally:
+        db.close()
+    assert not [p for p in tmp_path.rglob("*") if p.is_file()]  # temp files removed
+
+    # The declared content type is not trusted: a GIF sent as image/png is refused.
+    r = client.post(
+        f"/api/recipes/{recipe['id']}/image-upload",
+        files={"file": ("dish.png", b"GIF89a" + b"\0" * 100, "image/png")},
+        headers=auth_headers,
+    )
+    assert r.status_code == 400 and r.json()["detail"] == "Only JPEG or PNG images are allowed."
+    r = client.post(
+        f"/api/recipes/{recipe['id']}/image-upload",
+        files={"file": ("dish.png", b"\x89PNG\r\n\x1a\n" + b"\0" * (3 * 1024 * 1024), "image/png")},
+        headers=auth_headers,
+    )
+    assert r.status_code == 400 and r.json()["detail"] == "Image must be 3 MB or smaller."
+    # A JPEG labelled image/png is stored by what it is.
+    r = client.post(
+        f"/api/recipes/{recipe['id']}/image-upload",
+        files={"file": ("dish.png", b"\xff\xd8\xff\xe0" + b"\0" * 100, "image/png")},
+        headers=auth_headers,
+    )
+    assert r.status_code == 200 and r.json()["image_url"].endswith(".jpg")
+
+
+def test_near_duplicate_dishes_reuse_the_generated_image(client, registered_user):
+    backend = _RecordingBackend()
+    set_job_backend(backend)
+    db = TestSessionLocal()
+    try:
+        original = add_recipe(
+            db, registered_user["id"], "Classic Cheesecake", ["900 g cream cheese", "4 eggs", "200 g sugar"]
+        )
+        assert recipe_image.request_recipe_image(original, db) == recipe_image.IMAGE_PENDING
+        with patch("app.services.recipe_image._generate_image_via_openai", return_value=b"cheesecake") as gen:
+            run_job(backend.submitted[0][0])
+        assert gen.call_count == 1
+        db.refresh(original)
+
+        sernik = add_recipe(db, registered_user["id"], "Sernik", ["1 kg twarogu", "5 jajek", "200 g cukru"])
+        new_york = add_recipe(
+            db, registered_user["id"], "New York cheesecake", ["cream cheese", "eggs", "sugar", "graham crackers"]
+        )
+        for r in (sernik, new_york):
+            # Only exact keys are looked up on the request path; the job finds the near-duplicate.
+            assert recipe_image.request_recipe_image(r, db) == recipe_image.IMAGE_PENDING
+            with patch("app.services.recipe_image._generate_image_via_openai") as gen:
+                run_job(backend.submitted[-1][0])
+            assert gen.call_count == 0
+            db.refresh(r)
+            assert r.image_status == recipe_image.IMAGE_READY
+            assert r.image_url == original.image_url
+        alias = db.query(models.RecipeImageCache).filter_by(cache_key=recipe_image.recipe_image_cache_key(sernik)).one()
+        assert alias.canonical_key == recipe_image.recipe_image_cache_key(original)
+
+        # Same main word but a different dish stays below the threshold.
+        other = add_recipe(db, registered_user["id"], "Chicken soup", ["1 chicken", "2 carrots"])
+        assert recipe_image.request_recipe_image(other, db) == recipe_image.IMAGE_PENDING
+        # A second "Sernik" is now an exact hit on the alias row.
+        again = add_recipe(db, registered_user["id"], "Sernik", ["twarog"])
+        assert recipe_image.request_recipe_image(again, db) == recipe_image.IMAGE_READY
+    finally:
+        db.close()
+    assert len(backend.submitted) == 4
+
+    report = client.get("/api/admin/image-reuse", headers={"X-Admin-Token": "test-admin-token"}).json()
+    assert report["generated"] == 1
+    assert report["similar_aliases"] == 2
+    assert report["reused_similar"] == 3
+    assert report["generations_avoided"] == 3
+    assert report["top_reused"][0] == {"cache_key": "classic_cheesecake_pl_dessert", "aliases": 2, "hits": 3}
@@ -0,0 +1,103 @@
+"""Streaming recipe creation (POST /api/recipes/stream) and the partial JSON parser behind it."""
+import json
+from unittest.mock import patch
+
+from app import metrics, models
+from app.services.partial_json import PartialJSONObjectParser
+from tests.conftest import MOCK_TRANSLATED, TestSessionLocal, sse_events
+
+
+def _fake_stream(translated: dict, chunk_size: int = 7):
+    """Mimic translate_recipe_stream: feed the JSON to the parser in small chunks."""
+    def _gen(**kwargs):
+        text = json.dumps(translated, ensure_ascii=False)
+        parser = PartialJSONObjectParser()
+        for i in range(0, len(text), chunk_size):
+            yield from parser.feed(text[i:i + chunk_size])
+        yield ("result", dict(translated))
+    return _gen
+
+
+def test_partial_parser_emits_fields_and_items_across_chunk_boundaries():
+    doc = {"title_pl": 'Zupa "domowa", [1]', "ingredients_pl": ["1 a", "2 b, c"], "notes": {"x": [1]}, "n": 3}
+    text = json.dumps(doc, ensure_ascii=False)
+    parser = PartialJSONObjectParser()
+    events = []
+    for ch in text:
+        events += parser.feed(ch)
+    assert events == [
+        ("field", "title_pl", 'Zupa "domowa", [1]'),
+        ("item", "ingredients_pl", 0, "1 a"),
+        ("item", "ingredients_pl", 1, "2 b, c"),
+        ("field", "ingredients_pl", ["1 a", "2 b, c"]),
+        ("field", "notes", {"x": [1]}),
+        ("field", "n", 3),
+    ]
+    assert json.loads(parser.text()) == doc
+
+
+def test_stream_emits_title_ingredients_steps_then_persists(client, auth_headers, registered_user):
+    metrics.reset()
+    with patch("app.routers.recipes.translate_recipe_stream", side_effect=_fake_stream(MOCK_TRANSLATED)):
+        with client.stream("POST", "/api/recipes/stream", json={"raw_input": "מרק עגבניות"}, headers=auth_headers) as r:
+            assert r.status_code == 200
+            assert r.headers["content-type"].startswith("text/event-stream")
+            events = sse_events("".join(r.iter_text()))
+
+    names = [name for name, _ in events]
+    assert names == ["meta", "title"] + ["ingredient"] * 3 + ["step"] * 3 + ["recipe", "done"]
+    assert events[1][1]["title"] == "Zupa Pomidorowa"
+    assert events[2][1]["text"] == {"amount": "500g", "name": "pomidory"}
+    recipe_out = events[-2][1]["recipe"]
+    assert recipe_out["title_pl"] == "Zupa Pomidorowa"
+    assert events[-1][1]["recipe_ids"] == [recipe_out["id"]]
+    assert events[-1][1]["time_to_first_content_ms"] is not None
+
+    db = TestSessionLocal()
+    try:
+        assert db.get(models.Recipe, recipe_out["id"]) is not None
+        assert db.get(models.User, registered_user["id"]).transformations_used == 1
+    finally:
+        db.close()
+    assert metrics.snapshot()["timings"]["recipes.stream.time_to_first_content"]["count"] == 1
+
+
+def test_stream_not_a_recipe_sends_error_event_without_charging(client, auth_headers, registered_user):
+    def _not_a_recipe(**kwargs):
+        raise ValueError("NOT_A_RECIPE: classifier=false")
+        yield  # pragma: no cover
+
+    with patch("app.routers.recipes.translate_recipe_stream", side_effect=_not_a_recipe):
+        with client.stream("POST", "/api/recipes/stream", json={"raw_input": "hello"}, headers=auth_headers) as r:
+            events = sse_events("".join(r.iter_text()))
+    assert events[-1][0] == "error"
+    assert events[-1][1]["status_code"] == 422
+
+    db = TestSessionLocal()
+    try:
+        assert db.query(models.Recipe).count() == 0
+        assert db.get(models.User, registered_user["id"]).transformations_used == 0
+    finally:
+        db.close()
+
+
+def test_translate_recipe_stream_parses_openai_deltas():
+    from types import SimpleNamespace
+
+    from app.services.translation import translate_recipe_stream
+
+    text = json.dumps({"title_pl": "Zupa", "ingredients_pl": ["woda"], "steps_pl": ["Gotuj."]})
+    chunks = [
+        SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text[i:i + 5]))])
+        for i in range(0, len(text), 5)
+    ]
+    with patch("app.services.translation.OpenAI") as mock_openai, patch(
+        "app.services.translation._is_recipe", return_value=True
+    ), patch("app.services.translation.detect_language", return_value="he"):
+        mock_openai.return_value.chat.completions.create.return_value = iter(chunks)
+        events = list(translate_recipe_stream("x", "pl", "PL", ""))
+
+    assert events[0] == ("field", "title_pl", "Zupa")
+    assert ("item", "steps_pl", 0, "Gotuj.") in events
+    assert events[-1][0] == "result"
+    assert events[-1][1]["detected_language"] == "he"
@@ -2,8 +2,11 @@
 import json
 from unittest.mock import MagicMock, patch
 
+import httpx
+
 from tests.conftest import MOCK_TRANSLATED, CAPTCHA_DUMMY, password_hash
 from app import models
+from app.services.page_fetch import FetchedPage
 from tests.conftest import TestSessionLocal
 
 
@@ -259,16 +262,13 @@ def test_create_recipe_from_url_fetches_and_translates(client, auth_headers):
     <html><head><script>nope</script></head>
     <body><p>מרק עגבניות</p><p>Składniki: pomidory</p></body></html>
     """
-    mock_resp = MagicMock()
-    mock_resp.status_code = 200
-    mock_resp.text = html
-    mock_resp.content = html.encode("utf-8")
+    page = FetchedPage("https://example.com/recipe", 200, httpx.Headers(), html)
 
     def split_mock(page_text):
         # Return one chunk (full page) so translate_recipe is called once
         return [(page_text or "").strip()] if (page_text or "").strip() else []
 
-    with patch("app.routers.recipes.httpx.get", return_value=mock_resp), patch(
+    with patch("app.services.page_fetch.fetch_page", return_value=page), patch(
         "app.routers.recipes.split_page_into_recipes", side_effect=split_mock
     ), patch("app.routers.recipes.translate_recipe", return_value=MOCK_TRANSLATED):
         r = client.post(
@@ -287,10 +287,7 @@ def test_create_recipe_from_url_fetches_and_translates(client, auth_headers):
 def test_create_recipe_from_url_two_recipes_returns_two(client, auth_headers):
     """When page has two recipes, extraction yields 2 chunks and API returns 2 created recipes."""
     html = "<html><body><p>Recipe 1 and Recipe 2 page</p></body></html>"
-    mock_resp = MagicMock()
-    mock_resp.status_code = 200
-    mock_resp.text = html
-    mock_resp.content = html.encode("utf-8")
+    page = FetchedPage("https://example.com/recipe", 200, httpx.Headers(), html)
 
     def split_mock(page_text):
         # Simulate extractor finding two recipes: return two chunks
@@ -302,7 +299,7 @@ def test_create_recipe_from_url_two_recipes_returns_two(client, auth_headers):
     first_translated = {**MOCK_TRANSLATED, "title_pl": "First", "title_original": "First Recipe"}
     second_translated = {**MOCK_TRANSLATED, "title_pl": "Second", "title_original": "Second Recipe"}
 
-    with patch("app.routers.recipes.httpx.get", return_value=mock_resp), patch(
+    with patch("app.services.page_fetch.fetch_page", return_value=page), patch(
         "app.routers.recipes.split_page_into_recipes", side_effect=split_mock
     ), patch(
         "app.routers.recipes.translate_recipe",
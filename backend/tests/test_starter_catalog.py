@@ -0,0 +1,78 @@
+"""Starter-recipe catalog: onboarding reads stored sets; AI runs only for unseen combinations."""
+from unittest.mock import patch
+
+from app import models
+from app.cli import main as cli_main
+from app.services.starter_recipes import _fallback_recipes
+from tests.conftest import TestSessionLocal
+
+
+def _vegetarian_set() -> list[dict]:
+    return [
+        {
+            "title": f"Veggie dish {i}",
+            "ingredients": ["200 g rice", "1 onion"],
+            "steps": ["Cook."],
+            "author_name": f"Chef {i}",
+            "author_bio": "Cookbook author",
+            "author_image_url": None,
+            "tags": ["easy"],
+        }
+        for i in range(3)
+    ]
+
+
+def _catalog_rows() -> int:
+    db = TestSessionLocal()
+    try:
+        return db.query(models.StarterRecipeSet).count()
+    finally:
+        db.close()
+
+
+def test_onboarding_generates_once_per_combination(client):
+    body = {"target_country": "PL", "target_language": "pl", "dish_preferences": ["soups", "pasta"], "diet_filters": ["vegetarian"]}
+    with patch("app.services.starter_recipes.get_starter_recipes", return_value=_vegetarian_set()) as mock_get:
+        assert client.post("/api/onboarding/prepare-starter-recipes", json=body).status_code == 200
+        same_combo = {**body, "dish_preferences": ["Pasta", "soups"]}
+        assert client.post("/api/onboarding/prepare-starter-recipes", json=same_combo).status_code == 200
+        assert mock_get.call_count == 1
+
+        other_diet = {**body, "diet_filters": ["vegan"]}
+        assert client.post("/api/onboarding/prepare-starter-recipes", json=other_diet).status_code == 200
+        assert mock_get.call_count == 2
+
+    db = TestSessionLocal()
+    try:
+        prepared = db.query(models.PreparedStarterRecipes).all()
+        assert len(prepared) == 3
+        assert prepared[1].recipes_data == _vegetarian_set()
+    finally:
+        db.close()
+
+
+def test_fallback_and_non_compliant_sets_are_not_cached(client):
+    body = {"target_country": "US", "target_language": "en", "diet_filters": ["vegetarian"]}
+    with patch("app.services.starter_recipes.get_starter_recipes", return_value=_fallback_recipes("en")) as mock_get:
+        client.post("/api/onboarding/prepare-starter-recipes", json=body)
+        client.post("/api/onboarding/prepare-starter-recipes", json=body)
+    assert mock_get.call_count == 2
+
+    meat = _vegetarian_set()
+    meat[0]["ingredients"] = ["500 g chicken"]
+    with patch("app.services.starter_recipes.get_starter_recipes", return_value=meat):
+        client.post("/api/onboarding/prepare-starter-recipes", json=body)
+    assert _catalog_rows() == 0
+
+
+def test_warm_starter_catalog_command_skips_existing_sets(capsys):
+    args = ["warm-starter-catalog", "--locale", "PL:pl", "--locale", "il:HE", "--diets", "", "--diets", "vegetarian"]
+    with patch("app.services.starter_recipes.get_starter_recipes", return_value=_vegetarian_set()) as mock_get:
+        assert cli_main(args) == 0
+        assert mock_get.call_count == 4
+        assert "Generated 4 starter set(s); 0 already" in capsys.readouterr().out
+
+        assert cli_main(args) == 0
+        assert mock_get.call_count == 4
+        assert "Generated 0 starter set(s); 4 already" in capsys.readouterr().out
+    assert _catalog_rows() == 4
@@ -0,0 +1,192 @@
+"""URL import: bounded streaming fetch through the shared client, structured-data fast path, page cache."""
+import copy
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app import models
+from app.services import page_cache, page_fetch
+from tests.conftest import MOCK_TRANSLATED, TestSessionLocal
+
+FIXTURES = Path(__file__).parent / "fixtures" / "recipe_pages"
+
+
+@pytest.fixture
+def transport():
+    """Route the shared client through a handler set by the test."""
+    routes: dict = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return routes[str(request.url)](request)
+
+    page_fetch.set_client(httpx.Client(transport=httpx.MockTransport(handler), follow_redirects=False))
+    yield routes
+    page_fetch.set_client(None)
+
+
+def test_fetch_stops_reading_at_the_byte_cap(transport):
+    sent = []
+
+    def endless():
+        for _ in range(1000):
+            sent.append(1)
+            yield b"x" * 1024
+
+    transport["https://example.com/huge"] = lambda request: httpx.Response(200, content=endless())
+    with pytest.raises(page_fetch.PageFetchError, match="too large"):
+        page_fetch.fetch_page("https://example.com/huge", max_bytes=16 * 1024)
+    assert len(sent) <= 17
+
+
+def test_fetch_decodes_split_multibyte_characters_and_meta_charset(transport):
+    body = "<p>Żurek z jajkiem</p>".encode("utf-8")
+    transport["https://example.com/utf8"] = lambda request: httpx.Response(
+        200, content=iter([body[:4], body[4:5], body[5:]]), headers={"content-type": "text/html; charset=utf-8"}
+    )
+    assert page_fetch.fetch_page("https://example.com/utf8").text == "<p>Żurek z jajkiem</p>"
+
+    latin2 = '<meta charset="iso-8859-2"><p>Gołąbki</p>'.encode("iso-8859-2")
+    transport["https://example.com/latin2"] = lambda request: httpx.Response(200, content=latin2)
+    assert page_fetch.fetch_page("https://example.com/latin2").text.endswith("<p>Gołąbki</p>")
+
+
+def test_redirects_are_checked_and_total_deadline_is_enforced(transport):
+    transport["https://example.com/moved"] = lambda request: httpx.Response(
+        302, headers={"location": "http://127.0.0.1/admin"}
+    )
+    with pytest.raises(page_fetch.PageFetchError, match="disallowed URL"):
+        page_fetch.fetch_page("https://example.com/moved")
+
+    def slow():
+        for _ in range(20):
+            time.sleep(0.05)
+            yield b"x"
+
+    transport["https://example.com/slow"] = lambda request: httpx.Response(200, content=slow())
+    started = time.monotonic()
+    with pytest.raises(page_fetch.PageFetchError, match="Timed out"):
+        page_fetch.fetch_page("https://example.com/slow", deadline_s=0.2)
+    assert time.monotonic() - started < 0.5
+
+
+def test_each_body_read_is_bounded_by_the_time_left(transport):
+    read_timeouts = []
+
+    def trickle(request):
+        for _ in range(4):
+            read_timeouts.append(request.extensions["timeout"]["read"])
+            time.sleep(0.05)
+            yield b"x"
+
+    transport["https://example.com/trickle"] = lambda request: httpx.Response(200, content=trickle(request))
+    assert page_fetch.fetch_page("https://example.com/trickle", deadline_s=1.0).text == "xxxx"
+    assert read_timeouts[0] <= 1.0
+    assert all(later < earlier - 0.04 for earlier, later in zip(read_timeouts, read_timeouts[1:]))
+
+
+def test_url_import_reports_fetch_errors_and_shares_one_client(client, auth_headers, transport):
+    transport["https://example.com/big"] = lambda request: httpx.Response(
+        200, content=b"x" * 10, headers={"content-length": str(page_fetch.MAX_FETCH_BYTES + 1)}
+    )
+    r = client.post("/api/recipes/", json={"source_url": "https://example.com/big"}, headers=auth_headers)
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Page is too large to process."
+    assert page_fetch.get_client() is page_fetch.get_client()
+
+
+def test_structured_data_corpus_coverage(capsys):
+    from app.cli import main as cli_main
+
+    assert cli_main(["bench-structured-import"]) == 0
+    out = capsys.readouterr().out
+    assert "Structured data: 5/7 page(s), 6 recipe(s)" in out
+    assert "2 page(s) need the extraction LLM" in out
+
+
+def test_json_ld_recipe_skips_the_extraction_llm(client, auth_headers, transport):
+    page = (FIXTURES / "wordpress_jsonld_graph.html").read_text(encoding="utf-8")
+    transport["https://example.com/soup"] = lambda request: httpx.Response(
+        200, text=page, headers={"content-type": "text/html; charset=utf-8"}
+    )
+    with patch("app.services.translation.extract_recipes_from_page") as extract, patch(
+        "app.routers.recipes.translate_recipe", return_value=copy.deepcopy(MOCK_TRANSLATED)
+    ) as translate:
+        r = client.post("/api/recipes/", json={"source_url": "https://example.com/soup"}, headers=auth_headers)
+    assert r.status_code == 201
+    extract.assert_not_called()
+    raw_input = translate.call_args.kwargs["raw_input"]
+    assert raw_input.startswith("Creamy Tomato Soup\n\nIngredients:\n- 2 tablespoons olive oil")
+    assert "- salt & pepper" in raw_input
+    assert "4. Blend until smooth, stir in the cream and season." in raw_input
+
+
+def test_page_cache_skips_fetch_when_fresh_and_revalidates_with_etag(client, auth_headers, transport):
+    requests = []
+
+    def handler(request):
+        requests.append(dict(request.headers))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"etag": '"v1"'})
+        return httpx.Response(200, text="<p>Pancakes: flour, milk, eggs. Mix and fry.</p>", headers={"etag": '"v1"'})
+
+    transport["https://example.com/pancakes?utm_source=x"] = handler
+    transport["https://example.com/pancakes"] = handler
+
+    def import_(url):
+        with patch("app.routers.recipes.split_page_into_recipes", return_value=["pancakes"]) as split, patch(
+            "app.routers.recipes.translate_recipe", return_value=copy.deepcopy(MOCK_TRANSLATED)
+        ):
+            r = client.post("/api/recipes/", json={"source_url": url}, headers=auth_headers)
+        assert r.status_code == 201
+        return split.call_count
+
+    assert import_("https://example.com/pancakes?utm_source=x") == 1
+    assert page_cache.normalize_url("HTTPS://Example.com:443/pancakes?utm_source=x#top") == "https://example.com/pancakes"
+    assert import_("https://example.com/pancakes") == 0  # fresh: no request at all
+    assert len(requests) == 1
+
+    with patch.object(page_cache, "FRESH_S", 0):
+        assert import_("https://example.com/pancakes") == 0  # 304: cached extraction reused
+    assert len(requests) == 2
+    assert requests[1]["if-none-match"] == '"v1"'
+
+
+def test_page_cache_evicts_by_age_and_size():
+    db = TestSessionLocal()
+    try:
+        for name in ("a", "b", "c"):
+            page_cache.store(db, f"https://example.com/{name}", httpx.Headers(), "x" * 100, [name * 100], "llm")
+        page_cache.mark_used(db, page_cache.lookup(db, "https://example.com/a"))
+        old = page_cache.lookup(db, "https://example.com/c")
+        old.fetched_at = datetime.now(timezone.utc) - timedelta(days=365)
+        db.commit()
+
+        assert page_cache.evict(db, max_bytes=250) == 2  # c by age, then least recently used b by size
+        assert [e.url for e in db.query(models.FetchedPageCache)] == ["https://example.com/a"]
+    finally:
+        db.close()
+
+
+def test_page_text_keeps_structure_and_drops_boilerplate(capsys):
+    from app.cli import main as cli_main
+    from app.services.page_text import html_to_text
+
+    page = (
+        "<html><head><title>Pierogi</title><script>if (a < b) {}</script></head><body>"
+        '<nav><ul><li><a href="/">Home</a></li></ul></nav>'
+        '<div role="complementary"><p>Ads</p></div>'
+        "<h2>Ingredients</h2><ul><li>500 g flour</li><li>1 onion</li></ul>"
+        "<h2>Steps</h2><ol><li>Knead.</li><li>Boil &amp; serve.</li></ol>"
+        "<footer>© blog</footer></body></html>"
+    )
+    assert html_to_text(page) == (
+        "Pierogi\n# Ingredients\n- 500 g flour\n- 1 onion\n# Steps\n1. Knead.\n2. Boil & serve."
+    )
+    assert html_to_text("<p>x</p>" * 10000, max_chars=100) == ("x\n" * 50)[:100]
+
+    assert cli_main(["bench-page-text", "--large-bytes", "20000"]) == 0
+    assert "synthetic_unterminated_scripts.html" in capsys.readouterr().out